@@ -19,10 +19,15 @@ import os
 import sys
 import time
 
-from uaclient import config, contract, entitlements, status
+from uaclient import config, contract, dpkg, entitlements, status
 from uaclient.exceptions import UserFacingError, LockHeldError
 
-from uaclient.util import subp, ProcessExecutionError, UrlError
+from uaclient.util import (
+    subp,
+    setup_system_facts_cache,
+    ProcessExecutionError,
+    UrlError,
+)
 from uaclient.cli import setup_logging, assert_lock_file
 
 # Retry sleep backoff algorithm if lock is held.
@@ -160,4 +165,9 @@ def main(cfg):
 
 if __name__ == "__main__":
     cfg = config.UAConfig()
-    main(cfg=cfg)
+    setup_system_facts_cache(cfg.data_dir)
+    dpkg.setup_dpkg_status_cache(cfg.data_dir)
+    try:
+        main(cfg=cfg)
+    finally:
+        cfg.flush_notices()
@@ -299,4 +299,8 @@ def update_apt_and_motd_messages(cfg: config.UAConfig) -> None:
 
 if __name__ == "__main__":
     cfg = config.UAConfig()
-    update_apt_and_motd_messages(cfg=cfg)
+    util.setup_system_facts_cache(cfg.data_dir)
+    try:
+        update_apt_and_motd_messages(cfg=cfg)
+    finally:
+        cfg.flush_notices()
@@ -27,22 +27,13 @@ import sys
 from uaclient.cli import setup_logging
 from uaclient.config import UAConfig
 from uaclient.contract import process_entitlements_delta
-from uaclient.util import parse_os_release, subp
-
-version_to_codename = {
-    "14.04": "trusty",
-    "16.04": "xenial",
-    "18.04": "bionic",
-    "20.04": "focal",
-    "20.10": "groovy",
-}
-
-current_codename_to_past_codename = {
-    "xenial": "trusty",
-    "bionic": "xenial",
-    "focal": "bionic",
-    "groovy": "focal",
-}
+from uaclient.distro_info import get_distro_info
+from uaclient.util import (
+    clear_platform_info_cache,
+    override_platform_series,
+    parse_os_release,
+    subp,
+)
 
 
 def process_contract_delta_after_apt_lock() -> None:
@@ -58,18 +49,33 @@ def process_contract_delta_after_apt_lock() -> None:
     print(msg)
     logging.debug(msg)
 
+    # do-release-upgrade replaced /etc/os-release, drop any stale snapshot
+    clear_platform_info_cache()
     current_version = parse_os_release()["VERSION_ID"]
-    current_release = version_to_codename[current_version]
+    distro_info = get_distro_info()
+    release_info = distro_info.get_release_by_version(current_version)
+    if not release_info:
+        msg = "Unable to identify Ubuntu release for VERSION_ID {}".format(
+            current_version
+        )
+        print(msg)
+        logging.warning(msg)
+        sys.exit(1)
+    current_release = release_info.series
 
-    if current_release == "trusty":
-        msg = "Unable to execute upgrade-lts-contract.py on trusty"
+    past_release_info = distro_info.previous_release(current_release)
+    if current_release == "trusty" or not past_release_info:
+        msg = "Unable to execute upgrade-lts-contract.py on {}".format(
+            current_release
+        )
         print(msg)
         logging.warning(msg)
         sys.exit(1)
 
-    past_release = current_codename_to_past_codename[current_release]
+    past_release = past_release_info.series
     past_entitlements = UAConfig(series=past_release).entitlements
-    new_entitlements = UAConfig(series=current_release).entitlements
+    cfg = UAConfig(series=current_release)
+    new_entitlements = cfg.entitlements
 
     retry_count = 0
     while out:
@@ -84,12 +90,17 @@ def process_contract_delta_after_apt_lock() -> None:
     print(msg)
     logging.debug(msg)
 
-    process_entitlements_delta(
-        past_entitlements=past_entitlements,
-        new_entitlements=new_entitlements,
-        allow_enable=True,
-        series_overrides=False,
-    )
+    try:
+        with override_platform_series(current_release):
+            process_entitlements_delta(
+                past_entitlements=past_entitlements,
+                new_entitlements=new_entitlements,
+                allow_enable=True,
+                series_overrides=False,
+                cfg=cfg,
+            )
+    finally:
+        cfg.flush_notices()
     msg = "upgrade-lts-contract succeeded after {} retries".format(retry_count)
     print(msg)
     logging.debug(msg)
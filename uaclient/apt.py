@@ -1,29 +1,60 @@
+import email.utils
 import glob
+import hashlib
+import json
 import logging
 import os
 import re
+import shutil
 import subprocess
 import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
+from uaclient import dpkg
 from uaclient import exceptions
 from uaclient import gpg
 from uaclient import status
 from uaclient import util
 
 try:
-    from typing import Dict, List, Optional  # noqa
+    import apt_pkg  # type: ignore
+except ImportError:
+    # python3-apt is optional, apt-cache is used in its absence
+    apt_pkg = None
+
+try:
+    from typing import (  # noqa: F401
+        Any,
+        Callable,
+        Dict,
+        Iterable,
+        List,
+        Optional,
+        Set,
+        Tuple,
+    )
 except ImportError:
     # typing isn't available on trusty, so ignore its absence
     pass
 
 APT_HELPER_TIMEOUT = 60.0  # 60 second timeout used for apt-helper call
 APT_AUTH_COMMENT = "  # ubuntu-advantage-tools"
-APT_CONFIG_AUTH_FILE = "Dir::Etc::netrc/"
-APT_CONFIG_AUTH_PARTS_DIR = "Dir::Etc::netrcparts/"
-APT_CONFIG_LISTS_DIR = "Dir::State::lists/"
+APT_CONFIG_AUTH_FILE = "Dir::Etc::netrc"
+APT_CONFIG_AUTH_PARTS_DIR = "Dir::Etc::netrcparts"
+APT_CONFIG_LISTS_DIR = "Dir::State::lists"
+APT_CONFIG_STATE_DIR = "Dir::State"
+APT_CONFIG_SOURCES_FILE = "Dir::Etc::sourcelist"
+APT_CONFIG_SOURCES_PARTS_DIR = "Dir::Etc::sourceparts"
+APT_CONFIG_PREFERENCES_FILE = "Dir::Etc::preferences"
+APT_CONFIG_PREFERENCES_PARTS_DIR = "Dir::Etc::preferencesparts"
+APT_AUTH_PARTS_FILENAME = "90ubuntu-advantage"
 APT_KEYS_DIR = "/etc/apt/trusted.gpg.d"
 KEYRINGS_DIR = "/usr/share/keyrings"
 APT_METHOD_HTTPS_FILE = "/usr/lib/apt/methods/https"
+
 CA_CERTIFICATES_FILE = "/usr/sbin/update-ca-certificates"
 
 # Since we generally have a person at the command line prompt. Don't loop
@@ -32,13 +63,600 @@ CA_CERTIFICATES_FILE = "/usr/sbin/update-ca-certificates"
 # Hope for an optimal first try.
 APT_RETRIES = [1.0, 5.0, 10.0]
 
+# Upper bound on concurrent apt credentials validations in an AptTransaction
+APT_CREDENTIALS_MAX_WORKERS = 8
+
+# apt's built-in directory configuration, used when apt-config fails
+APT_CONFIG_DEFAULTS = {
+    "Dir": "/",
+    "Dir::Etc": "etc/apt/",
+    "Dir::Etc::netrc": "auth.conf",
+    "Dir::Etc::netrcparts": "auth.conf.d",
+    "Dir::Etc::sourcelist": "sources.list",
+    "Dir::Etc::sourceparts": "sources.list.d",
+    "Dir::Etc::preferences": "preferences",
+    "Dir::Etc::preferencesparts": "preferences.d",
+    "Dir::State": "var/lib/apt/",
+    "Dir::State::lists": "lists/",
+}
+
+REGEX_APT_CONFIG_DUMP = r'^(?P<key>[^\s"]+) "(?P<value>.*)";$'
+REGEX_APT_AUTH_MACHINE = r"machine\s+(?P<repo_url>[.\-\w]+)/?.*"
+REGEX_APT_SOURCE_LINE = (
+    r"^\s*deb(?:-src)?\s+(?:\[[^\]]*\]\s+)?(?P<url>\S+)\s+(?P<suite>\S+)"
+    r"(?P<components>.*)$"
+)
+
+# Per-invocation AptConfig, see get_apt_config
+_APT_CONFIG = None  # type: Optional[AptConfig]
+
+# Per-invocation AptPolicy snapshot and the apt state it was taken from
+_APT_POLICY = None  # type: Optional[Tuple[Any, AptPolicy]]
+
+APT_LISTS_UPDATED_FILE = "apt-lists-updated.json"
+
+# Touched by the APT::Update::Post-Invoke-Success hook of update-notifier
+# after every successful apt update, relative to Dir::State
+APT_UPDATE_SUCCESS_STAMP = "periodic/update-success-stamp"
+# Key of apt-lists-updated.json recording the update-success-stamp mtime
+# left by uaclient's last restricted update, which doesn't prove that all
+# sources were fetched
+_RESTRICTED_UPDATE_STAMP_KEY = "restricted-update-success-stamp"
+
+# Seconds apt lists are used without apt-get update and the file recording
+# when uaclient last updated them, see setup_apt_lists_max_age
+_APT_LISTS_MAX_AGE = 0
+_APT_LISTS_UPDATED_PATH = None  # type: Optional[str]
+
+
+class AptConfig:
+    """Parsed apt-config dump output with apt's path resolution rules."""
+
+    def __init__(
+        self,
+        values: "Dict[str, str]",
+        lists: "Optional[Dict[str, List[str]]]" = None,
+    ) -> None:
+        self._values = values
+        self._lists = lists or {}
+
+    @classmethod
+    def parse(cls, dump_output: str) -> "AptConfig":
+        values = {}  # type: Dict[str, str]
+        lists = {}  # type: Dict[str, List[str]]
+        for line in dump_output.splitlines():
+            match = re.match(REGEX_APT_CONFIG_DUMP, line)
+            if not match:
+                continue
+            key, value = match.group("key"), match.group("value")
+            if key.endswith("::"):
+                lists.setdefault(key[:-2], []).append(value)
+            else:
+                values[key] = value
+        return cls(values, lists)
+
+    def get(self, key: str, default: "Optional[str]" = None):
+        return self._values.get(key, default)
+
+    def get_list(self, key: str) -> "List[str]":
+        return list(self._lists.get(key, []))
+
+    def find_file(self, key: str) -> "Optional[str]":
+        """Resolve key to a path like apt-config's FindFile.
+
+        Relative values are prefixed by the value of each parent key until
+        an absolute path is reached: Dir::Etc::netrc -> /etc/apt/auth.conf
+
+        :return: The path or None when key is unset.
+        """
+        value = self._values.get(key)
+        if not value:
+            return None
+        parts = key.split("::")[:-1]
+        while parts:
+            parent_value = self._values.get("::".join(parts))
+            parts.pop()
+            if not parent_value:
+                continue
+            if value.startswith(("/", "~/", "./", "../")):
+                break
+            if not parent_value.endswith("/"):
+                value = "/" + value
+            value = parent_value + value
+        root_dir = self._values.get("RootDir")
+        if root_dir:
+            value = os.path.join(root_dir, value.lstrip("/"))
+        return value
+
+    def find_dir(self, key: str) -> "Optional[str]":
+        """Resolve key to a directory path ending in a slash."""
+        path = self.find_file(key)
+        if path and not path.endswith("/"):
+            path += "/"
+        return path
+
+    @property
+    def netrc_parts_dir(self) -> "Optional[str]":
+        """The auth.conf.d dir or None when apt doesn't support it."""
+        return self.find_dir(APT_CONFIG_AUTH_PARTS_DIR)
+
+    @property
+    def netrc_file(self) -> str:
+        return self.find_file(APT_CONFIG_AUTH_FILE) or "/etc/apt/auth.conf"
+
+    @property
+    def auth_file(self) -> str:
+        """The file in which uaclient stores apt repository credentials."""
+        netrc_parts_dir = self.netrc_parts_dir
+        if netrc_parts_dir:
+            return netrc_parts_dir + APT_AUTH_PARTS_FILENAME
+        return self.netrc_file
+
+    @property
+    def lists_dir(self) -> str:
+        return self.find_dir(APT_CONFIG_LISTS_DIR) or "/var/lib/apt/lists/"
+
+    @property
+    def update_success_stamp(self) -> str:
+        state_dir = self.find_dir(APT_CONFIG_STATE_DIR) or "/var/lib/apt/"
+        return state_dir + APT_UPDATE_SUCCESS_STAMP
+
+    @property
+    def sourcelist(self) -> str:
+        return (
+            self.find_file(APT_CONFIG_SOURCES_FILE) or "/etc/apt/sources.list"
+        )
+
+    @property
+    def sourceparts(self) -> str:
+        return (
+            self.find_dir(APT_CONFIG_SOURCES_PARTS_DIR)
+            or "/etc/apt/sources.list.d/"
+        )
+
+    @property
+    def preferences(self) -> str:
+        return (
+            self.find_file(APT_CONFIG_PREFERENCES_FILE)
+            or "/etc/apt/preferences"
+        )
+
+    @property
+    def preferences_parts(self) -> str:
+        return (
+            self.find_dir(APT_CONFIG_PREFERENCES_PARTS_DIR)
+            or "/etc/apt/preferences.d/"
+        )
+
+
+def get_apt_config() -> AptConfig:
+    """Return the system AptConfig, reading apt-config once per process."""
+    global _APT_CONFIG
+    if _APT_CONFIG is None:
+        try:
+            out, _err = util.subp(["apt-config", "dump"])
+            _APT_CONFIG = AptConfig.parse(out)
+        except util.ProcessExecutionError as e:
+            logging.debug(
+                "Unable to read apt-config, using apt defaults: %s", str(e)
+            )
+            _APT_CONFIG = AptConfig(APT_CONFIG_DEFAULTS)
+    return _APT_CONFIG
+
+
+def clear_apt_config_cache() -> None:
+    """Drop the AptConfig so the next lookup reruns apt-config."""
+    global _APT_CONFIG
+    _APT_CONFIG = None
+
+
+# A "Package files" entry of apt-cache policy, release holds parsed
+# release fields such as o (origin), a (suite), n (codename) and c.
+AptPolicySource = namedtuple(
+    "AptPolicySource", ("priority", "url", "dist", "release", "origin")
+)
+
+REGEX_APT_POLICY_SOURCE = (
+    r"^\s*(?P<priority>-?\d+) (?P<url>\S+)(?: (?P<dist>\S+))?"
+)
+REGEX_APT_POLICY_RELEASE = r"^\s+release (?P<fields>.*)$"
+REGEX_APT_POLICY_ORIGIN = r"^\s+origin (?P<origin>.*)$"
+
+
+class AptPolicy:
+    """Parsed apt-cache policy package files indexed by url, origin, suite."""
+
+    def __init__(self, sources: "List[AptPolicySource]") -> None:
+        self.sources = sources
+        self._by_url = {}  # type: Dict[str, List[AptPolicySource]]
+        self._by_origin = {}  # type: Dict[str, List[AptPolicySource]]
+        self._by_suite = {}  # type: Dict[str, List[AptPolicySource]]
+        for source in sources:
+            self._by_url.setdefault(source.url.rstrip("/"), []).append(source)
+            origin = source.release.get("o")
+            if origin:
+                self._by_origin.setdefault(origin, []).append(source)
+            suite = source.release.get("a")
+            if suite:
+                self._by_suite.setdefault(suite, []).append(source)
+
+    @classmethod
+    def parse(cls, policy_output: str) -> "AptPolicy":
+        """Parse the Package files section of apt-cache policy output."""
+        sources = []  # type: List[AptPolicySource]
+        for line in policy_output.splitlines():
+            if line.startswith("Pinned packages:"):
+                break
+            source_match = re.match(REGEX_APT_POLICY_SOURCE, line)
+            if source_match:
+                sources.append(
+                    AptPolicySource(
+                        priority=int(source_match.group("priority")),
+                        url=source_match.group("url"),
+                        dist=source_match.group("dist") or "",
+                        release={},
+                        origin=None,
+                    )
+                )
+                continue
+            if not sources:
+                continue
+            release_match = re.match(REGEX_APT_POLICY_RELEASE, line)
+            if release_match:
+                for field in release_match.group("fields").split(","):
+                    key, _, value = field.partition("=")
+                    if value:
+                        sources[-1].release[key.strip()] = value.strip()
+                continue
+            origin_match = re.match(REGEX_APT_POLICY_ORIGIN, line)
+            if origin_match:
+                sources[-1] = sources[-1]._replace(
+                    origin=origin_match.group("origin").strip()
+                )
+        return cls(sources)
+
+    def get_sources(
+        self,
+        url: "Optional[str]" = None,
+        origin: "Optional[str]" = None,
+        suite: "Optional[str]" = None,
+    ) -> "List[AptPolicySource]":
+        """Return package files matching all of url, origin and suite.
+
+        :param url: The archive url as configured: http://host/ubuntu
+        :param origin: The release Origin field: Ubuntu, UbuntuESM
+        :param suite: The release Suite field: bionic-updates
+        """
+        if url is not None:
+            candidates = self._by_url.get(url.rstrip("/"), [])
+        elif origin is not None:
+            candidates = self._by_origin.get(origin, [])
+        elif suite is not None:
+            candidates = self._by_suite.get(suite, [])
+        else:
+            candidates = self.sources
+        return [
+            source
+            for source in candidates
+            if (origin is None or source.release.get("o") == origin)
+            and (suite is None or source.release.get("a") == suite)
+        ]
+
+    def get_pin_priority(self, url: str) -> "Optional[int]":
+        """Return the pin priority of url or None when it isn't configured."""
+        sources = self.get_sources(url=url)
+        if not sources:
+            return None
+        return sources[0].priority
+
+
+class AptPkgPolicy(AptPolicy):
+    """AptPolicy read through python3-apt instead of forking apt-cache."""
+
+    # PackageFile attributes matching apt-cache policy release fields
+    RELEASE_FIELDS = (
+        ("v", "version"),
+        ("o", "origin"),
+        ("a", "archive"),
+        ("n", "codename"),
+        ("l", "label"),
+        ("c", "component"),
+        ("b", "architecture"),
+    )
+
+    @classmethod
+    def from_apt_pkg(cls) -> "AptPkgPolicy":
+        """Read the package files and pin priorities of the system cache.
+
+        :raise SystemError: on errors reading apt configuration or cache.
+        """
+        apt_pkg.init()
+        cache = apt_pkg.Cache(None)
+        policy = apt_pkg.Policy(cache)
+        source_list = apt_pkg.SourceList()
+        source_list.read_main_list()
+        sources = []
+        for pkg_file in cache.file_list:
+            index_file = source_list.find_index(pkg_file)
+            if index_file:
+                # Same "url dist arch Packages" description as apt-cache
+                url, _, dist = index_file.describe.partition(" ")
+                dist = dist.split(" ")[0]
+            else:
+                url, dist = pkg_file.filename, ""
+            release = {}
+            for field, attr in cls.RELEASE_FIELDS:
+                value = getattr(pkg_file, attr, None)
+                if value:
+                    release[field] = value
+            sources.append(
+                AptPolicySource(
+                    priority=policy.get_priority(pkg_file),
+                    url=url,
+                    dist=dist,
+                    release=release,
+                    origin=pkg_file.site or None,
+                )
+            )
+        return cls(sources)
+
+
+def _get_apt_policy_state_key() -> "List[Any]":
+    """Return stat details of apt state which affects apt-cache policy.
+
+    Any file uaclient writes in sources.list.d or preferences.d, as well as
+    apt-get update refreshing the lists dir, changes this key.
+    """
+    apt_config = get_apt_config()
+    parts_dirs = (apt_config.sourceparts, apt_config.preferences_parts)
+    key = []  # type: List[Any]
+    for path in (
+        apt_config.sourcelist,
+        apt_config.sourceparts,
+        apt_config.preferences,
+        apt_config.preferences_parts,
+        apt_config.lists_dir,
+    ):
+        paths = [path]
+        if path in parts_dirs:
+            try:
+                paths += sorted(
+                    os.path.join(path, name) for name in os.listdir(path)
+                )
+            except OSError:
+                pass
+        for stat_path in paths:
+            try:
+                stat = os.stat(stat_path)
+            except OSError:
+                key.append((stat_path, None))
+                continue
+            key.append((stat_path, stat.st_mtime_ns, stat.st_size))
+    return key
+
+
+def get_apt_policy() -> AptPolicy:
+    """Return an AptPolicy snapshot, shared until apt configuration changes.
+
+    :raise UserFacingError: on issues running apt-cache policy.
+    """
+    global _APT_POLICY
+    key = _get_apt_policy_state_key()
+    if _APT_POLICY is None or _APT_POLICY[0] != key:
+        _APT_POLICY = (key, _read_apt_policy())
+    return _APT_POLICY[1]
+
+
+def _read_apt_policy() -> AptPolicy:
+    """Read apt policy through python3-apt, falling back to apt-cache."""
+    if apt_pkg is not None:
+        try:
+            return AptPkgPolicy.from_apt_pkg()
+        except (SystemError, AttributeError, TypeError) as e:
+            # Old python3-apt or broken apt config, let apt-cache report it
+            logging.debug(
+                "Unable to read apt policy with python3-apt: %s", str(e)
+            )
+    policy = run_apt_command(
+        ["apt-cache", "policy"], status.MESSAGE_APT_POLICY_FAILED
+    )
+    return AptPolicy.parse(policy)
+
+
+def clear_apt_policy_cache() -> None:
+    """Drop the AptPolicy snapshot so the next lookup reruns apt-cache."""
+    global _APT_POLICY
+    _APT_POLICY = None
+
+
+# Serializes read-modify-write of credentials cache files, shared by all
+# AptCredentialsCache instances as services validate concurrently
+_APT_CREDENTIALS_CACHE_LOCK = threading.Lock()
+
+
+class AptCredentialsCache:
+    """Remember apt credentials recently validated with apt-helper.
+
+    Entries are keyed by repo URL and a SHA-256 hash of the credentials, so
+    no secret is written to disk, and expire after ttl seconds.
+    """
+
+    def __init__(self, cache_file: str, ttl: int) -> None:
+        self.cache_file = cache_file
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(repo_url: str, username: str, password: str) -> str:
+        token_hash = hashlib.sha256(
+            "{}:{}".format(username, password).encode("utf-8")
+        ).hexdigest()
+        return "{} {}".format(repo_url, token_hash)
+
+    def _load(self) -> "Dict[str, float]":
+        """Return unexpired entries from the cache file."""
+        try:
+            entries = json.loads(util.load_file(self.cache_file))
+        except (IOError, OSError, ValueError):
+            return {}
+        if not isinstance(entries, dict):
+            return {}
+        now = time.time()
+        return {
+            key: validated_at
+            for key, validated_at in entries.items()
+            if isinstance(validated_at, (int, float))
+            and 0 <= now - validated_at < self.ttl
+        }
+
+    def is_valid(self, repo_url: str, username: str, password: str) -> bool:
+        """Return True when the credentials were validated within ttl."""
+        if self.ttl <= 0:
+            return False
+        with _APT_CREDENTIALS_CACHE_LOCK:
+            entries = self._load()
+        return self._key(repo_url, username, password) in entries
+
+    def add(self, repo_url: str, username: str, password: str) -> None:
+        """Record the credentials of repo_url as validated now."""
+        if self.ttl <= 0:
+            return
+        with _APT_CREDENTIALS_CACHE_LOCK:
+            entries = {
+                key: validated_at
+                for key, validated_at in self._load().items()
+                if not key.startswith(repo_url + " ")
+            }
+            entries[self._key(repo_url, username, password)] = time.time()
+            cache_dir = os.path.dirname(self.cache_file)
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir, mode=0o700)
+            util.atomic_write_file(
+                self.cache_file,
+                json.dumps(entries, sort_keys=True),
+                mode=0o600,
+            )
+
+
+def _get_auth_repo_path(repo_url: str) -> str:
+    """Return the auth.conf machine of repo_url, without trailing slash."""
+    _protocol, repo_path = repo_url.split("://")
+    if repo_path.endswith("/"):  # strip trailing slash
+        repo_path = repo_path[:-1]
+    return repo_path
+
+
+class AptAuthFile:
+    """In-memory model of an apt auth.conf (netrc) file.
+
+    Lines are kept verbatim, so entries not managed by uaclient are
+    preserved, and indexed by their machine. Entry changes are held until
+    flush, which writes the file at most once, atomically, and not at all
+    when its content is unchanged.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        try:
+            self._content = util.load_file(path)  # type: Optional[str]
+        except (IOError, OSError):
+            self._content = None
+        content = self._content or ""
+        self._lines = content.splitlines()
+        self._trailing_newline = content.endswith("\n")
+        self._machines = {}  # type: Dict[str, List[int]]
+        self._index()
+
+    def _index(self) -> None:
+        self._machines = {}
+        for idx, line in enumerate(self._lines):
+            machine_match = re.match(REGEX_APT_AUTH_MACHINE, line)
+            if machine_match:
+                self._machines.setdefault(
+                    machine_match.group("repo_url"), []
+                ).append(idx)
 
-def assert_valid_apt_credentials(repo_url, username, password):
+    @property
+    def content(self) -> str:
+        """The file content including pending changes."""
+        content = "\n".join(self._lines)
+        if content and self._trailing_newline:
+            content += "\n"
+        return content
+
+    def set_entry(self, repo_url: str, login: str, password: str) -> None:
+        """Add or replace the credentials of repo_url.
+
+        An existing entry for repo_url is replaced in place. Otherwise the
+        entry is inserted before the first entry for a less specific machine,
+        so apt matches it first, or appended.
+        """
+        repo_path = _get_auth_repo_path(repo_url)
+        repo_auth_line = (
+            "machine {repo_path}/ login {login} password {password}"
+            "{cmt}".format(
+                repo_path=repo_path,
+                login=login,
+                password=password,
+                cmt=APT_AUTH_COMMENT,
+            )
+        )
+        if repo_path in self._machines:
+            for idx in self._machines[repo_path]:
+                self._lines[idx] = repo_auth_line
+        else:
+            base_lines = [
+                idx
+                for machine, idxs in self._machines.items()
+                if machine in repo_path
+                for idx in idxs
+            ]
+            if base_lines:
+                self._lines.insert(min(base_lines), repo_auth_line)
+            else:
+                self._lines.append(repo_auth_line)
+            self._index()
+        self._trailing_newline = True
+
+    def remove_entry(self, repo_url: str) -> None:
+        """Remove the credentials of repo_url."""
+        auth_prefix = "machine {repo_path}/ login".format(
+            repo_path=_get_auth_repo_path(repo_url)
+        )
+        lines = [line for line in self._lines if auth_prefix not in line]
+        if len(lines) != len(self._lines):
+            self._lines = lines
+            self._index()
+
+    def flush(self) -> None:
+        """Write pending changes, removing the file once it is empty."""
+        content = self.content
+        if not content:
+            if self._content is not None:
+                stage_apt_file(self.path)
+                os.unlink(self.path)
+        elif content != self._content:
+            stage_apt_file(self.path)
+            util.atomic_write_file(self.path, content, mode=0o600)
+        elif os.stat(self.path).st_mode & 0o7777 != 0o600:
+            stage_apt_file(self.path)
+            os.chmod(self.path, 0o600)
+        self._content = content or None
+
+
+def assert_valid_apt_credentials(
+    repo_url,
+    username,
+    password,
+    credentials_cache: "Optional[AptCredentialsCache]" = None,
+):
     """Validate apt credentials for a PPA.
 
     @param repo_url: private-ppa url path
     @param username: PPA login username.
     @param password: PPA login password or resource token.
+    @param credentials_cache: Optional AptCredentialsCache to skip apt-helper
+        for recently validated credentials and to record successful
+        validations.
 
     @raises: UserFacingError for invalid credentials, timeout or unexpected
         errors.
@@ -46,6 +664,11 @@ def assert_valid_apt_credentials(repo_url, username, password):
     protocol, repo_path = repo_url.split("://")
     if not os.path.exists("/usr/lib/apt/apt-helper"):
         return
+    if credentials_cache and credentials_cache.is_valid(
+        repo_url, username, password
+    ):
+        logging.debug("Using cached APT credentials validation: %s", repo_url)
+        return
     try:
         with tempfile.TemporaryDirectory() as tmpd:
             util.subp(
@@ -83,6 +706,8 @@ def assert_valid_apt_credentials(repo_url, username, password):
                 APT_HELPER_TIMEOUT, repo_path
             )
         )
+    if credentials_cache:
+        credentials_cache.add(repo_url, username, password)
 
 
 def _parse_apt_update_for_invalid_apt_config(apt_error: str) -> str:
@@ -161,42 +786,552 @@ def run_apt_command(
     return out
 
 
+def run_apt_update_command(source_files: "Optional[List[str]]" = None) -> str:
+    """Run apt-get update, optionally restricted to some source list files.
+
+    :param source_files: Optional list of sources.list.d files. When provided
+        only these sources are fetched and the lists of every other source
+        are left untouched.
+
+    :return: stdout from successful run of apt-get update.
+    :raise UserFacingError: on failure to update the apt lists.
+    """
+    cmd = ["apt-get", "update"]
+    if not source_files:
+        out = run_apt_command(cmd, status.MESSAGE_APT_UPDATE_FAILED)
+        _record_apt_lists_update(None)
+        return out
+    with tempfile.TemporaryDirectory() as tmpd:
+        sources_parts_dir = os.path.join(tmpd, "sources.list.d")
+        os.mkdir(sources_parts_dir)
+        for source_file in source_files:
+            shutil.copy(source_file, sources_parts_dir)
+        cmd += [
+            "-o",
+            "{}={}".format(
+                APT_CONFIG_SOURCES_FILE, os.path.join(tmpd, "sources.list")
+            ),
+            "-o",
+            "{}={}".format(APT_CONFIG_SOURCES_PARTS_DIR, sources_parts_dir),
+            "-o",
+            "APT::Get::List-Cleanup=0",
+        ]
+        out = run_apt_command(cmd, status.MESSAGE_APT_UPDATE_FAILED)
+    _record_apt_lists_update(source_files)
+    return out
+
+
+# A deferred apt-get install of service packages within an AptTransaction
+AptPackageInstall = namedtuple(
+    "AptPackageInstall",
+    ("service", "packages", "error_msg", "env", "apt_options", "cleanup"),
+)
+
+# A service repo added to an AptTransaction once its credentials validation,
+# running in the background, succeeds
+AptPendingRepo = namedtuple(
+    "AptPendingRepo", ("service", "validation", "cleanup", "add_repo_kwargs")
+)
+
+
+class AptTransaction:
+    """Stage apt config changes and package installs of several services.
+
+    While a transaction is active, the apt source, auth, pinning and keyring
+    files modified through this module are backed up before their first
+    change, auth.conf entries are changed in a single AptAuthFile written
+    once per update, services request a deferred apt-get update instead of
+    running one each, and service packages are added to a merged install plan.
+    Repo credentials are validated concurrently in the background, so a slow
+    validation doesn't hold up the setup of other services.
+
+    On commit, each repo is added once its credentials are validated, a
+    single apt-get update is run and then a single apt-get install for all
+    service packages sharing the same noninteractive options. If the
+    prerequisites install or the update fails, every staged file is restored.
+    Invalid credentials or a failed merged install are attributed to the
+    right service, which alone is cleaned up.
+
+    Transactions entered while another one is active join the outer one.
+
+    Usage:
+        with apt.AptTransaction():
+            for entitlement in entitlements:
+                entitlement.enable()
+    """
+
+    def __init__(self) -> None:
+        # Original (content, mode) of staged files, None when absent
+        self._originals = (
+            OrderedDict()
+        )  # type: OrderedDict[str, Optional[Tuple[bytes, int]]]
+        # Services requesting an update and their changed source list file.
+        # A None source file requires a full apt-get update.
+        self._updates = OrderedDict()  # type: OrderedDict[str, Optional[str]]
+        self._prerequisites = OrderedDict()  # type: OrderedDict[str, None]
+        self._auth_file = None  # type: Optional[AptAuthFile]
+        self._repos = []  # type: List[AptPendingRepo]
+        self._installs = []  # type: List[AptPackageInstall]
+        # (func, args, service) where service hooks only run when the apt
+        # changes of that service were all applied
+        self._commit_hooks = (
+            []
+        )  # type: List[Tuple[Callable, Tuple, Optional[str]]]
+        self._errors = []  # type: List[str]
+        # Services cleaned up on invalid credentials or failed installs
+        self._failed_services = set()  # type: Set[str]
+        # Services whose service hook returned False on commit, such as a
+        # failed post_enable messaging callback
+        self.failed_hook_services = []  # type: List[str]
+        self._executor = None  # type: Optional[ThreadPoolExecutor]
+        self._outer = None  # type: Optional[AptTransaction]
+
+    def __enter__(self) -> "AptTransaction":
+        global _APT_TRANSACTION
+        if _APT_TRANSACTION is not None:
+            self._outer = _APT_TRANSACTION
+            return self._outer
+        _APT_TRANSACTION = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        global _APT_TRANSACTION
+        if self._outer is not None:
+            self._outer = None
+            return  # The outer transaction commits or rolls back
+        try:
+            # Keep staging changes, such as service cleanups, while applying
+            if exc_type is None:
+                self.commit()
+            else:
+                self.rollback()
+        finally:
+            _APT_TRANSACTION = None
+
+    def stage_file(self, path: str) -> None:
+        """Back up path, if not already staged, before it gets modified."""
+        if path in self._originals:
+            return
+        if os.path.exists(path):
+            with open(path, "rb") as stream:
+                content = stream.read()
+            self._originals[path] = (content, os.stat(path).st_mode & 0o7777)
+        else:
+            self._originals[path] = None
+
+    def get_auth_file(self) -> AptAuthFile:
+        """Return the auth file whose changes are written on update."""
+        if self._auth_file is None:
+            self._auth_file = AptAuthFile(get_apt_auth_file_from_apt_config())
+        return self._auth_file
+
+    def request_update(
+        self, service: str, source_file: "Optional[str]" = None
+    ) -> None:
+        """Defer apt-get update for service until the transaction updates.
+
+        :param service: The service title reported should the update fail.
+        :param source_file: The sources.list.d file written for service. When
+            every requested update provides one, only those sources are
+            fetched. None requires a full apt-get update.
+        """
+        if service in self._updates and self._updates[service] is None:
+            return
+        self._updates[service] = source_file
+
+    def add_prerequisites(self, packages: "List[str]") -> None:
+        """Install packages once, before any credentials validation."""
+        for package in packages:
+            self._prerequisites[package] = None
+
+    def add_auth_apt_repo(
+        self,
+        service: str,
+        repo_filename: str,
+        repo_url: str,
+        credentials: str,
+        suites: "List[str]",
+        keyring_file: str,
+        credentials_cache: "Optional[AptCredentialsCache]" = None,
+        cleanup: "Optional[Callable[[], None]]" = None,
+    ) -> None:
+        """Add a service repo once its credentials are validated.
+
+        The validation is started right away in the background. See
+        add_auth_apt_repo for the repo parameters.
+
+        :param service: The service title the repo is added for.
+        :param cleanup: Optional callable to undo the service enablement when
+            its credentials are invalid.
+        """
+        # apt-helper may need the https method to validate credentials
+        self._install_prerequisites()
+        username, password = _split_apt_credentials(credentials)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=APT_CREDENTIALS_MAX_WORKERS
+            )
+        validation = self._executor.submit(
+            assert_valid_apt_credentials,
+            repo_url.rstrip("/"),
+            username,
+            password,
+            credentials_cache,
+        )
+        self._repos.append(
+            AptPendingRepo(
+                service=service,
+                validation=validation,
+                cleanup=cleanup,
+                add_repo_kwargs={
+                    "repo_filename": repo_filename,
+                    "repo_url": repo_url,
+                    "credentials": credentials,
+                    "suites": suites,
+                    "keyring_file": keyring_file,
+                },
+            )
+        )
+        self.request_update(service, repo_filename)
+
+    def add_install(
+        self,
+        service: str,
+        packages: "List[str]",
+        error_msg: str,
+        env: "Optional[Dict[str, str]]" = None,
+        apt_options: "Optional[List[str]]" = None,
+        cleanup: "Optional[Callable[[], None]]" = None,
+    ) -> None:
+        """Add service packages to the merged install plan.
+
+        :param service: The service title the packages are installed for.
+        :param packages: The packages to install.
+        :param error_msg: The error reported when installing packages fails.
+        :param env: Optional environment of the apt-get install command.
+        :param apt_options: Optional apt-get options such as dpkg options.
+        :param cleanup: Optional callable to undo the service enablement when
+            its packages can not be installed.
+        """
+        self._installs.append(
+            AptPackageInstall(
+                service=service,
+                packages=list(packages),
+                error_msg=error_msg,
+                env=env or {},
+                apt_options=apt_options or [],
+                cleanup=cleanup,
+            )
+        )
+
+    def add_commit_hook(self, func: "Callable", *args) -> None:
+        """Call func(*args) once the transaction is committed."""
+        self._commit_hooks.append((func, args, None))
+
+    def add_service_commit_hook(
+        self, service: str, func: "Callable", *args
+    ) -> None:
+        """Call func(*args) once committed, if service was set up.
+
+        The hook is skipped when the credentials of service are invalid,
+        its packages fail to install or the transaction is rolled back.
+        When func returns False, service is added to failed_hook_services.
+        """
+        self._commit_hooks.append((func, args, service))
+
+    def _install_prerequisites(self) -> None:
+        if not self._prerequisites:
+            return
+        prerequisites = list(self._prerequisites)
+        self._prerequisites.clear()
+        print(
+            status.MESSAGE_INSTALLING_PREREQUISITES_TMPL.format(
+                packages=", ".join(prerequisites)
+            )
+        )
+        self._run_or_rollback(
+            run_apt_command,
+            ["apt-get", "install", "--assume-yes"] + prerequisites,
+            status.MESSAGE_APT_INSTALL_FAILED,
+        )
+
+    def _add_validated_repos(self) -> None:
+        """Add repos with valid credentials, clean up the other services."""
+        repos, self._repos = self._repos, []
+        for repo in repos:
+            try:
+                repo.validation.result()
+                add_auth_apt_repo(validate=False, **repo.add_repo_kwargs)
+            except exceptions.UserFacingError as e:
+                self._errors.append(e.msg)
+                self._failed_services.add(repo.service)
+                self._updates.pop(repo.service, None)
+                self._installs = [
+                    plan
+                    for plan in self._installs
+                    if plan.service != repo.service
+                ]
+                if repo.cleanup:
+                    repo.cleanup()
+
+    def update(self) -> None:
+        """Add validated repos and run one apt-get update for all services.
+
+        :raise UserFacingError: when installing prerequisites or updating
+            fails, after restoring all files staged since the last successful
+            update.
+        """
+        self._install_prerequisites()
+        self._add_validated_repos()
+        if self._auth_file is not None:
+            self._auth_file.flush()
+        if not self._updates:
+            return
+        source_files = [
+            path
+            for path in self._updates.values()
+            if path and os.path.exists(path)
+        ]
+        if len(source_files) != len(self._updates):
+            source_files = []  # Removed sources need a full update
+        if source_files and are_apt_lists_fresh():
+            # The lists of the added sources were fetched already
+            self._originals.clear()
+            self._updates.clear()
+            return
+        print(status.MESSAGE_APT_UPDATING_LISTS)
+        self._run_or_rollback(run_apt_update_command, source_files)
+        self._originals.clear()
+        self._updates.clear()
+
+    def _run_or_rollback(self, func: "Callable", *args) -> None:
+        try:
+            func(*args)
+        except exceptions.UserFacingError as e:
+            services = list(self._updates) + [
+                repo.service
+                for repo in self._repos
+                if repo.service not in self._updates
+            ]
+            self.rollback()
+            if services:
+                raise exceptions.UserFacingError(
+                    "{}\n{}".format(
+                        e.msg,
+                        status.MESSAGE_APT_CONFIG_REVERTED_TMPL.format(
+                            services=", ".join(services)
+                        ),
+                    )
+                )
+            raise
+
+    def _install(self) -> None:
+        """Install the planned service packages.
+
+        Services sharing the same env and apt options are installed with a
+        single apt-get install. The error of each service whose packages
+        failed to install is recorded after running its cleanup.
+        """
+        groups = (
+            OrderedDict()
+        )  # type: OrderedDict[Any, List[AptPackageInstall]]
+        for plan in self._installs:
+            key = (tuple(sorted(plan.env.items())), tuple(plan.apt_options))
+            groups.setdefault(key, []).append(plan)
+        self._installs = []
+        for plans in groups.values():
+            for plan in plans:
+                print(
+                    status.MESSAGE_INSTALLING_SERVICE_PACKAGES_TMPL.format(
+                        title=plan.service
+                    )
+                )
+            packages = []  # type: List[str]
+            for plan in plans:
+                packages.extend(p for p in plan.packages if p not in packages)
+            try:
+                self._run_install(plans[0], packages)
+                continue
+            except exceptions.UserFacingError as e:
+                if len(plans) == 1:
+                    self._cleanup_install(plans[0], e)
+                    continue
+            # Attribute the failure by installing each service on its own
+            for plan in plans:
+                try:
+                    self._run_install(plan, plan.packages)
+                except exceptions.UserFacingError as e:
+                    self._cleanup_install(plan, e)
+
+    def _run_install(
+        self, plan: AptPackageInstall, packages: "List[str]"
+    ) -> None:
+        run_apt_command(
+            ["apt-get", "install", "--assume-yes"]
+            + plan.apt_options
+            + packages,
+            plan.error_msg,
+            env=plan.env,
+        )
+
+    def _cleanup_install(
+        self, plan: AptPackageInstall, error: exceptions.UserFacingError
+    ) -> None:
+        self._errors.append(error.msg)
+        self._failed_services.add(plan.service)
+        if plan.cleanup:
+            plan.cleanup()
+
+    def commit(self) -> None:
+        """Apply the staged apt changes and then run the commit hooks.
+
+        Commit hooks are run even when some services failed, as those
+        services are cleaned up individually. Only the service hooks of
+        failed services are skipped. Services whose hook returns False are
+        listed in failed_hook_services.
+
+        :raise UserFacingError: when installing prerequisites or updating
+            fails, after rolling back. Otherwise, listing the error of each
+            service which couldn't be enabled.
+        """
+        try:
+            self.update()
+            self._install()
+            self.update()  # Apply apt changes of any service cleanup
+        finally:
+            self._shutdown_executor()
+            hooks, self._commit_hooks = self._commit_hooks, []
+            failed_services, self._failed_services = (
+                self._failed_services,
+                set(),
+            )
+            for func, args, service in hooks:
+                if service is None:
+                    func(*args)
+                elif service not in failed_services:
+                    if func(*args) is False:
+                        self.failed_hook_services.append(service)
+        errors, self._errors = self._errors, []
+        if errors:
+            raise exceptions.UserFacingError("\n".join(errors))
+
+    def rollback(self) -> None:
+        """Restore every staged file and drop all pending apt work."""
+        for path, original in reversed(list(self._originals.items())):
+            if original is None:
+                logging.debug("Reverting apt file: removing %s", path)
+                util.del_file(path)
+                continue
+            logging.debug("Reverting apt file: %s", path)
+            content, mode = original
+            with open(path, "wb") as stream:
+                stream.write(content)
+            os.chmod(path, mode)
+        self._originals.clear()
+        self._updates.clear()
+        self._prerequisites.clear()
+        self._auth_file = None
+        self._repos = []
+        self._installs = []
+        self._commit_hooks = []
+        self._errors = []
+        self._failed_services = set()
+        self._shutdown_executor()
+
+    def _shutdown_executor(self) -> None:
+        if self._executor is not None:
+            # Don't wait on validations of services rolled back
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+_APT_TRANSACTION = None  # type: Optional[AptTransaction]
+
+
+def get_apt_transaction() -> "Optional[AptTransaction]":
+    """Return the active AptTransaction or None outside of a transaction."""
+    return _APT_TRANSACTION
+
+
+def stage_apt_file(path: str) -> None:
+    """Back up path in the active AptTransaction before it is modified."""
+    if _APT_TRANSACTION is not None:
+        _APT_TRANSACTION.stage_file(path)
+
+
+def call_after_apt_update(func: "Callable", *args) -> None:
+    """Call func(*args) once the staged apt changes are applied.
+
+    Outside of an AptTransaction, apt changes are applied immediately so func
+    is called right away.
+    """
+    if _APT_TRANSACTION is None:
+        func(*args)
+    else:
+        _APT_TRANSACTION.add_commit_hook(func, *args)
+
+
+def call_after_service_committed(
+    service: str, func: "Callable[..., Any]", *args
+) -> "Any":
+    """Call func(*args) once the staged apt changes of service are applied.
+
+    Within an AptTransaction, func is only called if the repo and packages
+    of service were set up. Outside of a transaction, apt changes are
+    applied immediately so func is called right away.
+
+    :return: the result of func when called right away, True otherwise.
+        Callers check AptTransaction.failed_hook_services once committed.
+    """
+    if _APT_TRANSACTION is None:
+        return func(*args)
+    _APT_TRANSACTION.add_service_commit_hook(service, func, *args)
+    return True
+
+
+def _split_apt_credentials(credentials: str) -> "Tuple[str, str]":
+    """Return the (username, password) apt uses for credentials."""
+    try:
+        username, password = credentials.split(":")
+    except ValueError:  # Then we have a bearer token
+        username = "bearer"
+        password = credentials
+    return username, password
+
+
 def add_auth_apt_repo(
     repo_filename: str,
     repo_url: str,
     credentials: str,
     suites: "List[str]",
     keyring_file: str,
+    credentials_cache: "Optional[AptCredentialsCache]" = None,
+    validate: bool = True,
 ) -> None:
     """Add an authenticated apt repo and credentials to the system.
 
+    @param credentials_cache: Optional AptCredentialsCache used to validate
+        credentials.
+    @param validate: Set False when credentials were already validated.
+
     @raises: InvalidAPTCredentialsError when the token provided can't access
         the repo PPA.
     """
-    try:
-        username, password = credentials.split(":")
-    except ValueError:  # Then we have a bearer token
-        username = "bearer"
-        password = credentials
+    username, password = _split_apt_credentials(credentials)
     series = util.get_platform_info()["series"]
     if repo_url.endswith("/"):
         repo_url = repo_url[:-1]
-    assert_valid_apt_credentials(repo_url, username, password)
+    if validate:
+        assert_valid_apt_credentials(
+            repo_url, username, password, credentials_cache
+        )
 
-    # Does this system have updates suite enabled?
-    updates_enabled = False
-    policy = run_apt_command(
-        ["apt-cache", "policy"], status.MESSAGE_APT_POLICY_FAILED
+    # Does this system have updates suite enabled from the Ubuntu archive?
+    updates_enabled = bool(
+        get_apt_policy().get_sources(
+            origin="Ubuntu", suite="{}-updates".format(series)
+        )
     )
-    for line in policy.splitlines():
-        # We only care about $suite-updates lines
-        if "a={}-updates".format(series) not in line:
-            continue
-        # We only care about $suite-updates from the Ubuntu archive
-        if "o=Ubuntu," not in line:
-            continue
-        updates_enabled = True
-        break
 
     content = ""
     for suite in suites:
@@ -217,79 +1352,52 @@ def add_auth_apt_repo(
                 maybe_comment=maybe_comment, url=repo_url, suite=suite
             )
         )
+    stage_apt_file(repo_filename)
     util.write_file(repo_filename, content)
     add_apt_auth_conf_entry(repo_url, username, password)
     source_keyring_file = os.path.join(KEYRINGS_DIR, keyring_file)
     destination_keyring_file = os.path.join(APT_KEYS_DIR, keyring_file)
+    stage_apt_file(destination_keyring_file)
     gpg.export_gpg_key(source_keyring_file, destination_keyring_file)
 
 
+def _get_apt_auth_file() -> AptAuthFile:
+    """Return the AptAuthFile pending in the active AptTransaction or a new
+    one read from apt's auth file."""
+    if _APT_TRANSACTION is not None:
+        return _APT_TRANSACTION.get_auth_file()
+    return AptAuthFile(get_apt_auth_file_from_apt_config())
+
+
 def add_apt_auth_conf_entry(repo_url, login, password):
-    """Add or replace an apt auth line in apt's auth.conf file or conf.d."""
-    apt_auth_file = get_apt_auth_file_from_apt_config()
-    _protocol, repo_path = repo_url.split("://")
-    if repo_path.endswith("/"):  # strip trailing slash
-        repo_path = repo_path[:-1]
-    if os.path.exists(apt_auth_file):
-        orig_content = util.load_file(apt_auth_file)
-    else:
-        orig_content = ""
-    repo_auth_line = (
-        "machine {repo_path}/ login {login} password {password}"
-        "{cmt}".format(
-            repo_path=repo_path,
-            login=login,
-            password=password,
-            cmt=APT_AUTH_COMMENT,
-        )
-    )
-    added_new_auth = False
-    new_lines = []
-    for line in orig_content.splitlines():
-        machine_match = re.match(r"machine\s+(?P<repo_url>[.\-\w]+)/?.*", line)
-        if machine_match:
-            matched_repo = machine_match.group("repo_url")
-            if matched_repo == repo_path:
-                # Replace old auth with new auth at same line
-                new_lines.append(repo_auth_line)
-                added_new_auth = True
-                continue
-            if matched_repo in repo_path:
-                # Insert our repo before. We are a more specific apt repo match
-                new_lines.append(repo_auth_line)
-                added_new_auth = True
-        new_lines.append(line)
-    if not added_new_auth:
-        new_lines.append(repo_auth_line)
-    new_lines.append("")
-    util.write_file(apt_auth_file, "\n".join(new_lines), mode=0o600)
+    """Add or replace an apt auth line in apt's auth.conf file or conf.d.
+
+    In an active AptTransaction, the file is only written when the
+    transaction updates.
+    """
+    auth_file = _get_apt_auth_file()
+    auth_file.set_entry(repo_url, login, password)
+    if _APT_TRANSACTION is None:
+        auth_file.flush()
 
 
 def remove_repo_from_apt_auth_file(repo_url):
     """Remove a repo from the shared apt auth file"""
-    _protocol, repo_path = repo_url.split("://")
-    if repo_path.endswith("/"):  # strip trailing slash
-        repo_path = repo_path[:-1]
-    apt_auth_file = get_apt_auth_file_from_apt_config()
-    if os.path.exists(apt_auth_file):
-        apt_auth = util.load_file(apt_auth_file)
-        auth_prefix = "machine {repo_path}/ login".format(repo_path=repo_path)
-        content = "\n".join(
-            [line for line in apt_auth.splitlines() if auth_prefix not in line]
-        )
-        if not content:
-            os.unlink(apt_auth_file)
-        else:
-            util.write_file(apt_auth_file, content, mode=0o600)
+    auth_file = _get_apt_auth_file()
+    auth_file.remove_entry(repo_url)
+    if _APT_TRANSACTION is None:
+        auth_file.flush()
 
 
 def remove_auth_apt_repo(
     repo_filename: str, repo_url: str, keyring_file: str = None
 ) -> None:
     """Remove an authenticated apt repo and credentials to the system"""
+    stage_apt_file(repo_filename)
     util.del_file(repo_filename)
     if keyring_file:
         keyring_file = os.path.join(APT_KEYS_DIR, keyring_file)
+        stage_apt_file(keyring_file)
         util.del_file(keyring_file)
     remove_repo_from_apt_auth_file(repo_url)
 
@@ -299,6 +1407,7 @@ def restore_commented_apt_list_file(filename: str) -> None:
     if os.path.exists(filename):
         file_content = util.load_file(filename)
         file_content = file_content.replace("# deb ", "deb ")
+        stage_apt_file(filename)
         util.write_file(filename, file_content)
 
 
@@ -315,34 +1424,28 @@ def add_ppa_pinning(apt_preference_file, repo_url, origin, priority):
             origin=origin, priority=priority, series=series
         )
     )
+    stage_apt_file(apt_preference_file)
     util.write_file(apt_preference_file, content)
 
 
 def get_apt_auth_file_from_apt_config():
     """Return to patch to the system configured APT auth file."""
-    out, _err = util.subp(
-        ["apt-config", "shell", "key", APT_CONFIG_AUTH_PARTS_DIR]
-    )
-    if out:  # then auth.conf.d parts is present
-        return out.split("'")[1] + "90ubuntu-advantage"
-    else:  # then use configured /etc/apt/auth.conf
-        out, _err = util.subp(
-            ["apt-config", "shell", "key", APT_CONFIG_AUTH_FILE]
-        )
-        return out.split("'")[1].rstrip("/")
+    return get_apt_config().auth_file
 
 
-def find_apt_list_files(repo_url, series):
-    """List any apt files in APT_CONFIG_LISTS_DIR given repo_url and series."""
+def _get_apt_list_prefix(repo_url: str) -> str:
+    """Return the apt lists file name prefix of repo_url."""
     _protocol, repo_path = repo_url.split("://")
     if repo_path.endswith("/"):  # strip trailing slash
         repo_path = repo_path[:-1]
-    lists_dir = "/var/lib/apt/lists"
-    out, _err = util.subp(["apt-config", "shell", "key", APT_CONFIG_LISTS_DIR])
-    if out:  # then lists dir is present in config
-        lists_dir = out.split("'")[1]
+    return repo_path.replace("/", "_")
+
 
-    aptlist_filename = repo_path.replace("/", "_")
+def find_apt_list_files(repo_url, series):
+    """List any apt files in the apt lists dir given repo_url and series."""
+    lists_dir = get_apt_config().lists_dir
+
+    aptlist_filename = _get_apt_list_prefix(repo_url)
     return sorted(
         glob.glob(
             os.path.join(
@@ -359,6 +1462,240 @@ def remove_apt_list_files(repo_url, series):
             os.unlink(path)
 
 
+def setup_apt_lists_max_age(
+    max_age: int, data_dir: "Optional[str]" = None
+) -> None:
+    """Skip apt-get update when apt lists are younger than max_age seconds.
+
+    :param max_age: apt_lists_max_age from uaclient.conf, 0 always updates.
+    :param data_dir: The uaclient data_dir where successful apt-get updates
+        are recorded. None always updates.
+    """
+    global _APT_LISTS_MAX_AGE, _APT_LISTS_UPDATED_PATH
+    _APT_LISTS_MAX_AGE = max_age
+    _APT_LISTS_UPDATED_PATH = None
+    if data_dir:
+        _APT_LISTS_UPDATED_PATH = os.path.join(
+            data_dir, APT_LISTS_UPDATED_FILE
+        )
+
+
+def _parse_one_line_sources(
+    content: str
+) -> "Iterable[Tuple[str, str, List[str]]]":
+    for line in content.splitlines():
+        match = re.match(REGEX_APT_SOURCE_LINE, line.split("#", 1)[0])
+        if match:
+            yield (
+                match.group("url"),
+                match.group("suite"),
+                match.group("components").split(),
+            )
+
+
+def _parse_deb822_sources(
+    content: str
+) -> "Iterable[Tuple[str, str, List[str]]]":
+    for stanza in re.split(r"\n\s*\n", content):
+        fields = {}  # type: Dict[str, str]
+        for line in stanza.splitlines():
+            if line.startswith("#") or ":" not in line:
+                continue
+            name, _sep, value = line.partition(":")
+            fields[name.strip().lower()] = value.strip()
+        if fields.get("enabled", "yes").lower() == "no":
+            continue
+        for url in fields.get("uris", "").split():
+            for suite in fields.get("suites", "").split():
+                yield url, suite, fields.get("components", "").split()
+
+
+def _iter_apt_sources(
+    paths: "Optional[List[str]]" = None
+) -> "Iterable[Tuple[str, str, str, List[str]]]":
+    """Yield the (path, url, suite, components) of each apt source.
+
+    path is the sources.list or sources.list.d file defining the source.
+
+    :param paths: Optional list of source files to read instead of the
+        configured sources.list and sources.list.d files.
+    """
+    if paths is None:
+        apt_config = get_apt_config()
+        paths = [apt_config.sourcelist]
+        try:
+            paths += [
+                os.path.join(apt_config.sourceparts, name)
+                for name in sorted(os.listdir(apt_config.sourceparts))
+                if name.endswith((".list", ".sources"))
+            ]
+        except OSError:
+            pass
+    for path in paths:
+        try:
+            content = util.load_file(path)
+        except (IOError, OSError):
+            continue
+        if path.endswith(".sources"):
+            sources = _parse_deb822_sources(content)
+        else:
+            sources = _parse_one_line_sources(content)
+        for url, suite, components in sources:
+            yield path, url, suite, components
+
+
+def _get_release_valid_until(release_file: str) -> "Optional[float]":
+    """Return the Valid-Until timestamp of an apt Release file, if any."""
+    with open(release_file, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            # The dates are in the header, before any file checksums
+            if line.startswith(("MD5Sum:", "SHA1:", "SHA256:", "SHA512:")):
+                break
+            name, _sep, value = line.partition(":")
+            if name == "Valid-Until":
+                parsed = email.utils.parsedate_tz(value.strip())
+                return email.utils.mktime_tz(parsed) if parsed else None
+    return None
+
+
+def _find_release_file(
+    lists_dir: str, url: str, suite: str, components: "List[str]"
+) -> "Optional[str]":
+    """Return the Release file of a source, None when its lists are missing.
+
+    Flat repositories and URLs which aren't mirrored in the lists dir by a
+    simple name, such as cdrom sources, are reported as missing.
+    """
+    if "://" not in url or suite.endswith("/"):
+        return None
+    prefix = os.path.join(
+        lists_dir,
+        "{}_dists_{}".format(
+            _get_apt_list_prefix(url), suite.replace("/", "_")
+        ),
+    )
+    for component in components:
+        component_prefix = "{}_{}_".format(prefix, component.replace("/", "_"))
+        if not glob.glob(glob.escape(component_prefix) + "*"):
+            return None
+    for release_name in ("_InRelease", "_Release"):
+        if os.path.exists(prefix + release_name):
+            return prefix + release_name
+    return None
+
+
+def _load_apt_lists_updates() -> "Dict[str, float]":
+    """Return when uaclient last updated each apt Release file."""
+    if not _APT_LISTS_UPDATED_PATH:
+        return {}
+    try:
+        updates = json.loads(util.load_file(_APT_LISTS_UPDATED_PATH))
+    except (IOError, OSError, ValueError):
+        return {}
+    if not isinstance(updates, dict):
+        return {}
+    return updates
+
+
+def _record_apt_lists_update(source_files: "Optional[List[str]]") -> None:
+    """Record the Release files fetched by a successful apt-get update.
+
+    :param source_files: The source files the update was restricted to.
+        None or an empty list records a full update, which drops the records
+        of sources which are no longer configured.
+    """
+    if not _APT_LISTS_UPDATED_PATH:
+        return
+    updates = _load_apt_lists_updates() if source_files else {}
+    apt_config = get_apt_config()
+    now = time.time()
+    for _path, url, suite, components in _iter_apt_sources(
+        source_files or None
+    ):
+        release_file = _find_release_file(
+            apt_config.lists_dir, url, suite, components
+        )
+        if release_file:
+            updates[release_file] = now
+    if source_files:
+        # Our restricted update touched the stamp for the other sources too
+        stamp_mtime = _get_mtime(apt_config.update_success_stamp)
+        if stamp_mtime is not None:
+            updates[_RESTRICTED_UPDATE_STAMP_KEY] = stamp_mtime
+    try:
+        util.atomic_write_file(_APT_LISTS_UPDATED_PATH, json.dumps(updates))
+    except (IOError, OSError) as e:
+        logging.debug("Unable to record apt lists update: %s", str(e))
+
+
+def _get_mtime(path: str) -> "Optional[float]":
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def are_apt_lists_fresh() -> bool:
+    """Return True when apt-get update can be skipped.
+
+    Each configured source must pass on its own: it has lists for all of
+    its components, its Release file is not past its Valid-Until date and
+    it was fetched by a successful apt update less than apt_lists_max_age
+    seconds ago.
+
+    Updates run by uaclient are recorded per source. Updates run by other
+    tools are known from apt's update-success-stamp, which only proves a
+    source was fetched when it is newer than the file defining the source.
+    Sources added or changed since the last update always require one.
+    """
+    if _APT_LISTS_MAX_AGE <= 0 or not _APT_LISTS_UPDATED_PATH:
+        return False
+    updates = _load_apt_lists_updates()
+    apt_config = get_apt_config()
+    stamp_mtime = _get_mtime(apt_config.update_success_stamp)
+    if stamp_mtime is not None and stamp_mtime == updates.get(
+        _RESTRICTED_UPDATE_STAMP_KEY
+    ):
+        stamp_mtime = None
+    now = time.time()
+    checked = set()  # type: Set[str]
+    for path, url, suite, components in _iter_apt_sources():
+        release_file = _find_release_file(
+            apt_config.lists_dir, url, suite, components
+        )
+        if not release_file:
+            logging.debug("Apt lists of %s %s are missing", url, suite)
+            return False
+        if release_file in checked:
+            continue
+        updated_at = updates.get(release_file)
+        source_mtime = _get_mtime(path)
+        if (
+            stamp_mtime is not None
+            and source_mtime is not None
+            and stamp_mtime > source_mtime
+            and (
+                not isinstance(updated_at, (int, float))
+                or stamp_mtime > updated_at
+            )
+        ):
+            updated_at = stamp_mtime
+        if not isinstance(updated_at, (int, float)) or not (
+            0 <= now - updated_at <= _APT_LISTS_MAX_AGE
+        ):
+            logging.debug("Apt lists %s are not fresh", release_file)
+            return False
+        try:
+            valid_until = _get_release_valid_until(release_file)
+        except (IOError, OSError):
+            return False
+        if valid_until is not None and valid_until < now:
+            logging.debug("Apt lists %s have expired", release_file)
+            return False
+        checked.add(release_file)
+    return bool(checked)
+
+
 def clean_apt_files(*, _entitlements=None):
     """
     Clean apt files written by uaclient
@@ -389,5 +1726,5 @@ def clean_apt_files(*, _entitlements=None):
 
 
 def get_installed_packages() -> "List[str]":
-    out, _ = util.subp(["dpkg-query", "-W", "--showformat=${Package}\\n"])
-    return out.splitlines()
+    """Return the names of packages known to dpkg, as listed by dpkg-query."""
+    return list(dpkg.get_dpkg_status().packages)
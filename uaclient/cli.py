@@ -20,11 +20,14 @@ except ImportError:
     pass
 
 
+from uaclient import apt
 from uaclient import config
 from uaclient import contract
+from uaclient import dpkg
 from uaclient import entitlements
 from uaclient import exceptions
 from uaclient import security
+from uaclient import security_dataset
 from uaclient import status as ua_status
 from uaclient import util
 from uaclient import version
@@ -56,6 +59,8 @@ STATUS_FORMATS = ["tabular", "json"]
 # UAConfig in order to determine dynamic data_path exception handling of
 # main_error_handler
 _CLEAR_LOCK_FILE = None
+# Writes the notices changed by the command, set by main
+_FLUSH_NOTICES = None
 
 
 class UAArgumentParser(argparse.ArgumentParser):
@@ -226,7 +231,7 @@ def attach_parser(parser):
 def fix_parser(parser):
     """Build or extend an arg parser for fix subcommand."""
     parser.usage = USAGE_TMPL.format(
-        name=NAME, command="fix <CVE-yyyy-nnnn+>|<USN-nnnn-d+>"
+        name=NAME, command="fix <CVE-yyyy-nnnn+>|<USN-nnnn-d+> ..."
     )
     parser.prog = "fix"
     parser.description = (
@@ -236,11 +241,72 @@ def fix_parser(parser):
     parser._optionals.title = "Flags"
     parser.add_argument(
         "security_issue",
+        nargs="*",
         help=(
             "Security vulnerability ID to inspect and resolve on this system."
-            " Format: CVE-yyyy-nnnn, CVE-yyyy-nnnnnnn or USN-nnnn-dd"
+            " Format: CVE-yyyy-nnnn, CVE-yyyy-nnnnnnn or USN-nnnn-dd."
+            " Packages fixing multiple IDs are upgraded at once"
         ),
     )
+    parser.add_argument(
+        "--from-file",
+        metavar="FILE",
+        help=(
+            "also fix the IDs listed in FILE, separated by whitespace."
+            " Text after # is ignored. Use - to read from stdin"
+        ),
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help=(
+            "answer from the security data imported by {name}"
+            " import-security-data instead of querying ubuntu.com/security"
+        ).format(name=NAME),
+    )
+    return parser
+
+
+def import_security_data_parser(parser):
+    """Build or extend an arg parser for import-security-data subcommand."""
+    parser.usage = USAGE_TMPL.format(
+        name=NAME, command="import-security-data <file> [<file> ...]"
+    )
+    parser.prog = "import-security-data"
+    parser.description = (
+        "Import CVEs and USNs exported from the Ubuntu Security API for"
+        " ua fix --offline. The imported data replaces any previous import."
+    )
+    parser._optionals.title = "Flags"
+    parser.add_argument(
+        "files",
+        nargs="+",
+        metavar="file",
+        help=(
+            "JSON file of Security API CVEs and USNs, as an object with"
+            " cves and notices lists or a list of CVEs and USNs"
+        ),
+    )
+    return parser
+
+
+def security_status_parser(parser):
+    """Build or extend an arg parser for security-status subcommand."""
+    parser.usage = USAGE_TMPL.format(name=NAME, command="security-status")
+    parser.prog = "security-status"
+    parser.description = (
+        "List the USNs (Ubuntu Security Notices) with released fixes which"
+        " are not installed on this machine."
+    )
+    parser._optionals.title = "Flags"
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help=(
+            "answer from the security data imported by {name}"
+            " import-security-data instead of querying ubuntu.com/security"
+        ).format(name=NAME),
+    )
     return parser
 
 
@@ -255,15 +321,68 @@ def refresh_parser(parser):
     return parser
 
 
+def _read_security_issues_file(path: str) -> "List[str]":
+    """Return the whitespace separated issue IDs of path, or of stdin."""
+    try:
+        if path == "-":
+            content = sys.stdin.read()
+        else:
+            content = util.load_file(path)
+    except (IOError, OSError) as e:
+        raise exceptions.UserFacingError(
+            "Error: unable to read {}: {}".format(path, str(e))
+        )
+    issue_ids = []  # type: List[str]
+    for line in content.splitlines():
+        issue_ids.extend(line.split("#", 1)[0].split())
+    return issue_ids
+
+
 def action_fix(args, cfg, **kwargs):
-    if not re.match(security.CVE_OR_USN_REGEX, args.security_issue):
-        msg = (
-            'Error: issue "{}" is not recognized.\n'
+    issue_ids = list(args.security_issue)
+    if args.from_file:
+        issue_ids.extend(_read_security_issues_file(args.from_file))
+    if not issue_ids:
+        raise exceptions.UserFacingError(
             'Usage: "ua fix CVE-yyyy-nnnn" or "ua fix USN-nnnn"'
-        ).format(args.security_issue)
-        raise exceptions.UserFacingError(msg)
+        )
+    for issue_id in issue_ids:
+        if not re.match(security.CVE_OR_USN_REGEX, issue_id):
+            msg = (
+                'Error: issue "{}" is not recognized.\n'
+                'Usage: "ua fix CVE-yyyy-nnnn" or "ua fix USN-nnnn"'
+            ).format(issue_id)
+            raise exceptions.UserFacingError(msg)
+
+    client = security.get_security_client(cfg, offline=args.offline)
+    if len(issue_ids) == 1:
+        security.fix_security_issue_id(cfg, issue_ids[0], client=client)
+        return 0
+    if not security.fix_security_issue_ids(cfg, issue_ids, client=client):
+        return 1
+    return 0
 
-    security.fix_security_issue_id(cfg, args.security_issue)
+
+def action_security_status(args, cfg, **kwargs):
+    client = security.get_security_client(cfg, offline=args.offline)
+    security.print_security_status(cfg, client=client)
+    return 0
+
+
+@assert_root
+def action_import_security_data(args, cfg, **kwargs):
+    dataset = security_dataset.SecurityDataset(
+        os.path.join(cfg.data_dir, security_dataset.SECURITY_DATASET_DIR)
+    )
+    try:
+        counts = dataset.import_exports(args.files)
+    except security_dataset.SecurityDatasetError as e:
+        raise exceptions.UserFacingError(str(e))
+    print(
+        ua_status.MESSAGE_SECURITY_DATASET_IMPORTED.format(
+            cves=counts["cves"], notices=counts["notices"]
+        )
+    )
     return 0
 
 
@@ -456,7 +575,8 @@ def _perform_disable(entitlement_name, cfg, *, assume_yes):
     ent_cls = entitlements.ENTITLEMENT_CLASS_BY_NAME[entitlement_name]
     entitlement = ent_cls(cfg, assume_yes=assume_yes)
     ret = entitlement.disable()
-    cfg.status()  # Update the status cache
+    # Update the status cache once apt reflects the change
+    apt.call_after_apt_update(cfg.status)
     return ret
 
 
@@ -492,8 +612,14 @@ def action_disable(args, cfg, **kwargs):
     tmpl = ua_status.MESSAGE_INVALID_SERVICE_OP_FAILURE_TMPL
     ret = True
 
-    for entitlement in entitlements_found:
-        ret &= _perform_disable(entitlement, cfg, assume_yes=args.assume_yes)
+    # Stage the apt changes of all services to run a single apt-get update
+    with apt.AptTransaction() as transaction:
+        for entitlement in entitlements_found:
+            ret &= _perform_disable(
+                entitlement, cfg, assume_yes=args.assume_yes
+            )
+    # Deferred post_disable reporting of a service may have failed
+    ret &= not transaction.failed_hook_services
 
     if entitlements_not_found:
         valid_names = "Try " + entitlements.ALL_ENTITLEMENTS_STR + "."
@@ -552,7 +678,8 @@ def _perform_enable(
 
     entitlement = ent_cls(cfg, assume_yes=assume_yes)
     ret = entitlement.enable(silent_if_inapplicable=silent_if_inapplicable)
-    cfg.status()  # Update the status cache
+    # Update the status cache once apt reflects the change
+    apt.call_after_apt_update(cfg.status)
     return ret
 
 
@@ -577,18 +704,27 @@ def action_enable(args, cfg, **kwargs):
     )
     ret = True
 
-    for entitlement in entitlements_found:
-        try:
-            ret &= _perform_enable(
-                entitlement,
-                cfg,
-                assume_yes=args.assume_yes,
-                allow_beta=args.beta,
-            )
-        except exceptions.BetaServiceError:
-            entitlements_not_found.append(entitlement)
-        except exceptions.UserFacingError as e:
-            print(e)
+    try:
+        # Stage the apt changes of all services to run a single apt-get update
+        with apt.AptTransaction() as transaction:
+            for entitlement in entitlements_found:
+                try:
+                    ret &= _perform_enable(
+                        entitlement,
+                        cfg,
+                        assume_yes=args.assume_yes,
+                        allow_beta=args.beta,
+                    )
+                except exceptions.BetaServiceError:
+                    entitlements_not_found.append(entitlement)
+                except exceptions.UserFacingError as e:
+                    print(e)
+        # Deferred post_enable reporting of a service may have failed
+        ret &= not transaction.failed_hook_services
+    except exceptions.UserFacingError as e:
+        # The staged apt changes of every service were rolled back
+        print(e)
+        ret = False
 
     if entitlements_not_found:
         if args.beta:
@@ -645,8 +781,11 @@ def _detach(cfg: config.UAConfig, assume_yes: bool) -> int:
             print("    {}".format(ent.name))
     if not util.prompt_for_confirmation(assume_yes=assume_yes):
         return 1
-    for ent in to_disable:
-        ent.disable(silent=True)
+    ret = True
+    with apt.AptTransaction() as transaction:
+        for ent in to_disable:
+            ret &= bool(ent.disable(silent=True))
+    ret &= not transaction.failed_hook_services
     contract_client = contract.UAContractClient(cfg)
     machine_token = cfg.machine_token["machineToken"]
     contract_id = cfg.machine_token["machineTokenInfo"]["contractInfo"]["id"]
@@ -654,7 +793,7 @@ def _detach(cfg: config.UAConfig, assume_yes: bool) -> int:
     cfg.delete_cache()
     config.update_ua_messages(cfg)
     print(ua_status.MESSAGE_DETACH_SUCCESS)
-    return 0
+    return 0 if ret else 1
 
 
 def _attach_with_token(
@@ -875,6 +1014,20 @@ def get_parser():
     )
     parser_fix.set_defaults(action=action_fix)
     fix_parser(parser_fix)
+    parser_import_security_data = subparsers.add_parser(
+        "import-security-data",
+        help="import CVEs and USNs for fix without network access",
+    )
+    parser_import_security_data.set_defaults(
+        action=action_import_security_data
+    )
+    import_security_data_parser(parser_import_security_data)
+    parser_security_status = subparsers.add_parser(
+        "security-status",
+        help="list security fixes which are not installed on this system",
+    )
+    parser_security_status.set_defaults(action=action_security_status)
+    security_status_parser(parser_security_status)
     parser_version = subparsers.add_parser(
         "version", help="show version of {}".format(NAME)
     )
@@ -1042,10 +1195,25 @@ def main_error_handler(func):
                 _CLEAR_LOCK_FILE("lock")
             print(ua_status.MESSAGE_UNEXPECTED_ERROR, file=sys.stderr)
             sys.exit(1)
+        finally:
+            _flush_notices()
 
     return wrapper
 
 
+def _flush_notices():
+    """Write the notices changed by the command once it exits."""
+    global _FLUSH_NOTICES
+    if not _FLUSH_NOTICES:
+        return
+    flush_notices, _FLUSH_NOTICES = _FLUSH_NOTICES, None
+    try:
+        flush_notices()
+    except (IOError, OSError) as e:
+        with util.disable_log_to_console():
+            logging.warning("Failed to write notices: %s", e)
+
+
 @main_error_handler
 def main(sys_argv=None):
     if not sys_argv:
@@ -1058,6 +1226,16 @@ def main(sys_argv=None):
         sys.exit(1)
     args = parser.parse_args(args=cli_arguments)
     cfg = config.UAConfig()
+    global _FLUSH_NOTICES
+    _FLUSH_NOTICES = cfg.flush_notices
+    util.setup_system_facts_cache(cfg.data_dir)
+    dpkg.setup_dpkg_status_cache(cfg.data_dir)
+    apt.setup_apt_lists_max_age(cfg.apt_lists_max_age, cfg.data_dir)
+    dpkg.setup_dpkg_compare_versions(
+        util.is_config_value_true(
+            config=cfg.cfg, path_to_value="features.dpkg_compare_versions"
+        )
+    )
     log_level = cfg.log_level
     console_level = logging.DEBUG if args.debug else logging.INFO
     setup_logging(console_level, log_level, cfg.log_file)
@@ -59,6 +59,7 @@ def get_cloud_type_from_result_file(
 
 
 @apply_config_settings_override("cloud_type")
+@util.persistent_system_fact("cloud_type")
 def get_cloud_type() -> "Optional[str]":
     if util.which("cloud-id"):
         # Present in cloud-init on >= Xenial
@@ -1,6 +1,7 @@
 import copy
 from datetime import datetime
 from functools import wraps
+import hashlib
 import json
 import logging
 import os
@@ -10,7 +11,13 @@ import yaml
 from collections import namedtuple, OrderedDict
 
 from uaclient import status, util
-from uaclient.defaults import CONFIG_DEFAULTS, DEFAULT_CONFIG_FILE
+from uaclient.defaults import (
+    APT_CREDENTIALS_TTL,
+    APT_LISTS_MAX_AGE,
+    CONFIG_DEFAULTS,
+    DEFAULT_CONFIG_FILE,
+    SECURITY_API_CACHE_TTL,
+)
 from uaclient import exceptions
 
 try:
@@ -60,6 +67,7 @@ DataPath = namedtuple("DataPath", ("filename", "private"))
 class UAConfig:
 
     data_paths = {
+        "apt-credentials": DataPath("apt-credentials.json", True),
         "instance-id": DataPath("instance-id", True),
         "machine-access-cis": DataPath("machine-access-cis.json", True),
         "machine-id": DataPath("machine-id", True),
@@ -84,6 +92,15 @@ class UAConfig:
             self.cfg = parse_config()
 
         self.series = series
+        # Digest and stat signature of cache files as last read or written
+        self._cache_digests = (
+            {}
+        )  # type: Dict[str, Tuple[str, Tuple[int, int, int, int]]]
+        # Notices loaded from notices.json, see flush_notices
+        self._notices = (
+            None
+        )  # type: Optional[OrderedDict[Tuple[str, str], None]]
+        self._notices_dirty = False
 
     @property
     def accounts(self):
@@ -141,6 +158,40 @@ class UAConfig:
     def data_dir(self):
         return self.cfg["data_dir"]
 
+    @property
+    def apt_credentials_ttl(self) -> int:
+        """Seconds validated apt credentials are trusted without apt-helper.
+
+        Set apt_credentials_ttl to 0 in uaclient.conf to always validate.
+        """
+        return self._get_ttl("apt_credentials_ttl", APT_CREDENTIALS_TTL)
+
+    @property
+    def apt_lists_max_age(self) -> int:
+        """Seconds apt lists are used by uaclient without apt-get update.
+
+        Set apt_lists_max_age to 0 in uaclient.conf to always update.
+        """
+        return self._get_ttl("apt_lists_max_age", APT_LISTS_MAX_AGE)
+
+    @property
+    def security_api_cache_ttl(self) -> int:
+        """Seconds Security API responses are used without revalidation.
+
+        Set security_api_cache_ttl to 0 in uaclient.conf to revalidate cached
+        responses on every request.
+        """
+        return self._get_ttl("security_api_cache_ttl", SECURITY_API_CACHE_TTL)
+
+    def _get_ttl(self, key: str, default: int) -> int:
+        try:
+            return int(self.cfg.get(key, default))
+        except (TypeError, ValueError):
+            logging.warning(
+                "Invalid %s in uaclient.conf: %s", key, self.cfg.get(key)
+            )
+            return default
+
     @property
     def log_level(self):
         log_level = self.cfg.get("log_level")
@@ -149,17 +200,32 @@ class UAConfig:
         except AttributeError:
             return getattr(logging, CONFIG_DEFAULTS["log_level"])
 
+    def _get_notices(self) -> "OrderedDict[Tuple[str, str], None]":
+        """Return the ordered set of notices, loading notices.json once."""
+        if self._notices is None:
+            self._notices = OrderedDict()
+            for label, description in self.read_cache("notices") or []:
+                self._notices[(label, description)] = None
+        return self._notices
+
+    @property
+    def notices(self) -> "List[List[str]]":
+        """Return notices as [label, description] pairs."""
+        return [list(notice) for notice in self._get_notices()]
+
     def add_notice(self, label: str, description: str):
         """Add a notice message to notices cache.
 
         Such notices are seen in the Notices section from ua status output.
         They are also present in the JSON status output.
+
+        Changes are only written to notices.json by flush_notices.
         """
-        notices = self.read_cache("notices") or []
-        notice = [label, description]
+        notices = self._get_notices()
+        notice = (label, description)
         if notice not in notices:
-            notices.append(notice)
-            self.write_cache("notices", notices)
+            notices[notice] = None
+            self._notices_dirty = True
 
     def remove_notice(self, label_regex: str, descr_regex: str):
         """Remove matching notices if present.
@@ -168,18 +234,32 @@ class UAConfig:
         :param descr_regex: Regex used to remove notices with matching
             descriptions.
         """
-        notices = []
-        cached_notices = self.read_cache("notices")
-        if cached_notices:
-            for notice_label, notice_descr in cached_notices:
-                if re.match(label_regex, notice_label):
-                    if re.match(descr_regex, notice_descr):
-                        continue
-                notices.append((notice_label, notice_descr))
+        notices = self._get_notices()
+        label_matches = {}  # type: Dict[str, bool]
+        removed = []
+        for label, description in notices:
+            if label not in label_matches:
+                label_matches[label] = bool(re.match(label_regex, label))
+            if label_matches[label] and re.match(descr_regex, description):
+                removed.append((label, description))
+        for notice in removed:
+            del notices[notice]
+        if removed:
+            self._notices_dirty = True
+
+    def flush_notices(self) -> None:
+        """Write notices changed since they were loaded or last flushed.
+
+        notices.json is removed once no notice remains.
+        """
+        if not self._notices_dirty:
+            return
+        notices = self.notices
         if notices:
             self.write_cache("notices", notices)
-        elif os.path.exists(self.data_path("notices")):
-            util.remove_file(self.data_path("notices"))
+        else:
+            self._perform_delete(self.data_path("notices"))
+        self._notices_dirty = False
 
     @property
     def log_file(self):
@@ -326,6 +406,7 @@ class UAConfig:
         (This is a separate method to allow easier disabling of deletion during
         tests.)
         """
+        self._cache_digests.pop(cache_path, None)
         if os.path.exists(cache_path):
             os.unlink(cache_path)
 
@@ -340,6 +421,9 @@ class UAConfig:
             self._machine_token = None
         elif key == "lock":
             self.remove_notice("", "Operation in progress.*")
+        elif key == "notices":
+            self._notices = None
+            self._notices_dirty = False
         cache_path = self.data_path(key)
         self._perform_delete(cache_path)
 
@@ -377,13 +461,42 @@ class UAConfig:
                     "",
                     "Operation in progress: {}".format(content.split(":")[1]),
                 )
+                # Show the operation to other processes while it runs
+                self.flush_notices()
         if not isinstance(content, str):
             content = json.dumps(content, cls=util.DatetimeAwareJSONEncoder)
         mode = 0o600
         if key in self.data_paths:
             if not self.data_paths[key].private:
                 mode = 0o644
-        util.write_file(filepath, content, mode=mode)
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        if self._get_cache_digest(filepath, mode) == digest:
+            logging.debug("Skipping write of unchanged file: %s", filepath)
+            return
+        util.atomic_write_file(filepath, content, mode=mode)
+        signature = _get_cache_file_signature(filepath)
+        if signature:
+            self._cache_digests[filepath] = (digest, signature)
+
+    def _get_cache_digest(self, cache_path: str, mode: int) -> "Optional[str]":
+        """Return the digest of the cache_path content, if it has mode.
+
+        The digest of the last content read or written is reused while the
+        file isn't replaced or modified.
+        """
+        signature = _get_cache_file_signature(cache_path)
+        if not signature or signature[-1] != mode:
+            return None
+        cached = self._cache_digests.get(cache_path)
+        if cached and cached[1] == signature:
+            return cached[0]
+        try:
+            with open(cache_path, "rb") as stream:
+                digest = hashlib.sha256(stream.read()).hexdigest()
+        except (IOError, OSError):
+            return None
+        self._cache_digests[cache_path] = (digest, signature)
+        return digest
 
     def _remove_beta_resources(self, response) -> "Dict[str, Any]":
         """ Remove beta services from response dict"""
@@ -418,21 +531,19 @@ class UAConfig:
 
         return new_response
 
-    def _get_config_status(
-        self
-    ) -> "Dict[str, Union[str, List[Tuple[str,str]]]]":
+    def _get_config_status(self) -> "Dict[str, Union[str, List[List[str]]]]":
         """Return a dict with configStatus, configStatusDetails and notices.
 
             Values for configStatus will be one of UserFacingConfigStatus enum:
                 inactive, active, reboot-required
             configStatusDescription will provide more details about that state.
-            notices is a list of tuples with label and description items.
+            notices is a list of label and description pairs.
         """
         userStatus = status.UserFacingConfigStatus
         status_val = userStatus.INACTIVE.value
         status_desc = status.MESSAGE_NO_ACTIVE_OPERATIONS
         (lock_pid, lock_holder) = self.check_lock_info()
-        notices = self.read_cache("notices") or []
+        notices = self.notices
         if lock_pid > 0:
             status_val = userStatus.ACTIVE.value
             status_desc = status.MESSAGE_LOCK_HELD.format(
@@ -524,7 +635,7 @@ class UAConfig:
                 "origin": contractInfo.get("origin"),
                 "subscription": contractInfo["name"],
                 "subscription-id": contractInfo["id"],
-                "notices": self.read_cache("notices") or [],
+                "notices": self.notices,
             }
         )
         if contractInfo.get("effectiveTo"):
@@ -648,6 +759,22 @@ class UAConfig:
         return response_dict
 
 
+def _get_cache_file_signature(
+    cache_path: str
+) -> "Optional[Tuple[int, int, int, int]]":
+    """Return (inode, size, mtime_ns, mode) of cache_path, None if absent."""
+    try:
+        file_stat = os.stat(cache_path)
+    except OSError:
+        return None
+    return (
+        file_stat.st_ino,
+        file_stat.st_size,
+        file_stat.st_mtime_ns,
+        file_stat.st_mode & 0o7777,
+    )
+
+
 def parse_config(config_path=None):
     """Parse known UA config file
 
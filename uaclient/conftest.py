@@ -4,7 +4,9 @@ import mock
 
 import pytest
 
+from uaclient import apt, distro_info, dpkg, util
 from uaclient.config import UAConfig
+from uaclient.testing.data import DISTRO_INFO_UBUNTU_CSV
 
 try:
     from typing import Any, Dict, Optional  # noqa: F401
@@ -65,6 +67,95 @@ def caplog_text(request):
     return _func
 
 
+@pytest.yield_fixture(autouse=True)
+def clear_platform_info_cache():
+    """Don't share the process-wide PlatformInfo snapshot across tests."""
+    util.clear_platform_info_cache()
+    yield
+    util.clear_platform_info_cache()
+
+
+@pytest.yield_fixture(autouse=True)
+def disable_system_facts_cache():
+    """Don't persist system facts unless a test explicitly asks for it."""
+    util.setup_system_facts_cache(None)
+    yield
+    util.setup_system_facts_cache(None)
+
+
+@pytest.yield_fixture(autouse=True)
+def disable_dpkg_status_cache():
+    """Don't share or persist parsed dpkg status across tests."""
+    dpkg.setup_dpkg_status_cache(None)
+    yield
+    dpkg.setup_dpkg_status_cache(None)
+
+
+@pytest.yield_fixture(autouse=True)
+def compare_versions_in_process():
+    """Don't share dpkg version comparison settings across tests."""
+    dpkg.setup_dpkg_compare_versions(False)
+    yield
+    dpkg.setup_dpkg_compare_versions(False)
+
+
+@pytest.yield_fixture(autouse=True)
+def clear_distro_info_cache():
+    """Don't share parsed distro-info data across tests."""
+    distro_info._load_distro_info.cache_clear()
+    yield
+    distro_info._load_distro_info.cache_clear()
+
+
+@pytest.yield_fixture(autouse=True)
+def clear_apt_policy_cache():
+    """Don't share AptPolicy snapshots across tests."""
+    apt.clear_apt_policy_cache()
+    yield
+    apt.clear_apt_policy_cache()
+
+
+@pytest.yield_fixture(autouse=True)
+def always_update_apt_lists():
+    """Don't skip apt-get update based on the host apt lists."""
+    apt.setup_apt_lists_max_age(0)
+    yield
+    apt.setup_apt_lists_max_age(0)
+
+
+@pytest.yield_fixture(autouse=True)
+def default_apt_config():
+    """Use apt's default paths instead of running apt-config dump."""
+    with mock.patch(
+        "uaclient.apt._APT_CONFIG", apt.AptConfig(apt.APT_CONFIG_DEFAULTS)
+    ):
+        yield
+
+
+@pytest.yield_fixture(autouse=True)
+def apt_cache_policy_backend():
+    """Read apt policy through apt-cache unless a test fakes python3-apt."""
+    with mock.patch("uaclient.apt.apt_pkg", None):
+        yield
+
+
+@pytest.yield_fixture
+def distro_info_csv(tmpdir):
+    """Point DISTRO_INFO_CSV at the recorded distro-info-data snapshot."""
+    csv_file = tmpdir.join("ubuntu.csv")
+    csv_file.write(DISTRO_INFO_UBUNTU_CSV)
+    with mock.patch("uaclient.distro_info.DISTRO_INFO_CSV", csv_file.strpath):
+        yield csv_file.strpath
+
+
+@pytest.yield_fixture
+def no_distro_info_csv(tmpdir):
+    """Simulate a system without distro-info-data installed."""
+    missing = tmpdir.join("missing-ubuntu.csv").strpath
+    with mock.patch("uaclient.distro_info.DISTRO_INFO_CSV", missing):
+        yield missing
+
+
 @pytest.yield_fixture
 def logging_sandbox():
     # Monkeypatch a replacement root logger, so that our changes to logging
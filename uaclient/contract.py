@@ -1,5 +1,6 @@
 import logging
 
+from uaclient import apt
 from uaclient import clouds
 from uaclient import exceptions
 from uaclient import status
@@ -225,7 +226,7 @@ class UAContractClient(serviceclient.UAServiceClient):
         """"Return a dict of platform-relateddata for contract requests"""
         if not machine_id:
             machine_id = util.get_machine_id(self.cfg.data_dir)
-        platform = util.get_platform_info()
+        platform = dict(util.get_platform_info())
         arch = platform.pop("arch")
         return {"machineId": machine_id, "architecture": arch, "os": platform}
 
@@ -235,6 +236,7 @@ def process_entitlements_delta(
     new_entitlements: "Dict[str, Any]",
     allow_enable: bool,
     series_overrides: bool = True,
+    cfg=None,
 ) -> None:
     """Iterate over all entitlements in new_entitlement and apply any delta
     found according to past_entitlements.
@@ -248,31 +250,50 @@ def process_entitlements_delta(
         about the recommended enabled service.
     :param series_overrides: Boolean set True if series overrides should be
         applied to the new_access dict.
+    :param cfg: Instance of UAConfig used by the entitlements, whose notices
+        the caller flushes. Defaults to a new UAConfig per entitlement.
     """
     delta_error = False
     unexpected_error = False
-    for name, new_entitlement in sorted(new_entitlements.items()):
-        try:
-            process_entitlement_delta(
-                past_entitlements.get(name, {}),
-                new_entitlement,
-                allow_enable=allow_enable,
-                series_overrides=series_overrides,
-            )
-        except exceptions.UserFacingError:
+    try:
+        # Enable services with a single apt-get update and install
+        with apt.AptTransaction() as transaction:
+            for name, new_entitlement in sorted(new_entitlements.items()):
+                try:
+                    process_entitlement_delta(
+                        past_entitlements.get(name, {}),
+                        new_entitlement,
+                        allow_enable=allow_enable,
+                        series_overrides=series_overrides,
+                        cfg=cfg,
+                    )
+                except exceptions.UserFacingError:
+                    delta_error = True
+                    with util.disable_log_to_console():
+                        logging.error(
+                            "Failed to process contract delta for {name}:"
+                            " {delta}".format(name=name, delta=new_entitlement)
+                        )
+                except Exception:
+                    unexpected_error = True
+                    with util.disable_log_to_console():
+                        logging.exception(
+                            "Unexpected error processing contract delta for"
+                            " {name}: {delta}".format(
+                                name=name, delta=new_entitlement
+                            )
+                        )
+        if transaction.failed_hook_services:
             delta_error = True
             with util.disable_log_to_console():
                 logging.error(
-                    "Failed to process contract delta for {name}:"
-                    " {delta}".format(name=name, delta=new_entitlement)
-                )
-        except Exception:
-            unexpected_error = True
-            with util.disable_log_to_console():
-                logging.exception(
-                    "Unexpected error processing contract delta for {name}:"
-                    " {delta}".format(name=name, delta=new_entitlement)
+                    "Failed to report contract deltas of: %s",
+                    ", ".join(transaction.failed_hook_services),
                 )
+    except exceptions.UserFacingError as e:
+        delta_error = True
+        with util.disable_log_to_console():
+            logging.error("Failed to apply contract deltas: %s", e.msg)
     if unexpected_error:
         raise exceptions.UserFacingError(status.MESSAGE_UNEXPECTED_ERROR)
     elif delta_error:
@@ -286,6 +307,7 @@ def process_entitlement_delta(
     new_access: "Dict[str, Any]",
     allow_enable: bool = False,
     series_overrides: bool = True,
+    cfg=None,
 ) -> "Dict":
     """Process a entitlement access dictionary deltas if they exist.
 
@@ -298,6 +320,7 @@ def process_entitlement_delta(
         about the recommended enabled service.
     :param series_overrides: Boolean set True if series overrides should be
         applied to the new_access dict.
+    :param cfg: Instance of UAConfig used by the entitlement.
 
     :raise UserFacingError: on failure to process deltas.
     :return: Dict of processed deltas
@@ -325,7 +348,7 @@ def process_entitlement_delta(
                 'Skipping entitlement deltas for "%s". No such class', name
             )
             return deltas
-        entitlement = ent_cls(assume_yes=allow_enable)
+        entitlement = ent_cls(cfg, assume_yes=allow_enable)
         entitlement.process_contract_deltas(
             orig_access, deltas, allow_enable=allow_enable
         )
@@ -384,7 +407,7 @@ def request_updated_contract(
         )
 
     process_entitlements_delta(
-        orig_entitlements, cfg.entitlements, allow_enable
+        orig_entitlements, cfg.entitlements, allow_enable, cfg=cfg
     )
 
 
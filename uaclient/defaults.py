@@ -18,6 +18,9 @@ BASE_ESM_URL = "https://ubuntu.com/esm"
 PRINT_WRAP_WIDTH = 80
 CONTRACT_EXPIRY_GRACE_PERIOD_DAYS = 14
 CONTRACT_EXPIRY_PENDING_DAYS = 20
+APT_CREDENTIALS_TTL = 6 * 60 * 60  # seconds validated credentials are reused
+SECURITY_API_CACHE_TTL = 60 * 60  # seconds Security API responses are reused
+APT_LISTS_MAX_AGE = 15 * 60  # seconds apt lists are used without updating
 
 CONFIG_DEFAULTS = {
     "contract_url": BASE_CONTRACT_URL,
@@ -0,0 +1,188 @@
+"""
+In-process queries of the distro-info Ubuntu release data.
+
+This reads the same CSV data used by ubuntu-distro-info so that uaclient can
+answer LTS, ESM and EOL questions without forking the CLI tool.
+
+N.B. This module intentionally only depends on the standard library so that
+uaclient.util can import it.
+"""
+
+import csv
+import datetime
+from collections import namedtuple
+from functools import lru_cache
+
+try:
+    from typing import Dict, List, Optional  # noqa: F401
+except ImportError:
+    # typing isn't available on trusty, so ignore its absence
+    pass
+
+
+DISTRO_INFO_CSV = "/usr/share/distro-info/ubuntu.csv"
+
+# Milestone dates are datetime.date instances or None when undefined
+UbuntuRelease = namedtuple(
+    "UbuntuRelease",
+    (
+        "version",
+        "codename",
+        "series",
+        "created",
+        "release",
+        "eol",
+        "eol_server",
+        "eol_esm",
+    ),
+)
+
+
+def _parse_date(value: "Optional[str]") -> "Optional[datetime.date]":
+    if not value:
+        return None
+    return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+
+
+class DistroInfo:
+    """Series-indexed view of the distro-info Ubuntu release table."""
+
+    def __init__(self, releases: "List[UbuntuRelease]") -> None:
+        self.releases = releases
+        self._by_series = {
+            release.series: release for release in releases
+        }  # type: Dict[str, UbuntuRelease]
+        self._by_version = {
+            release.version.split()[0]: release for release in releases
+        }  # type: Dict[str, UbuntuRelease]
+
+    @classmethod
+    def from_csv(cls, csv_file: str) -> "DistroInfo":
+        """Load a DistroInfo from a distro-info CSV file.
+
+        :raise IOError: when csv_file can not be read.
+        :raise ValueError: when csv_file contains unparseable data.
+        """
+        releases = []
+        with open(csv_file, "r") as stream:
+            reader = csv.DictReader(stream)
+            if "eol-esm" not in (reader.fieldnames or []):
+                # Older distro-info-data does not publish ESM dates
+                raise ValueError(
+                    "{} does not define eol-esm dates".format(csv_file)
+                )
+            for row in reader:
+                releases.append(
+                    UbuntuRelease(
+                        version=row["version"],
+                        codename=row["codename"],
+                        series=row["series"],
+                        created=_parse_date(row.get("created")),
+                        release=_parse_date(row.get("release")),
+                        eol=_parse_date(row.get("eol")),
+                        eol_server=_parse_date(row.get("eol-server")),
+                        eol_esm=_parse_date(row.get("eol-esm")),
+                    )
+                )
+        return cls(releases)
+
+    def get_release(self, series: str) -> "Optional[UbuntuRelease]":
+        """Return the UbuntuRelease for series or None if unknown."""
+        return self._by_series.get(series)
+
+    def get_release_by_version(
+        self, version: str
+    ) -> "Optional[UbuntuRelease]":
+        """Return the UbuntuRelease for a VERSION_ID such as 20.04."""
+        return self._by_version.get(version)
+
+    def is_lts(self, series: str) -> bool:
+        release = self.get_release(series)
+        return bool(release and release.version.endswith(" LTS"))
+
+    def supported_esm(
+        self, date: "Optional[datetime.date]" = None
+    ) -> "List[str]":
+        """Return series supported by ESM on date.
+
+        Equivalent to: ubuntu-distro-info --supported-esm
+        """
+        if date is None:
+            date = datetime.date.today()
+        return [
+            release.series
+            for release in self.releases
+            if release.created
+            and release.eol_esm
+            and release.created <= date <= release.eol_esm
+        ]
+
+    def is_supported_esm(
+        self, series: str, date: "Optional[datetime.date]" = None
+    ) -> bool:
+        release = self.get_release(series)
+        if not release or not release.created or not release.eol_esm:
+            return False
+        if date is None:
+            date = datetime.date.today()
+        return release.created <= date <= release.eol_esm
+
+    def days_until_eol(
+        self, series: str, date: "Optional[datetime.date]" = None
+    ) -> "Optional[int]":
+        """Return days until series reaches EOL, negative once EOL.
+
+        Equivalent to: ubuntu-distro-info --series <series> -yeol
+        """
+        release = self.get_release(series)
+        if not release or not release.eol:
+            return None
+        if date is None:
+            date = datetime.date.today()
+        return (release.eol - date).days
+
+    def is_eol(
+        self, series: str, date: "Optional[datetime.date]" = None
+    ) -> bool:
+        days = self.days_until_eol(series, date)
+        return days is not None and days <= 0
+
+    def is_esm_eol(
+        self, series: str, date: "Optional[datetime.date]" = None
+    ) -> bool:
+        release = self.get_release(series)
+        if not release or not release.eol_esm:
+            return False
+        if date is None:
+            date = datetime.date.today()
+        return release.eol_esm < date
+
+    def previous_release(self, series: str) -> "Optional[UbuntuRelease]":
+        """Return the release which upgrades directly to series.
+
+        LTS releases are upgraded from the previous LTS release, while
+        interim releases are upgraded from the release just before them.
+        """
+        release = self.get_release(series)
+        if not release:
+            return None
+        candidates = self.releases[: self.releases.index(release)]
+        if self.is_lts(series):
+            candidates = [r for r in candidates if self.is_lts(r.series)]
+        return candidates[-1] if candidates else None
+
+
+@lru_cache(maxsize=None)
+def _load_distro_info(csv_file: str) -> DistroInfo:
+    return DistroInfo.from_csv(csv_file)
+
+
+def get_distro_info(csv_file: "Optional[str]" = None) -> DistroInfo:
+    """Return the DistroInfo for csv_file, parsed once per process.
+
+    :param csv_file: Optional path to the CSV, defaults to DISTRO_INFO_CSV.
+
+    :raise IOError: when the distro-info data is not available.
+    :raise ValueError: when the distro-info data can not be parsed.
+    """
+    return _load_distro_info(csv_file or DISTRO_INFO_CSV)
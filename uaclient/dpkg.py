@@ -0,0 +1,296 @@
+"""
+In-process reader of the dpkg status database and Debian version ordering.
+
+This parses the same status file read by dpkg-query so that uaclient can look
+up installed packages without forking it. Parsed packages are persisted in
+the uaclient data_dir and reused until the status file changes.
+
+Debian versions are compared with the same rules as dpkg --compare-versions,
+through sort keys computed once per version.
+
+N.B. This module intentionally only depends on the standard library and
+uaclient.util so that uaclient.apt can import it.
+"""
+
+import json
+import logging
+import os
+import string
+import sys
+from functools import lru_cache
+
+from uaclient import util
+
+try:
+    from typing import Any, Dict, Iterable, List, Optional, Tuple  # noqa: F401
+except ImportError:
+    # typing isn't available on trusty, so ignore its absence
+    pass
+
+
+DPKG_STATUS_FILE = "/var/lib/dpkg/status"
+DPKG_STATUS_CACHE_FILE = "dpkg-status.json"
+
+# Package states which are listed by dpkg-query -W
+DPKG_UNKNOWN_STATES = ("not-installed",)
+# Package states whose files are considered installed on the system
+DPKG_INSTALLED_STATES = ("installed", "half-installed")
+
+_DPKG_STATUS_FIELDS = ("Package:", "Source:", "Version:", "Status:")
+
+_DEBIAN_VERSION_DIGITS = frozenset(string.digits)
+_DEBIAN_VERSION_LETTERS = frozenset(string.ascii_letters)
+
+_DPKG_STATUS_CACHE_PATH = None  # type: Optional[str]
+# Compare versions by forking dpkg, see setup_dpkg_compare_versions
+_DPKG_COMPARE_VERSIONS = False
+# Per-process (status file key, DpkgStatus), see get_dpkg_status
+_DPKG_STATUS = None  # type: Optional[Tuple[List[int], DpkgStatus]]
+
+
+class DpkgStatus:
+    """Indexes of the packages known to the dpkg status database.
+
+    :param packages: (package, version, source, state) tuples where source is
+        the source package name and state the last word of the Status field.
+    """
+
+    def __init__(self, packages: "Iterable[Tuple[str, str, str, str]]"):
+        self.package_records = []  # type: List[Tuple[str, str, str, str]]
+        self.packages = []  # type: List[str]
+        self._versions = {}  # type: Dict[str, str]
+        self._sources = {}  # type: Dict[str, Dict[str, str]]
+        for record in packages:
+            package, version, source, state = (
+                sys.intern(value) for value in record
+            )
+            self.package_records.append((package, version, source, state))
+            if state in DPKG_UNKNOWN_STATES:
+                continue
+            self.packages.append(package)
+            if state in DPKG_INSTALLED_STATES:
+                self._versions[package] = version
+                self._sources.setdefault(source, {})[package] = version
+
+    def __contains__(self, package: str) -> bool:
+        return package in self._versions
+
+    def get_version(self, package: str) -> "Optional[str]":
+        """Return the installed version of a binary package or None."""
+        return self._versions.get(package)
+
+    @property
+    def source_versions(self) -> "Dict[str, Dict[str, str]]":
+        """Installed binary package versions keyed by source package name.
+
+        The returned dict is shared and must not be modified.
+        """
+        return self._sources
+
+    @classmethod
+    def from_status_file(cls, status_file: str) -> "DpkgStatus":
+        """Parse a dpkg status file, one stanza at a time.
+
+        :raise IOError: when status_file can not be read.
+        """
+        return cls(_iter_status_file(status_file))
+
+
+def _get_package_record(
+    package: str, version: str, source: str, status: str
+) -> "Tuple[str, str, str, str]":
+    # Source may carry the source version: "krb5 (1.17-6)"
+    source = source.split(" ", 1)[0] or package
+    return (package, version, source, status.rsplit(" ", 1)[-1])
+
+
+def _iter_status_file(
+    status_file: str
+) -> "Iterable[Tuple[str, str, str, str]]":
+    package = None  # type: Optional[str]
+    version = source = status = ""
+    with open(status_file, "r", encoding="utf-8", errors="replace") as stream:
+        for line in stream:
+            # Multiline field continuations start with a space, skipping them
+            if not line.startswith(_DPKG_STATUS_FIELDS):
+                continue
+            name, _sep, value = line.partition(":")
+            value = value.strip()
+            if name == "Package":  # Package starts each stanza
+                if package is not None:
+                    yield _get_package_record(package, version, source, status)
+                package = value
+                version = source = status = ""
+            elif name == "Version":
+                version = value
+            elif name == "Source":
+                source = value
+            else:
+                status = value
+    if package is not None:
+        yield _get_package_record(package, version, source, status)
+
+
+def setup_dpkg_status_cache(data_dir: "Optional[str]") -> None:
+    """Persist parsed dpkg status in data_dir for later processes to reuse.
+
+    :param data_dir: The uaclient data_dir. None disables persistence.
+    """
+    global _DPKG_STATUS_CACHE_PATH, _DPKG_STATUS
+    _DPKG_STATUS_CACHE_PATH = None
+    if data_dir:
+        _DPKG_STATUS_CACHE_PATH = os.path.join(
+            data_dir, DPKG_STATUS_CACHE_FILE
+        )
+    _DPKG_STATUS = None
+
+
+def _load_dpkg_status_cache(key: "List[int]") -> "Optional[DpkgStatus]":
+    if not _DPKG_STATUS_CACHE_PATH:
+        return None
+    try:
+        cached = json.loads(util.load_file(_DPKG_STATUS_CACHE_PATH))
+        if cached["key"] != key:
+            return None
+        return DpkgStatus(tuple(record) for record in cached["packages"])
+    except (IOError, OSError, ValueError, KeyError, TypeError) as e:
+        logging.debug("Ignoring invalid dpkg status cache: %s", str(e))
+        return None
+
+
+def _write_dpkg_status_cache(key: "List[int]", dpkg_status: DpkgStatus):
+    if not _DPKG_STATUS_CACHE_PATH:
+        return
+    content = json.dumps(
+        {"key": key, "packages": dpkg_status.package_records},
+        separators=(",", ":"),
+    )
+    try:
+        util.atomic_write_file(_DPKG_STATUS_CACHE_PATH, content)
+    except (IOError, OSError) as e:
+        logging.debug("Unable to cache dpkg status: %s", str(e))
+
+
+def get_dpkg_status() -> DpkgStatus:
+    """Return the packages of the dpkg status database.
+
+    The status is parsed again only when the status file mtime or size
+    changes, such as after installing packages.
+    """
+    global _DPKG_STATUS
+    try:
+        status_stat = os.stat(DPKG_STATUS_FILE)
+    except OSError as e:
+        logging.debug("Unable to read dpkg status: %s", str(e))
+        return DpkgStatus([])
+    key = [status_stat.st_mtime_ns, status_stat.st_size]
+    if _DPKG_STATUS is not None and _DPKG_STATUS[0] == key:
+        return _DPKG_STATUS[1]
+    dpkg_status = _load_dpkg_status_cache(key)
+    if dpkg_status is None:
+        dpkg_status = DpkgStatus.from_status_file(DPKG_STATUS_FILE)
+        _write_dpkg_status_cache(key, dpkg_status)
+    _DPKG_STATUS = (key, dpkg_status)
+    return dpkg_status
+
+
+def _get_char_order(char: str) -> int:
+    """Return the weight of a non-digit char, as dpkg's order function."""
+    if char in _DEBIAN_VERSION_LETTERS:
+        return ord(char)
+    if char == "~":
+        return -1
+    return ord(char) + 256
+
+
+# Sort key element closing every upstream version or revision key. It sorts
+# after "~" and before any other non-digit part, as the end of a string does.
+_END_OF_VERSION_PART = ((0,), 0)
+
+
+def _get_version_part_key(part: str) -> "Tuple[Any, ...]":
+    """Return the sort key of an upstream version or a revision.
+
+    As in dpkg, the part is split into alternating non-digit and digit
+    strings. Each pair becomes a (non-digit char weights, number) element
+    where the weights end with 0 so that a shorter non-digit string sorts
+    before longer ones, unless those continue with "~".
+    """
+    key = []
+    idx = 0
+    length = len(part)
+    while True:
+        start = idx
+        while idx < length and part[idx] not in _DEBIAN_VERSION_DIGITS:
+            idx += 1
+        weights = tuple(_get_char_order(char) for char in part[start:idx])
+        start = idx
+        while idx < length and part[idx] in _DEBIAN_VERSION_DIGITS:
+            idx += 1
+        key.append((weights + (0,), int(part[start:idx] or 0)))
+        if idx >= length:
+            break
+    key.append(_END_OF_VERSION_PART)
+    return tuple(key)
+
+
+@lru_cache(maxsize=4096)
+def get_version_key(version: str) -> "Tuple[Any, ...]":
+    """Return a key sorting Debian versions as dpkg does.
+
+    :raise ValueError: when version is not a valid Debian version.
+    """
+    version = version.strip()
+    epoch = "0"
+    if ":" in version:
+        epoch, version = version.split(":", 1)
+        if not epoch or not all(c in _DEBIAN_VERSION_DIGITS for c in epoch):
+            raise ValueError("Invalid version epoch: {}".format(epoch))
+    revision = ""
+    if "-" in version:
+        version, revision = version.rsplit("-", 1)
+        if not revision:
+            raise ValueError("Empty version revision")
+    if not version or " " in version:
+        raise ValueError("Invalid version: {}".format(version))
+    return (
+        int(epoch),
+        _get_version_part_key(version),
+        _get_version_part_key(revision),
+    )
+
+
+def setup_dpkg_compare_versions(enabled: bool) -> None:
+    """Compare versions by forking dpkg instead of in-process when enabled.
+
+    This is a debugging aid, enabled by features.dpkg_compare_versions in
+    uaclient.conf.
+    """
+    global _DPKG_COMPARE_VERSIONS
+    _DPKG_COMPARE_VERSIONS = enabled
+
+
+def is_dpkg_compare_versions_enabled() -> bool:
+    """Return True when versions are compared by forking dpkg."""
+    return _DPKG_COMPARE_VERSIONS
+
+
+def _dpkg_compare_versions(version1: str, operator: str, version2: str):
+    try:
+        util.subp(["dpkg", "--compare-versions", version1, operator, version2])
+        return True
+    except util.ProcessExecutionError:
+        return False
+
+
+def version_le(version1: str, version2: str) -> bool:
+    """Return True when version1 is less than or equal to version2.
+
+    Invalid versions are compared by dpkg, which also rejects them.
+    """
+    if not _DPKG_COMPARE_VERSIONS:
+        try:
+            return get_version_key(version1) <= get_version_key(version2)
+        except ValueError as e:
+            logging.debug("Comparing versions with dpkg: %s", str(e))
+    return _dpkg_compare_versions(version1, "le", version2)
@@ -1,3 +1,4 @@
+from uaclient import apt
 from uaclient.entitlements import repo
 from uaclient import util
 from uaclient.config import update_ua_messages
@@ -17,13 +18,13 @@ class ESMBaseEntitlement(repo.RepoEntitlement):
             silent_if_inapplicable=silent_if_inapplicable
         )
         if enable_performed:
-            update_ua_messages(self.cfg)
+            apt.call_after_apt_update(update_ua_messages, self.cfg)
         return enable_performed
 
     def disable(self, silent=False) -> bool:
         disable_performed = super().disable(silent=silent)
         if disable_performed:
-            update_ua_messages(self.cfg)
+            apt.call_after_apt_update(update_ua_messages, self.cfg)
         return disable_performed
 
 
@@ -330,7 +330,12 @@ class FIPSEntitlement(FIPSCommonEntitlement):
 
     def enable(self, *, silent_if_inapplicable: bool = False) -> bool:
         if super().enable(silent_if_inapplicable=silent_if_inapplicable):
-            self.cfg.remove_notice("", status.MESSAGE_FIPS_INSTALL_OUT_OF_DATE)
+            apt.call_after_service_committed(
+                self.title,
+                self.cfg.remove_notice,
+                "",
+                status.MESSAGE_FIPS_INSTALL_OUT_OF_DATE,
+            )
             return True
         return False
 
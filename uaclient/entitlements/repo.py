@@ -1,7 +1,7 @@
 import abc
+import functools
 import logging
 import os
-import re
 
 from uaclient import contract
 
@@ -115,12 +115,18 @@ class RepoEntitlement(base.UAEntitlement):
             if not handle_message_operations(msg_ops):
                 return False
             self.install_packages()
+        # The repo and packages may only be set up once a shared
+        # AptTransaction commits, so only report success after that
+        return apt.call_after_service_committed(
+            self.title, self._report_enabled
+        )
+
+    def _report_enabled(self) -> bool:
         print(status.MESSAGE_ENABLED_TMPL.format(title=self.title))
         msg_ops = self.messaging.get("post_enable", [])
         if not handle_message_operations(msg_ops):
             return False
-
-        self.check_for_reboot_msg(operation="install")
+        self.check_for_reboot_msg("install")
         return True
 
     def disable(self, silent=False):
@@ -132,6 +138,11 @@ class RepoEntitlement(base.UAEntitlement):
         if hasattr(self, "remove_packages"):
             self.remove_packages()
         self._cleanup()
+        return apt.call_after_service_committed(
+            self.title, self._report_disabled
+        )
+
+    def _report_disabled(self) -> bool:
         msg_ops = self.messaging.get("post_disable", [])
         if not handle_message_operations(msg_ops):
             return False
@@ -153,14 +164,10 @@ class RepoEntitlement(base.UAEntitlement):
                 ApplicationStatus.DISABLED,
                 "{} does not have an aptURL directive".format(self.title),
             )
-        protocol, repo_path = repo_url.split("://")
-        policy = apt.run_apt_command(
-            ["apt-cache", "policy"], status.MESSAGE_APT_POLICY_FAILED
+        pin = apt.get_apt_policy().get_pin_priority(
+            "{}/ubuntu".format(repo_url.rstrip("/"))
         )
-        match = re.search(
-            r"(?P<pin>(-)?\d+) {}/ubuntu".format(repo_url), policy
-        )
-        if match and match.group("pin") != APT_DISABLED_PIN:
+        if pin is not None and str(pin) != APT_DISABLED_PIN:
             return ApplicationStatus.ENABLED, "{} is active".format(self.title)
         return (
             ApplicationStatus.DISABLED,
@@ -252,7 +259,6 @@ class RepoEntitlement(base.UAEntitlement):
         :param package_list: Optional package list to use instead of
             self.packages.
         """
-        print("Installing {title} packages".format(title=self.title))
         if self.apt_noninteractive:
             env = {"DEBIAN_FRONTEND": "noninteractive"}
             apt_options = [
@@ -264,6 +270,23 @@ class RepoEntitlement(base.UAEntitlement):
             apt_options = []
         if not package_list:
             package_list = self.packages
+        transaction = apt.get_apt_transaction()
+        if transaction:
+            # Merge into a single apt-get install with the other services
+            transaction.add_install(
+                self.title,
+                package_list,
+                status.MESSAGE_ENABLED_FAILED_TMPL.format(title=self.title),
+                env=env,
+                apt_options=apt_options,
+                cleanup=self._cleanup if cleanup_on_failure else None,
+            )
+            return
+        print(
+            status.MESSAGE_INSTALLING_SERVICE_PACKAGES_TMPL.format(
+                title=self.title
+            )
+        )
         try:
             apt.run_apt_command(
                 ["apt-get", "install", "--assume-yes"]
@@ -343,6 +366,7 @@ class RepoEntitlement(base.UAEntitlement):
                     self.repo_pin_priority,
                 )
             elif os.path.exists(repo_pref_file):
+                apt.stage_apt_file(repo_pref_file)
                 os.unlink(repo_pref_file)  # Remove disabling apt pref file
 
         prerequisite_pkgs = []
@@ -351,10 +375,14 @@ class RepoEntitlement(base.UAEntitlement):
         if not os.path.exists(apt.CA_CERTIFICATES_FILE):
             prerequisite_pkgs.append("ca-certificates")
 
-        if prerequisite_pkgs:
+        transaction = apt.get_apt_transaction()
+        if prerequisite_pkgs and transaction:
+            # Installed once for all services, before apt-get update
+            transaction.add_prerequisites(prerequisite_pkgs)
+        elif prerequisite_pkgs:
             print(
-                "Installing prerequisites: {}".format(
-                    ", ".join(prerequisite_pkgs)
+                status.MESSAGE_INSTALLING_PREREQUISITES_TMPL.format(
+                    packages=", ".join(prerequisite_pkgs)
                 )
             )
             try:
@@ -365,18 +393,42 @@ class RepoEntitlement(base.UAEntitlement):
             except exceptions.UserFacingError:
                 self.remove_apt_config()
                 raise
+        credentials_cache = apt.AptCredentialsCache(
+            self.cfg.data_path("apt-credentials"), self.cfg.apt_credentials_ttl
+        )
+        if transaction:
+            # Validate credentials in the background. Once valid, the repo
+            # is added and fetched along with the other staged services.
+            transaction.add_auth_apt_repo(
+                self.title,
+                repo_filename,
+                repo_url,
+                token,
+                repo_suites,
+                self.repo_key_file,
+                credentials_cache=credentials_cache,
+                cleanup=functools.partial(
+                    self.remove_apt_config, run_apt_update=False
+                ),
+            )
+            return
         apt.add_auth_apt_repo(
-            repo_filename, repo_url, token, repo_suites, self.repo_key_file
+            repo_filename,
+            repo_url,
+            token,
+            repo_suites,
+            self.repo_key_file,
+            credentials_cache=credentials_cache,
         )
         # Run apt-update on any repo-entitlement enable because the machine
         # probably wants access to the repo that was just enabled.
         # Side-effect is that apt policy will now report the repo as accessible
         # which allows ua status to report correct info
+        if apt.are_apt_lists_fresh():
+            return  # The lists of the repo were fetched already
         print(status.MESSAGE_APT_UPDATING_LISTS)
         try:
-            apt.run_apt_command(
-                ["apt-get", "update"], status.MESSAGE_APT_UPDATE_FAILED
-            )
+            apt.run_apt_update_command()
         except exceptions.UserFacingError:
             self.remove_apt_config(run_apt_update=False)
             raise
@@ -416,13 +468,16 @@ class RepoEntitlement(base.UAEntitlement):
                     self.repo_pin_priority,
                 )
             elif os.path.exists(repo_pref_file):
+                apt.stage_apt_file(repo_pref_file)
                 os.unlink(repo_pref_file)
 
         if run_apt_update:
+            transaction = apt.get_apt_transaction()
+            if transaction:
+                transaction.request_update(self.title)
+                return
             print(status.MESSAGE_APT_UPDATING_LISTS)
-            apt.run_apt_command(
-                ["apt-get", "update"], status.MESSAGE_APT_UPDATE_FAILED
-            )
+            apt.run_apt_update_command()
 
 
 def handle_message_operations(
@@ -161,6 +161,7 @@ class TestCommonCriteriaEntitlementEnable:
                 "{}-token".format(entitlement.name),
                 ["xenial"],
                 entitlement.repo_key_file,
+                credentials_cache=mock.ANY,
             )
         ]
 
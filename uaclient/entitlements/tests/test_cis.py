@@ -65,6 +65,7 @@ class TestCISEntitlementEnable:
                 "{}-token".format(entitlement.name),
                 ["xenial"],
                 entitlement.repo_key_file,
+                credentials_cache=mock.ANY,
             )
         ]
 
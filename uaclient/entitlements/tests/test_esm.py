@@ -237,6 +237,7 @@ class TestESMInfraEntitlementEnable:
                 "{}-token".format(entitlement.name),
                 ["trusty"],
                 entitlement.repo_key_file,
+                credentials_cache=mock.ANY,
             )
         ]
         install_cmd = mock.call(
@@ -339,6 +340,7 @@ class TestESMInfraEntitlementEnable:
                 "{}-token".format(entitlement.name),
                 ["trusty"],
                 entitlement.repo_key_file,
+                credentials_cache=mock.ANY,
             )
         ]
         subp_calls = [
@@ -171,6 +171,7 @@ class TestFIPSEntitlementEnable:
                 "{}-token".format(entitlement.name),
                 ["xenial"],
                 entitlement.repo_key_file,
+                credentials_cache=mock.ANY,
             )
         ]
         apt_pinning_calls = [
@@ -224,7 +225,7 @@ class TestFIPSEntitlementEnable:
         assert subp_calls == m_subp.call_args_list
         assert [
             ["", status.MESSAGE_FIPS_REBOOT_REQUIRED]
-        ] == entitlement.cfg.read_cache("notices")
+        ] == entitlement.cfg.notices
 
     @pytest.mark.parametrize(
         "repo_enable_return_value, expected_remove_notice_calls",
@@ -651,7 +652,7 @@ class TestFIPSEntitlementDisable:
         assert [mock.call()] == m_remove_packages.call_args_list
         assert [
             ["", status.MESSAGE_FIPS_DISABLE_REBOOT_REQUIRED]
-        ] == entitlement.cfg.read_cache("notices")
+        ] == entitlement.cfg.notices
 
 
 class TestFIPSEntitlementApplicationStatus:
@@ -715,18 +716,18 @@ class TestFIPSEntitlementApplicationStatus:
         expected_status = status.ApplicationStatus.ENABLED
         if path_exists and proc_content == "1":
             expected_msg = msg
-            assert entitlement.cfg.read_cache("notices") is None
+            assert [] == entitlement.cfg.notices
         elif path_exists and proc_content == "0":
             expected_msg = "/proc/sys/crypto/fips_enabled is not set to 1"
             expected_status = status.ApplicationStatus.DISABLED
             assert [
                 ["", status.NOTICE_FIPS_MANUAL_DISABLE_URL]
-            ] == entitlement.cfg.read_cache("notices")
+            ] == entitlement.cfg.notices
         else:
             expected_msg = "Reboot to FIPS kernel required"
             assert [
                 ["", status.MESSAGE_FIPS_REBOOT_REQUIRED]
-            ] == entitlement.cfg.read_cache("notices")
+            ] == entitlement.cfg.notices
 
         assert (expected_status, expected_msg) == application_status
 
@@ -532,6 +532,39 @@ class TestLivepatchEntitlementEnable:
         ]
         assert expected_calls == m_which.call_args_list
 
+    @mock.patch("uaclient.apt.are_apt_lists_fresh", return_value=True)
+    @mock.patch("uaclient.util.get_platform_info")
+    @mock.patch("uaclient.util.subp")
+    @mock.patch("uaclient.apt.run_apt_command")
+    @mock.patch("uaclient.util.which", return_value=False)
+    @mock.patch(M_PATH + "LivepatchEntitlement.application_status")
+    @mock.patch(M_PATH + "LivepatchEntitlement.can_enable", return_value=True)
+    def test_enable_skips_apt_update_when_apt_lists_are_fresh(
+        self,
+        m_can_enable,
+        m_app_status,
+        m_which,
+        m_run_apt,
+        m_subp,
+        _m_get_platform_info,
+        _m_lists_fresh,
+        capsys,
+        entitlement,
+    ):
+        """snapd is installed from fresh apt lists without updating them."""
+        m_app_status.return_value = status.ApplicationStatus.ENABLED, ""
+
+        assert entitlement.enable()
+        assert self.mocks_install + self.mocks_config in m_subp.call_args_list
+        assert 0 == m_run_apt.call_count
+        msg = (
+            "Installing snapd\n"
+            "Installing canonical-livepatch snap\n"
+            "Canonical livepatch enabled.\n"
+        )
+        assert (msg, "") == capsys.readouterr()
+
+    @mock.patch(M_PATH + "apt.get_installed_packages", return_value=["snapd"])
     @mock.patch("uaclient.util.get_platform_info")
     @mock.patch("uaclient.util.subp", return_value=("snapd", ""))
     @mock.patch(
@@ -546,6 +579,7 @@ class TestLivepatchEntitlementEnable:
         m_which,
         m_subp,
         _m_get_platform_info,
+        _m_get_installed_packages,
         capsys,
         entitlement,
     ):
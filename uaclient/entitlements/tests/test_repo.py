@@ -489,6 +489,28 @@ class TestRepoEnable:
         stdout, _ = capsys.readouterr()
         assert output == stdout
 
+    @mock.patch(M_PATH + "util.should_reboot", return_value=False)
+    @mock.patch.object(RepoTestEntitlement, "setup_apt_config")
+    @mock.patch.object(RepoTestEntitlement, "can_enable", return_value=True)
+    def test_failed_post_enable_messaging_in_transaction_is_reported(
+        self,
+        _m_can_enable,
+        _m_setup_apt_config,
+        _m_should_reboot,
+        entitlement,
+        capsys,
+    ):
+        """A deferred post_enable failure is listed once committed."""
+        messaging = {"post_enable": ["post1", (lambda: False, {}), "post2"]}
+        with mock.patch.object(type(entitlement), "messaging", messaging):
+            with mock.patch.object(type(entitlement), "packages", []):
+                with apt.AptTransaction() as transaction:
+                    assert entitlement.enable()
+                    assert [] == transaction.failed_hook_services
+        assert ["Repo Test Class"] == transaction.failed_hook_services
+        stdout, _ = capsys.readouterr()
+        assert "Repo Test Class enabled\npost1\n" == stdout
+
     @pytest.mark.parametrize("should_reboot", (False, True))
     @pytest.mark.parametrize("with_pre_install_msg", (False, True))
     @pytest.mark.parametrize("packages", (["a"], [], None))
@@ -594,6 +616,7 @@ class TestRepoEnable:
                 "repotest-token",
                 ["xenial"],
                 entitlement.repo_key_file,
+                credentials_cache=mock.ANY,
             )
         ]
         assert add_apt_calls == m_apt_add.call_args_list
@@ -601,6 +624,28 @@ class TestRepoEnable:
         stdout, _ = capsys.readouterr()
         assert expected_output == stdout
 
+    @mock.patch(M_PATH + "apt.run_apt_command")
+    def test_install_packages_joins_apt_transaction_install_plan(
+        self, m_run_apt_command, entitlement
+    ):
+        calls = []
+        m_run_apt_command.side_effect = lambda cmd, *args, **kwargs: (
+            calls.append(cmd)
+        )
+        with mock.patch(
+            "uaclient.apt.run_apt_update_command",
+            side_effect=lambda source_files: calls.append("update"),
+        ):
+            with apt.AptTransaction() as transaction:
+                transaction.request_update(entitlement.title)
+                entitlement.install_packages(package_list=["pkg1"])
+                entitlement.install_packages(package_list=["pkg2"])
+                assert [] == calls
+        assert [
+            "update",
+            ["apt-get", "install", "--assume-yes", "pkg1", "pkg2"],
+        ] == calls
+
     @mock.patch(M_PATH + "util.subp")
     def test_failed_install_removes_apt_config_and_packages(
         self, m_subp, entitlement
@@ -874,6 +919,108 @@ class TestSetupAptConfig:
         )
         assert install_call in m_run_apt_command.call_args_list
 
+    @pytest.mark.parametrize("lists_fresh", (True, False))
+    @mock.patch(
+        M_PATH + "util.get_platform_info", return_value=PLATFORM_INFO_SUPPORTED
+    )
+    @mock.patch(M_PATH + "apt.are_apt_lists_fresh")
+    @mock.patch(M_PATH + "apt.add_auth_apt_repo")
+    @mock.patch(M_PATH + "apt.run_apt_command")
+    def test_apt_update_skipped_when_apt_lists_are_fresh(
+        self,
+        m_run_apt_command,
+        m_add_auth_repo,
+        m_lists_fresh,
+        _m_platform,
+        lists_fresh,
+        entitlement,
+    ):
+        m_lists_fresh.return_value = lists_fresh
+        with mock.patch(M_PATH + "os.path.exists", return_value=True):
+            entitlement.setup_apt_config()
+        assert 1 == m_add_auth_repo.call_count
+        update_call = mock.call(["apt-get", "update"], mock.ANY)
+        assert (update_call not in m_run_apt_command.call_args_list) is (
+            lists_fresh
+        )
+
+    @mock.patch(
+        M_PATH + "util.get_platform_info", return_value=PLATFORM_INFO_SUPPORTED
+    )
+    @mock.patch(M_PATH + "apt.assert_valid_apt_credentials")
+    @mock.patch(M_PATH + "apt.add_auth_apt_repo")
+    @mock.patch(M_PATH + "apt.run_apt_command")
+    def test_setup_defers_apt_update_to_active_apt_transaction(
+        self,
+        m_run_apt_command,
+        m_add_auth_repo,
+        m_assert_valid,
+        _m_platform,
+        entitlement,
+    ):
+        """Within an AptTransaction only this repo is fetched, once."""
+        with mock.patch("uaclient.apt.run_apt_update_command") as m_update:
+            with apt.AptTransaction():
+                entitlement.setup_apt_config()
+                assert 0 == m_add_auth_repo.call_count
+                assert 0 == m_update.call_count
+        update_call = mock.call(["apt-get", "update"], mock.ANY)
+        assert update_call not in m_run_apt_command.call_args_list
+        assert [
+            mock.call("http://REPOTEST", "bearer", "repotest-token", mock.ANY)
+        ] == m_assert_valid.call_args_list
+        assert [
+            mock.call(
+                validate=False,
+                repo_filename="/etc/apt/sources.list.d/ubuntu-repotest.list",
+                repo_url="http://REPOTEST",
+                credentials="repotest-token",
+                suites=["xenial"],
+                keyring_file="test.gpg",
+            )
+        ] == m_add_auth_repo.call_args_list
+        # The mocked add_auth_apt_repo doesn't write the list file to fetch
+        assert [mock.call([])] == m_update.call_args_list
+
+    @mock.patch(
+        M_PATH + "util.get_platform_info", return_value=PLATFORM_INFO_SUPPORTED
+    )
+    @mock.patch(M_PATH + "apt.assert_valid_apt_credentials")
+    @mock.patch(M_PATH + "apt.add_auth_apt_repo")
+    @mock.patch(M_PATH + "apt.run_apt_command")
+    def test_invalid_credentials_clean_up_only_that_service(
+        self,
+        m_run_apt_command,
+        m_add_auth_repo,
+        m_assert_valid,
+        _m_platform,
+        entitlement,
+    ):
+        m_assert_valid.side_effect = exceptions.UserFacingError(
+            "Invalid APT credentials provided for http://REPOTEST"
+        )
+        with mock.patch.object(entitlement, "remove_apt_config") as m_remove:
+            with mock.patch("uaclient.apt.run_apt_update_command") as m_update:
+                with pytest.raises(exceptions.UserFacingError) as excinfo:
+                    with apt.AptTransaction() as transaction:
+                        entitlement.setup_apt_config()
+                        entitlement.install_packages(package_list=["pkg"])
+                        transaction.request_update("Other Service")
+        assert (
+            "Invalid APT credentials provided for http://REPOTEST"
+            == excinfo.value.msg
+        )
+        assert [mock.call(run_apt_update=False)] == m_remove.call_args_list
+        assert 0 == m_add_auth_repo.call_count
+        # The update of other services goes on, the service install doesn't
+        assert [mock.call([])] == m_update.call_args_list
+        install_call = mock.call(
+            ["apt-get", "install", "--assume-yes", "pkg"],
+            mock.ANY,
+            env=mock.ANY,
+        )
+        assert install_call not in m_run_apt_command.call_args_list
+
     @mock.patch(M_PATH + "util.get_platform_info")
     def test_setup_error_with_repo_pin_priority_and_missing_origin(
         self, m_get_platform_info, entitlement_factory
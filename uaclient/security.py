@@ -1,13 +1,19 @@
-import copy
+import hashlib
 import itertools
+import json
+import logging
 import os
 import socket
 import textwrap
+import time
 
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
 
 from uaclient import apt
+from uaclient import dpkg
 from uaclient.config import UAConfig
 from uaclient.clouds.identity import (
     CLOUD_TYPE_TO_TITLE,
@@ -18,11 +24,25 @@ from uaclient import exceptions
 from uaclient import status
 from uaclient import serviceclient
 from uaclient import util
+from uaclient.security_dataset import (
+    SECURITY_DATASET_DIR,
+    SecurityDataset,
+    SecurityDatasetError,
+)
 from uaclient.entitlements import ENTITLEMENT_CLASS_BY_NAME
 from uaclient.defaults import BASE_UA_URL, PRINT_WRAP_WIDTH
 
 try:
-    from typing import Any, Dict, List, Optional, Tuple  # noqa: F401
+    from typing import (  # noqa: F401
+        Any,
+        Callable,
+        Dict,
+        Iterable,
+        Iterator,
+        List,
+        Optional,
+        Tuple,
+    )
 except ImportError:
     # typing isn't available on trusty, so ignore its absence
     pass
@@ -37,6 +57,12 @@ API_V1_CVE_TMPL = "cves/{cve}.json"
 API_V1_NOTICES = "notices.json"
 API_V1_NOTICE_TMPL = "notices/{notice}.json"
 
+SECURITY_API_CACHE_DIR = "security-api-cache"
+# Upper bound on concurrent Security API requests
+SECURITY_API_MAX_WORKERS = 8
+# CVEs or USNs requested per page by UASecurityClient.iter_* queries
+SECURITY_API_PAGE_SIZE = 50
+
 UBUNTU_STANDARD_UPDATES_POCKET = "Ubuntu standard updates"
 UA_INFRA_POCKET = "UA Infra"
 UA_APPS_POCKET = "UA Apps"
@@ -63,12 +89,89 @@ class SecurityAPIError(util.UrlError):
         return prefix + ": [" + self.url + "]"
 
 
+class SecurityAPIResponseCache:
+    """Security API responses persisted on disk, one file per URL.
+
+    Responses are reused for ttl seconds. Older responses are revalidated
+    with the ETag and Last-Modified headers they were served with, and are
+    still used when the Security API can't be reached.
+    """
+
+    def __init__(self, cache_dir: str, ttl: int) -> None:
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+    def _get_path(self, url: str) -> str:
+        url_hash = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, url_hash + ".json")
+
+    def get(self, url: str) -> "Optional[Dict[str, Any]]":
+        """Return the cached entry of url, or None."""
+        try:
+            entry = json.loads(util.load_file(self._get_path(url)))
+        except (IOError, OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or entry.get("url") != url:
+            return None
+        return entry
+
+    def is_fresh(self, entry: "Dict[str, Any]") -> bool:
+        """Return True when entry can be used without revalidation."""
+        fetched_at = entry.get("fetched_at")
+        if not isinstance(fetched_at, (int, float)):
+            return False
+        return 0 <= time.time() - fetched_at < self.ttl
+
+    def get_conditional_headers(
+        self, entry: "Dict[str, Any]"
+    ) -> "Dict[str, str]":
+        """Return headers asking the server whether entry is still valid."""
+        headers = {}
+        if entry.get("etag"):
+            headers["if-none-match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["if-modified-since"] = entry["last_modified"]
+        return headers
+
+    def set(
+        self,
+        url: str,
+        response: "Any",
+        etag: "Optional[str]" = None,
+        last_modified: "Optional[str]" = None,
+    ) -> "Dict[str, Any]":
+        """Record response as fetched now and return its cache entry."""
+        entry = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time(),
+            "response": response,
+        }
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            util.atomic_write_file(
+                self._get_path(url), json.dumps(entry, sort_keys=True)
+            )
+        except (IOError, OSError) as e:
+            # Non-root users can query the Security API too
+            logging.debug("Unable to cache response of %s: %s", url, str(e))
+        return entry
+
+
 class UASecurityClient(serviceclient.UAServiceClient):
 
     url_timeout = 20
     cfg_url_base_attr = "security_url"
     api_error_cls = SecurityAPIError
 
+    def __init__(self, cfg: "Optional[UAConfig]" = None) -> None:
+        super().__init__(cfg=cfg)
+        self.response_cache = SecurityAPIResponseCache(
+            os.path.join(self.cfg.data_dir, SECURITY_API_CACHE_DIR),
+            self.cfg.security_api_cache_ttl,
+        )
+
     def _get_query_params(
         self, query_params: "Dict[str, Any]"
     ) -> "Dict[str, Any]":
@@ -85,11 +188,78 @@ class UASecurityClient(serviceclient.UAServiceClient):
 
         return extra_security_params
 
-    @util.retry(socket.timeout, retry_sleeps=[1, 3, 5])
     def request_url(
         self, path, data=None, headers=None, method=None, query_params=None
     ):
         query_params = self._get_query_params(query_params)
+        if data is not None or method not in (None, "GET"):
+            return self._request_url(
+                path=path,
+                data=data,
+                headers=headers,
+                method=method,
+                query_params=query_params,
+            )
+        return self._request_cached_url(
+            path=path, headers=headers, query_params=query_params
+        )
+
+    def _request_cached_url(self, path, headers=None, query_params=None):
+        """GET path, reusing the cached response when it is still valid.
+
+        When the Security API is unreachable or failing, the last cached
+        response is returned, however old it is.
+        """
+        url = self._build_url(path, query_params)
+        entry = self.response_cache.get(url)
+        if entry and self.response_cache.is_fresh(entry):
+            logging.debug("Using cached response of %s", url)
+            return entry["response"], {}
+        request_headers = dict(headers or self.headers())
+        if entry:
+            request_headers.update(
+                self.response_cache.get_conditional_headers(entry)
+            )
+        try:
+            response, response_headers = self._request_url(
+                path=path, headers=request_headers, query_params=query_params
+            )
+        except util.UrlError as e:
+            if e.code == 304 and entry:
+                logging.debug("Cached response of %s is still valid", url)
+                entry = self.response_cache.set(
+                    url,
+                    entry["response"],
+                    etag=entry.get("etag"),
+                    last_modified=entry.get("last_modified"),
+                )
+                return entry["response"], {}
+            # Client errors such as unknown CVEs are not network failures
+            if not entry or (e.code is not None and e.code < 500):
+                raise
+            logging.debug(
+                "Using cached response of %s after error: %s", url, str(e)
+            )
+            return entry["response"], {}
+        except socket.timeout as e:
+            if not entry:
+                raise
+            logging.debug(
+                "Using cached response of %s after error: %s", url, str(e)
+            )
+            return entry["response"], {}
+        self.response_cache.set(
+            url,
+            response,
+            etag=response_headers.get("ETag"),
+            last_modified=response_headers.get("Last-Modified"),
+        )
+        return response, response_headers
+
+    @util.retry(socket.timeout, retry_sleeps=[1, 3, 5])
+    def _request_url(
+        self, path, data=None, headers=None, method=None, query_params=None
+    ):
         return super().request_url(
             path=path,
             data=data,
@@ -128,6 +298,85 @@ class UASecurityClient(serviceclient.UAServiceClient):
         )
         return [CVE(client=self, response=cve_md) for cve_md in cves_response]
 
+    def _iter_pages(
+        self,
+        path: str,
+        query_params: "Dict[str, Any]",
+        get_items: "Callable[[Any], List[Dict[str, Any]]]",
+        page_size: int,
+    ) -> "Iterator[Dict[str, Any]]":
+        """Yield the items of path, requesting one page at a time.
+
+        The next page is only requested once the items of the previous page
+        were consumed, and never after a short page.
+        """
+        offset = 0
+        while True:
+            response, _headers = self.request_url(
+                path,
+                query_params=dict(
+                    query_params, limit=page_size, offset=offset
+                ),
+            )
+            items = get_items(response)
+            for item in items:
+                yield item
+            if len(items) < page_size:
+                return
+            offset += page_size
+
+    def iter_cves(
+        self,
+        query: "Optional[str]" = None,
+        priority: "Optional[str]" = None,
+        package: "Optional[str]" = None,
+        component: "Optional[str]" = None,
+        version: "Optional[str]" = None,
+        status: "Optional[List[str]]" = None,
+        page_size: int = SECURITY_API_PAGE_SIZE,
+    ) -> "Iterator[CVE]":
+        """Iterate over all CVEs matching the query, in API order.
+
+        Pages of page_size CVEs are requested as the iteration proceeds, so
+        stopping early skips the remaining requests.
+        """
+        query_params = {
+            "q": query,
+            "priority": priority,
+            "package": package,
+            "component": component,
+            "version": version,
+            "status": status,
+        }
+        for cve_md in self._iter_pages(
+            API_V1_CVES, query_params, lambda response: response, page_size
+        ):
+            yield CVE(client=self, response=cve_md)
+
+    def iter_notices(
+        self,
+        details: "Optional[str]" = None,
+        release: "Optional[str]" = None,
+        order: "Optional[str]" = None,
+        page_size: int = SECURITY_API_PAGE_SIZE,
+    ) -> "Iterator[USN]":
+        """Iterate over all USNs matching the query, in API order.
+
+        Unlike get_notices, USNs are neither sorted nor all loaded at once:
+        pages of page_size USNs are requested as the iteration proceeds.
+        details is filtered by the Security API, which also matches CVE IDs
+        prefixed by details, so USNs not listing details are skipped.
+        """
+        query_params = {"details": details, "release": release, "order": order}
+        for usn_md in self._iter_pages(
+            API_V1_NOTICES,
+            query_params,
+            lambda response: response.get("notices", []),
+            page_size,
+        ):
+            if details is None or details in usn_md.get("cves_ids", []):
+                yield USN(client=self, response=usn_md)
+
     def get_cve(self, cve_id: str) -> "CVE":
         """Query to match single-CVE.
 
@@ -180,16 +429,284 @@ class UASecurityClient(serviceclient.UAServiceClient):
         return USN(client=self, response=notice_response)
 
 
+class OfflineSecurityClient(UASecurityClient):
+    """Answer Security API queries from an imported SecurityDataset.
+
+    No request is ever sent to the Security API. Unknown issues raise a
+    UserFacingError instead of SecurityAPIError.
+
+    :raise UserFacingError: when no valid dataset was imported.
+    """
+
+    def __init__(
+        self,
+        cfg: "Optional[UAConfig]" = None,
+        dataset: "Optional[SecurityDataset]" = None,
+    ) -> None:
+        super().__init__(cfg=cfg)
+        if dataset is None:
+            dataset = SecurityDataset(
+                os.path.join(self.cfg.data_dir, SECURITY_DATASET_DIR)
+            )
+        if not dataset.exists():
+            raise exceptions.UserFacingError(
+                status.MESSAGE_SECURITY_DATASET_MISSING
+            )
+        try:
+            dataset.index
+        except (IOError, OSError, ValueError, SecurityDatasetError) as e:
+            raise exceptions.UserFacingError(
+                status.MESSAGE_SECURITY_DATASET_INVALID.format(error=str(e))
+            )
+        self.dataset = dataset
+
+    def request_url(
+        self, path, data=None, headers=None, method=None, query_params=None
+    ):
+        raise RuntimeError(
+            "Offline Security API client can't request {}".format(path)
+        )
+
+    def _get_issue(self, issue_id: str) -> "Dict[str, Any]":
+        try:
+            response = self.dataset.get_issue(issue_id)
+        except ValueError as e:
+            raise exceptions.UserFacingError(
+                status.MESSAGE_SECURITY_DATASET_INVALID.format(error=str(e))
+            )
+        if response is None:
+            raise exceptions.UserFacingError(
+                status.MESSAGE_SECURITY_FIX_NOT_FOUND_ISSUE.format(
+                    issue_id=issue_id
+                )
+            )
+        return response
+
+    @staticmethod
+    def _paginate(
+        items: "Iterable[Any]",
+        limit: "Optional[int]" = None,
+        offset: "Optional[int]" = None,
+    ) -> "List[Any]":
+        start = offset or 0
+        stop = None if limit is None else start + limit
+        return list(itertools.islice(items, start, stop))
+
+    def iter_cves(
+        self,
+        query: "Optional[str]" = None,
+        priority: "Optional[str]" = None,
+        package: "Optional[str]" = None,
+        component: "Optional[str]" = None,
+        version: "Optional[str]" = None,
+        status: "Optional[List[str]]" = None,
+        page_size: int = SECURITY_API_PAGE_SIZE,
+    ) -> "Iterator[CVE]":
+        """Iterate over imported CVEs matching query, priority and package.
+
+        CVEs are sorted by ID and each is only loaded once reached.
+        component, version and status filters aren't supported offline and
+        are ignored, as is page_size.
+        """
+        if package:
+            cves_ids = [
+                issue_id
+                for issue_id in self.dataset.get_package_issues_ids(package)
+                if issue_id.startswith("CVE-")
+            ]
+        else:
+            cves_ids = self.dataset.get_issues_ids("CVE")
+        for cve_id in cves_ids:
+            cve = CVE(client=self, response=self._get_issue(cve_id))
+            if priority and cve.priority != priority:
+                continue
+            if (
+                query
+                and query.lower()
+                not in " ".join([cve.id, cve.description or ""]).lower()
+            ):
+                continue
+            yield cve
+
+    def get_cves(
+        self,
+        query: "Optional[str]" = None,
+        priority: "Optional[str]" = None,
+        package: "Optional[str]" = None,
+        limit: "Optional[int]" = None,
+        offset: "Optional[int]" = None,
+        component: "Optional[str]" = None,
+        version: "Optional[str]" = None,
+        status: "Optional[List[str]]" = None,
+    ) -> "List[CVE]":
+        """Return imported CVEs matching query, priority and package.
+
+        component, version and status filters aren't supported offline and
+        are ignored. limit and offset apply to CVEs sorted by ID.
+        """
+        return self._paginate(
+            self.iter_cves(query=query, priority=priority, package=package),
+            limit=limit,
+            offset=offset,
+        )
+
+    def get_cve(self, cve_id: str) -> "CVE":
+        return CVE(client=self, response=self._get_issue(cve_id))
+
+    def _get_notices_ids(
+        self, details: "Optional[str]", release: "Optional[str]"
+    ) -> "Tuple[List[str], Optional[str]]":
+        """Return the sorted IDs of USNs fixing details on release.
+
+        :return: Tuple of the USN IDs and the release USNs still need to be
+            filtered by, None when the dataset index already did.
+        """
+        if details:
+            notices_ids = sorted(self.dataset.get_cve_notices_ids(details))
+        else:
+            notices_ids = self.dataset.get_issues_ids("USN")
+        if release:
+            release_notices_ids = self.dataset.get_release_notices_ids(release)
+            if release_notices_ids is not None:
+                release_notices = set(release_notices_ids)
+                notices_ids = [
+                    notice_id
+                    for notice_id in notices_ids
+                    if notice_id in release_notices
+                ]
+                release = None
+        return notices_ids, release
+
+    def _iter_notices_by_ids(
+        self, notices_ids: "Iterable[str]", release: "Optional[str]"
+    ) -> "Iterator[USN]":
+        for notice_id in notices_ids:
+            response = self.dataset.get_issue(notice_id)
+            if response is None:  # Referenced by CVEs but not imported
+                continue
+            if release and release not in response.get("release_packages", {}):
+                continue
+            yield USN(client=self, response=response)
+
+    def iter_notices(
+        self,
+        details: "Optional[str]" = None,
+        release: "Optional[str]" = None,
+        order: "Optional[str]" = None,
+        page_size: int = SECURITY_API_PAGE_SIZE,
+    ) -> "Iterator[USN]":
+        """Iterate over imported USNs fixing the details CVE on release.
+
+        USNs are sorted by ID and each is only loaded once reached. order
+        and page_size are ignored.
+        """
+        notices_ids, release = self._get_notices_ids(details, release)
+        return self._iter_notices_by_ids(notices_ids, release)
+
+    def get_notices(
+        self,
+        details: "Optional[str]" = None,
+        release: "Optional[str]" = None,
+        limit: "Optional[int]" = None,
+        offset: "Optional[int]" = None,
+        order: "Optional[str]" = None,
+    ) -> "List[USN]":
+        """Return imported USNs fixing the details CVE on release.
+
+        limit and offset apply to USNs sorted by ID, order is ignored.
+        """
+        notices_ids, release = self._get_notices_ids(details, release)
+        if not details and not release:
+            # Every listed USN is returned, so only load the requested page
+            return list(
+                self._iter_notices_by_ids(
+                    self._paginate(notices_ids, limit=limit, offset=offset),
+                    release,
+                )
+            )
+        return self._paginate(
+            self._iter_notices_by_ids(notices_ids, release),
+            limit=limit,
+            offset=offset,
+        )
+
+    def get_notice(self, notice_id: str) -> "USN":
+        return USN(client=self, response=self._get_issue(notice_id))
+
+
+def get_security_client(
+    cfg: UAConfig, offline: bool = False
+) -> UASecurityClient:
+    """Return the Security API client backend of ua fix.
+
+    :param offline: Answer from the imported security dataset instead of
+        the Security API.
+    """
+    if offline:
+        return OfflineSecurityClient(cfg=cfg)
+    return UASecurityClient(cfg=cfg)
+
+
 # Model for Security API responses
 class CVEPackageStatus:
-    """Class representing specific CVE PackageStatus on an Ubuntu series"""
+    """Class representing specific CVE PackageStatus on an Ubuntu series
+
+    Instances are immutable, replace returns a modified copy.
+    """
+
+    __slots__ = ("_description", "_pocket", "_release_codename", "_status")
+
+    _FIELDS = ("description", "pocket", "release_codename", "status")
 
     def __init__(self, cve_response: "Dict[str, Any]"):
-        self.response = cve_response
+        self._description = cve_response.get("description")
+        self._pocket = cve_response.get("pocket")
+        self._release_codename = cve_response.get("release_codename")
+        self._status = cve_response.get("status")
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, CVEPackageStatus):
+            return False
+        return self._get_fields() == other._get_fields()
+
+    def __hash__(self) -> int:
+        return hash(self._get_fields())
+
+    def __repr__(self) -> str:
+        return "CVEPackageStatus({!r})".format(
+            dict(zip(self._FIELDS, self._get_fields()))
+        )
+
+    def _get_fields(self) -> "Tuple[Optional[str], ...]":
+        return (
+            self._description,
+            self._pocket,
+            self._release_codename,
+            self._status,
+        )
+
+    def replace(self, **changes: "Optional[str]") -> "CVEPackageStatus":
+        """Return a copy of this status with the changed fields replaced.
+
+        :raise TypeError: when changes include unknown fields.
+        """
+        unknown_fields = set(changes).difference(self._FIELDS)
+        if unknown_fields:
+            raise TypeError(
+                "Unknown CVEPackageStatus fields: {}".format(
+                    ", ".join(sorted(unknown_fields))
+                )
+            )
+        return CVEPackageStatus(
+            {
+                field: changes.get(field, getattr(self, field))
+                for field in self._FIELDS
+            }
+        )
 
     @property
     def description(self):
-        return self.response["description"]
+        return self._description
 
     @property
     def fixed_version(self):
@@ -197,15 +714,15 @@ class CVEPackageStatus:
 
     @property
     def pocket(self):
-        return self.response["pocket"]
+        return self._pocket
 
     @property
     def release_codename(self):
-        return self.response["release_codename"]
+        return self._release_codename
 
     @property
     def status(self):
-        return self.response["status"]
+        return self._status
 
     @property
     def status_message(self):
@@ -235,36 +752,97 @@ class CVEPackageStatus:
     @property
     def pocket_source(self):
         """Human-readable string representing where the fix is published."""
-        if self.pocket == "esm-infra":
+        return get_pocket_source(self.pocket, self.description)
+
+
+def get_pocket_source(
+    pocket: "Optional[str]", fixed_version: "Optional[str]"
+) -> str:
+    """Human-readable string representing where a fix is published.
+
+    :param pocket: Security API pocket of the fix: security, updates,
+        esm-infra or esm-apps.
+    :param fixed_version: Version of the fix, used when pocket is unknown.
+    """
+    if pocket == "esm-infra":
+        fix_source = UA_INFRA_POCKET
+    elif pocket == "esm-apps":
+        fix_source = UA_APPS_POCKET
+    elif pocket in ("updates", "security"):
+        fix_source = UBUNTU_STANDARD_UPDATES_POCKET
+    else:
+        # TODO(GH: #1376 drop this when esm* pockets supplied by API)
+        if "esm" in (fixed_version or ""):
             fix_source = UA_INFRA_POCKET
-        elif self.pocket == "esm-apps":
-            fix_source = UA_APPS_POCKET
-        elif self.pocket in ("updates", "security"):
-            fix_source = UBUNTU_STANDARD_UPDATES_POCKET
         else:
-            # TODO(GH: #1376 drop this when esm* pockets supplied by API)
-            if "esm" in self.fixed_version:
-                fix_source = UA_INFRA_POCKET
-            else:
-                fix_source = UBUNTU_STANDARD_UPDATES_POCKET
-        return fix_source
+            fix_source = UBUNTU_STANDARD_UPDATES_POCKET
+    return fix_source
 
 
 class CVE:
-    """Class representing CVE response from the SecurityClient"""
+    """Class representing CVE response from the SecurityClient
+
+    Only the fields used by ua fix are kept from the response. Package
+    statuses and the released packages of its notices are reduced to the
+    current Ubuntu series when decoded.
+    """
 
-    def __init__(self, client: UASecurityClient, response: "Dict[str, Any]"):
-        self.response = response
+    __slots__ = (
+        "client",
+        "_id",
+        "_description",
+        "_priority",
+        "_notices_ids",
+        "_notices",
+        "_packages_status",
+    )
+
+    def __init__(
+        self,
+        client: UASecurityClient,
+        response: "Dict[str, Any]",
+        series: "Optional[str]" = None,
+    ):
+        """
+        :param series: Ubuntu series whose package statuses are kept,
+            defaults to the series of this system.
+        """
         self.client = client
+        self._id = response.get("id", "UNKNOWN_CVE_ID").upper()
+        self._description = response.get("description")
+        self._priority = response.get("priority")
+        self._notices_ids = response.get("notices_ids", [])
+        packages = response.get("packages", [])
+        if packages and series is None:
+            series = util.get_platform_info()["series"]
+        self._packages_status = {
+            package["name"]: CVEPackageStatus(pkg_status)
+            for package in packages
+            for pkg_status in package["statuses"]
+            if pkg_status["release_codename"] == series
+        }  # type: Dict[str, CVEPackageStatus]
+        self._notices = sorted(
+            [
+                USN(client, notice, series=series)
+                for notice in response.get("notices", [])
+            ],
+            key=lambda n: n.id,
+            reverse=True,
+        )  # type: List[USN]
 
     def __eq__(self, other) -> bool:
         if not isinstance(other, CVE):
             return False
-        return self.response == other.response
+        return (
+            self.id,
+            self.description,
+            self.priority,
+            self.notices_ids,
+        ) == (other.id, other.description, other.priority, other.notices_ids)
 
     @property
     def id(self):
-        return self.response.get("id", "UNKNOWN_CVE_ID").upper()
+        return self._id
 
     def get_url_header(self):
         """Return a string representing the URL for this cve."""
@@ -281,28 +859,20 @@ class CVE:
 
     @property
     def notices_ids(self) -> "List[str]":
-        return self.response.get("notices_ids", [])
+        return self._notices_ids
 
     @property
     def notices(self) -> "List[USN]":
-        """Return a list of USN instances from API response 'notices'.
-
-        Cache the value to avoid extra work on multiple calls.
-        """
-        if not hasattr(self, "_notices"):
-            self._notices = sorted(
-                [
-                    USN(self.client, notice)
-                    for notice in self.response.get("notices", [])
-                ],
-                key=lambda n: n.id,
-                reverse=True,
-            )
+        """List of USN instances from API response 'notices', newest first."""
         return self._notices
 
     @property
     def description(self):
-        return self.response.get("description")
+        return self._description
+
+    @property
+    def priority(self) -> "Optional[str]":
+        return self._priority
 
     @property
     def packages_status(self) -> "Dict[str, CVEPackageStatus]":
@@ -311,39 +881,80 @@ class CVE:
         Top-level keys are source packages names and each value is a
         CVEPackageStatus object
         """
-        if hasattr(self, "_packages_status"):
-            return self._packages_status  # type: ignore
-        self._packages_status = {}
-        series = util.get_platform_info()["series"]
-        for package in self.response["packages"]:
-            for pkg_status in package["statuses"]:
-                if pkg_status["release_codename"] == series:
-                    self._packages_status[package["name"]] = CVEPackageStatus(
-                        pkg_status
-                    )
         return self._packages_status
 
 
 class USN:
-    """Class representing USN response from the SecurityClient"""
+    """Class representing USN response from the SecurityClient
+
+    Only the fields used by ua fix are kept from the response. Released
+    packages are reduced to the current Ubuntu series when first accessed.
+    """
 
-    def __init__(self, client: UASecurityClient, response: "Dict[str, Any]"):
-        self.response = response
+    __slots__ = (
+        "client",
+        "_id",
+        "_title",
+        "_cves_ids",
+        "_cves_response",
+        "_cves",
+        "_has_release_packages",
+        "_release_packages",
+        "_release_packages_error",
+    )
+
+    def __init__(
+        self,
+        client: UASecurityClient,
+        response: "Dict[str, Any]",
+        series: "Optional[str]" = None,
+    ):
+        """
+        :param series: Ubuntu series whose release_packages are indexed,
+            defaults to the series of this system.
+        """
         self.client = client
+        self._id = response.get("id", "UNKNOWN_USN_ID").upper()
+        self._title = response.get("title")
+        self._cves_ids = response.get("cves_ids", [])
+        self._cves_response = response.get("cves", [])
+        self._cves = None  # type: Optional[List[CVE]]
+        release_packages = response.get("release_packages", {})
+        self._has_release_packages = bool(release_packages)
+        self._release_packages = (
+            {}
+        )  # type: Dict[str, Dict[str, Dict[str, str]]]
+        # Invalid metadata is only reported once release_packages is read
+        self._release_packages_error = (
+            None
+        )  # type: Optional[exceptions.SecurityAPIMetadataError]
+        if release_packages:
+            if series is None:
+                series = util.get_platform_info()["series"]
+            try:
+                self._release_packages = self._index_release_packages(
+                    release_packages.get(series, [])
+                )
+            except exceptions.SecurityAPIMetadataError as e:
+                self._release_packages_error = e
 
     def __eq__(self, other) -> bool:
         if not isinstance(other, USN):
             return False
-        return self.response == other.response
+        return (self.id, self.title, self.cves_ids) == (
+            other.id,
+            other.title,
+            other.cves_ids,
+        )
 
     @property
     def id(self) -> str:
-        return self.response.get("id", "UNKNOWN_USN_ID").upper()
+        return self._id
 
     @property
     def cves_ids(self) -> "List[str]":
         """List of CVE IDs related to this USN."""
-        return self.response.get("cves_ids", [])
+        return self._cves_ids
 
     @property
     def cves(self) -> "List[CVE]":
@@ -351,20 +962,23 @@ class USN:
 
         Cache the values to avoid extra work for multiple call-sites.
         """
-        if not hasattr(self, "_cves"):
+        if self._cves is None:
             self._cves = sorted(
-                [
-                    CVE(self.client, cve)
-                    for cve in self.response.get("cves", [])
-                ],
+                [CVE(self.client, cve) for cve in self._cves_response],
                 key=lambda n: n.id,
                 reverse=True,
-            )  # type: List[CVE]
+            )
+            self._cves_response = []
         return self._cves
 
     @property
     def title(self):
-        return self.response.get("title")
+        return self._title
+
+    @property
+    def has_release_packages(self) -> bool:
+        """True when the USN releases packages for any Ubuntu series."""
+        return self._has_release_packages
 
     def get_url_header(self):
         """Return a string representing the URL for this notice."""
@@ -390,25 +1004,32 @@ class USN:
             that binary package. The binary metadata contains the following
             keys: name, version.
             Optional additional keys: pocket and component.
+        :raise SecurityAPIMetadataError: when the release_packages of this
+            release are invalid.
         """
-        if hasattr(self, "_release_packages"):
-            return self._release_packages
-        series = util.get_platform_info()["series"]
-        self._release_packages = {}  # type: Dict[str, Dict[str, Any]]
+        if self._release_packages_error:
+            raise self._release_packages_error
+        return self._release_packages
+
+    def _index_release_packages(
+        self, series_packages: "List[Dict[str, Any]]"
+    ) -> "Dict[str, Dict[str, Dict[str, str]]]":
+        """Key the release_packages of one series by source package name."""
+        release_packages = {}  # type: Dict[str, Dict[str, Any]]
         # Organize source and binary packages under a common source package key
-        for pkg in self.response.get("release_packages", {}).get(series, []):
+        for pkg in series_packages:
             if pkg.get("is_source"):
                 # Create a "source" key under src_pkg_name with API response
-                if pkg["name"] in self._release_packages:
-                    if "source" in self._release_packages[pkg["name"]]:
+                if pkg["name"] in release_packages:
+                    if "source" in release_packages[pkg["name"]]:
                         raise exceptions.SecurityAPIMetadataError(
                             "{usn} metadata defines duplicate source packages"
                             " {pkg}".format(usn=self.id, pkg=pkg["name"]),
                             issue_id=self.id,
                         )
-                    self._release_packages[pkg["name"]]["source"] = pkg
+                    release_packages[pkg["name"]]["source"] = pkg
                 else:
-                    self._release_packages[pkg["name"]] = {"source": pkg}
+                    release_packages[pkg["name"]] = {"source": pkg}
             else:
                 # is_source == False or None, then this is a binary package.
                 # If processed before a source item, the top-level key will
@@ -433,10 +1054,10 @@ class USN:
                         issue_id=self.id,
                     )
                 source_pkg_name = pkg["source_link"].split("/")[-1]
-                if source_pkg_name not in self._release_packages:
-                    self._release_packages[source_pkg_name] = {}
-                self._release_packages[source_pkg_name][pkg["name"]] = pkg
-        return self._release_packages
+                if source_pkg_name not in release_packages:
+                    release_packages[source_pkg_name] = {}
+                release_packages[source_pkg_name][pkg["name"]] = pkg
+        return release_packages
 
 
 def query_installed_source_pkg_versions() -> "Dict[str, Dict[str, str]]":
@@ -445,31 +1066,73 @@ def query_installed_source_pkg_versions() -> "Dict[str, Dict[str, str]]":
     The dict keys will be source package name: "krb5". The value will be a dict
     with keys binary_pkg and version.
     """
-    series = util.get_platform_info()["series"]
-    if series == "trusty":
-        status_field = "${Status}"
-    else:
-        status_field = "${db:Status-Status}"
-    out, _err = util.subp(
-        [
-            "dpkg-query",
-            "-f=${Package},${Source},${Version}," + status_field + "\n",
-            "-W",
-        ]
-    )
-    installed_packages = {}  # type: Dict[str, Dict[str, str]]
-    for pkg_line in out.splitlines():
-        pkg_name, source_pkg_name, pkg_version, status = pkg_line.split(",")
-        if not source_pkg_name:
-            # some package don't define the Source
-            source_pkg_name = pkg_name
-        if "installed" not in status:
-            continue
-        if source_pkg_name in installed_packages:
-            installed_packages[source_pkg_name][pkg_name] = pkg_version
-        else:
-            installed_packages[source_pkg_name] = {pkg_name: pkg_version}
-    return installed_packages
+    return dpkg.get_dpkg_status().source_versions
+
+
+class USNReleasedPackagesMerger:
+    """Merge the released binary package versions of USNs, one at a time.
+
+    The maximum version required for each binary package is tracked along
+    with its version key, so each added binary package costs a single key
+    comparison and no dpkg fork.
+
+    :param beta_pockets: Dict keyed on service name: esm-infra, esm-apps
+        the values of which will be true of USN response instances
+        from which to calculate merge.
+    """
+
+    def __init__(self, beta_pockets: "Dict[str, bool]") -> None:
+        self.beta_pockets = beta_pockets
+        self.released_packages = (
+            {}
+        )  # type: Dict[str, Dict[str, Dict[str, str]]]
+        # Version keys of the merged binary versions, None when only dpkg
+        # can compare them
+        self._version_keys = {}  # type: Dict[Tuple[str, str], Any]
+
+    @staticmethod
+    def _get_version_key(version: "Optional[str]") -> "Any":
+        if version is None or dpkg.is_dpkg_compare_versions_enabled():
+            return None
+        try:
+            return dpkg.get_version_key(version)
+        except ValueError:
+            return None
+
+    def add(self, usn: "USN") -> None:
+        """Merge the released binary package versions of usn.
+
+        :raise SecurityAPIMetadataError: when the usn release_packages are
+            invalid.
+        """
+        for src_pkg, binary_pkg_versions in usn.release_packages.items():
+            public_bin_pkg_versions = [
+                (bin_pkg_name, bin_pkg_md)
+                for bin_pkg_name, bin_pkg_md in binary_pkg_versions.items()
+                if False
+                is self.beta_pockets.get(
+                    bin_pkg_md.get("pocket", "None"), False
+                )
+            ]
+            if not public_bin_pkg_versions:
+                continue
+            usn_src_pkg = self.released_packages.setdefault(src_pkg, {})
+            for bin_pkg, binary_pkg_md in public_bin_pkg_versions:
+                version = binary_pkg_md.get("version")
+                version_key = self._get_version_key(version)
+                if bin_pkg in usn_src_pkg:
+                    prev_key = self._version_keys[(src_pkg, bin_pkg)]
+                    if version_key is not None and prev_key is not None:
+                        is_newer = version_key > prev_key
+                    else:
+                        is_newer = not version_cmp_le(
+                            binary_pkg_md["version"],
+                            usn_src_pkg[bin_pkg]["version"],
+                        )
+                    if not is_newer:
+                        continue
+                usn_src_pkg[bin_pkg] = binary_pkg_md
+                self._version_keys[(src_pkg, bin_pkg)] = version_key
 
 
 def merge_usn_released_binary_package_versions(
@@ -491,103 +1154,233 @@ def merge_usn_released_binary_package_versions(
         be a dict with binary package name as keys and binary package metadata
         as the value.
     """
-    usn_pkg_versions = {}
+    merger = USNReleasedPackagesMerger(beta_pockets)
     for usn in usns:
-        # Aggregate USN.release_package binary versions into usn_pkg_versions
-        for src_pkg, binary_pkg_versions in usn.release_packages.items():
-            public_bin_pkg_versions = {
-                bin_pkg_name: bin_pkg_md
-                for bin_pkg_name, bin_pkg_md in binary_pkg_versions.items()
-                if False
-                is beta_pockets.get(bin_pkg_md.get("pocket", "None"), False)
-            }
-            if src_pkg not in usn_pkg_versions and public_bin_pkg_versions:
-                usn_pkg_versions[src_pkg] = public_bin_pkg_versions
-            elif src_pkg in usn_pkg_versions:
-                # Since src_pkg exists, only record this USN's binary version
-                # when it is greater than the previous version in usn_src_pkg.
-                usn_src_pkg = usn_pkg_versions[src_pkg]
-                for bin_pkg, binary_pkg_md in public_bin_pkg_versions.items():
-                    if bin_pkg not in usn_src_pkg:
-                        usn_src_pkg[bin_pkg] = binary_pkg_md
-                    else:
-                        prev_version = usn_src_pkg[bin_pkg]["version"]
-                        current_version = binary_pkg_md["version"]
-                        if not version_cmp_le(current_version, prev_version):
-                            # binary_version is greater than prev_version
-                            usn_src_pkg[bin_pkg] = binary_pkg_md
-    return usn_pkg_versions
+        merger.add(usn)
+    return merger.released_packages
 
 
-def fix_security_issue_id(cfg: UAConfig, issue_id: str) -> None:
-    issue_id = issue_id.upper()
-    client = UASecurityClient(cfg=cfg)
-    installed_packages = query_installed_source_pkg_versions()
+def _call_concurrently(
+    calls: "List[Callable[[], Any]]", max_workers: "Optional[int]" = None
+) -> "List[Any]":
+    """Call independent functions concurrently, returning results in order.
 
-    # Used to filter out beta pockets during merge_usns
-    beta_pockets = {
-        "esm-apps": _is_pocket_used_by_beta_service("esm-apps", cfg),
-        "esm-infra": _is_pocket_used_by_beta_service("esm-infra", cfg),
-    }
+    @raises: The exception of the first failed call, in call order. Calls
+        which haven't started by then are cancelled.
+    """
+    if len(calls) < 2:
+        return [call() for call in calls]
+    workers = min(len(calls), max_workers or SECURITY_API_MAX_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(call) for call in calls]
+        try:
+            return [future.result() for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
 
+
+class SecurityIssueFetcher:
+    """Fetch USNs from the Security API concurrently, each one only once.
+
+    :param client: The UASecurityClient used for requests.
+    :param max_workers: Optional limit on concurrent requests, defaults to
+        SECURITY_API_MAX_WORKERS.
+    """
+
+    def __init__(
+        self, client: UASecurityClient, max_workers: "Optional[int]" = None
+    ) -> None:
+        self.client = client
+        self.max_workers = max_workers
+        self._notices = {}  # type: Dict[str, USN]
+
+    def add_notice(self, usn: "USN") -> None:
+        """Record an already fetched USN so it isn't requested again."""
+        self._notices[usn.id] = usn
+
+    def get_notices(self, notice_ids: "List[str]") -> "List[USN]":
+        """Return the USN of each unique notice id, in notice_ids order.
+
+        @raises: SecurityAPIError of the first notice which failed.
+        """
+        notice_ids = list(OrderedDict.fromkeys(notice_ids))
+        missing_ids = [
+            notice_id
+            for notice_id in notice_ids
+            if notice_id not in self._notices
+        ]
+        usns = _call_concurrently(
+            [
+                partial(self.client.get_notice, notice_id=notice_id)
+                for notice_id in missing_ids
+            ],
+            max_workers=self.max_workers,
+        )
+        self._notices.update(zip(missing_ids, usns))
+        return [self._notices[notice_id] for notice_id in notice_ids]
+
+    def get_related_notices(
+        self, usn: "USN", max_depth: int = 1
+    ) -> "List[USN]":
+        """Return USNs sharing CVEs with usn, expanded breadth-first.
+
+        Each level of the graph is fetched concurrently. With the default
+        max_depth only the USNs of the CVEs of usn are returned.
+        """
+        self.add_notice(usn)
+        related = OrderedDict()  # type: Dict[str, USN]
+        level = [usn]
+        for _depth in range(max_depth):
+            notice_ids = [
+                notice_id
+                for level_usn in level
+                for cve in level_usn.cves
+                for notice_id in cve.notices_ids
+                if notice_id not in related
+            ]
+            if not notice_ids:
+                break
+            level = self.get_notices(notice_ids)
+            related.update(zip(OrderedDict.fromkeys(notice_ids), level))
+        return list(related.values())
+
+
+def _get_fix_issue_error(
+    issue_id: str, e: SecurityAPIError
+) -> exceptions.UserFacingError:
+    """Return the ua fix error of a failed Security API query."""
+    msg = str(e)
+    if "not found" in msg.lower():
+        msg = status.MESSAGE_SECURITY_FIX_NOT_FOUND_ISSUE.format(
+            issue_id=issue_id
+        )
+    return exceptions.UserFacingError(msg)
+
+
+def _fetch_security_issue(
+    client: UASecurityClient, issue_id: str
+) -> "Tuple[Any, List[USN]]":
+    """Return the CVE or USN of issue_id, along with the USNs of a CVE.
+
+    The related USNs of a USN are fetched by _fetch_related_usns.
+
+    :raise UserFacingError: when the Security API query failed.
+    """
+    try:
+        if "CVE" in issue_id:
+            cve, usns = _call_concurrently(
+                [
+                    partial(client.get_cve, cve_id=issue_id),
+                    partial(client.get_notices, details=issue_id),
+                ]
+            )
+            return cve, usns
+        return client.get_notice(notice_id=issue_id), []
+    except SecurityAPIError as e:
+        raise _get_fix_issue_error(issue_id, e)
+
+
+def _fetch_related_usns(
+    fetcher: SecurityIssueFetcher, issue_id: str, usn: "USN"
+) -> "List[USN]":
+    """Return the USNs related to the USN of issue_id, sorted by ID.
+
+    :raise UserFacingError: when the Security API query failed.
+    """
+    try:
+        related_usns = fetcher.get_related_notices(usn)
+    except SecurityAPIError as e:
+        raise _get_fix_issue_error(issue_id, e)
+    return list(sorted(related_usns, key=lambda x: x.id))
+
+
+def _get_security_issue_affected_packages(
+    issue_id: str,
+    issue: "Any",
+    usns: "List[USN]",
+    installed_packages: "Dict[str, Dict[str, str]]",
+    beta_pockets: "Dict[str, bool]",
+) -> "Tuple[Dict[str, CVEPackageStatus], Dict[str, Dict[str, Any]]]":
+    """Print the issue header and return its affected and released packages.
+
+    :param issue: The CVE or USN of issue_id.
+    :param usns: The USNs fixing the CVE, or related to the USN, of issue_id.
+
+    :return: Tuple of the CVEPackageStatus of affected source packages and
+        the binary package versions released by usns, both keyed by source
+        package name.
+    :raise SecurityAPIMetadataError: when the USN metadata is incomplete.
+    """
     if "CVE" in issue_id:
-        try:
-            cve = client.get_cve(cve_id=issue_id)
-            usns = client.get_notices(details=issue_id)
-        except SecurityAPIError as e:
-            msg = str(e)
-            if "not found" in msg.lower():
-                msg = status.MESSAGE_SECURITY_FIX_NOT_FOUND_ISSUE.format(
-                    issue_id=issue_id
-                )
-            raise exceptions.UserFacingError(msg)
         affected_pkg_status = get_cve_affected_source_packages_status(
-            cve=cve, installed_packages=installed_packages
+            cve=issue, installed_packages=installed_packages
         )
-        print(cve.get_url_header())
+        print(issue.get_url_header())
         usn_released_pkgs = merge_usn_released_binary_package_versions(
             usns, beta_pockets
         )
-    else:  # USN
-        related_usns = {}
-        try:
-            usn = client.get_notice(notice_id=issue_id)
-            for cve in usn.cves:
-                for related_usn_id in cve.notices_ids:
-                    if related_usn_id not in related_usns:
-                        related_usns[related_usn_id] = client.get_notice(
-                            notice_id=related_usn_id
-                        )
-            usns = list(sorted(related_usns.values(), key=lambda x: x.id))
-        except SecurityAPIError as e:
-            msg = str(e)
-            if "not found" in msg.lower():
-                msg = status.MESSAGE_SECURITY_FIX_NOT_FOUND_ISSUE.format(
-                    issue_id=issue_id
-                )
-            raise exceptions.UserFacingError(msg)
-        affected_pkg_status = get_usn_affected_packages_status(
-            usn=usn, installed_packages=installed_packages
+        return affected_pkg_status, usn_released_pkgs
+
+    affected_pkg_status = get_usn_affected_packages_status(
+        usn=issue, installed_packages=installed_packages
+    )
+    usn_released_pkgs = merge_usn_released_binary_package_versions(
+        usns, beta_pockets
+    )
+    print(issue.get_url_header())
+    related_cves = set(itertools.chain(*[u.cves_ids for u in usns]))
+    if not related_cves:
+        raise exceptions.SecurityAPIMetadataError(
+            "{} metadata defines no related CVEs.".format(issue_id),
+            issue_id=issue_id,
         )
-        usn_released_pkgs = merge_usn_released_binary_package_versions(
-            usns, beta_pockets
+    if not issue.has_release_packages:
+        # Since usn.release_packages filters to our current release only
+        # check overall metadata and error if empty.
+        raise exceptions.SecurityAPIMetadataError(
+            "{} metadata defines no fixed package versions.".format(issue_id),
+            issue_id=issue_id,
         )
-        print(usn.get_url_header())
-        related_cves = set(itertools.chain(*[u.cves_ids for u in usns]))
-        if not related_cves:
-            raise exceptions.SecurityAPIMetadataError(
-                "{} metadata defines no related CVEs.".format(issue_id),
-                issue_id=issue_id,
-            )
-        if not usn.response["release_packages"]:
-            # Since usn.release_packages filters to our current release only
-            # check overall metadata and error if empty.
-            raise exceptions.SecurityAPIMetadataError(
-                "{} metadata defines no fixed package versions.".format(
-                    issue_id
-                ),
-                issue_id=issue_id,
-            )
+    return affected_pkg_status, usn_released_pkgs
+
+
+def _get_beta_pockets(cfg: UAConfig) -> "Dict[str, bool]":
+    """Return whether each UA pocket belongs to a beta service."""
+    return {
+        "esm-apps": _is_pocket_used_by_beta_service("esm-apps", cfg),
+        "esm-infra": _is_pocket_used_by_beta_service("esm-infra", cfg),
+    }
+
+
+def fix_security_issue_id(
+    cfg: UAConfig, issue_id: str, client: "Optional[UASecurityClient]" = None
+) -> None:
+    """Fix issue_id, answering Security API queries with client.
+
+    :param client: Optional client backend, defaults to querying the
+        Security API.
+    """
+    issue_id = issue_id.upper()
+    if client is None:
+        client = UASecurityClient(cfg=cfg)
+    installed_packages = query_installed_source_pkg_versions()
+
+    # Used to filter out beta pockets during merge_usns
+    beta_pockets = _get_beta_pockets(cfg)
+
+    issue, usns = _fetch_security_issue(client, issue_id)
+    if "CVE" not in issue_id:
+        usns = _fetch_related_usns(
+            SecurityIssueFetcher(client), issue_id, issue
+        )
+    (
+        affected_pkg_status,
+        usn_released_pkgs,
+    ) = _get_security_issue_affected_packages(
+        issue_id, issue, usns, installed_packages, beta_pockets
+    )
     prompt_for_affected_packages(
         cfg=cfg,
         issue_id=issue_id,
@@ -684,24 +1477,23 @@ def override_usn_release_package_status(
        this source package. Normally, release_packages would have data on
        multiple source packages.
 
-    :return: Tuple of:
-        human-readable status message, boolean whether released,
-        boolean whether the fix requires access to UA
+    :return: pkg_status, or a released copy of it when the USN releases
+        the source package.
     """
 
-    usn_pkg_status = copy.deepcopy(pkg_status)
-    if usn_src_released_pkgs and usn_src_released_pkgs.get("source"):
-        usn_pkg_status.response["status"] = "released"
-        usn_pkg_status.response["description"] = usn_src_released_pkgs[
-            "source"
-        ]["version"]
-        for pkg_name, usn_released_pkg in usn_src_released_pkgs.items():
-            # Copy the pocket from any valid binary package
-            pocket = usn_released_pkg.get("pocket")
-            if pocket:
-                usn_pkg_status.response["pocket"] = pocket
-                break
-    return usn_pkg_status
+    if not usn_src_released_pkgs or not usn_src_released_pkgs.get("source"):
+        return pkg_status
+    pocket = pkg_status.pocket
+    for pkg_name, usn_released_pkg in usn_src_released_pkgs.items():
+        # Copy the pocket from any valid binary package
+        if usn_released_pkg.get("pocket"):
+            pocket = usn_released_pkg["pocket"]
+            break
+    return pkg_status.replace(
+        status="released",
+        description=usn_src_released_pkgs["source"]["version"],
+        pocket=pocket,
+    )
 
 
 def group_by_usn_package_status(affected_pkg_status, usn_released_pkgs):
@@ -785,6 +1577,10 @@ def _handle_released_package_fixes(
 ) -> "Tuple[bool, List[str], bool]":
     """Handle the packages that could be fixed and have a released status.
 
+    Attach and enable prompts are resolved and the upgrade command printed
+    for each pocket in turn, then the packages of all accessible pockets
+    are upgraded with a single apt-get update and apt-get install.
+
     :returns: Tuple of
         boolean whether all packages were successfully upgraded,
         list of strings containing the packages that were not upgraded,
@@ -793,6 +1589,8 @@ def _handle_released_package_fixes(
     all_already_installed = True
     upgrade_status = True
     unfixed_pkgs = []
+    # Packages of all accessible pockets, upgraded with one apt transaction
+    upgrade_packages = []  # type: List[str]
     if src_pocket_pkgs:
         for pocket in [
             UBUNTU_STANDARD_UPDATES_POCKET,
@@ -822,13 +1620,18 @@ def _handle_released_package_fixes(
                         all_already_installed = False
 
                 pkg_index += len(pkg_src_group)
-                upgrade_status &= upgrade_packages_and_attach(
+                upgrade_status &= _check_pocket_upgrade_access(
                     cfg, binary_pkgs, pocket
                 )
+                if upgrade_status and binary_pkgs:
+                    _print_apt_upgrade_command(binary_pkgs)
+                    upgrade_packages.extend(binary_pkgs)
 
             if not upgrade_status:
                 unfixed_pkgs += [src_pkg for src_pkg, _ in pkg_src_group]
 
+    if upgrade_packages:
+        _run_apt_upgrade(upgrade_packages)
     return upgrade_status, unfixed_pkgs, all_already_installed
 
 
@@ -851,55 +1654,74 @@ def _format_unfixed_packages_msg(unfixed_pkgs: "List[str]") -> str:
     )
 
 
-def prompt_for_affected_packages(
-    cfg: UAConfig,
+class AffectedPackagesFix:
+    """Upgrades of the affected packages of a CVE or USN, by pocket.
+
+    :param issue_id: String of USN or CVE issue id.
+    :param num_pkgs: The number of affected source packages.
+    """
+
+    def __init__(self, issue_id: str, num_pkgs: int) -> None:
+        self.issue_id = issue_id
+        self.num_pkgs = num_pkgs
+        # Index of the last source package reported to the user
+        self.pkg_index = 0
+        self.fix_message = status.MESSAGE_SECURITY_ISSUE_RESOLVED.format(
+            issue=issue_id
+        )
+        # Source packages without a released fix
+        self.unfixed_pkgs = []  # type: List[str]
+        self.src_pocket_pkgs = defaultdict(
+            list
+        )  # type: Dict[str, List[Tuple[str, CVEPackageStatus]]]
+        self.binary_pocket_pkgs = defaultdict(
+            list
+        )  # type: Dict[str, List[str]]
+
+
+def _plan_affected_packages_fix(
     issue_id: str,
     affected_pkg_status: "Dict[str, CVEPackageStatus]",
     installed_packages: "Dict[str, Dict[str, str]]",
     usn_released_pkgs: "Dict[str, Dict[str, Dict[str, str]]]",
-) -> None:
-    """Process security CVE dict returning a CVEStatus object.
+) -> AffectedPackagesFix:
+    """Print affected packages without a released fix and plan upgrades.
 
-    Since CVEs point to a USN if active, get_notice may be called to fill in
-    CVE title details.
+    :return: AffectedPackagesFix of the binary packages to upgrade.
+    :raise SecurityAPIMetadataError: when an installed binary package of a
+        released source package has no fixed version.
     """
     count = len(affected_pkg_status)
-    print_affected_packages_header(issue_id, affected_pkg_status)
-    if count == 0:
-        return
-    fix_message = status.MESSAGE_SECURITY_ISSUE_RESOLVED.format(issue=issue_id)
-    src_pocket_pkgs = defaultdict(list)
-    binary_pocket_pkgs = defaultdict(list)
-    pkg_index = 0
+    fix = AffectedPackagesFix(issue_id, count)
 
     pkg_status_groups = group_by_usn_package_status(
         affected_pkg_status, usn_released_pkgs
     )
 
-    unfixed_pkgs = []
+    not_resolved_message = status.MESSAGE_SECURITY_ISSUE_NOT_RESOLVED.format(
+        issue=issue_id
+    )
     for status_value, pkg_status_group in sorted(pkg_status_groups.items()):
         if status_value != "released":
-            fix_message = status.MESSAGE_SECURITY_ISSUE_NOT_RESOLVED.format(
-                issue=issue_id
-            )
+            fix.fix_message = not_resolved_message
             print(
                 _format_packages_message(
                     pkg_status_list=pkg_status_group,
-                    pkg_index=pkg_index,
+                    pkg_index=fix.pkg_index,
                     num_pkgs=count,
                 )
             )
-            pkg_index += len(pkg_status_group)
-            unfixed_pkgs += [src_pkg for src_pkg, _ in pkg_status_group]
+            fix.pkg_index += len(pkg_status_group)
+            fix.unfixed_pkgs += [src_pkg for src_pkg, _ in pkg_status_group]
         else:
             for src_pkg, pkg_status in pkg_status_group:
-                src_pocket_pkgs[pkg_status.pocket_source].append(
+                fix.src_pocket_pkgs[pkg_status.pocket_source].append(
                     (src_pkg, pkg_status)
                 )
                 for binary_pkg, version in installed_packages[src_pkg].items():
                     usn_released_src = usn_released_pkgs.get(src_pkg, {})
                     if binary_pkg not in usn_released_src:
-                        unfixed_pkgs += [
+                        fix.unfixed_pkgs += [
                             src_pkg for src_pkg, _ in pkg_status_group
                         ]
                         msg = (
@@ -907,30 +1729,29 @@ def prompt_for_affected_packages(
                             " {pkg}.\n".format(pkg=binary_pkg, issue=issue_id)
                         )
 
-                        msg += _format_unfixed_packages_msg(unfixed_pkgs)
+                        msg += _format_unfixed_packages_msg(fix.unfixed_pkgs)
                         raise exceptions.SecurityAPIMetadataError(
                             msg, issue_id
                         )
                     fixed_pkg = usn_released_src[binary_pkg]
                     fixed_version = fixed_pkg["version"]  # type: ignore
                     if not version_cmp_le(fixed_version, version):
-                        binary_pocket_pkgs[pkg_status.pocket_source].append(
-                            binary_pkg
-                        )
+                        fix.binary_pocket_pkgs[
+                            pkg_status.pocket_source
+                        ].append(binary_pkg)
+    return fix
 
-    (
-        fix_status,
-        unfixed_pkgs_released,
-        all_already_installed,
-    ) = _handle_released_package_fixes(
-        cfg=cfg,
-        src_pocket_pkgs=src_pocket_pkgs,
-        binary_pocket_pkgs=binary_pocket_pkgs,
-        pkg_index=pkg_index,
-        num_pkgs=count,
-    )
 
-    unfixed_pkgs += unfixed_pkgs_released
+def _print_affected_packages_fix_result(
+    cfg: UAConfig,
+    fix: AffectedPackagesFix,
+    fix_status: bool,
+    unfixed_pkgs_released: "List[str]",
+    all_already_installed: bool,
+) -> None:
+    """Print whether the upgrades of fix resolved its issue."""
+    issue_id = fix.issue_id
+    unfixed_pkgs = fix.unfixed_pkgs + unfixed_pkgs_released
 
     if unfixed_pkgs:
         print(_format_unfixed_packages_msg(unfixed_pkgs))
@@ -942,7 +1763,7 @@ def prompt_for_affected_packages(
         # In case (2), then all_already_installed is also True
         if all_already_installed:
             # we didn't install any packages, so we're good
-            print(fix_message)
+            print(fix.fix_message)
         elif util.should_reboot():
             # we successfully installed some packages, but
             # system reboot-required. This might be because
@@ -960,13 +1781,48 @@ def prompt_for_affected_packages(
         else:
             # we successfully installed some packages, and the system
             # reboot-required flag is not set, so we're good
-            print(fix_message)
+            print(fix.fix_message)
     else:
         print(
             status.MESSAGE_SECURITY_ISSUE_NOT_RESOLVED.format(issue=issue_id)
         )
 
 
+def prompt_for_affected_packages(
+    cfg: UAConfig,
+    issue_id: str,
+    affected_pkg_status: "Dict[str, CVEPackageStatus]",
+    installed_packages: "Dict[str, Dict[str, str]]",
+    usn_released_pkgs: "Dict[str, Dict[str, Dict[str, str]]]",
+) -> None:
+    """Process security CVE dict returning a CVEStatus object.
+
+    Since CVEs point to a USN if active, get_notice may be called to fill in
+    CVE title details.
+    """
+    count = len(affected_pkg_status)
+    print_affected_packages_header(issue_id, affected_pkg_status)
+    if count == 0:
+        return
+    fix = _plan_affected_packages_fix(
+        issue_id, affected_pkg_status, installed_packages, usn_released_pkgs
+    )
+    (
+        fix_status,
+        unfixed_pkgs_released,
+        all_already_installed,
+    ) = _handle_released_package_fixes(
+        cfg=cfg,
+        src_pocket_pkgs=fix.src_pocket_pkgs,
+        binary_pocket_pkgs=fix.binary_pocket_pkgs,
+        pkg_index=fix.pkg_index,
+        num_pkgs=count,
+    )
+    _print_affected_packages_fix_result(
+        cfg, fix, fix_status, unfixed_pkgs_released, all_already_installed
+    )
+
+
 def _inform_ubuntu_pro_existence_if_applicable() -> None:
     """Alert the user when running UA on cloud with PRO support."""
     cloud_type = get_cloud_type()
@@ -1120,15 +1976,35 @@ def _check_subscription_is_expired(cfg: UAConfig) -> bool:
     return False
 
 
-def upgrade_packages_and_attach(
+def _prompt_for_pocket_access(cfg: UAConfig, pocket: str) -> bool:
+    """Prompt to attach or enable the service needed to upgrade from pocket.
+
+    :return: True if packages can be upgraded from pocket.
+    """
+    if pocket == UBUNTU_STANDARD_UPDATES_POCKET:
+        return True
+
+    if not cfg.is_attached:
+        if not _prompt_for_attach(cfg):
+            return False  # User opted to cancel
+    elif _check_subscription_is_expired(cfg):
+        # UA subscription is expired and the user has not
+        # renewed it
+        return False
+
+    # False when user subscription does not have required service enabled
+    return _check_subscription_for_required_service(pocket, cfg)
+
+
+def _check_pocket_upgrade_access(
     cfg: UAConfig, upgrade_packages: "List[str]", pocket: str
 ) -> bool:
-    """Upgrade available packages to fix a CVE.
+    """Check that upgrade_packages can be upgraded from pocket.
 
-    Upgrade all packages in upgrades_packages and, if necessary,
-    prompt regarding system attach prior to upgrading UA packages.
+    Prompt regarding system attach or service enable if necessary, without
+    upgrading anything.
 
-    :return: True if package upgrade completed or unneeded, False otherwise.
+    :return: True if packages can be upgraded or none need to be.
     """
     if not upgrade_packages:
         return True
@@ -1137,43 +2013,343 @@ def upgrade_packages_and_attach(
         print(status.MESSAGE_SECURITY_APT_NON_ROOT)
         return False
 
-    if pocket != UBUNTU_STANDARD_UPDATES_POCKET:
-        if not cfg.is_attached:
-            if not _prompt_for_attach(cfg):
-                return False  # User opted to cancel
-        elif _check_subscription_is_expired(cfg):
-            # UA subscription is expired and the user has not
-            # renewed it
-            return False
+    return _prompt_for_pocket_access(cfg, pocket)
 
-        if not _check_subscription_for_required_service(pocket, cfg):
-            # User subscription does not have required service enabled
-            return False
 
-    print(
-        status.colorize_commands(
-            [
-                ["apt", "update", "&&"]
-                + ["apt", "install", "--only-upgrade", "-y"]
-                + upgrade_packages
-            ]
-        )
-    )
-    apt.run_apt_command(
-        cmd=["apt-get", "update"], error_msg=status.MESSAGE_APT_UPDATE_FAILED
-    )
+def _print_apt_upgrade_command(upgrade_packages: "List[str]") -> None:
+    """Print the apt commands which upgrade upgrade_packages.
+
+    apt update is left out when apt lists are fresh.
+    """
+    command = ["apt", "install", "--only-upgrade", "-y"] + upgrade_packages
+    if not apt.are_apt_lists_fresh():
+        command = ["apt", "update", "&&"] + command
+    print(status.colorize_commands([command]))
+
+
+def _run_apt_upgrade(upgrade_packages: "List[str]") -> None:
+    """Run apt-get update once, then upgrade all of upgrade_packages.
+
+    apt-get update is skipped when apt lists are fresh. The commands are
+    printed by the caller, see _print_apt_upgrade_command.
+    """
+    upgrade_packages = list(OrderedDict.fromkeys(upgrade_packages))
+    if not apt.are_apt_lists_fresh():
+        apt.run_apt_update_command()
     apt.run_apt_command(
         cmd=["apt-get", "install", "--only-upgrade", "-y"] + upgrade_packages,
         error_msg=status.MESSAGE_APT_INSTALL_FAILED,
         env={"DEBIAN_FRONTEND": "noninteractive"},
     )
+
+
+def upgrade_packages_and_attach(
+    cfg: UAConfig, upgrade_packages: "List[str]", pocket: str
+) -> bool:
+    """Upgrade available packages to fix a CVE.
+
+    Upgrade all packages in upgrades_packages and, if necessary,
+    prompt regarding system attach prior to upgrading UA packages.
+
+    :return: True if package upgrade completed or unneeded, False otherwise.
+    """
+    if not _check_pocket_upgrade_access(cfg, upgrade_packages, pocket):
+        return False
+    if upgrade_packages:
+        _print_apt_upgrade_command(upgrade_packages)
+        _run_apt_upgrade(upgrade_packages)
     return True
 
 
 def version_cmp_le(version1: str, version2: str) -> bool:
     """Return True when version1 is less than or equal to version2."""
-    try:
-        util.subp(["dpkg", "--compare-versions", version1, "le", version2])
-        return True
-    except util.ProcessExecutionError:
-        return False
+    return dpkg.version_le(version1, version2)
+
+
+def upgrade_pocket_packages(
+    cfg: UAConfig, pocket_pkgs: "Dict[str, List[str]]"
+) -> "Dict[str, bool]":
+    """Upgrade the packages of all pockets with one apt transaction.
+
+    Access to every pocket is checked, prompting to attach or enable
+    services if needed, and the upgrade command of each accessible pocket
+    printed before apt-get update and apt-get install run once for the
+    packages of all accessible pockets.
+
+    :param pocket_pkgs: Binary packages to upgrade keyed by pocket.
+
+    :return: Dict keyed by pocket, True if its packages were upgraded or
+        none needed to be.
+    """
+    results = {pocket: not pkgs for pocket, pkgs in pocket_pkgs.items()}
+    if all(results.values()):
+        return results
+
+    if os.getuid() != 0:
+        print(status.MESSAGE_SECURITY_APT_NON_ROOT)
+        return results
+
+    upgrade_packages = []  # type: List[str]
+    for pocket in [
+        UBUNTU_STANDARD_UPDATES_POCKET,
+        UA_INFRA_POCKET,
+        UA_APPS_POCKET,
+    ]:
+        if results.get(pocket, True):
+            continue
+        results[pocket] = _prompt_for_pocket_access(cfg, pocket)
+        if results[pocket]:
+            _print_apt_upgrade_command(pocket_pkgs[pocket])
+            upgrade_packages.extend(pocket_pkgs[pocket])
+    if upgrade_packages:
+        _run_apt_upgrade(upgrade_packages)
+    return results
+
+
+def _print_released_package_fixes(fix: AffectedPackagesFix) -> bool:
+    """Print the packages of fix with a released fix, by pocket.
+
+    :return: True when the fixed versions of all packages are installed.
+    """
+    all_already_installed = True
+    pkg_index = fix.pkg_index
+    for pocket in [
+        UBUNTU_STANDARD_UPDATES_POCKET,
+        UA_INFRA_POCKET,
+        UA_APPS_POCKET,
+    ]:
+        pkg_src_group = fix.src_pocket_pkgs[pocket]
+        msg = _format_packages_message(
+            pkg_status_list=pkg_src_group,
+            pkg_index=pkg_index,
+            num_pkgs=fix.num_pkgs,
+        )
+        if msg:
+            print(msg)
+            if fix.binary_pocket_pkgs[pocket]:
+                all_already_installed = False
+            else:
+                print(status.MESSAGE_SECURITY_UPDATE_INSTALLED)
+        pkg_index += len(pkg_src_group)
+    return all_already_installed
+
+
+def fix_security_issue_ids(
+    cfg: UAConfig,
+    issue_ids: "List[str]",
+    client: "Optional[UASecurityClient]" = None,
+) -> bool:
+    """Fix multiple issues, upgrading packages with one apt transaction.
+
+    Installed packages, beta pockets and fetched USNs are shared by all
+    issues. Each issue is reported first, then the upgrades fixing all of
+    them are installed at once, and the result of each issue is printed.
+
+    :param client: Optional client backend, defaults to querying the
+        Security API.
+
+    :return: False if any issue could not be processed.
+    """
+    issue_ids = list(
+        OrderedDict.fromkeys(issue_id.upper() for issue_id in issue_ids)
+    )
+    if client is None:
+        client = UASecurityClient(cfg=cfg)
+    installed_packages = query_installed_source_pkg_versions()
+    # Used to filter out beta pockets during merge_usns
+    beta_pockets = _get_beta_pockets(cfg)
+    fetcher = SecurityIssueFetcher(client)
+
+    def _fetch(issue_id: str) -> "Any":
+        try:
+            return _fetch_security_issue(client, issue_id)
+        except exceptions.UserFacingError as e:
+            return e
+
+    issues = _call_concurrently(
+        [partial(_fetch, issue_id) for issue_id in issue_ids]
+    )
+    for issue in issues:
+        if not isinstance(issue, Exception) and isinstance(issue[0], USN):
+            fetcher.add_notice(issue[0])
+
+    success = True
+    # (AffectedPackagesFix, all_already_installed) of affected issues
+    fixes = []  # type: List[Tuple[AffectedPackagesFix, bool]]
+    for issue_id, fetched_issue in zip(issue_ids, issues):
+        try:
+            if isinstance(fetched_issue, Exception):
+                raise fetched_issue
+            issue, usns = fetched_issue
+            if "CVE" not in issue_id:
+                usns = _fetch_related_usns(fetcher, issue_id, issue)
+            (
+                affected_pkg_status,
+                usn_released_pkgs,
+            ) = _get_security_issue_affected_packages(
+                issue_id, issue, usns, installed_packages, beta_pockets
+            )
+            print_affected_packages_header(issue_id, affected_pkg_status)
+            if affected_pkg_status:
+                fix = _plan_affected_packages_fix(
+                    issue_id,
+                    affected_pkg_status,
+                    installed_packages,
+                    usn_released_pkgs,
+                )
+                fixes.append((fix, _print_released_package_fixes(fix)))
+        except exceptions.UserFacingError as e:
+            print(e.msg)
+            success = False
+        print()
+
+    pocket_pkgs = defaultdict(list)  # type: Dict[str, List[str]]
+    for fix, _ in fixes:
+        for pocket, binary_pkgs in fix.binary_pocket_pkgs.items():
+            pocket_pkgs[pocket].extend(binary_pkgs)
+    pocket_results = upgrade_pocket_packages(cfg, pocket_pkgs)
+
+    for fix, all_already_installed in fixes:
+        # Pockets where this issue had nothing to upgrade are already fixed
+        unfixed_pkgs_released = [
+            src_pkg
+            for pocket, pkg_src_group in fix.src_pocket_pkgs.items()
+            if fix.binary_pocket_pkgs.get(pocket)
+            and not pocket_results.get(pocket, True)
+            for src_pkg, _ in pkg_src_group
+        ]
+        _print_affected_packages_fix_result(
+            cfg,
+            fix,
+            not unfixed_pkgs_released,
+            unfixed_pkgs_released,
+            all_already_installed,
+        )
+    return success
+
+
+# A USN with a released fix not installed on this system.
+# pocket_pkgs: List of the affected source packages keyed by fix pocket.
+OutstandingUSN = namedtuple("OutstandingUSN", ("id", "title", "pocket_pkgs"))
+
+
+def _get_outstanding_usns(
+    usns: "List[USN]",
+    installed_packages: "Dict[str, Dict[str, str]]",
+    beta_pockets: "Dict[str, bool]",
+) -> "List[OutstandingUSN]":
+    """Return the USNs whose fixed binary versions are not installed."""
+    usn_pocket_pkgs = defaultdict(
+        lambda: defaultdict(list)
+    )  # type: Dict[int, Dict[str, List[str]]]
+    for idx, usn in enumerate(usns):
+        try:
+            release_packages = usn.release_packages
+        except exceptions.SecurityAPIMetadataError as e:
+            logging.warning("Skipping %s: %s", usn.id, e.msg)
+            continue
+        for src_pkg, binary_pkgs in release_packages.items():
+            for binary_pkg, version in installed_packages.get(
+                src_pkg, {}
+            ).items():
+                binary_md = binary_pkgs.get(binary_pkg)
+                if not binary_md or not binary_md.get("version"):
+                    continue
+                if beta_pockets.get(binary_md.get("pocket", "None"), False):
+                    continue
+                if version_cmp_le(binary_md["version"], version):
+                    continue
+                pocket = get_pocket_source(
+                    binary_md.get("pocket"), binary_md["version"]
+                )
+                if src_pkg not in usn_pocket_pkgs[idx][pocket]:
+                    usn_pocket_pkgs[idx][pocket].append(src_pkg)
+    return [
+        OutstandingUSN(
+            id=usns[idx].id,
+            title=usns[idx].title,
+            pocket_pkgs=dict(usn_pocket_pkgs[idx]),
+        )
+        for idx in sorted(usn_pocket_pkgs)
+        if usn_pocket_pkgs[idx]
+    ]
+
+
+def scan_security_notices(
+    cfg: UAConfig,
+    client: "Optional[UASecurityClient]" = None,
+    page_size: int = SECURITY_API_PAGE_SIZE,
+) -> "Iterator[OutstandingUSN]":
+    """Yield the USNs of this release with fixes not installed.
+
+    USNs are requested one page at a time and each page is joined against
+    the installed source packages before the next one is requested, so
+    memory use doesn't grow with the number of USNs of the release.
+
+    :param client: Optional client backend, defaults to querying the
+        Security API.
+    """
+    if client is None:
+        client = UASecurityClient(cfg=cfg)
+    series = util.get_platform_info()["series"]
+    installed_packages = query_installed_source_pkg_versions()
+    beta_pockets = _get_beta_pockets(cfg)
+    # Pages shift when USNs are published during the scan
+    seen_ids = set()  # type: set
+    notices = client.iter_notices(release=series, page_size=page_size)
+    while True:
+        page = list(itertools.islice(notices, page_size))
+        if not page:
+            return
+        usns = list(
+            OrderedDict(
+                (usn.id, usn) for usn in page if usn.id not in seen_ids
+            ).values()
+        )
+        for outstanding_usn in _get_outstanding_usns(
+            usns, installed_packages, beta_pockets
+        ):
+            seen_ids.add(outstanding_usn.id)
+            yield outstanding_usn
+
+
+def print_security_status(
+    cfg: UAConfig, client: "Optional[UASecurityClient]" = None
+) -> int:
+    """Print the USNs with released fixes not installed on this system.
+
+    :param client: Optional client backend, defaults to querying the
+        Security API.
+
+    :return: The number of outstanding USNs.
+    """
+    count = 0
+    for outstanding_usn in scan_security_notices(cfg, client=client):
+        count += 1
+        print("{}: {}".format(outstanding_usn.id, outstanding_usn.title))
+        for pocket in [
+            UBUNTU_STANDARD_UPDATES_POCKET,
+            UA_INFRA_POCKET,
+            UA_APPS_POCKET,
+        ]:
+            src_pkgs = outstanding_usn.pocket_pkgs.get(pocket)
+            if src_pkgs:
+                print(
+                    " - {}: {}".format(
+                        ", ".join(sorted(src_pkgs)),
+                        status.MESSAGE_SECURITY_FIX_RELEASE_STREAM.format(
+                            fix_stream=pocket
+                        ),
+                    )
+                )
+    if count:
+        print(
+            status.MESSAGE_SECURITY_STATUS_AFFECTED.format(
+                count=count,
+                plural_str="s" if count > 1 else "",
+                verb_str="" if count > 1 else "s",
+            )
+        )
+    else:
+        print(status.MESSAGE_SECURITY_STATUS_UNAFFECTED)
+    return count
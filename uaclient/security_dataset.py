@@ -0,0 +1,265 @@
+"""
+Offline copy of Security API CVEs and USNs.
+
+A bulk export of Security API responses is imported into data_dir once, so
+ua fix can be answered on hosts which can't reach ubuntu.com/security.
+
+Each CVE and USN response is stored in its own file, so looking up an issue
+only reads that issue. index.json relates CVEs to the USNs fixing them and
+source packages to the issues affecting them.
+
+N.B. This module intentionally only depends on the standard library and
+uaclient.util so that uaclient.security can import it.
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from uaclient import util
+
+try:
+    from typing import Any, Dict, Iterable, List, Optional  # noqa: F401
+except ImportError:
+    # typing isn't available on trusty, so ignore its absence
+    pass
+
+
+SECURITY_DATASET_DIR = "security-dataset"
+SECURITY_DATASET_INDEX = "index.json"
+SECURITY_DATASET_VERSION = 1
+
+REGEX_SECURITY_ISSUE_ID = re.compile(r"^(CVE|USN|LSN)-[0-9][0-9-]*$")
+
+_ISSUE_TYPE_DIRS = {"CVE": "cves", "USN": "notices", "LSN": "notices"}
+
+
+class SecurityDatasetError(Exception):
+    """Raised when a security dataset export can't be imported."""
+
+    pass
+
+
+def _get_issue_type_dir(issue_id: str) -> "Optional[str]":
+    """Return the dataset subdirectory of issue_id, None when invalid.
+
+    Issue IDs are used as file names, so only well formed IDs are accepted.
+    """
+    if not REGEX_SECURITY_ISSUE_ID.match(issue_id):
+        return None
+    return _ISSUE_TYPE_DIRS[issue_id.split("-", 1)[0]]
+
+
+def _get_usn_source_packages(usn: "Dict[str, Any]") -> "Iterable[str]":
+    for packages in usn.get("release_packages", {}).values():
+        for pkg in packages:
+            if pkg.get("is_source"):
+                yield pkg["name"]
+            elif pkg.get("source_link"):
+                yield pkg["source_link"].split("/")[-1]
+
+
+class SecurityDataset:
+    """Security API responses imported under dataset_dir.
+
+    :param dataset_dir: Directory of the dataset, usually
+        <data_dir>/security-dataset.
+    """
+
+    def __init__(self, dataset_dir: str) -> None:
+        self.dataset_dir = dataset_dir
+        self._index = None  # type: Optional[Dict[str, Any]]
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.dataset_dir, SECURITY_DATASET_INDEX)
+
+    def exists(self) -> bool:
+        """Return True when a dataset was imported in dataset_dir."""
+        return os.path.exists(self.index_path)
+
+    @property
+    def index(self) -> "Dict[str, Any]":
+        """The dataset index, loaded on first use."""
+        if self._index is None:
+            index = json.loads(util.load_file(self.index_path))
+            if index.get("version") != SECURITY_DATASET_VERSION:
+                raise SecurityDatasetError(
+                    "Unsupported security dataset version: {}".format(
+                        index.get("version")
+                    )
+                )
+            self._index = index
+        return self._index
+
+    def get_issue(self, issue_id: str) -> "Optional[Dict[str, Any]]":
+        """Return the Security API response of a CVE or USN, or None."""
+        issue_id = issue_id.upper()
+        type_dir = _get_issue_type_dir(issue_id)
+        if not type_dir:
+            return None
+        try:
+            content = util.load_file(
+                os.path.join(self.dataset_dir, type_dir, issue_id + ".json")
+            )
+        except (IOError, OSError):
+            return None
+        return json.loads(content)
+
+    def get_cve_notices_ids(self, cve_id: str) -> "List[str]":
+        """Return the IDs of the USNs fixing cve_id."""
+        return self.index["cve_notices"].get(cve_id.upper(), [])
+
+    def get_package_issues_ids(self, source_package: str) -> "List[str]":
+        """Return the IDs of the CVEs and USNs affecting source_package."""
+        return self.index["packages"].get(source_package, [])
+
+    def get_release_notices_ids(self, release: str) -> "Optional[List[str]]":
+        """Return the sorted IDs of the USNs fixing packages of release.
+
+        None when the dataset was imported without a release index.
+        """
+        releases = self.index.get("releases")
+        if releases is None:
+            return None
+        return releases.get(release, [])
+
+    def get_issues_ids(self, issue_type: str) -> "List[str]":
+        """Return the sorted IDs of all issues of issue_type, CVE or USN."""
+        type_dir = _ISSUE_TYPE_DIRS[issue_type]
+        return sorted(
+            filename[: -len(".json")]
+            for filename in os.listdir(
+                os.path.join(self.dataset_dir, type_dir)
+            )
+            if filename.endswith(".json")
+        )
+
+    def import_exports(self, export_paths: "List[str]") -> "Dict[str, int]":
+        """Replace the dataset by the issues of Security API JSON exports.
+
+        Exports have the shape of Security API responses: an object with
+        "cves" and/or "notices" lists, or a list of CVEs or USNs.
+
+        The new dataset is built in a versioned directory next to
+        dataset_dir, which is a symlink atomically replaced to point at it
+        once complete, so readers never see a partial dataset.
+
+        :return: Dict of the number of imported "cves" and "notices".
+        :raise SecurityDatasetError: when an export can't be read.
+        """
+        parent_dir = os.path.dirname(self.dataset_dir)
+        os.makedirs(parent_dir, exist_ok=True)
+        new_dir = tempfile.mkdtemp(
+            prefix=SECURITY_DATASET_DIR + ".", dir=parent_dir
+        )
+        new_link = new_dir + ".link"
+        try:
+            counts = _write_dataset(new_dir, export_paths)
+            os.chmod(new_dir, 0o755)
+            old_dir = None
+            if os.path.islink(self.dataset_dir):
+                old_dir = os.path.join(
+                    parent_dir, os.readlink(self.dataset_dir)
+                )
+            os.symlink(os.path.basename(new_dir), new_link)
+            os.replace(new_link, self.dataset_dir)
+        except Exception:
+            if os.path.lexists(new_link):
+                os.unlink(new_link)
+            shutil.rmtree(new_dir, ignore_errors=True)
+            raise
+        if old_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+        self._index = None
+        return counts
+
+
+def _load_export_issues(export_path: str) -> "List[Dict[str, Any]]":
+    try:
+        export = json.loads(util.load_file(export_path))
+    except (IOError, OSError, ValueError) as e:
+        raise SecurityDatasetError(
+            "Unable to read security data from {}: {}".format(
+                export_path, str(e)
+            )
+        )
+    if isinstance(export, dict):
+        return export.get("cves", []) + export.get("notices", [])
+    if isinstance(export, list):
+        return export
+    raise SecurityDatasetError(
+        "Unexpected security data in {}".format(export_path)
+    )
+
+
+def _write_json(path: str, content: "Any") -> None:
+    # Not util.write_file, which logs every one of the many issue files
+    with open(path, "w", encoding="utf-8") as stream:
+        json.dump(content, stream, separators=(",", ":"))
+    os.chmod(path, 0o644)
+
+
+def _write_dataset(
+    dataset_dir: str, export_paths: "List[str]"
+) -> "Dict[str, int]":
+    cve_notices = {}  # type: Dict[str, set]
+    packages = {}  # type: Dict[str, set]
+    releases = {}  # type: Dict[str, set]
+    imported = {
+        type_dir: set() for type_dir in _ISSUE_TYPE_DIRS.values()
+    }  # type: Dict[str, set]
+
+    for issues_dir in imported:
+        os.mkdir(os.path.join(dataset_dir, issues_dir))
+    for export_path in export_paths:
+        for issue in _load_export_issues(export_path):
+            issue_id = str(issue.get("id", "")).upper()
+            type_dir = _get_issue_type_dir(issue_id)
+            if not type_dir:
+                raise SecurityDatasetError(
+                    "Invalid security issue id in {}: {}".format(
+                        export_path, issue.get("id")
+                    )
+                )
+            _write_json(
+                os.path.join(dataset_dir, type_dir, issue_id + ".json"), issue
+            )
+            imported[type_dir].add(issue_id)
+            if type_dir == "cves":
+                for notice_id in issue.get("notices_ids", []):
+                    cve_notices.setdefault(issue_id, set()).add(notice_id)
+                source_packages = [
+                    pkg["name"] for pkg in issue.get("packages", [])
+                ]
+            else:
+                for cve_id in issue.get("cves_ids", []):
+                    cve_notices.setdefault(cve_id, set()).add(issue_id)
+                source_packages = list(_get_usn_source_packages(issue))
+                for release in issue.get("release_packages", {}):
+                    releases.setdefault(release, set()).add(issue_id)
+            for source_package in source_packages:
+                packages.setdefault(source_package, set()).add(issue_id)
+    _write_json(
+        os.path.join(dataset_dir, SECURITY_DATASET_INDEX),
+        {
+            "version": SECURITY_DATASET_VERSION,
+            "imported_at": int(time.time()),
+            "cve_notices": {
+                cve_id: sorted(notices_ids)
+                for cve_id, notices_ids in cve_notices.items()
+            },
+            "packages": {
+                source_package: sorted(issues_ids)
+                for source_package, issues_ids in packages.items()
+            },
+            "releases": {
+                release: sorted(notices_ids)
+                for release, notices_ids in releases.items()
+            },
+        },
+    )
+    return {type_dir: len(ids) for type_dir, ids in imported.items()}
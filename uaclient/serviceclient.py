@@ -45,14 +45,8 @@ class UAServiceClient(metaclass=abc.ABCMeta):
             "content-type": "application/json",
         }
 
-    def request_url(
-        self, path, data=None, headers=None, method=None, query_params=None
-    ):
+    def _build_url(self, path, query_params=None):
         path = path.lstrip("/")
-        if not headers:
-            headers = self.headers()
-        if headers.get("content-type") == "application/json" and data:
-            data = json.dumps(data).encode("utf-8")
         url = urljoin(getattr(self.cfg, self.cfg_url_base_attr), path)
         if query_params:
             # filter out None values
@@ -60,6 +54,16 @@ class UAServiceClient(metaclass=abc.ABCMeta):
                 k: v for k, v in sorted(query_params.items()) if v is not None
             }
             url += "?" + urlencode(filtered_params)
+        return url
+
+    def request_url(
+        self, path, data=None, headers=None, method=None, query_params=None
+    ):
+        if not headers:
+            headers = self.headers()
+        if headers.get("content-type") == "application/json" and data:
+            data = json.dumps(data).encode("utf-8")
+        url = self._build_url(path, query_params)
         try:
             response, headers = util.readurl(
                 url=url,
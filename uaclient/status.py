@@ -134,6 +134,13 @@ STATUS_COLOR = {
 }
 
 MESSAGE_SECURITY_FIX_NOT_FOUND_ISSUE = "Error: {issue_id} not found."
+MESSAGE_SECURITY_DATASET_MISSING = """\
+Error: no security dataset has been imported.
+Import one with: ua import-security-data FILE"""
+MESSAGE_SECURITY_DATASET_INVALID = "Error: invalid security dataset: {error}"
+MESSAGE_SECURITY_DATASET_IMPORTED = (
+    "Imported {cves} CVEs and {notices} USNs for ua fix --offline."
+)
 MESSAGE_SECURITY_FIX_RELEASE_STREAM = "A fix is available in {fix_stream}."
 MESSAGE_SECURITY_UPDATE_NOT_INSTALLED = "The update is not yet installed."
 MESSAGE_SECURITY_UPDATE_NOT_INSTALLED_SUBSCRIPTION = """\
@@ -158,6 +165,13 @@ MESSAGE_SECURITY_ISSUE_NOT_RESOLVED = FAIL_X + " {issue} is not resolved."
 MESSAGE_SECURITY_ISSUE_UNAFFECTED = (
     OKGREEN_CHECK + " {issue} does not affect your system."
 )
+MESSAGE_SECURITY_STATUS_AFFECTED = (
+    FAIL_X + " {count} USN{plural_str} with released fixes affect{verb_str}"
+    " your system.\nRun ua fix USN-nnnn-d to resolve them."
+)
+MESSAGE_SECURITY_STATUS_UNAFFECTED = (
+    OKGREEN_CHECK + " No USN with a released fix affects your system."
+)
 MESSAGE_SECURITY_AFFECTED_PKGS = (
     "{count} affected package{plural_str} installed"
 )
@@ -179,6 +193,11 @@ MESSAGE_APT_UPDATE_INVALID_URL_CONFIG = (
 )
 MESSAGE_APT_POLICY_FAILED = "Failure checking APT policy."
 MESSAGE_APT_UPDATING_LISTS = "Updating package lists"
+MESSAGE_APT_CONFIG_REVERTED_TMPL = (
+    "Reverted APT configuration changes for: {services}"
+)
+MESSAGE_INSTALLING_PREREQUISITES_TMPL = "Installing prerequisites: {packages}"
+MESSAGE_INSTALLING_SERVICE_PACKAGES_TMPL = "Installing {title} packages"
 MESSAGE_CONNECTIVITY_ERROR = """\
 Failed to connect to authentication server
 Check your Internet connection and try again."""
@@ -8,3 +8,111 @@ GPG_KEY1 = b"\x99\x02\r\x04\\\xe2\xfd\x19\x01\x10\x00\xc5\xd5\xf0\xde\x96\x13\xe
 # Real gpg key for fingerprint 3CB3DF682220A643B43065E9B30EDAA63D8F61D0
 GPG_KEY2_ID = "3CB3DF682220A643B43065E9B30EDAA63D8F61D0"
 GPG_KEY2 = b"\x99\x02\r\x04]\t\xfb\xe3\x01\x10\x00\xba\xf5\xeaG\x05\x04\x8a\xcbwV\xf2{\x03=\xf7\xea`\x1b\xdd\xbd\xe4\xdb<\xb3\xce\xca\xabA\x16\xf4{\x06\xbaW\x13c@\xdf\xaa\xde\x1b\x1c`z#\xc04\xff\x06x\xf1d\x02\xed\xc4.\xfbT\x8f\x87YBs\x9b\x08\xef\xe3=\xf2ON\xf4\x0e\xd0\xe0\x9e\x8e\x04\xf1H\xe2\x94Fo\xd9\x94\xfaD\xec\x9e\x7f\xa1\x10\x93\xc3H\x8f\xac\xf2\xec`?\x12ZV\x0cI\x99\x89\x07\xba-{\xc8\xb9<\x91\xd1\x89jm\xad\xe3C\xd5\x8e\x0f^\xc0K\xcc\x86-\xea\xf8\xa9\xe7\x9c\xed\xa0\xa7\xaf\x06Q\xbe{\xe4a{\xd0GH$\x85\xa0d\x93G\x06\xa6L*yYk\x02\x105#\xc5\x05\xe0l\x91\xa7Xj\x16\x16\x98_\xf5G\xc0\x9b\x9e\xfc\xaa\xd4,\xd8\xd6\n\x1d\x1e\xc0\xb9\x8eY>\xd0\x04F\x90\xaa\xf6\x9c`lj\xe3Z\xcb\x16\x06\xfb\xaf<^C\xd5\x91\xa0\xb8\xcd6{Z\xb3lF\xe4\xe0y\xbc\x89\xfc\xe9\x86Q\xfc-:yNqX\x8f\xbd\x02\xf7l\xb0\xbd\x80v \x11@\xf2]\xb5\xc5\x83\xe7\xa08\xf4\x93&\xdf\x0bO\xc0\xa3.\xa3\xb2\xcdZ<\x17\xb1[\x88\xc2\x1c\t\xca\x82w\x9e\xa0*\xed\x1b\x93\n\xa2\xbbAm.\x13\xe3\xce\xbdZZ\x19\xa6\x00\xa81vz\x0f6\x14A!\xe1\x88\xfb\xe0\xcb\xdcK\xea*\xce\xb1[\xd5V\xd7\x1a\xc8\x02Q\xd3\x9f\xc40\x8e\x87\xb8.G\xc6*)\xdc\xbbcTj\x83\x14:iK'\xf0t~\xa8/\xce\xe5\xb95\x1f\x80\x86\xdc8\xad\xf6\xe6JVn\x80\xb2Z\xbff\xfd\xb9\xb4\x17`s6\xbeN\xd9\x00\xc2\x7f\xb0\x18\x9fa\xa4\xdf\x9d\xa2m\x114u\xcc\xf7\x95\xf8.\xff\xca_d\xbeK(w\x9a\x19\xb2\xa2\x9b\xffW\xa0p#}>\xcd\x9c\xc8\x01m\x1d\xa4\xb4x?\xc3.F\xb0\xc2\xba\x19f1\xfc+\x99\xe2\xd1\x9bB\x87a\x9b\xd3\x19\xe3\xcc\xf3\xcf\xb8\x94M\xa7F0\x890\xe6?\xa2\xcc\x9b\x99?W\x8d\xb2T*AO\xb2\xb2\xf3\xdb\"\xa3\xce\xa5\xdczg\xa0\x13\xf1\xe4?\xb9\x00\x11\x01\x00\x01\xb4TUbuntu 16.04 Extended Security Maintenance Automatic Signing Key <esm@canonical.com>\x89\x028\x04\x13\x01\x02\x00\"\x05\x02]\t\xfb\xe3\x02\x1b\x03\x06\x0b\t\x08\x07\x03\x02\x06\x15\x08\x02\t\n\x0b\x04\x16\x02\x03\x01\x02\x1e\x01\x02\x17\x80\x00\n\t\x10\xb3\x0e\xda\xa6=\x8fa\xd03?\x0f\xfd\x15\x9f\xb2\xdc\x07\xe1\xc2\xa7_\x03\xaa\xd9\xdd@k\xd5xf\xbc\xaf#\xb7\xd9(\xf3M\n\xb2[H\xfcH\xc6\xac7\xd6\xa5O\xe5\xcc\xa5\xc0\x86\x02\xc17\t\xfd+\xe3\xd6n4\x81/-\xfdo:5\xc1Q\xbe\x16\x15\xc1+<\xf7\x90|?o\xb6\x0eS3Z\xe1Z\x9f\xbd\xee\xe1\xb2O\xba\xac\xee\xce\xbd\xce\xd3[\xa4US\xce\x9ff\x80\xbd\x95\xe9\x81\x15%\tb\xce!\xc3\x90i$w\x8c\xdf\tX\xb8\xcb\x80\xae\xed\xf5\xc6\x10\x83+\xe5-\xf8\x8d\xab\xc5\x18\\%x\xcd\x13,\x0f\x16\xfd\xad+\xcc\xb1U\x16id\x10\r\x0e`\x80\xf0\xa5X;\x9eT\x03\xcd&\xb4\xa6C/M\xa9(\xd4\xd7\xa0\xdc\x16\xe3Fw\xcc\x8a\x83F\x88\x9dRt7\x95\x13\xe9\x96_\n|\x03\xa9\xa8%\xf0\xaa+\xc2S\xd7\xce\x1f\xaeIQ\xa4\xcds\xebc\xbc\xca\x84\xcf\x95\xef\x98\xe1wD8\x11\x03\xae!&\xb1\x89\x84\x0c\xbbWHH\x07p\xact\xf3\x13\"\x1a\xa4:\xcd\xf9\xf6\x02\xb8[\xa9\xb7%\xa5T\xa4\xe8\x08\xdaL|\xf4\xd4L\xde\x8aT25\xa3\x04\xb6C9L7\xc5<o\xd1m\x02m;2I\xf0\xd9j2l\x8a[5\xdd\x85:\xa3\xff1U\x90K\xd0\xa4\xce\xe8gPzfN\xbc\x1f\"\xd6H\x90$\r=\xc8\xc6\xd3!\xb3\x1er\x80#\xdf\xf5\x1a>\xab2\xeb\xf2 \xcb\xd1S\xf1\x93\xf7$LO\xb2Z\x08\x99N\xbe@\xe5\x1f\xa2\xb6\xc7\xfb\xaar9\x0c\xc2\x90\x9eB\x82^\\~5\xb0\x17\x15H\xcb\xa9d\xfe\x10\xc8\x90\xda{\x1d\x84\xfb\x90\xb7i:\x06\xae\\S\xa9P\xf2XGXY\xc0;\xe2\x1ac\x9cDG\n\xd9\x88+\xc2 _b\xda\x89\x93\xaa\\\xef\x8d\x90|;\xff>N/k\\\xbc\xdar\x86\x9aL\x8b_+\xfc\xd2\xe6\xa1\x8d\x16\x05\x12\x86\xb7\xe5\x88\x89\x1c\xd8\xa1\xc6\x85\xeab\xd1\xe7\x98\xf1yH:+\xaa\xc7\xe8/\xee\x86\x0c\xe8*f\xe5\x7f\x90\x1b\xfa\x05\x87\x95\xa3\xf04\x95\x8c\xd3(\x93`\xf3K\xb0\x02\x00\x03\xb9\x02\r\x04]\t\xfb\xe3\x01\x10\x00\xcb$\xaa(\xfdm\x13\xd1\x0b\xde\x90>%\xd7\xebZ\x0c\xe0\x8ey\x9ad4\x93\x04\xc5\xbf\xb0\xfb\xf46\xc81\xb4f2%\x11e\x18\xdf\xc0\r\xebMxx0\x7f\xd6\xf1\x11\xf0\x968w\x1a\x93 \x80\xa7\xe7\xe9\xe2 \x15\xd8\x9b\n]!S\xd9\xc3\xef\x9f\xdc\xea\xee\n=\x8c,\x18p\xaf \x11\x9f\x9c\xd3.\x0e\x9eAY>\xf0\xbf\x1bf\xf1 \xd9\x1b\xf9{\x9f\xa7\xb9\x03\xbd9\xee\x0c\x87\x16\xb3\xa2#\x88\x18I\xc7\x8f\xaf{5\xc2\xab\xf1\xf1\x80\xab\xad\x9foL\xaa\xeeLu\x18\x99=\xc2\xa9e\x0f\x06\xab\x07J\xe9\xa6KQ\xe9\xf3\x89\xa9\xac\xc3\x82\xce\xac\xb0\t\x86\x13\xae\xb3\x06Z\xe3.s\x0f\xc0\xf0\xd6%\x92\xc5Gx\xbb\xf3\x98\xdb\\#\x94M\r\x1dp\xe9\xc2\x97\xe0oX\xddV\"/_\x8a\xff\xf6^\x84c`z\x9a\xa4O\x01\xf41\xfb\x0e\x0f\xa9\xe1\x02\xb1\x93\xfec6\xc6\x11iT\xe5A\xee\xa5\xbc8\xde\xda\x03\xddF>,\xba\xa0Z\x80\xffK\xfcX(\x08\xa5\x0f\xdc\xb1\x8f\xa3\xca\x1b\xaa\x13\x96\x97M\x88\xfb\xfe9\xc9K\xb0\xc8\xf5\xae;'w\xde+\\\xe3\xebh\xe3\xcc\x98u\x87\x16\xea@\x17'\xfc*ewo\xeb\xe7\x86f\xf2\t\x86\x04\xec\xc7\x82\xce\xccT\xc6\xda\xfd\xf8\x16&\xb8l[7\x9d\x97\x0e>d\xa3'\xa4\xbdT\x01\xeb\x90\x98\x0f2\xee\xa66\x81\xe1\x97\x93\x1e\x93\x1f`I\rR'b'0\xe9\x91I,\xb2d\x1c[\xa6=6\xeb\x8a\x0e}\x88c?\xbc\xa4\x01\xd9\xc5\x12S$\x88@:\"\x94#\xf4\xe7\xda&I\xb1e\xdd\x10\xe0\xe1\x05\xb65\xe0\xe3\x9f\x80\xd6y\xf5W\xddU\xfa\x1f\x8fqFz\x04a\xffa\xc0s\xf6'ID~E\xdc`p\xcec\x8f,\xf6\xcd\xaa\xf8\xf1\xe8x\x03\x9d#\x9f,0\xf0\xa5n*[b\xb0\xe2\x19N\x9d\x1bC\x9b/\x08\xca\xe0\xeb\xf9\x9a\x1a5\xaa\xcbQ]vgCh\x9f\x8c]\xb7\xcd|\x9f\x06\x1a\x98\x97dod\xf0\xbeh)\x95\x1ck\xf3\x00\x11\x01\x00\x01\x89\x02\x1f\x04\x18\x01\x02\x00\t\x05\x02]\t\xfb\xe3\x02\x1b\x0c\x00\n\t\x10\xb3\x0e\xda\xa6=\x8fa\xd0 \xc9\x0f\xfe9 \xfbRPmc\x96\xc2\xa2\x0b'e\xa8\x1b<\x12\xb5\xf1\xb6\xfaaKU\x18\xd6\x1ak^g\xcd<Z/R\xd2\xc6\xc9\xe7q\t\x95(\xa6S\xb0p\xd2\xcby\xc9\xa2\xe8\x8fd\xcba_\xda0Hk\xd1\x9d\x98\xdd\x0e\xd4\x17\x8c%\x8b\xb7=g\xd6C\xd2\xcab>r\xaa\x86\x16\x89vG\x9b1\t\xbcT9\x8f\xfb\x19>\x99\x00\x82\x8f\xd8\xbc\xa1\xbdr\xab\x03\xd9\xf2[_w.0/\xb1\xa9{b\x8a\x1b\xa2\xa3\xb9\x81U\xd5\x8e\xe5qzLD\x15\x1a\x7f\x9aA\x89q\xab\n\x12\xb7t\xb8y\x81q\x1d\x06\x95\x16*$\x92\x15\x0e\xcb\x0e\xa2\t\xc2%\xfb\xf4<Y\xbe\xd8\x18n\x84\xc24\xd4Q\x01\xe4\x90\"a\x19\xea\xe8Hm<~H\x80[\x10\xc7p\xa5\xddpN6\x00=\x7f\x9dx\xe4\xdf\x10e\xf2~a\xf9{jc.\xa6(\xc5\x01\xa7\xa1,\x1a\x9b\xc6\xfeKu\x02f\xba\x94\xa7\xc8\xab\r\xae\\6\\\xde\x7fc>,\xd7\xb3.\x04\xf8{5\xed\x0c}&\x8d\xa6\x1f\xfeaB\x1e\x01\x8f\x96]\xc9\xda\x9f\x9d\x02(flm\x89[q\xb4\xbc\xb5\xf5\x87\xcf\x00D\x8e\xbc\r\xd4\xce\xdaZC>]@\x9f\xc9\x9cU\x89\xcb\xadR+\xa73\x9d\xbd\xb0\xf3\xa0\xc4\x03\xc6\x12n\xb7\x9e\xf0 F\x9fV\xd1\xd3K\xa3\xf5b\xb9\xd6\xecK\xeaKH\xb3\xbd\x89\xe4\xef\xf0\x03`\xeb<\x84s\x11\x04'\xa7\xc8>\x04\xcc\xdb\xadqf/\xe8\xfaA\xf9pCX\xf5u\x8flB\x96G\x13\xf0&t\x9b\xaa\x805=\xb9\x85`\xc5uK\xd7\xbf\x1bR\xf2^EV\x17\x08\xc9\xf2\xa0\x82\x16o\xf0~SHk\x9c\xb6A\xd9u~m\x89\xbe/=\x8c\x8a\xab\x1a*\xf4C\x1bN\xa5\x84\x96Isov\xdd\x02\xbe\xf5\x83\xb8+R\xaf\x81\"\xce\x84X\xce\xa2\x8f\xf9E\xabI\xdf'x\x8fF\x89C\xaf\xd7\x99\x00\x84\x8az\x16\x8d8\xda\xd0\xd6\xbf\x0f\x7fK\xbf\x8a\xf7\xf0p\x8e\xcelZjF\xddx6\xd6\xf2\xd3+]\x92zD\xb0\x02\x00\x03"  # noqa: E501
+
+
+# Snapshot of /usr/share/distro-info/ubuntu.csv from distro-info-data
+DISTRO_INFO_UBUNTU_CSV = """\
+version,codename,series,created,release,eol,eol-server,eol-esm
+12.04 LTS,Precise Pangolin,precise,2011-10-13,2012-04-26,2017-04-28,2017-04-28,2019-04-26
+14.04 LTS,Trusty Tahr,trusty,2013-10-17,2014-04-17,2019-04-25,2019-04-25,2022-04-25
+14.10,Utopic Unicorn,utopic,2014-04-17,2014-10-23,2015-07-23
+15.04,Vivid Vervet,vivid,2014-10-23,2015-04-23,2016-02-04
+15.10,Wily Werewolf,wily,2015-04-23,2015-10-22,2016-07-28
+16.04 LTS,Xenial Xerus,xenial,2015-10-22,2016-04-21,2021-04-30,2021-04-30,2024-04-21
+16.10,Yakkety Yak,yakkety,2016-04-21,2016-10-13,2017-07-20
+17.04,Zesty Zapus,zesty,2016-10-13,2017-04-13,2018-01-13
+17.10,Artful Aardvark,artful,2017-04-13,2017-10-19,2018-07-19
+18.04 LTS,Bionic Beaver,bionic,2017-10-19,2018-04-26,2023-04-26,2023-04-26,2028-04-26
+18.10,Cosmic Cuttlefish,cosmic,2018-04-26,2018-10-18,2019-07-18
+19.04,Disco Dingo,disco,2018-10-18,2019-04-18,2020-01-23
+19.10,Eoan Ermine,eoan,2019-04-18,2019-10-17,2020-07-17
+20.04 LTS,Focal Fossa,focal,2019-10-17,2020-04-23,2025-04-23,2025-04-23,2030-04-23
+20.10,Groovy Gorilla,groovy,2020-04-23,2020-10-22,2021-07-22
+21.04,Hirsute Hippo,hirsute,2020-10-22,2021-04-22,2022-01-22
+"""  # noqa: E501
+
+# ubuntu-distro-info output recorded against DISTRO_INFO_UBUNTU_CSV
+# Keys are the --date argument passed to the CLI
+DISTRO_INFO_CLI_SUPPORTED_ESM = {
+    "2019-04-26": ["precise", "trusty", "xenial", "bionic"],
+    "2019-10-16": ["trusty", "xenial", "bionic"],
+    "2021-01-01": ["trusty", "xenial", "bionic", "focal"],
+    "2021-04-30": ["trusty", "xenial", "bionic", "focal"],
+    "2022-04-26": ["xenial", "bionic", "focal"],
+}
+# Output of: ubuntu-distro-info --series <series> -yeol --date <date>
+DISTRO_INFO_CLI_DAYS_UNTIL_EOL = {
+    ("xenial", "2021-01-01"): 119,
+    ("xenial", "2021-04-30"): 0,
+    ("xenial", "2021-05-01"): -1,
+    ("bionic", "2021-01-01"): 845,
+    ("focal", "2021-01-01"): 1573,
+    ("groovy", "2021-07-22"): 0,
+}
+
+
+# Versions in ascending order according to dpkg --compare-versions.
+# Versions sharing a tuple compare as equal.
+DPKG_SORTED_VERSIONS = (
+    ("0",),
+    ("0.0",),
+    ("0.9.8z-1",),
+    ("0.9.8zg-1",),
+    ("000001", "1"),
+    ("1.0~~",),
+    ("1.0~",),
+    ("1.0~rc1",),
+    ("1.0~+",),
+    ("1.0-~",),
+    ("0:1.0", "1.0", "1.0-0", "1.00"),
+    ("1.0-0ubuntu0.16.04.1",),
+    ("1.0-0ubuntu0.18.04.1",),
+    ("1.0-1~",),
+    ("1.0-1~18.04.1",),
+    ("1.0-1",),
+    ("1.0-1build1",),
+    ("1.0-1ubuntu0.1",),
+    ("1.0-1ubuntu1~esm1",),
+    ("1.0-1ubuntu1",),
+    ("1.0-1ubuntu1.1",),
+    ("1.0-1+",),
+    ("1.0-1+esm1",),
+    ("1.0-1.",),
+    ("1.0-A",),
+    ("1.0-a",),
+    ("1.0A-1",),
+    ("1.0a",),
+    ("1.0a-1",),
+    ("1.0+~",),
+    ("1.0+",),
+    ("1.0+b1",),
+    ("1.0+dfsg-1",),
+    ("1.0+dfsg1-1",),
+    ("1.0.0",),
+    ("1.0.-1",),
+    ("1.0.1",),
+    ("1.0.dfsg-1",),
+    ("1.0..1",),
+    ("1.0001", "1.01", "1.1"),
+    ("1.2.3-4-4",),
+    ("1.2.3-4-5",),
+    ("1.9",),
+    ("1.10",),
+    ("1.17-6ubuntu4.1",),
+    ("2",),
+    ("2.27-3ubuntu1",),
+    ("2.27-3ubuntu1.2",),
+    ("3.0-11build1",),
+    ("4.15.0-112.113",),
+    ("4.15.0-1096.106",),
+    ("5.4.0-42.46~18.04.1",),
+    ("7.58.0-2ubuntu3.9",),
+    ("7.58.0-2ubuntu3.10",),
+    ("10",),
+    ("9999999999999999999999.1",),
+    ("a",),
+    ("b1",),
+    ("1:0.9",),
+    ("1:2.27-3",),
+    ("2:1.0",),
+)
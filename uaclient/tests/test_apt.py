@@ -1,10 +1,13 @@
 """Tests related to uaclient.apt module."""
 
 import glob
+import json
 import mock
 import os
 import stat
 import subprocess
+import threading
+import time
 from textwrap import dedent
 
 import pytest
@@ -64,7 +67,11 @@ class TestFindAptListFilesFromRepoSeries:
     @mock.patch("uaclient.util.subp")
     def test_find_all_apt_list_files_from_apt_config_key(self, m_subp, tmpdir):
         """Find all matching apt list files from apt-config dir."""
-        m_subp.return_value = ("key='{}'".format(tmpdir.strpath), "")
+        apt.clear_apt_config_cache()
+        m_subp.return_value = (
+            'Dir::State::lists "{}";\n'.format(tmpdir.strpath),
+            "",
+        )
         repo_url = "http://c.com/fips-updates/"
         _protocol, repo_path = repo_url.split("://")
         prefix = repo_path.rstrip("/").replace("/", "_")
@@ -81,6 +88,7 @@ class TestFindAptListFilesFromRepoSeries:
             util.write_file(path, "")
 
         assert paths[1:] == find_apt_list_files(repo_url, "xenial")
+        assert [mock.call(["apt-config", "dump"])] == m_subp.call_args_list
 
 
 class TestRemoveAptListFiles:
@@ -89,7 +97,11 @@ class TestRemoveAptListFiles:
         self, m_subp, tmpdir
     ):
         """Remove all matching apt list files from apt-config dir."""
-        m_subp.return_value = ("key='{}'".format(tmpdir.strpath), "")
+        apt.clear_apt_config_cache()
+        m_subp.return_value = (
+            'Dir::State::lists "{}";\n'.format(tmpdir.strpath),
+            "",
+        )
         repo_url = "http://c.com/fips-updates/"
         _protocol, repo_path = repo_url.split("://")
         prefix = repo_path.rstrip("/").replace("/", "_")
@@ -154,6 +166,28 @@ class TestValidAptCredentials:
         )
         assert [apt_helper_call] == m_subp.call_args_list
 
+    @mock.patch("uaclient.apt.tempfile.TemporaryDirectory")
+    @mock.patch("uaclient.util.subp")
+    @mock.patch("uaclient.apt.os.path.exists", return_value=True)
+    def test_credentials_cache_skips_recently_validated_credentials(
+        self, _m_exists, m_subp, _m_temporary_directory, tmpdir
+    ):
+        m_subp.return_value = "Fetched 285 B in 1s", ""
+        cache = apt.AptCredentialsCache(
+            tmpdir.mkdir("private").join("apt-credentials.json").strpath,
+            ttl=60,
+        )
+        for _ in range(2):
+            assert_valid_apt_credentials(
+                "http://fakerepo", "user", "pwd", credentials_cache=cache
+            )
+        assert 1 == m_subp.call_count
+        # Other credentials for the same repo are validated again
+        assert_valid_apt_credentials(
+            "http://fakerepo", "user", "new-pwd", credentials_cache=cache
+        )
+        assert 2 == m_subp.call_count
+
     @pytest.mark.parametrize(
         "exit_code,stderr,error_msg",
         (
@@ -793,6 +827,88 @@ class TestRemoveRepoFromAptAuthFile:
         assert after_content == auth_file.read("rb")
 
 
+class TestAptAuthFile:
+    def test_batches_changes_in_a_single_write(self, tmpdir):
+        auth_file = tmpdir.join("auth.conf")
+        auth_file.write("machine other/ login me password pw\n")
+        apt_auth = apt.AptAuthFile(auth_file.strpath)
+        apt_auth.set_entry("https://esm.example.com/infra/", "bearer", "t1")
+        apt_auth.set_entry("https://esm.example.com/apps/", "bearer", "t2")
+        apt_auth.remove_entry("https://esm.example.com/infra")
+        with mock.patch(
+            "uaclient.apt.util.atomic_write_file", wraps=util.atomic_write_file
+        ) as m_write:
+            apt_auth.flush()
+        assert 1 == m_write.call_count
+        assert (
+            "machine other/ login me password pw\n"
+            "machine esm.example.com/apps/ login bearer password"
+            " t2{}\n".format(APT_AUTH_COMMENT)
+        ) == auth_file.read()
+        assert 0o600 == stat.S_IMODE(os.stat(auth_file.strpath).st_mode)
+
+    @mock.patch("uaclient.apt.util.atomic_write_file")
+    def test_unchanged_content_is_not_rewritten(self, m_write, tmpdir):
+        auth_line = "machine esm.example.com/ login bearer password t1{}\n"
+        auth_file = tmpdir.join("auth.conf")
+        auth_file.write(auth_line.format(APT_AUTH_COMMENT))
+        auth_file.chmod(0o600)
+        apt_auth = apt.AptAuthFile(auth_file.strpath)
+        apt_auth.set_entry("https://esm.example.com", "bearer", "t1")
+        apt_auth.remove_entry("https://other.example.com")
+        apt_auth.flush()
+        assert 0 == m_write.call_count
+
+    def test_flush_removes_emptied_file(self, tmpdir):
+        auth_file = tmpdir.join("auth.conf")
+        apt_auth = apt.AptAuthFile(auth_file.strpath)
+        apt_auth.set_entry("https://esm.example.com", "bearer", "t1")
+        apt_auth.flush()
+        assert auth_file.exists()
+        apt_auth.remove_entry("https://esm.example.com/")
+        apt_auth.flush()
+        assert not auth_file.exists()
+
+    @mock.patch("uaclient.apt.run_apt_update_command")
+    @mock.patch("uaclient.apt.get_apt_auth_file_from_apt_config")
+    def test_transaction_writes_auth_file_once_before_update(
+        self, m_get_apt_auth_file, m_update, tmpdir
+    ):
+        auth_file = tmpdir.join("auth.conf")
+        m_get_apt_auth_file.return_value = auth_file.strpath
+        m_update.side_effect = lambda *args: contents.append(auth_file.read())
+        contents = []
+
+        with mock.patch(
+            "uaclient.apt.util.atomic_write_file", wraps=util.atomic_write_file
+        ) as m_write:
+            with apt.AptTransaction() as transaction:
+                add_apt_auth_conf_entry("https://esm.example.com/i", "a", "1")
+                add_apt_auth_conf_entry("https://esm.example.com/a", "b", "2")
+                remove_repo_from_apt_auth_file("https://cis.example.com")
+                assert not auth_file.exists()
+                transaction.request_update("UA Infra: ESM")
+
+        assert 1 == m_write.call_count
+        assert [auth_file.read()] == contents
+        assert 2 == len(contents[0].splitlines())
+
+    @mock.patch("uaclient.apt.run_apt_update_command")
+    @mock.patch("uaclient.apt.get_apt_auth_file_from_apt_config")
+    def test_transaction_rollback_discards_auth_changes(
+        self, m_get_apt_auth_file, m_update, tmpdir
+    ):
+        auth_file = tmpdir.join("auth.conf")
+        auth_file.write("machine other/ login me password pw\n")
+        m_get_apt_auth_file.return_value = auth_file.strpath
+        with pytest.raises(KeyboardInterrupt):
+            with apt.AptTransaction():
+                add_apt_auth_conf_entry("https://esm.example.com", "a", "1")
+                raise KeyboardInterrupt()
+        assert "machine other/ login me password pw\n" == auth_file.read()
+        assert 0 == m_update.call_count
+
+
 class TestRestoreCommentAptListFile:
     @pytest.mark.parametrize(
         "before,expected",
@@ -828,26 +944,24 @@ class TestRestoreCommentAptListFile:
 
 
 class TestGetInstalledPackages:
-    @mock.patch("uaclient.apt.util.subp", return_value=("", ""))
-    def test_correct_command_called(self, m_subp):
-        get_installed_packages()
-
-        expected_call = mock.call(
-            ["dpkg-query", "-W", "--showformat=${Package}\\n"]
-        )
-        assert [expected_call] == m_subp.call_args_list
-
-    @mock.patch("uaclient.apt.util.subp", return_value=("", ""))
-    def test_empty_output_means_empty_list(self, m_subp):
-        assert [] == get_installed_packages()
-
-    @mock.patch("uaclient.apt.util.subp", return_value=("a\nb\n", ""))
-    def test_lines_are_split(self, m_subp):
-        assert ["a", "b"] == get_installed_packages()
-
-    @mock.patch("uaclient.apt.util.subp", return_value=("a\nb", ""))
-    def test_assert_missing_eof_newline_works(self, m_subp):
-        assert ["a", "b"] == get_installed_packages()
+    @pytest.mark.parametrize(
+        "dpkg_status,expected",
+        (
+            ("", []),
+            ("Package: a\nStatus: install ok installed\n", ["a"]),
+            (
+                "Package: a\nStatus: install ok installed\n\n"
+                "Package: b\nStatus: deinstall ok config-files\n\n"
+                "Package: c\nStatus: purge ok not-installed\n\n",
+                ["a", "b"],
+            ),
+        ),
+    )
+    def test_lists_packages_known_to_dpkg(self, dpkg_status, expected, tmpdir):
+        status_file = tmpdir.join("status")
+        status_file.write(dpkg_status)
+        with mock.patch("uaclient.dpkg.DPKG_STATUS_FILE", status_file.strpath):
+            assert expected == get_installed_packages()
 
 
 class TestRunAptCommand:
@@ -915,3 +1029,1033 @@ class TestRunAptCommand:
 
         expected_message = "\n".join(output_list) + "."
         assert expected_message == excinfo.value.msg
+
+
+APT_CACHE_POLICY = """\
+Package files:
+ 100 /var/lib/dpkg/status
+     release a=now
+ 500 http://archive.ubuntu.com/ubuntu bionic-updates/main amd64 Packages
+     release v=18.04,o=Ubuntu,a=bionic-updates,n=bionic,l=Ubuntu,c=main,b=amd64
+     origin archive.ubuntu.com
+ -32768 https://esm.ubuntu.com/apps/ubuntu bionic-apps-security/main amd64 Packages
+     release v=18.04,o=UbuntuESMApps,a=bionic-apps-security,n=bionic,l=UbuntuESMApps,c=main,b=amd64
+     origin esm.ubuntu.com
+ 510 https://esm.ubuntu.com/ubuntu bionic-infra-updates/main amd64 Packages
+     release v=18.04,o=UbuntuESM,a=bionic-infra-updates,n=bionic,l=UbuntuESM,c=main,b=amd64
+     origin esm.ubuntu.com
+ 510 https://esm.ubuntu.com/ubuntu bionic-infra-security/main amd64 Packages
+     release v=18.04,o=UbuntuESM,a=bionic-infra-security,n=bionic,l=UbuntuESM,c=main,b=amd64
+     origin esm.ubuntu.com
+Pinned packages:
+     hello -> 2.10-1 with priority 1001
+"""  # noqa: E501
+
+
+class TestAptPolicy:
+    def test_parse_package_files(self):
+        policy = apt.AptPolicy.parse(APT_CACHE_POLICY)
+        assert 5 == len(policy.sources)
+        dpkg_status, updates = policy.sources[:2]
+        assert 100 == dpkg_status.priority
+        assert "/var/lib/dpkg/status" == dpkg_status.url
+        assert {"a": "now"} == dpkg_status.release
+        assert None is dpkg_status.origin
+        assert 500 == updates.priority
+        assert "http://archive.ubuntu.com/ubuntu" == updates.url
+        assert "bionic-updates/main" == updates.dist
+        assert "Ubuntu" == updates.release["o"]
+        assert "archive.ubuntu.com" == updates.origin
+
+    @pytest.mark.parametrize(
+        "url, priority",
+        (
+            ("https://esm.ubuntu.com/ubuntu", 510),
+            ("https://esm.ubuntu.com/ubuntu/", 510),
+            ("https://esm.ubuntu.com/apps/ubuntu", -32768),
+            ("https://esm.ubuntu.com/fips/ubuntu", None),
+        ),
+    )
+    def test_get_pin_priority_by_url(self, url, priority):
+        policy = apt.AptPolicy.parse(APT_CACHE_POLICY)
+        assert priority == policy.get_pin_priority(url)
+
+    def test_get_sources_by_origin_and_suite(self):
+        policy = apt.AptPolicy.parse(APT_CACHE_POLICY)
+        assert 2 == len(policy.get_sources(origin="UbuntuESM"))
+        assert [] == policy.get_sources(origin="Ubuntu", suite="bionic")
+        sources = policy.get_sources(origin="Ubuntu", suite="bionic-updates")
+        assert ["http://archive.ubuntu.com/ubuntu"] == [
+            source.url for source in sources
+        ]
+        sources = policy.get_sources(suite="bionic-infra-security")
+        assert ["bionic-infra-security/main"] == [
+            source.dist for source in sources
+        ]
+
+
+class TestGetAptPolicy:
+    @pytest.fixture
+    def apt_dirs(self, tmpdir):
+        sources_d = tmpdir.mkdir("sources.list.d")
+        prefs_d = tmpdir.mkdir("preferences.d")
+        lists_d = tmpdir.mkdir("lists")
+        apt_config = apt.AptConfig(
+            {
+                "Dir::Etc::sourcelist": tmpdir.join("sources.list").strpath,
+                "Dir::Etc::sourceparts": sources_d.strpath,
+                "Dir::Etc::preferences": tmpdir.join("preferences").strpath,
+                "Dir::Etc::preferencesparts": prefs_d.strpath,
+                "Dir::State::lists": lists_d.strpath,
+            }
+        )
+        with mock.patch("uaclient.apt._APT_CONFIG", apt_config):
+            yield sources_d, prefs_d
+
+    @mock.patch("uaclient.apt.run_apt_command")
+    def test_policy_is_shared_until_apt_config_changes(
+        self, m_run_apt_command, apt_dirs
+    ):
+        """apt-cache policy is rerun when sources or preferences change."""
+        sources_d, prefs_d = apt_dirs
+        m_run_apt_command.return_value = APT_CACHE_POLICY
+
+        policy = apt.get_apt_policy()
+        assert policy is apt.get_apt_policy()
+        assert 1 == m_run_apt_command.call_count
+        assert [
+            mock.call(
+                ["apt-cache", "policy"], status.MESSAGE_APT_POLICY_FAILED
+            )
+        ] == m_run_apt_command.call_args_list
+
+        sources_d.join("ubuntu-esm-infra.list").write("deb ...")
+        assert policy is not apt.get_apt_policy()
+        assert 2 == m_run_apt_command.call_count
+
+        prefs_d.join("ubuntu-esm-infra").write("Pin-Priority: 510")
+        apt.get_apt_policy()
+        assert 3 == m_run_apt_command.call_count
+
+        prefs_d.join("ubuntu-esm-infra").remove()
+        apt.get_apt_policy()
+        apt.get_apt_policy()
+        assert 4 == m_run_apt_command.call_count
+
+    @mock.patch("uaclient.apt.run_apt_command")
+    def test_clear_apt_policy_cache(self, m_run_apt_command, apt_dirs):
+        m_run_apt_command.return_value = APT_CACHE_POLICY
+        apt.get_apt_policy()
+        apt.clear_apt_policy_cache()
+        apt.get_apt_policy()
+        assert 2 == m_run_apt_command.call_count
+
+
+def _fake_pkg_file(filename, site="", priority=500, describe=None, **fields):
+    pkg_file = mock.Mock(
+        filename=filename,
+        site=site,
+        version=fields.get("version", ""),
+        origin=fields.get("origin", ""),
+        archive=fields.get("archive", ""),
+        codename=fields.get("codename", ""),
+        label=fields.get("label", ""),
+        component=fields.get("component", ""),
+        architecture=fields.get("architecture", ""),
+    )
+    pkg_file.priority = priority
+    pkg_file.describe = describe
+    return pkg_file
+
+
+@pytest.fixture
+def fake_apt_pkg():
+    """Provide a fake python3-apt apt_pkg module to uaclient.apt."""
+    pkg_files = [
+        _fake_pkg_file("/var/lib/dpkg/status", priority=100, archive="now"),
+        _fake_pkg_file(
+            "/var/lib/apt/lists/esm.ubuntu.com_ubuntu_dists_bionic-infra",
+            site="esm.ubuntu.com",
+            priority=510,
+            describe=(
+                "https://esm.ubuntu.com/ubuntu bionic-infra-updates/main"
+                " amd64 Packages"
+            ),
+            version="18.04",
+            origin="UbuntuESM",
+            archive="bionic-infra-updates",
+            codename="bionic",
+            component="main",
+            architecture="amd64",
+        ),
+    ]
+    m_apt_pkg = mock.Mock()
+    cache = m_apt_pkg.Cache.return_value
+    cache.file_list = pkg_files
+    m_apt_pkg.Policy.return_value.get_priority.side_effect = (
+        lambda pkg_file: pkg_file.priority
+    )
+    source_list = m_apt_pkg.SourceList.return_value
+    source_list.find_index.side_effect = lambda pkg_file: (
+        mock.Mock(describe=pkg_file.describe) if pkg_file.describe else None
+    )
+    with mock.patch("uaclient.apt.apt_pkg", m_apt_pkg):
+        yield m_apt_pkg
+
+
+class TestAptPkgPolicy:
+    @mock.patch("uaclient.apt.run_apt_command")
+    def test_policy_read_from_python_apt(
+        self, m_run_apt_command, fake_apt_pkg
+    ):
+        policy = apt.get_apt_policy()
+
+        assert isinstance(policy, apt.AptPkgPolicy)
+        assert 0 == m_run_apt_command.call_count
+        dpkg_status, infra = policy.sources
+        assert (100, "/var/lib/dpkg/status", "", {"a": "now"}, None) == (
+            dpkg_status
+        )
+        assert 510 == policy.get_pin_priority("https://esm.ubuntu.com/ubuntu")
+        assert "bionic-infra-updates/main" == infra.dist
+        assert "esm.ubuntu.com" == infra.origin
+        assert {
+            "v": "18.04",
+            "o": "UbuntuESM",
+            "a": "bionic-infra-updates",
+            "n": "bionic",
+            "c": "main",
+            "b": "amd64",
+        } == infra.release
+        assert [infra] == policy.get_sources(
+            origin="UbuntuESM", suite="bionic-infra-updates"
+        )
+
+    @mock.patch("uaclient.apt.run_apt_command")
+    def test_fallback_to_apt_cache_on_python_apt_errors(
+        self, m_run_apt_command, fake_apt_pkg
+    ):
+        fake_apt_pkg.Cache.side_effect = SystemError("E:Broken sources")
+        m_run_apt_command.return_value = APT_CACHE_POLICY
+
+        policy = apt.get_apt_policy()
+
+        assert not isinstance(policy, apt.AptPkgPolicy)
+        assert 5 == len(policy.sources)
+
+
+APT_CONFIG_DUMP = """\
+Dir "/";
+Dir::State "var/lib/apt/";
+Dir::State::lists "lists/";
+Dir::Etc "etc/apt/";
+Dir::Etc::sourcelist "sources.list";
+Dir::Etc::sourceparts "sources.list.d";
+Dir::Etc::preferences "preferences";
+Dir::Etc::preferencesparts "preferences.d";
+Dir::Etc::netrc "auth.conf";
+Dir::Etc::netrcparts "auth.conf.d";
+Dir::Log "var/log/apt";
+Dir::Log::Terminal "/var/log/apt/term.log";
+APT::Update::Post-Invoke-Success "";
+APT::Update::Post-Invoke-Success:: "/usr/bin/test -e /usr/bin/foo";
+APT::Update::Post-Invoke-Success:: "/usr/bin/bar";
+"""
+
+
+class TestAptConfig:
+    def test_parse_values_and_lists(self):
+        apt_config = apt.AptConfig.parse(APT_CONFIG_DUMP)
+        assert "auth.conf" == apt_config.get("Dir::Etc::netrc")
+        assert None is apt_config.get("Dir::Unset")
+        assert [
+            "/usr/bin/test -e /usr/bin/foo",
+            "/usr/bin/bar",
+        ] == apt_config.get_list("APT::Update::Post-Invoke-Success")
+
+    def test_accessors_resolve_paths_through_parent_dirs(self):
+        apt_config = apt.AptConfig.parse(APT_CONFIG_DUMP)
+        assert "/etc/apt/auth.conf.d/" == apt_config.netrc_parts_dir
+        assert "/etc/apt/auth.conf" == apt_config.netrc_file
+        assert "/etc/apt/auth.conf.d/90ubuntu-advantage" == (
+            apt_config.auth_file
+        )
+        assert "/var/lib/apt/lists/" == apt_config.lists_dir
+        assert "/etc/apt/sources.list" == apt_config.sourcelist
+        assert "/etc/apt/sources.list.d/" == apt_config.sourceparts
+        assert "/etc/apt/preferences" == apt_config.preferences
+        assert "/etc/apt/preferences.d/" == apt_config.preferences_parts
+        # Absolute values are not prefixed by parents
+        assert "/var/log/apt/term.log" == apt_config.find_file(
+            "Dir::Log::Terminal"
+        )
+        # Parents without a trailing slash are joined with one
+        assert "/var/log/apt/" == apt_config.find_dir("Dir::Log")
+
+    def test_auth_file_without_netrc_parts_support(self):
+        """Use Dir::Etc::netrc when apt has no auth.conf.d support."""
+        dump = APT_CONFIG_DUMP.replace(
+            'Dir::Etc::netrcparts "auth.conf.d";\n', ""
+        ).replace('"auth.conf"', '"/opt/apt/auth.conf"')
+        apt_config = apt.AptConfig.parse(dump)
+        assert None is apt_config.netrc_parts_dir
+        assert "/opt/apt/auth.conf" == apt_config.auth_file
+
+    def test_root_dir_prefixes_paths(self):
+        apt_config = apt.AptConfig.parse(
+            APT_CONFIG_DUMP + 'RootDir "/srv/chroot";\n'
+        )
+        assert "/srv/chroot/var/lib/apt/lists/" == apt_config.lists_dir
+
+
+class TestGetAptConfig:
+    @mock.patch("uaclient.util.subp")
+    def test_apt_config_dump_is_read_once(self, m_subp):
+        apt.clear_apt_config_cache()
+        m_subp.return_value = (APT_CONFIG_DUMP, "")
+
+        assert "/var/lib/apt/lists/" == apt.get_apt_config().lists_dir
+        assert apt.get_apt_config() is apt.get_apt_config()
+        assert "/etc/apt/auth.conf.d/90ubuntu-advantage" == (
+            apt.get_apt_auth_file_from_apt_config()
+        )
+        assert [mock.call(["apt-config", "dump"])] == m_subp.call_args_list
+
+    @mock.patch("uaclient.util.subp")
+    def test_apt_defaults_when_apt_config_fails(self, m_subp):
+        apt.clear_apt_config_cache()
+        m_subp.side_effect = util.ProcessExecutionError("apt-config dump")
+
+        apt_config = apt.get_apt_config()
+        assert "/etc/apt/auth.conf.d/90ubuntu-advantage" == (
+            apt_config.auth_file
+        )
+        assert "/var/lib/apt/lists/" == apt_config.lists_dir
+
+
+RELEASE_TMPL = """\
+Origin: Ubuntu
+Suite: {suite}
+Date: {date}
+{valid_until}SHA256:
+ 0123 1024 main/binary-amd64/Packages
+"""
+
+
+class TestAreAptListsFresh:
+    @pytest.fixture
+    def apt_dirs(self, tmpdir):
+        sources_d = tmpdir.mkdir("sources.list.d")
+        lists_d = tmpdir.mkdir("lists")
+        apt_config = apt.AptConfig(
+            {
+                "Dir::Etc::sourcelist": tmpdir.join("sources.list").strpath,
+                "Dir::Etc::sourceparts": sources_d.strpath,
+                "Dir::State": tmpdir.strpath,
+                "Dir::State::lists": lists_d.strpath,
+            }
+        )
+        tmpdir.join("sources.list").write(
+            "# deb http://archive.ubuntu.com/ubuntu focal-proposed main\n"
+            "deb [arch=amd64] http://archive.ubuntu.com/ubuntu/ focal"
+            " main universe # comment\n"
+        )
+        sources_d.join("ubuntu-esm-infra.sources").write(
+            "Types: deb\n"
+            "URIs: https://esm.ubuntu.com/infra/ubuntu\n"
+            "Suites: focal-infra-security focal-infra-updates\n"
+            "Components: main\n"
+            "\n"
+            "Enabled: no\n"
+            "URIs: https://esm.ubuntu.com/apps/ubuntu\n"
+            "Suites: focal-apps-security\n"
+            "Components: main\n"
+        )
+        apt.setup_apt_lists_max_age(60, tmpdir.strpath)
+        with mock.patch("uaclient.apt._APT_CONFIG", apt_config):
+            yield sources_d, lists_d
+
+    def _write_lists(self, lists_d, prefix, suite, components, **kwargs):
+        release_file = lists_d.join(
+            "{}_dists_{}_InRelease".format(prefix, suite)
+        )
+        release_file.write(
+            RELEASE_TMPL.format(
+                suite=suite,
+                date=kwargs.get("date", "Thu, 23 Apr 2020 17:33:17 UTC"),
+                valid_until=kwargs.get("valid_until", ""),
+            )
+        )
+        for component in components:
+            lists_d.join(
+                "{}_dists_{}_{}_binary-amd64_Packages".format(
+                    prefix, suite, component
+                )
+            ).write("")
+        return release_file
+
+    def _write_all_lists(self, lists_d):
+        self._write_lists(
+            lists_d, "archive.ubuntu.com_ubuntu", "focal", ["main", "universe"]
+        )
+        for suite in ("focal-infra-security", "focal-infra-updates"):
+            self._write_lists(
+                lists_d, "esm.ubuntu.com_infra_ubuntu", suite, ["main"]
+            )
+
+    def _set_updated_at(self, release_file, updated_at):
+        updates = apt._load_apt_lists_updates()
+        updates[release_file.strpath] = updated_at
+        util.write_file(apt._APT_LISTS_UPDATED_PATH, json.dumps(updates))
+
+    def _age_sources(self, sources_d):
+        """Pretend the sources were last changed two hours ago."""
+        source_time = time.time() - 7200
+        for source_file in [sources_d.dirpath().join("sources.list")] + (
+            sources_d.listdir()
+        ):
+            os.utime(source_file.strpath, (source_time, source_time))
+
+    def _touch_update_success_stamp(self, sources_d, age=0):
+        """Act as apt's Post-Invoke-Success hook, age seconds ago."""
+        stamp = sources_d.dirpath().ensure("periodic", "update-success-stamp")
+        stamp_time = time.time() - age
+        os.utime(stamp.strpath, (stamp_time, stamp_time))
+        return stamp
+
+    @mock.patch("uaclient.apt.run_apt_command")
+    def test_fresh_when_lists_of_all_sources_were_just_updated(
+        self, _m_run_apt_command, apt_dirs
+    ):
+        _sources_d, lists_d = apt_dirs
+        self._write_all_lists(lists_d)
+        apt.run_apt_update_command()
+        assert apt.are_apt_lists_fresh()
+
+    def test_always_stale_when_max_age_is_zero(self, apt_dirs):
+        _sources_d, lists_d = apt_dirs
+        self._write_all_lists(lists_d)
+        apt._record_apt_lists_update(None)
+        apt.setup_apt_lists_max_age(0)
+        assert not apt.are_apt_lists_fresh()
+
+    def test_stale_when_lists_were_not_updated_by_uaclient(self, apt_dirs):
+        """Recent lists mtimes don't prove an apt-get update succeeded."""
+        _sources_d, lists_d = apt_dirs
+        self._write_all_lists(lists_d)
+        assert not apt.are_apt_lists_fresh()
+
+    @pytest.mark.parametrize(
+        "stamp_age,expected", ((30, True), (3600, False), (-3600, False))
+    )
+    def test_fresh_when_other_tools_updated_after_sources_changed(
+        self, stamp_age, expected, apt_dirs
+    ):
+        """apt's update-success-stamp counts for sources older than it."""
+        sources_d, lists_d = apt_dirs
+        self._write_all_lists(lists_d)
+        self._age_sources(sources_d)
+        self._touch_update_success_stamp(sources_d, stamp_age)
+        assert expected is apt.are_apt_lists_fresh()
+
+    def test_stale_when_a_source_changed_after_other_tools_updated(
+        self, apt_dirs
+    ):
+        sources_d, lists_d = apt_dirs
+        self._write_all_lists(lists_d)
+        self._touch_update_success_stamp(sources_d, 30)
+        assert not apt.are_apt_lists_fresh()
+
+    @mock.patch("uaclient.apt.run_apt_command")
+    def test_stale_when_update_failed(self, m_run_apt_command, apt_dirs):
+        _sources_d, lists_d = apt_dirs
+        self._write_all_lists(lists_d)
+        m_run_apt_command.side_effect = exceptions.UserFacingError("failed")
+        with pytest.raises(exceptions.UserFacingError):
+            apt.run_apt_update_command()
+        assert not apt.are_apt_lists_fresh()
+
+    @pytest.mark.parametrize(
+        "source",
+        (
+            "deb http://ppa.launchpad.net/a/b/ubuntu focal main",
+            "deb http://archive.ubuntu.com/ubuntu focal multiverse",
+            "deb file:/srv/repo ./",
+        ),
+    )
+    def test_stale_when_a_source_has_no_lists(self, source, apt_dirs):
+        """Sources added or changed since the last update need lists."""
+        sources_d, lists_d = apt_dirs
+        self._write_all_lists(lists_d)
+        apt._record_apt_lists_update(None)
+        sources_d.join("new.list").write(source + "\n")
+        assert not apt.are_apt_lists_fresh()
+
+    def test_stale_when_release_is_past_valid_until(self, apt_dirs):
+        _sources_d, lists_d = apt_dirs
+        self._write_all_lists(lists_d)
+        self._write_lists(
+            lists_d,
+            "esm.ubuntu.com_infra_ubuntu",
+            "focal-infra-updates",
+            ["main"],
+            valid_until="Valid-Until: Fri, 01 May 2020 17:33:17 UTC\n",
+        )
+        apt._record_apt_lists_update(None)
+        assert not apt.are_apt_lists_fresh()
+
+    @pytest.mark.parametrize(
+        "age,expected", ((3600, False), (30, True), (-3600, False))
+    )
+    def test_each_source_must_be_updated_within_max_age(
+        self, age, expected, apt_dirs
+    ):
+        """A single stale source is not hidden by fresher ones."""
+        _sources_d, lists_d = apt_dirs
+        self._write_all_lists(lists_d)
+        apt._record_apt_lists_update(None)
+        release_file = lists_d.join(
+            "esm.ubuntu.com_infra_ubuntu_dists_focal-infra-updates_InRelease"
+        )
+        self._set_updated_at(release_file, time.time() - age)
+        assert expected is apt.are_apt_lists_fresh()
+
+    @mock.patch("uaclient.apt.run_apt_command")
+    def test_restricted_update_only_records_its_sources(
+        self, _m_run_apt_command, apt_dirs
+    ):
+        sources_d, lists_d = apt_dirs
+        self._write_all_lists(lists_d)
+        self._age_sources(sources_d)
+        esm_sources = sources_d.join("ubuntu-esm-infra.sources")
+        # apt touches its update-success-stamp after restricted updates too
+        _m_run_apt_command.side_effect = lambda *args: (
+            self._touch_update_success_stamp(sources_d)
+        )
+        apt.run_apt_update_command([esm_sources.strpath])
+        assert not apt.are_apt_lists_fresh()
+
+        archive_release = lists_d.join(
+            "archive.ubuntu.com_ubuntu_dists_focal_InRelease"
+        )
+        self._set_updated_at(archive_release, time.time())
+        assert apt.are_apt_lists_fresh()
+
+
+class TestRunAptUpdateCommand:
+    @mock.patch("uaclient.apt.run_apt_command")
+    def test_full_update_without_source_files(self, m_run_apt_command):
+        apt.run_apt_update_command()
+        assert [
+            mock.call(["apt-get", "update"], status.MESSAGE_APT_UPDATE_FAILED)
+        ] == m_run_apt_command.call_args_list
+
+    @mock.patch("uaclient.apt.run_apt_command")
+    def test_update_restricted_to_source_files(
+        self, m_run_apt_command, tmpdir
+    ):
+        source_files = []
+        for name in ("ubuntu-esm-infra.list", "ubuntu-esm-apps.list"):
+            source_file = tmpdir.join(name)
+            source_file.write("deb http://{} xenial main\n".format(name))
+            source_files.append(source_file.strpath)
+
+        def fake_run_apt_command(cmd, error_msg):
+            sources_file = cmd[3].split("=", 1)[1]
+            sources_parts_dir = cmd[5].split("=", 1)[1]
+            assert not os.path.exists(sources_file)
+            assert ["ubuntu-esm-apps.list", "ubuntu-esm-infra.list"] == sorted(
+                os.listdir(sources_parts_dir)
+            )
+            return ""
+
+        m_run_apt_command.side_effect = fake_run_apt_command
+        apt.run_apt_update_command(source_files)
+        [call] = m_run_apt_command.call_args_list
+        cmd = call[0][0]
+        assert ["apt-get", "update", "-o"] == cmd[:3]
+        assert cmd[3].startswith("Dir::Etc::sourcelist=")
+        assert cmd[5].startswith("Dir::Etc::sourceparts=")
+        assert ["-o", "APT::Get::List-Cleanup=0"] == cmd[6:]
+
+
+class TestAptTransaction:
+    @mock.patch("uaclient.apt.run_apt_update_command")
+    def test_single_restricted_update_for_staged_sources(
+        self, m_update, tmpdir, capsys
+    ):
+        infra = tmpdir.join("ubuntu-esm-infra.list")
+        apps = tmpdir.join("ubuntu-esm-apps.list")
+        with apt.AptTransaction() as transaction:
+            assert transaction is apt.get_apt_transaction()
+            for source_file in (infra, apps):
+                apt.stage_apt_file(source_file.strpath)
+                source_file.write("deb http://example.com xenial main\n")
+            transaction.request_update("UA Infra: ESM", infra.strpath)
+            transaction.request_update("UA Apps: ESM", apps.strpath)
+            assert 0 == m_update.call_count
+
+        assert None is apt.get_apt_transaction()
+        assert [
+            mock.call([infra.strpath, apps.strpath])
+        ] == m_update.call_args_list
+        assert status.MESSAGE_APT_UPDATING_LISTS + "\n" == (
+            capsys.readouterr()[0]
+        )
+
+    @mock.patch("uaclient.apt.run_apt_update_command")
+    def test_full_update_when_any_service_needs_it(self, m_update, tmpdir):
+        infra = tmpdir.join("ubuntu-esm-infra.list")
+        infra.write("deb http://example.com xenial main\n")
+        with apt.AptTransaction() as transaction:
+            transaction.request_update("UA Infra: ESM", infra.strpath)
+            transaction.request_update("UA Apps: ESM")
+        assert [mock.call([])] == m_update.call_args_list
+
+    @mock.patch("uaclient.apt.are_apt_lists_fresh", return_value=True)
+    @mock.patch("uaclient.apt.run_apt_update_command")
+    def test_no_update_when_lists_of_staged_sources_are_fresh(
+        self, m_update, _m_lists_fresh, tmpdir
+    ):
+        """Sources removed by a service still need a full update."""
+        infra = tmpdir.join("ubuntu-esm-infra.list")
+        infra.write("deb http://example.com xenial main\n")
+        with apt.AptTransaction() as transaction:
+            transaction.request_update("UA Infra: ESM", infra.strpath)
+        assert 0 == m_update.call_count
+
+        with apt.AptTransaction() as transaction:
+            transaction.request_update("UA Apps: ESM")
+        assert [mock.call([])] == m_update.call_args_list
+
+    @mock.patch("uaclient.apt.run_apt_command")
+    def test_no_update_after_apt_update_run_by_other_tools(
+        self, m_run_apt_command, tmpdir
+    ):
+        """Lists fetched by apt update outside uaclient are reused."""
+        sources_d = tmpdir.mkdir("sources.list.d")
+        lists_d = tmpdir.mkdir("lists")
+        infra = sources_d.join("ubuntu-esm-infra.list")
+        infra.write("deb https://esm.ubuntu.com/infra/ubuntu xenial main\n")
+        prefix = "esm.ubuntu.com_infra_ubuntu_dists_xenial"
+        lists_d.join(prefix + "_InRelease").write("Suite: xenial\n")
+        lists_d.join(prefix + "_main_binary-amd64_Packages").write("")
+        source_time = time.time() - 7200
+        os.utime(infra.strpath, (source_time, source_time))
+        # As left by the apt update of some automation a minute ago
+        stamp = tmpdir.ensure("periodic", "update-success-stamp")
+        stamp_time = time.time() - 60
+        os.utime(stamp.strpath, (stamp_time, stamp_time))
+        apt_config = apt.AptConfig(
+            {
+                "Dir::Etc::sourcelist": tmpdir.join("sources.list").strpath,
+                "Dir::Etc::sourceparts": sources_d.strpath,
+                "Dir::State": tmpdir.strpath,
+                "Dir::State::lists": lists_d.strpath,
+            }
+        )
+        apt.setup_apt_lists_max_age(300, tmpdir.strpath)
+
+        with mock.patch("uaclient.apt._APT_CONFIG", apt_config):
+            with apt.AptTransaction() as transaction:
+                transaction.request_update("UA Infra: ESM", infra.strpath)
+        assert 0 == m_run_apt_command.call_count
+
+    @mock.patch("uaclient.apt.run_apt_update_command")
+    def test_no_update_when_nothing_requested(self, m_update):
+        with apt.AptTransaction():
+            pass
+        assert 0 == m_update.call_count
+
+    @mock.patch("uaclient.apt.run_apt_update_command")
+    def test_update_failure_rolls_back_all_staged_files(
+        self, m_update, tmpdir
+    ):
+        m_update.side_effect = exceptions.UserFacingError(
+            status.MESSAGE_APT_UPDATE_FAILED
+        )
+        auth_file = tmpdir.join("auth.conf")
+        auth_file.write("machine example.com/ login a password b\n")
+        auth_file.chmod(0o600)
+        new_source = tmpdir.join("ubuntu-cis.list")
+        hook = mock.Mock()
+
+        with pytest.raises(exceptions.UserFacingError) as excinfo:
+            with apt.AptTransaction() as transaction:
+                apt.stage_apt_file(auth_file.strpath)
+                auth_file.write("changed")
+                apt.stage_apt_file(auth_file.strpath)
+                apt.stage_apt_file(new_source.strpath)
+                new_source.write("deb http://example.com xenial main\n")
+                transaction.request_update("CIS Audit", new_source.strpath)
+                transaction.request_update("UA Infra: ESM")
+                apt.call_after_apt_update(hook, "arg")
+
+        assert (
+            "APT update failed.\nReverted APT configuration changes for:"
+            " CIS Audit, UA Infra: ESM"
+        ) == excinfo.value.msg
+        assert "machine example.com/ login a password b\n" == auth_file.read()
+        assert 0o600 == stat.S_IMODE(os.stat(auth_file.strpath).st_mode)
+        assert not new_source.exists()
+        assert 0 == hook.call_count
+
+    @mock.patch("uaclient.apt.run_apt_update_command")
+    def test_exceptions_roll_back_without_update(self, m_update, tmpdir):
+        new_source = tmpdir.join("ubuntu-cis.list")
+        with pytest.raises(KeyboardInterrupt):
+            with apt.AptTransaction() as transaction:
+                apt.stage_apt_file(new_source.strpath)
+                new_source.write("deb http://example.com xenial main\n")
+                transaction.request_update("CIS Audit", new_source.strpath)
+                raise KeyboardInterrupt()
+        assert not new_source.exists()
+        assert 0 == m_update.call_count
+        assert None is apt.get_apt_transaction()
+
+    @mock.patch("uaclient.apt.run_apt_update_command")
+    def test_explicit_update_commits_staged_files(self, m_update, tmpdir):
+        """Files staged before a successful update are not rolled back."""
+        committed = tmpdir.join("ubuntu-esm-infra.list")
+        staged = tmpdir.join("ubuntu-cis.list")
+        with pytest.raises(KeyboardInterrupt):
+            with apt.AptTransaction() as transaction:
+                apt.stage_apt_file(committed.strpath)
+                committed.write("deb http://example.com xenial main\n")
+                transaction.request_update("UA Infra: ESM", committed.strpath)
+                transaction.update()
+                apt.stage_apt_file(staged.strpath)
+                staged.write("deb http://example.com xenial main\n")
+                raise KeyboardInterrupt()
+        assert committed.exists()
+        assert not staged.exists()
+        assert [mock.call([committed.strpath])] == m_update.call_args_list
+
+    def test_commit_hooks_run_after_update(self):
+        calls = []
+
+        def fake_update(source_files):
+            calls.append("update")
+
+        with mock.patch(
+            "uaclient.apt.run_apt_update_command", side_effect=fake_update
+        ):
+            with apt.AptTransaction() as transaction:
+                transaction.request_update("UA Infra: ESM")
+                apt.call_after_apt_update(calls.append, "hook")
+                assert [] == calls
+        assert ["update", "hook"] == calls
+
+    def test_call_after_apt_update_outside_transaction_calls_now(self):
+        hook = mock.Mock()
+        apt.call_after_apt_update(hook, "arg")
+        assert [mock.call("arg")] == hook.call_args_list
+
+    @mock.patch("uaclient.apt.run_apt_update_command")
+    def test_nested_transactions_join_the_outer_transaction(self, m_update):
+        with apt.AptTransaction() as transaction:
+            with apt.AptTransaction() as nested:
+                assert transaction is nested
+                nested.request_update("UA Infra: ESM")
+            assert transaction is apt.get_apt_transaction()
+            assert 0 == m_update.call_count
+        assert [mock.call([])] == m_update.call_args_list
+
+
+NONINTERACTIVE_ENV = {"DEBIAN_FRONTEND": "noninteractive"}
+NONINTERACTIVE_OPTS = ['-o Dpkg::Options::="--force-confold"']
+
+
+class TestAptTransactionInstallPlan:
+    @mock.patch("uaclient.apt.run_apt_update_command")
+    @mock.patch("uaclient.apt.run_apt_command")
+    def test_merge_installs_sharing_apt_options(
+        self, m_run_apt_command, m_update, capsys
+    ):
+        with apt.AptTransaction() as transaction:
+            transaction.add_prerequisites(["ca-certificates"])
+            transaction.add_prerequisites(["ca-certificates"])
+            transaction.request_update("CIS Audit")
+            transaction.add_install(
+                "CIS Audit",
+                ["usg-cisbenchmark", "usg-common"],
+                "Could not enable CIS Audit.",
+                env=NONINTERACTIVE_ENV,
+                apt_options=NONINTERACTIVE_OPTS,
+            )
+            transaction.add_install(
+                "FIPS",
+                ["ubuntu-fips", "usg-common"],
+                "Could not enable FIPS.",
+                env=NONINTERACTIVE_ENV,
+                apt_options=NONINTERACTIVE_OPTS,
+            )
+            transaction.add_install(
+                "CC EAL2", ["ubuntu-commoncriteria"], "Could not enable CC."
+            )
+
+        assert [
+            mock.call(
+                ["apt-get", "install", "--assume-yes", "ca-certificates"],
+                status.MESSAGE_APT_INSTALL_FAILED,
+            ),
+            mock.call(
+                ["apt-get", "install", "--assume-yes"]
+                + NONINTERACTIVE_OPTS
+                + ["usg-cisbenchmark", "usg-common", "ubuntu-fips"],
+                "Could not enable CIS Audit.",
+                env=NONINTERACTIVE_ENV,
+            ),
+            mock.call(
+                [
+                    "apt-get",
+                    "install",
+                    "--assume-yes",
+                    "ubuntu-commoncriteria",
+                ],
+                "Could not enable CC.",
+                env={},
+            ),
+        ] == m_run_apt_command.call_args_list
+        assert [mock.call([])] == m_update.call_args_list
+        assert (
+            "Installing prerequisites: ca-certificates\n"
+            "Updating package lists\n"
+            "Installing CIS Audit packages\n"
+            "Installing FIPS packages\n"
+            "Installing CC EAL2 packages\n"
+        ) == capsys.readouterr()[0]
+
+    @mock.patch("uaclient.apt.run_apt_update_command")
+    @mock.patch("uaclient.apt.run_apt_command")
+    def test_merged_install_failure_is_attributed_to_service(
+        self, m_run_apt_command, _m_update
+    ):
+        def fake_run_apt_command(cmd, error_msg, env=None):
+            if "ubuntu-fips" in cmd:
+                raise exceptions.UserFacingError(error_msg)
+
+        m_run_apt_command.side_effect = fake_run_apt_command
+        cis_cleanup = mock.Mock()
+        fips_cleanup = mock.Mock()
+        hook = mock.Mock()
+
+        with pytest.raises(exceptions.UserFacingError) as excinfo:
+            with apt.AptTransaction() as transaction:
+                transaction.add_install(
+                    "CIS Audit",
+                    ["usg-cisbenchmark"],
+                    "Could not enable CIS Audit.",
+                    cleanup=cis_cleanup,
+                )
+                transaction.add_install(
+                    "FIPS",
+                    ["ubuntu-fips"],
+                    "Could not enable FIPS.",
+                    cleanup=fips_cleanup,
+                )
+                apt.call_after_apt_update(hook)
+
+        assert "Could not enable FIPS." == excinfo.value.msg
+        install_cmds = [c[0][0][3:] for c in m_run_apt_command.call_args_list]
+        assert [
+            ["usg-cisbenchmark", "ubuntu-fips"],
+            ["usg-cisbenchmark"],
+            ["ubuntu-fips"],
+        ] == install_cmds
+        assert 0 == cis_cleanup.call_count
+        assert 1 == fips_cleanup.call_count
+        assert 1 == hook.call_count
+
+    @mock.patch("uaclient.apt.run_apt_update_command")
+    @mock.patch("uaclient.apt.run_apt_command")
+    def test_service_hooks_only_run_for_installed_services(
+        self, m_run_apt_command, _m_update
+    ):
+        def fake_run_apt_command(cmd, error_msg, env=None):
+            if "ubuntu-fips" in cmd:
+                raise exceptions.UserFacingError(error_msg)
+
+        m_run_apt_command.side_effect = fake_run_apt_command
+        calls = []
+
+        with pytest.raises(exceptions.UserFacingError):
+            with apt.AptTransaction() as transaction:
+                transaction.add_install(
+                    "CIS Audit", ["usg-cisbenchmark"], "Failed CIS Audit."
+                )
+                transaction.add_install("FIPS", ["ubuntu-fips"], "Failed.")
+                for service in ("CIS Audit", "FIPS"):
+                    assert apt.call_after_service_committed(
+                        service, calls.append, service
+                    )
+                assert [] == calls
+        assert ["CIS Audit"] == calls
+
+    def test_service_hooks_outside_transaction_return_result_now(self):
+        hook = mock.Mock(return_value=False)
+        assert not apt.call_after_service_committed("FIPS", hook, "arg")
+        assert [mock.call("arg")] == hook.call_args_list
+
+    @mock.patch("uaclient.apt.run_apt_update_command")
+    @mock.patch("uaclient.apt.run_apt_command")
+    def test_prerequisites_failure_rolls_back_without_update(
+        self, m_run_apt_command, m_update, tmpdir
+    ):
+        m_run_apt_command.side_effect = exceptions.UserFacingError(
+            status.MESSAGE_APT_INSTALL_FAILED
+        )
+        source = tmpdir.join("ubuntu-cis.list")
+        with pytest.raises(exceptions.UserFacingError) as excinfo:
+            with apt.AptTransaction() as transaction:
+                apt.stage_apt_file(source.strpath)
+                source.write("deb http://example.com xenial main\n")
+                transaction.add_prerequisites(["apt-transport-https"])
+                transaction.request_update("CIS Audit", source.strpath)
+                transaction.add_install("CIS Audit", ["pkg"], "Failed.")
+
+        assert (
+            "APT install failed.\n"
+            "Reverted APT configuration changes for: CIS Audit"
+        ) == excinfo.value.msg
+        assert not source.exists()
+        assert 0 == m_update.call_count
+        assert 1 == m_run_apt_command.call_count
+
+
+class TestAptCredentialsCache:
+    @pytest.fixture
+    def cache_file(self, tmpdir):
+        return tmpdir.join("private", "apt-credentials.json").strpath
+
+    def test_records_hashed_credentials_only(self, cache_file):
+        cache = apt.AptCredentialsCache(cache_file, ttl=60)
+        assert not cache.is_valid("http://repo", "bearer", "s3cr3t")
+        cache.add("http://repo", "bearer", "s3cr3t")
+        assert cache.is_valid("http://repo", "bearer", "s3cr3t")
+        assert not cache.is_valid("http://repo", "bearer", "other")
+        assert not cache.is_valid("http://other", "bearer", "s3cr3t")
+
+        content = util.load_file(cache_file)
+        assert "s3cr3t" not in content
+        assert 0o600 == stat.S_IMODE(os.stat(cache_file).st_mode)
+        assert 0o700 == stat.S_IMODE(
+            os.stat(os.path.dirname(cache_file)).st_mode
+        )
+
+    def test_new_credentials_replace_previous_ones_of_repo(self, cache_file):
+        cache = apt.AptCredentialsCache(cache_file, ttl=60)
+        cache.add("http://repo", "bearer", "old")
+        cache.add("http://other", "bearer", "old")
+        cache.add("http://repo", "bearer", "new")
+        assert not cache.is_valid("http://repo", "bearer", "old")
+        assert cache.is_valid("http://repo", "bearer", "new")
+        assert cache.is_valid("http://other", "bearer", "old")
+
+    @mock.patch("uaclient.apt.time.time")
+    def test_entries_expire_after_ttl(self, m_time, cache_file):
+        cache = apt.AptCredentialsCache(cache_file, ttl=60)
+        m_time.return_value = 1000.0
+        cache.add("http://repo", "bearer", "token")
+        m_time.return_value = 1059.0
+        assert cache.is_valid("http://repo", "bearer", "token")
+        m_time.return_value = 1060.0
+        assert not cache.is_valid("http://repo", "bearer", "token")
+
+    def test_zero_ttl_disables_the_cache(self, cache_file):
+        cache = apt.AptCredentialsCache(cache_file, ttl=0)
+        cache.add("http://repo", "bearer", "token")
+        assert not os.path.exists(cache_file)
+        assert not cache.is_valid("http://repo", "bearer", "token")
+
+    @pytest.mark.parametrize("content", ("", "[]", "{invalid"))
+    def test_ignores_unreadable_cache_file(self, content, cache_file):
+        os.makedirs(os.path.dirname(cache_file))
+        util.write_file(cache_file, content)
+        cache = apt.AptCredentialsCache(cache_file, ttl=60)
+        assert not cache.is_valid("http://repo", "bearer", "token")
+        cache.add("http://repo", "bearer", "token")
+        assert cache.is_valid("http://repo", "bearer", "token")
+
+    def test_concurrent_instances_keep_all_entries(self, cache_file):
+        """Each service thread uses its own instance of the same file."""
+        repos = ["http://repo{}".format(idx) for idx in range(20)]
+        threads = [
+            threading.Thread(
+                target=apt.AptCredentialsCache(cache_file, ttl=60).add,
+                args=(repo, "bearer", "token"),
+            )
+            for repo in repos
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        cache = apt.AptCredentialsCache(cache_file, ttl=60)
+        for repo in repos:
+            assert cache.is_valid(repo, "bearer", "token")
+
+
+class TestAptTransactionCredentials:
+    @mock.patch("uaclient.apt.run_apt_update_command")
+    @mock.patch("uaclient.apt.add_auth_apt_repo")
+    @mock.patch("uaclient.apt.assert_valid_apt_credentials")
+    def test_credentials_are_validated_concurrently(
+        self, m_assert_valid, m_add_auth_apt_repo, _m_update
+    ):
+        """A slow validation doesn't hold up staging the next services."""
+        both_started = threading.Barrier(2, timeout=5)
+
+        def fake_assert_valid(repo_url, username, password, cache):
+            both_started.wait()
+
+        m_assert_valid.side_effect = fake_assert_valid
+        with apt.AptTransaction() as transaction:
+            for name in ("esm-infra", "esm-apps"):
+                transaction.add_auth_apt_repo(
+                    name,
+                    "/etc/apt/sources.list.d/ubuntu-{}.list".format(name),
+                    "https://{}.example.com/".format(name),
+                    "user:pwd",
+                    ["xenial"],
+                    "{}.gpg".format(name),
+                )
+            assert 0 == m_add_auth_apt_repo.call_count
+
+        assert [
+            mock.call("https://esm-infra.example.com", "user", "pwd", None),
+            mock.call("https://esm-apps.example.com", "user", "pwd", None),
+        ] == m_assert_valid.call_args_list
+        assert ["ubuntu-esm-infra.list", "ubuntu-esm-apps.list"] == [
+            os.path.basename(call[1]["repo_filename"])
+            for call in m_add_auth_apt_repo.call_args_list
+        ]
+
+    @mock.patch("uaclient.apt.run_apt_update_command")
+    @mock.patch("uaclient.apt.add_auth_apt_repo")
+    @mock.patch("uaclient.apt.assert_valid_apt_credentials")
+    def test_service_hooks_skipped_on_invalid_credentials(
+        self, m_assert_valid, m_add_auth_apt_repo, _m_update
+    ):
+        def fake_assert_valid(repo_url, username, password, cache):
+            if "esm-apps" in repo_url:
+                raise exceptions.UserFacingError("Invalid esm-apps token")
+
+        m_assert_valid.side_effect = fake_assert_valid
+        calls = []
+        with pytest.raises(exceptions.UserFacingError) as excinfo:
+            with apt.AptTransaction() as transaction:
+                for name in ("esm-infra", "esm-apps"):
+                    transaction.add_auth_apt_repo(
+                        name,
+                        "/etc/apt/sources.list.d/ubuntu-{}.list".format(name),
+                        "https://{}.example.com/".format(name),
+                        "user:pwd",
+                        ["xenial"],
+                        "{}.gpg".format(name),
+                    )
+                    apt.call_after_service_committed(name, calls.append, name)
+
+        assert "Invalid esm-apps token" == excinfo.value.msg
+        assert ["esm-infra"] == calls
+        assert 1 == m_add_auth_apt_repo.call_count
@@ -518,6 +518,40 @@ class TestMain:
         error_log = caplog_text()
         assert expected_log in error_log
 
+    @pytest.mark.parametrize(
+        "exception", (None, UserFacingError("error"), KeyboardInterrupt)
+    )
+    @mock.patch(M_PATH_UACONFIG + "flush_notices")
+    @mock.patch("uaclient.cli.setup_logging")
+    @mock.patch("uaclient.cli.get_parser")
+    def test_notices_flushed_once_after_lock_is_cleared(
+        self,
+        m_get_parser,
+        _m_setup_logging,
+        m_flush_notices,
+        logging_sandbox,
+        exception,
+    ):
+        calls = []
+        m_clear_lock = mock.Mock(side_effect=lambda key: calls.append(key))
+        m_flush_notices.side_effect = lambda: calls.append("flush")
+
+        def action(args, cfg):
+            if exception:
+                raise exception
+            return 0
+
+        m_get_parser.return_value.parse_args.return_value.action = action
+
+        if exception:
+            with mock.patch("uaclient.cli._CLEAR_LOCK_FILE", m_clear_lock):
+                with pytest.raises(SystemExit):
+                    main(["some", "args"])
+            assert ["lock", "flush"] == calls
+        else:
+            assert 0 == main(["some", "args"])
+            assert ["flush"] == calls
+
     @pytest.mark.parametrize(
         "exception,expected_exit_code",
         [
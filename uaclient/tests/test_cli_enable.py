@@ -6,7 +6,9 @@ import textwrap
 import pytest
 
 from uaclient.cli import _perform_enable, action_enable, main
+from uaclient import apt
 from uaclient import entitlements
+from uaclient.entitlements.repo import handle_message_operations
 from uaclient import exceptions
 from uaclient import status
 
@@ -336,6 +338,45 @@ class TestActionEnable:
         assert beta_count == m_ent2_is_beta.call_count
         assert beta_count == m_ent3_is_beta.call_count
 
+    @mock.patch("uaclient.contract.get_available_resources", return_value={})
+    @mock.patch("uaclient.cli.entitlements")
+    def test_failed_deferred_post_enable_messaging_returns_one(
+        self,
+        m_entitlements,
+        _m_get_available_resources,
+        _m_request_updated_contract,
+        m_getuid,
+        FakeConfig,
+    ):
+        """Fail when post_enable messaging fails once apt changes apply."""
+        m_getuid.return_value = 0
+
+        def fake_enable(silent_if_inapplicable):
+            return apt.call_after_service_committed(
+                "Ent1",
+                handle_message_operations,
+                ["post1", (lambda: False, {}), "post2"],
+            )
+
+        m_ent1_cls = mock.Mock()
+        type(m_ent1_cls).is_beta = mock.PropertyMock(return_value=False)
+        m_ent1_cls.return_value.enable.side_effect = fake_enable
+        m_entitlements.ENTITLEMENT_CLASS_BY_NAME = {"ent1": m_ent1_cls}
+
+        cfg = FakeConfig.for_attached_machine()
+        args_mock = mock.Mock()
+        args_mock.service = ["ent1"]
+        args_mock.assume_yes = False
+        args_mock.beta = False
+
+        fake_stdout = io.StringIO()
+        with contextlib.redirect_stdout(fake_stdout):
+            assert 1 == action_enable(args_mock, cfg)
+        assert (
+            "One moment, checking your subscription first\npost1\n"
+            == fake_stdout.getvalue()
+        )
+
     @pytest.mark.parametrize(
         "service, beta",
         ((["bogus"], False), (["bogus"], True), (["bogus1", "bogus2"], False)),
@@ -11,17 +11,21 @@ M_PATH = "uaclient.cli."
 
 HELP_OUTPUT = textwrap.dedent(
     """\
-usage: ua fix <CVE-yyyy-nnnn+>|<USN-nnnn-d+> [flags]
+usage: ua fix <CVE-yyyy-nnnn+>|<USN-nnnn-d+> ... [flags]
 
 Inspect and resolve CVEs and USNs (Ubuntu Security Notices) on this machine.
 
 positional arguments:
-  security_issue  Security vulnerability ID to inspect and resolve on this
-                  system. Format: CVE-yyyy-nnnn, CVE-yyyy-nnnnnnn or USN-nnnn-
-                  dd
+  security_issue    Security vulnerability ID to inspect and resolve on this
+                    system. Format: CVE-yyyy-nnnn, CVE-yyyy-nnnnnnn or USN-
+                    nnnn-dd. Packages fixing multiple IDs are upgraded at once
 
 Flags:
-  -h, --help      show this help message and exit
+  -h, --help        show this help message and exit
+  --from-file FILE  also fix the IDs listed in FILE, separated by whitespace.
+                    Text after # is ignored. Use - to read from stdin
+  --offline         answer from the security data imported by ua import-
+                    security-data instead of querying ubuntu.com/security
 """
 )
 
@@ -59,11 +63,13 @@ class TestActionFix:
     ):
         """Check that root and non-root will emit attached status"""
         cfg = FakeConfig()
-        args = mock.MagicMock(security_issue=issue)
+        args = mock.MagicMock(
+            security_issue=[issue], from_file=None, offline=False
+        )
         if is_valid:
             assert 0 == action_fix(args, cfg)
             assert [
-                mock.call(cfg, issue)
+                mock.call(cfg, issue, client=mock.ANY)
             ] == m_fix_security_issue_id.call_args_list
         else:
             with pytest.raises(exceptions.UserFacingError) as excinfo:
@@ -76,3 +82,76 @@ class TestActionFix:
 
             assert expected_msg == str(excinfo.value)
             assert 0 == m_fix_security_issue_id.call_count
+
+    @mock.patch("uaclient.security.fix_security_issue_ids")
+    @mock.patch("uaclient.security.fix_security_issue_id")
+    def test_multiple_issues_fixed_together(
+        self, m_fix_security_issue_id, m_fix_security_issue_ids, FakeConfig
+    ):
+        cfg = FakeConfig()
+        m_fix_security_issue_ids.return_value = True
+        args = mock.MagicMock(
+            security_issue=["CVE-2020-1472", "USN-4510-1"],
+            from_file=None,
+            offline=False,
+        )
+        assert 0 == action_fix(args, cfg)
+        assert [
+            mock.call(cfg, ["CVE-2020-1472", "USN-4510-1"], client=mock.ANY)
+        ] == m_fix_security_issue_ids.call_args_list
+        assert 0 == m_fix_security_issue_id.call_count
+
+        m_fix_security_issue_ids.return_value = False
+        assert 1 == action_fix(args, cfg)
+
+    @mock.patch("uaclient.security.fix_security_issue_ids")
+    def test_issues_read_from_file(
+        self, m_fix_security_issue_ids, FakeConfig, tmpdir
+    ):
+        issues_file = tmpdir.join("issues")
+        issues_file.write(
+            "# Patch Tuesday\nCVE-2020-1472 cve-2020-1473\n\nUSN-4510-1 # s\n"
+        )
+        cfg = FakeConfig()
+        args = mock.MagicMock(
+            security_issue=["USN-4511-1"],
+            from_file=issues_file.strpath,
+            offline=False,
+        )
+        assert 0 == action_fix(args, cfg)
+        assert [
+            mock.call(
+                cfg,
+                ["USN-4511-1", "CVE-2020-1472", "cve-2020-1473", "USN-4510-1"],
+                client=mock.ANY,
+            )
+        ] == m_fix_security_issue_ids.call_args_list
+
+    @pytest.mark.parametrize(
+        "security_issue,from_file,expected_msg",
+        (
+            ([], None, 'Usage: "ua fix CVE-yyyy-nnnn" or "ua fix USN-nnnn"'),
+            ([], "/nonexistent", "Error: unable to read /nonexistent"),
+            (
+                ["CVE-2020-1472", "CVE-1"],
+                None,
+                'Error: issue "CVE-1" is not recognized.',
+            ),
+        ),
+    )
+    @mock.patch("uaclient.security.fix_security_issue_ids")
+    def test_invalid_issues_error(
+        self,
+        m_fix_security_issue_ids,
+        security_issue,
+        from_file,
+        expected_msg,
+        FakeConfig,
+    ):
+        args = mock.MagicMock(
+            security_issue=security_issue, from_file=from_file, offline=False
+        )
+        with pytest.raises(exceptions.UserFacingError) as excinfo:
+            action_fix(args, FakeConfig())
+        assert expected_msg in excinfo.value.msg
+        assert 0 == m_fix_security_issue_ids.call_count
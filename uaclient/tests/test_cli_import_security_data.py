@@ -0,0 +1,71 @@
+import json
+import mock
+import textwrap
+
+import pytest
+
+from uaclient import exceptions
+from uaclient.cli import action_import_security_data, main
+
+M_PATH = "uaclient.cli."
+
+HELP_OUTPUT = textwrap.dedent(
+    """\
+usage: ua import-security-data <file> [<file> ...] [flags]
+
+Import CVEs and USNs exported from the Ubuntu Security API for ua fix
+--offline. The imported data replaces any previous import.
+
+positional arguments:
+  file        JSON file of Security API CVEs and USNs, as an object with cves
+              and notices lists or a list of CVEs and USNs
+
+Flags:
+  -h, --help  show this help message and exit
+"""
+)
+
+
+@mock.patch(M_PATH + "os.getuid", return_value=0)
+class TestActionImportSecurityData:
+    def test_import_security_data_help(self, _getuid, capsys):
+        with pytest.raises(SystemExit):
+            with mock.patch(
+                "sys.argv", ["/usr/bin/ua", "import-security-data", "--help"]
+            ):
+                main()
+        out, _err = capsys.readouterr()
+        assert HELP_OUTPUT == out
+
+    def test_non_root_users_are_rejected(self, getuid, FakeConfig):
+        getuid.return_value = 1
+        with pytest.raises(exceptions.NonRootUserError):
+            action_import_security_data(mock.MagicMock(), FakeConfig())
+
+    def test_import_security_data(self, _getuid, FakeConfig, tmpdir, capsys):
+        export = tmpdir.join("export.json")
+        export.write(
+            json.dumps(
+                {
+                    "cves": [{"id": "CVE-2020-1472"}],
+                    "notices": [{"id": "USN-4510-1"}, {"id": "USN-4510-2"}],
+                }
+            )
+        )
+        cfg = FakeConfig()
+        args = mock.MagicMock(files=[export.strpath])
+        assert 0 == action_import_security_data(args, cfg)
+
+        out, _err = capsys.readouterr()
+        assert "Imported 1 CVEs and 2 USNs for ua fix --offline.\n" == out
+        assert tmpdir.join(
+            "security-dataset", "notices", "USN-4510-2.json"
+        ).exists()
+
+    def test_invalid_security_data_errors(self, _getuid, FakeConfig, tmpdir):
+        export = tmpdir.join("export.json")
+        export.write("<html>")
+        args = mock.MagicMock(files=[export.strpath])
+        with pytest.raises(exceptions.UserFacingError) as excinfo:
+            action_import_security_data(args, FakeConfig())
+        assert "Unable to read security data from" in excinfo.value.msg
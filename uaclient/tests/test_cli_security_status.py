@@ -0,0 +1,49 @@
+import mock
+import textwrap
+
+import pytest
+
+from uaclient.cli import action_security_status, main
+
+M_PATH = "uaclient.cli."
+
+HELP_OUTPUT = textwrap.dedent(
+    """\
+usage: ua security-status [flags]
+
+List the USNs (Ubuntu Security Notices) with released fixes which are not
+installed on this machine.
+
+Flags:
+  -h, --help  show this help message and exit
+  --offline   answer from the security data imported by ua import-security-
+              data instead of querying ubuntu.com/security
+"""
+)
+
+
+class TestActionSecurityStatus:
+    def test_security_status_help(self, capsys):
+        with pytest.raises(SystemExit):
+            with mock.patch(
+                "sys.argv", ["/usr/bin/ua", "security-status", "--help"]
+            ):
+                main()
+        out, _err = capsys.readouterr()
+        assert HELP_OUTPUT == out
+
+    @pytest.mark.parametrize("offline", (True, False))
+    @mock.patch(M_PATH + "security.print_security_status")
+    @mock.patch(M_PATH + "security.get_security_client")
+    def test_security_status_prints_outstanding_usns(
+        self, m_get_client, m_print_status, offline, FakeConfig
+    ):
+        cfg = FakeConfig()
+        args = mock.MagicMock(offline=offline)
+        m_print_status.return_value = 2
+
+        assert 0 == action_security_status(args, cfg)
+        assert [mock.call(cfg, offline=offline)] == m_get_client.call_args_list
+        assert [
+            mock.call(cfg, client=m_get_client.return_value)
+        ] == m_print_status.call_args_list
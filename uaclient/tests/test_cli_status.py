@@ -2,12 +2,14 @@ import io
 import json
 import mock
 import os
+import posix
 import socket
 import sys
 import textwrap
 
 import pytest
 
+from uaclient import entitlements
 from uaclient import util
 
 from uaclient.cli import action_status, main
@@ -413,3 +415,62 @@ class TestActionStatus:
 
         expected_out = ATTACHED_STATUS.format(dash=expected_dash, notices="")
         assert expected_out == out
+
+    @mock.patch("uaclient.util.os.uname")
+    @mock.patch("uaclient.util.parse_os_release")
+    @mock.patch("uaclient.util.subp")
+    def test_arch_is_probed_once_per_command(
+        self,
+        m_subp,
+        m_parse_os_release,
+        m_uname,
+        _m_getuid,
+        _m_get_avail_resources,
+        _m_should_reboot,
+        _m_remove_notice,
+        FakeConfig,
+    ):
+        """Every entitled service reads the same PlatformInfo snapshot."""
+        m_subp.side_effect = lambda cmd, *args, **kwargs: (
+            ("amd64\n", "") if cmd[0] == "dpkg" else ("", "")
+        )
+        m_parse_os_release.return_value = {
+            "NAME": "Ubuntu",
+            "VERSION": "20.04 LTS (Focal Fossa)",
+        }
+        m_uname.return_value = posix.uname_result(
+            ("", "", "5.4.0-42-generic", "", "x86_64")
+        )
+        machine_token = {
+            "availableResources": [
+                {"name": ent_cls.name, "available": True}
+                for ent_cls in entitlements.ENTITLEMENT_CLASSES
+            ],
+            "machineToken": "not-null",
+            "machineTokenInfo": {
+                "accountInfo": {"id": "acct-1", "name": "test_account"},
+                "contractInfo": {
+                    "id": "cid",
+                    "name": "test_contract",
+                    "resourceEntitlements": [
+                        {"type": ent_cls.name, "entitled": True}
+                        for ent_cls in entitlements.ENTITLEMENT_CLASSES
+                    ],
+                },
+            },
+        }
+        cfg = FakeConfig.for_attached_machine(machine_token=machine_token)
+
+        with mock.patch(
+            "uaclient.util.get_platform_info", wraps=util.get_platform_info
+        ) as m_get_platform_info:
+            assert 0 == action_status(mock.MagicMock(all=True), cfg)
+
+        assert m_get_platform_info.call_count > len(
+            entitlements.ENTITLEMENT_CLASSES
+        )
+        assert [mock.call(["dpkg", "--print-architecture"])] == [
+            call
+            for call in m_subp.call_args_list
+            if call[0][0] == ["dpkg", "--print-architecture"]
+        ]
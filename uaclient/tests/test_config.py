@@ -9,7 +9,7 @@ import stat
 import mock
 import pytest
 
-from uaclient import entitlements, exceptions, status
+from uaclient import entitlements, exceptions, status, util
 from uaclient.config import (
     DataPath,
     DEFAULT_STATUS,
@@ -70,6 +70,8 @@ class TestNotices:
         assert None is cfg.read_cache("notices")
         for notice in notices:
             cfg.add_notice(*notice)
+        assert expected == cfg.notices
+        cfg.flush_notices()
         if notices:
             assert expected == cfg.read_cache("notices")
         else:
@@ -96,8 +98,49 @@ class TestNotices:
             cfg.add_notice(*notice)
         for label, descr in removes:
             cfg.remove_notice(label, descr)
+        assert (expected or []) == cfg.notices
+        cfg.flush_notices()
         assert expected == cfg.read_cache("notices")
 
+    def test_notices_are_loaded_and_written_once(self, tmpdir):
+        cfg = UAConfig({"data_dir": tmpdir.strpath})
+        cfg.write_cache("notices", [["a", "a1"]])
+        cfg = UAConfig({"data_dir": tmpdir.strpath})
+        with mock.patch.object(
+            cfg, "read_cache", wraps=cfg.read_cache
+        ) as m_read_cache:
+            with mock.patch.object(
+                cfg, "write_cache", wraps=cfg.write_cache
+            ) as m_write_cache:
+                cfg.add_notice("b", "b1")
+                cfg.remove_notice("a", ".*")
+                cfg.add_notice("c", "c1")
+                cfg.remove_notice("", "nothing")
+                cfg.flush_notices()
+                cfg.flush_notices()
+        assert [mock.call("notices")] == m_read_cache.call_args_list
+        assert [
+            mock.call("notices", [["b", "b1"], ["c", "c1"]])
+        ] == m_write_cache.call_args_list
+
+    def test_flush_removes_notices_file_once_empty(self, tmpdir):
+        cfg = UAConfig({"data_dir": tmpdir.strpath})
+        cfg.add_notice("a", "a1")
+        cfg.flush_notices()
+        cfg.remove_notice("a", "a1")
+        assert os.path.exists(cfg.data_path("notices"))
+        cfg.flush_notices()
+        assert not os.path.exists(cfg.data_path("notices"))
+
+    def test_lock_notice_is_written_immediately(self, tmpdir):
+        cfg = UAConfig({"data_dir": tmpdir.strpath})
+        cfg.write_cache("lock", "123:ua enable")
+        assert [["", "Operation in progress: ua enable"]] == UAConfig(
+            {"data_dir": tmpdir.strpath}
+        ).notices
+        cfg.delete_cache_key("lock")
+        assert [] == cfg.notices
+
 
 class TestEntitlements:
     def test_entitlements_property_keyed_by_entitlement_name(self, tmpdir):
@@ -322,6 +365,46 @@ class TestWriteCache:
         with open(cfg.data_path(key)) as f:
             assert dt.isoformat() == f.read().strip('"')
 
+    def test_identical_content_is_not_rewritten(self, tmpdir):
+        cfg = UAConfig({"data_dir": tmpdir.strpath})
+        cfg.write_cache("status-cache", {"attached": False})
+        with mock.patch(
+            "uaclient.config.util.atomic_write_file",
+            wraps=util.atomic_write_file,
+        ) as m_write:
+            cfg.write_cache("status-cache", {"attached": False})
+            UAConfig({"data_dir": tmpdir.strpath}).write_cache(
+                "status-cache", {"attached": False}
+            )
+            assert 0 == m_write.call_count
+            cfg.write_cache("status-cache", {"attached": True})
+            assert 1 == m_write.call_count
+        assert {"attached": True} == cfg.read_cache("status-cache")
+
+    @pytest.mark.parametrize("change", ("content", "mode", "delete"))
+    def test_externally_changed_file_is_rewritten(self, change, tmpdir):
+        cfg = UAConfig({"data_dir": tmpdir.strpath})
+        cfg.write_cache("status-cache", "content")
+        cache_path = cfg.data_path("status-cache")
+        if change == "content":
+            with open(cache_path, "w") as stream:
+                stream.write("changed content")
+        elif change == "mode":
+            os.chmod(cache_path, 0o600)
+        else:
+            cfg.delete_cache_key("status-cache")
+        cfg.write_cache("status-cache", "content")
+        assert "content" == cfg.read_cache("status-cache")
+        assert 0o644 == stat.S_IMODE(os.lstat(cache_path).st_mode)
+
+    @mock.patch("uaclient.config.util.atomic_write_file")
+    def test_writes_are_atomic(self, m_write, tmpdir):
+        cfg = UAConfig({"data_dir": tmpdir.strpath})
+        cfg.write_cache("status-cache", "content")
+        assert [
+            mock.call(cfg.data_path("status-cache"), "content", mode=0o644)
+        ] == m_write.call_args_list
+
 
 class TestReadCache:
     @pytest.mark.parametrize("key,path_basename", KNOWN_DATA_PATHS)
@@ -1192,6 +1275,46 @@ class TestFeatures:
             assert warnings in caplog_text()
 
 
+class TestAptCredentialsTTL:
+    @pytest.mark.parametrize("caplog_text", [logging.WARNING], indirect=True)
+    @pytest.mark.parametrize(
+        "cfg_ttl,expected,warning",
+        (
+            (None, 6 * 60 * 60, False),
+            (0, 0, False),
+            ("600", 600, False),
+            ("soon", 6 * 60 * 60, True),
+        ),
+    )
+    def test_apt_credentials_ttl(
+        self, cfg_ttl, expected, warning, caplog_text
+    ):
+        user_cfg = {}
+        if cfg_ttl is not None:
+            user_cfg["apt_credentials_ttl"] = cfg_ttl
+        cfg = UAConfig(cfg=user_cfg)
+        assert expected == cfg.apt_credentials_ttl
+        assert warning == ("Invalid apt_credentials_ttl" in caplog_text())
+
+    @pytest.mark.parametrize(
+        "cfg_ttl,expected", ((None, 60 * 60), (0, 0), ("600", 600))
+    )
+    def test_security_api_cache_ttl(self, cfg_ttl, expected):
+        user_cfg = {}
+        if cfg_ttl is not None:
+            user_cfg["security_api_cache_ttl"] = cfg_ttl
+        assert expected == UAConfig(cfg=user_cfg).security_api_cache_ttl
+
+    @pytest.mark.parametrize(
+        "cfg_max_age,expected", ((None, 15 * 60), (0, 0), ("60", 60))
+    )
+    def test_apt_lists_max_age(self, cfg_max_age, expected):
+        user_cfg = {}
+        if cfg_max_age is not None:
+            user_cfg["apt_lists_max_age"] = cfg_max_age
+        assert expected == UAConfig(cfg=user_cfg).apt_lists_max_age
+
+
 class TestMachineTokenOverlay:
     machine_token_dict = {
         "availableResources": [
@@ -478,12 +478,14 @@ class TestRequestUpdatedContract:
                 },
                 allow_enable=False,
                 series_overrides=True,
+                cfg=cfg,
             ),
             mock.call(
                 {"entitlement": {"entitled": False, "type": "ent2"}},
                 {"entitlement": {"entitled": False, "type": "ent2"}},
                 allow_enable=False,
                 series_overrides=True,
+                cfg=cfg,
             ),
         ]
         assert process_calls == process_entitlement_delta.call_args_list
@@ -0,0 +1,117 @@
+import datetime
+
+import pytest
+
+from uaclient import distro_info
+from uaclient.testing.data import (
+    DISTRO_INFO_CLI_DAYS_UNTIL_EOL,
+    DISTRO_INFO_CLI_SUPPORTED_ESM,
+)
+
+
+def _date(value):
+    return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+
+
+@pytest.fixture
+def info(distro_info_csv):
+    return distro_info.DistroInfo.from_csv(distro_info_csv)
+
+
+class TestDistroInfoFromCSV:
+    def test_indexes_releases_by_series_and_version(self, info):
+        xenial = info.get_release("xenial")
+        assert "16.04 LTS" == xenial.version
+        assert datetime.date(2021, 4, 30) == xenial.eol
+        assert xenial is info.get_release_by_version("16.04")
+        assert None is info.get_release("unknown")
+        assert None is info.get_release_by_version("99.04")
+
+    def test_missing_milestones_are_none(self, info):
+        groovy = info.get_release("groovy")
+        assert None is groovy.eol_server
+        assert None is groovy.eol_esm
+
+    def test_error_when_csv_lacks_esm_dates(self, tmpdir):
+        csv_file = tmpdir.join("ubuntu.csv")
+        csv_file.write(
+            "version,codename,series,created,release,eol\n"
+            "16.04 LTS,Xenial Xerus,xenial,2015-10-22,2016-04-21,2021-04-30\n"
+        )
+        with pytest.raises(ValueError):
+            distro_info.DistroInfo.from_csv(csv_file.strpath)
+
+    def test_error_when_csv_missing(self, tmpdir):
+        with pytest.raises(IOError):
+            distro_info.DistroInfo.from_csv(tmpdir.join("nope").strpath)
+
+
+class TestDistroInfoMatchesCLI:
+    @pytest.mark.parametrize(
+        "date, expected", sorted(DISTRO_INFO_CLI_SUPPORTED_ESM.items())
+    )
+    def test_supported_esm(self, info, date, expected):
+        """Match ubuntu-distro-info --supported-esm --date <date>."""
+        assert expected == info.supported_esm(_date(date))
+
+    @pytest.mark.parametrize(
+        "series_date, expected", sorted(DISTRO_INFO_CLI_DAYS_UNTIL_EOL.items())
+    )
+    def test_days_until_eol(self, info, series_date, expected):
+        """Match ubuntu-distro-info --series <series> -yeol --date <date>."""
+        series, date = series_date
+        assert expected == info.days_until_eol(series, _date(date))
+
+
+class TestDistroInfoQueries:
+    @pytest.mark.parametrize(
+        "series, expected",
+        (("xenial", True), ("groovy", False), ("unknown", False)),
+    )
+    def test_is_lts(self, info, series, expected):
+        assert expected is info.is_lts(series)
+
+    @pytest.mark.parametrize(
+        "series, date, expected",
+        (
+            ("xenial", "2021-04-29", False),
+            ("xenial", "2021-04-30", True),
+            ("unknown", "2021-04-30", False),
+        ),
+    )
+    def test_is_eol(self, info, series, date, expected):
+        assert expected is info.is_eol(series, _date(date))
+
+    @pytest.mark.parametrize(
+        "series, date, expected",
+        (
+            ("trusty", "2022-04-25", False),
+            ("trusty", "2022-04-26", True),
+            ("groovy", "2030-01-01", False),
+        ),
+    )
+    def test_is_esm_eol(self, info, series, date, expected):
+        assert expected is info.is_esm_eol(series, _date(date))
+
+    @pytest.mark.parametrize(
+        "series, expected",
+        (
+            ("precise", None),
+            ("trusty", "precise"),
+            ("xenial", "trusty"),
+            ("bionic", "xenial"),
+            ("focal", "bionic"),
+            ("groovy", "focal"),
+            ("hirsute", "groovy"),
+            ("unknown", None),
+        ),
+    )
+    def test_previous_release(self, info, series, expected):
+        previous = info.previous_release(series)
+        assert expected == (previous.series if previous else None)
+
+
+class TestGetDistroInfo:
+    def test_parses_csv_once(self, distro_info_csv):
+        assert distro_info.get_distro_info() is distro_info.get_distro_info()
+        assert 1 == distro_info._load_distro_info.cache_info().misses
@@ -0,0 +1,214 @@
+"""Tests related to uaclient.dpkg module."""
+
+import itertools
+import json
+import os
+import random
+import shutil
+
+import mock
+import pytest
+
+from uaclient import dpkg, util
+from uaclient.testing.data import DPKG_SORTED_VERSIONS
+
+DPKG_STATUS = """\
+Package: libkrb5-3
+Status: install ok installed
+Priority: optional
+Architecture: amd64
+Multi-Arch: same
+Source: krb5 (1.17-6ubuntu4)
+Version: 1.17-6ubuntu4.1
+Description: MIT Kerberos runtime libraries
+ Kerberos is a system for authenticating users and services on a network.
+ .
+ Source: not a field
+
+Package: krb5-locales
+Status: install ok installed
+Source: krb5
+Version: 1.17-6ubuntu4.1
+
+Package: zip
+Status: install ok half-installed
+Version: 3.0-11build1
+
+Package: oldpkg
+Status: deinstall ok config-files
+Version: 1.0
+
+Package: gone
+Status: purge ok not-installed
+Version: 2.0
+"""
+
+
+@pytest.fixture
+def status_file(tmpdir):
+    status_file = tmpdir.join("status")
+    status_file.write(DPKG_STATUS)
+    with mock.patch("uaclient.dpkg.DPKG_STATUS_FILE", status_file.strpath):
+        yield status_file
+
+
+class TestDpkgStatus:
+    def test_indexes_installed_packages(self, status_file):
+        dpkg_status = dpkg.DpkgStatus.from_status_file(status_file.strpath)
+
+        assert ["libkrb5-3", "krb5-locales", "zip", "oldpkg"] == (
+            dpkg_status.packages
+        )
+        assert {
+            "krb5": {
+                "libkrb5-3": "1.17-6ubuntu4.1",
+                "krb5-locales": "1.17-6ubuntu4.1",
+            },
+            "zip": {"zip": "3.0-11build1"},
+        } == dpkg_status.source_versions
+        assert "1.17-6ubuntu4.1" == dpkg_status.get_version("libkrb5-3")
+        assert "libkrb5-3" in dpkg_status
+        assert "oldpkg" not in dpkg_status
+        assert None is dpkg_status.get_version("gone")
+
+    def test_versions_are_interned(self, status_file):
+        dpkg_status = dpkg.DpkgStatus.from_status_file(status_file.strpath)
+        krb5 = dpkg_status.source_versions["krb5"]
+        assert krb5["libkrb5-3"] is krb5["krb5-locales"]
+
+    def test_status_without_trailing_newline(self, tmpdir):
+        status_file = tmpdir.join("status")
+        status_file.write("Package: a\nStatus: install ok installed")
+        dpkg_status = dpkg.DpkgStatus.from_status_file(status_file.strpath)
+        assert {"a": {"a": ""}} == dpkg_status.source_versions
+
+
+class TestGetDpkgStatus:
+    def test_missing_status_file_means_no_packages(self, tmpdir):
+        missing = tmpdir.join("missing").strpath
+        with mock.patch("uaclient.dpkg.DPKG_STATUS_FILE", missing):
+            assert [] == dpkg.get_dpkg_status().packages
+
+    def test_status_parsed_once_until_status_file_changes(self, status_file):
+        with mock.patch.object(
+            dpkg.DpkgStatus,
+            "from_status_file",
+            wraps=dpkg.DpkgStatus.from_status_file,
+        ) as m_from_status_file:
+            dpkg_status = dpkg.get_dpkg_status()
+            assert dpkg_status is dpkg.get_dpkg_status()
+            assert 1 == m_from_status_file.call_count
+
+            status_file.write("Package: new\nStatus: install ok installed\n")
+            assert ["new"] == dpkg.get_dpkg_status().packages
+            assert 2 == m_from_status_file.call_count
+
+    def test_parsed_status_persisted_in_data_dir(self, status_file, tmpdir):
+        data_dir = tmpdir.mkdir("data")
+        dpkg.setup_dpkg_status_cache(data_dir.strpath)
+        expected = dpkg.get_dpkg_status().source_versions
+        cache_file = data_dir.join(dpkg.DPKG_STATUS_CACHE_FILE)
+        assert cache_file.exists()
+
+        # A later process loads the cache without parsing the status file
+        dpkg.setup_dpkg_status_cache(data_dir.strpath)
+        with mock.patch.object(
+            dpkg.DpkgStatus, "from_status_file"
+        ) as m_from_status_file:
+            assert expected == dpkg.get_dpkg_status().source_versions
+        assert 0 == m_from_status_file.call_count
+
+    def test_stale_persisted_status_ignored(self, status_file, tmpdir):
+        data_dir = tmpdir.mkdir("data")
+        cache_file = data_dir.join(dpkg.DPKG_STATUS_CACHE_FILE)
+        status_stat = os.stat(status_file.strpath)
+        cache_file.write(
+            json.dumps(
+                {
+                    "key": [status_stat.st_mtime_ns, status_stat.st_size + 1],
+                    "packages": [["stale", "1", "stale", "installed"]],
+                }
+            )
+        )
+        dpkg.setup_dpkg_status_cache(data_dir.strpath)
+        assert "stale" not in dpkg.get_dpkg_status()
+        assert "libkrb5-3" in dpkg.get_dpkg_status()
+        assert "stale" not in cache_file.read()
+
+
+DPKG_VERSION_RANKS = {
+    version: rank
+    for rank, versions in enumerate(DPKG_SORTED_VERSIONS)
+    for version in versions
+}
+
+
+class TestGetVersionKey:
+    def test_sorts_versions_as_dpkg(self):
+        for version1, version2 in itertools.product(
+            DPKG_VERSION_RANKS, repeat=2
+        ):
+            rank1 = DPKG_VERSION_RANKS[version1]
+            rank2 = DPKG_VERSION_RANKS[version2]
+            key1 = dpkg.get_version_key(version1)
+            key2 = dpkg.get_version_key(version2)
+            assert (rank1 < rank2, rank1 == rank2) == (
+                key1 < key2,
+                key1 == key2,
+            ), "{} vs {}".format(version1, version2)
+
+    @pytest.mark.skipif(not shutil.which("dpkg"), reason="dpkg not present")
+    def test_matches_dpkg_compare_versions(self):
+        rng = random.Random(20201017)
+        versions = list(DPKG_VERSION_RANKS)
+        for _ in range(50):
+            version1 = rng.choice(versions)
+            version2 = rng.choice(versions)
+            try:
+                util.subp(
+                    ["dpkg", "--compare-versions", version1, "le", version2]
+                )
+                expected = True
+            except util.ProcessExecutionError:
+                expected = False
+            assert expected is dpkg.version_le(version1, version2)
+
+    @pytest.mark.parametrize(
+        "version", ("", "1:", ":1.0", "a:1.0", "1.0-", "-1", "1.0 1")
+    )
+    def test_invalid_versions_raise_value_error(self, version):
+        with pytest.raises(ValueError):
+            dpkg.get_version_key(version)
+
+    def test_keys_are_memoized(self):
+        dpkg.get_version_key.cache_clear()
+        dpkg.get_version_key("1.0-1ubuntu1")
+        dpkg.get_version_key("1.0-1ubuntu1")
+        assert 1 == dpkg.get_version_key.cache_info().hits
+
+
+class TestVersionLe:
+    @mock.patch("uaclient.dpkg.util.subp")
+    def test_compared_in_process(self, m_subp):
+        assert dpkg.version_le("2.1~18.04.1", "2.1")
+        assert not dpkg.version_le("1:1.0", "2.0")
+        assert 0 == m_subp.call_count
+
+    @pytest.mark.parametrize(
+        "subp_side_effect,expected",
+        ((None, True), (util.ProcessExecutionError("dpkg"), False)),
+    )
+    @pytest.mark.parametrize(
+        "version1,use_dpkg", (("1.0", True), ("1.0-", False))
+    )
+    @mock.patch("uaclient.dpkg.util.subp")
+    def test_dpkg_fallback(
+        self, m_subp, version1, use_dpkg, subp_side_effect, expected
+    ):
+        """Use dpkg when enabled, or for versions only dpkg can judge."""
+        m_subp.side_effect = subp_side_effect
+        dpkg.setup_dpkg_compare_versions(use_dpkg)
+        assert expected is dpkg.version_le(version1, "2.0")
+        assert [
+            mock.call(["dpkg", "--compare-versions", version1, "le", "2.0"])
+        ] == m_subp.call_args_list
@@ -1,7 +1,13 @@
 import copy
+import json
 import mock
+import os
 import pytest
 import textwrap
+import threading
+import time
+from io import BytesIO
+from urllib.error import HTTPError, URLError
 
 from uaclient.security import (
     API_V1_CVES,
@@ -10,19 +16,30 @@ from uaclient.security import (
     API_V1_NOTICE_TMPL,
     CVE,
     CVEPackageStatus,
+    OfflineSecurityClient,
+    OutstandingUSN,
     UASecurityClient,
     USN,
+    USNReleasedPackagesMerger,
     SecurityAPIError,
+    SecurityIssueFetcher,
     fix_security_issue_id,
+    fix_security_issue_ids,
     get_cve_affected_source_packages_status,
+    get_security_client,
     merge_usn_released_binary_package_versions,
     override_usn_release_package_status,
+    print_security_status,
     prompt_for_affected_packages,
     query_installed_source_pkg_versions,
+    scan_security_notices,
     upgrade_packages_and_attach,
+    upgrade_pocket_packages,
     version_cmp_le,
 )
+from uaclient.security_dataset import SECURITY_DATASET_DIR, SecurityDataset
 from uaclient.status import (
+    MESSAGE_SECURITY_DATASET_MISSING,
     MESSAGE_SECURITY_USE_PRO_TMPL,
     OKGREEN_CHECK,
     FAIL_X,
@@ -30,6 +47,7 @@ from uaclient.status import (
     MESSAGE_SECURITY_UA_SERVICE_NOT_ENABLED,
     MESSAGE_SECURITY_UA_SERVICE_NOT_ENTITLED,
     MESSAGE_SECURITY_ISSUE_NOT_RESOLVED,
+    MESSAGE_SECURITY_ISSUE_RESOLVED,
     MESSAGE_SECURITY_UPDATE_NOT_INSTALLED_SUBSCRIPTION as MSG_SUBSCRIPTION,
     MESSAGE_SECURITY_SERVICE_DISABLED,
     MESSAGE_SECURITY_UPDATE_NOT_INSTALLED_EXPIRED,
@@ -40,7 +58,7 @@ from uaclient.status import (
     ApplicabilityStatus,
     colorize_commands,
 )
-from uaclient import exceptions
+from uaclient import dpkg, exceptions
 from uaclient.util import UrlError
 
 M_PATH = "uaclient.contract."
@@ -199,7 +217,7 @@ class TestGetCVEAffectedPackageStatus:
         )
         if expected_status:
             package_status = affected_packages["samba"]
-            assert expected_status == package_status.response
+            assert CVEPackageStatus(expected_status) == package_status
         else:
             assert expected_status == affected_packages
 
@@ -222,29 +240,40 @@ class TestVersionCmpLe:
 
 class TestCVE:
     def test_cve_init_attributes(self, FakeConfig):
-        """CVE.__init__ saves client and response on instance."""
+        """CVE.__init__ saves client and response fields on instance."""
         client = UASecurityClient(FakeConfig())
-        cve = CVE(client, {"some": "response"})
+        cve = CVE(client, {"id": "cve-1", "priority": "high", "some": "x"})
         assert client == cve.client
-        assert {"some": "response"} == cve.response
+        assert "CVE-1" == cve.id
+        assert "high" == cve.priority
+        assert not hasattr(cve, "response")
+
+    def test_cve_is_immutable(self, FakeConfig):
+        cve = CVE(UASecurityClient(FakeConfig()), {"id": "CVE-1"})
+        with pytest.raises(AttributeError):
+            cve.id = "CVE-2"
+        with pytest.raises(AttributeError):
+            cve.response = {}
 
     @pytest.mark.parametrize(
         "cve1,cve2,are_equal",
         (
-            (CVE(None, {"1": "2"}), CVE(None, {"1": "2"}), True),
-            (CVE("A", {"1": "2"}), CVE("B", {"1": "2"}), True),
-            (CVE(None, {}), CVE("B", {"1": "2"}), False),
-            (CVE(None, {"1": "2"}), USN(None, {"1": "2"}), False),
+            (CVE(None, {"id": "1"}), CVE(None, {"id": "1"}), True),
+            (CVE("A", {"id": "1"}), CVE("B", {"id": "1"}), True),
+            (CVE(None, {}), CVE("B", {"id": "1"}), False),
+            (
+                CVE(None, {"id": "1", "priority": "low"}),
+                CVE(None, {"id": "1", "priority": "high"}),
+                False,
+            ),
+            (CVE(None, {"id": "1"}), USN(None, {"id": "1"}), False),
         ),
     )
     def test_equality(self, cve1, cve2, are_equal):
-        """Equality is based instance type and CVE.response value"""
+        """Equality is based instance type and CVE field values"""
         if are_equal:
-            assert cve1.response == cve2.response
             assert cve1 == cve2
         else:
-            if isinstance(cve1, CVE) and isinstance(cve2, CVE):
-                assert cve1.response != cve2.response
             assert cve1 != cve2
 
     @pytest.mark.parametrize(
@@ -271,7 +300,43 @@ class TestCVE:
         cve = CVE(client, response)
         assert expected == getattr(cve, attr_name)
 
-    def test_get_url_header(self, FakeConfig):
+    @mock.patch("uaclient.util.get_platform_info")
+    def test_packages_status_reduced_to_series_when_decoded(
+        self, get_platform_info, FakeConfig
+    ):
+        get_platform_info.return_value = {"series": "focal"}
+        response = {
+            "id": "CVE-1",
+            "packages": [
+                {
+                    "name": "samba",
+                    "statuses": [
+                        {"release_codename": "bionic", "status": "released"},
+                        {"release_codename": "focal", "status": "needed"},
+                    ],
+                },
+                {
+                    "name": "zip",
+                    "statuses": [
+                        {"release_codename": "bionic", "status": "released"}
+                    ],
+                },
+            ],
+        }
+        cve = CVE(UASecurityClient(FakeConfig()), response)
+        assert 1 == get_platform_info.call_count
+        assert {
+            "samba": CVEPackageStatus(
+                {"release_codename": "focal", "status": "needed"}
+            )
+        } == cve.packages_status
+        assert 1 == get_platform_info.call_count
+        assert {} == CVE(None, response, series="xenial").packages_status
+
+    @mock.patch(
+        "uaclient.util.get_platform_info", return_value={"series": "focal"}
+    )
+    def test_get_url_header(self, _get_platform_info, FakeConfig):
         """CVE.get_url_header returns a string based on the CVE response."""
         client = UASecurityClient(FakeConfig())
         detailed_cve_response = copy.deepcopy(SAMPLE_CVE_RESPONSE)
@@ -298,8 +363,11 @@ class TestCVE:
             ),
         ),
     )
+    @mock.patch(
+        "uaclient.util.get_platform_info", return_value={"series": "focal"}
+    )
     def test_notices_cached_from_usns_response(
-        self, usns_response, expected, FakeConfig
+        self, _get_platform_info, usns_response, expected, FakeConfig
     ):
         """List of USNs returned from CVE 'usns' response if present."""
         client = UASecurityClient(FakeConfig())
@@ -309,35 +377,76 @@ class TestCVE:
         cve = CVE(client, cve_response)
         assert expected == cve.notices
         # white box test caching in effect
-        cve.response = "junk"
-        assert expected == cve.notices
+        assert cve.notices is cve.notices
 
 
 class TestUSN:
     def test_usn_init_attributes(self, FakeConfig):
-        """USN.__init__ saves client and response on instance."""
+        """USN.__init__ saves client and response fields on instance."""
         client = UASecurityClient(FakeConfig())
-        cve = USN(client, {"some": "response"})
-        assert client == cve.client
-        assert {"some": "response"} == cve.response
+        usn = USN(client, {"id": "usn-1", "title": "t", "some": "x"})
+        assert client == usn.client
+        assert "USN-1" == usn.id
+        assert "t" == usn.title
+        assert not usn.has_release_packages
+        assert not hasattr(usn, "response")
+
+    @mock.patch("uaclient.util.get_platform_info")
+    def test_release_packages_indexed_once_when_decoded(
+        self, get_platform_info, FakeConfig
+    ):
+        get_platform_info.return_value = {"series": "bionic"}
+        usn = USN(UASecurityClient(FakeConfig()), SAMPLE_USN_RESPONSE)
+        assert 1 == get_platform_info.call_count
+
+        assert usn.has_release_packages
+        assert ["coin3"] == list(usn.release_packages)
+        assert usn.release_packages is usn.release_packages
+        assert 1 == get_platform_info.call_count
+
+    @mock.patch("uaclient.util.get_platform_info")
+    def test_release_packages_of_series_param(
+        self, get_platform_info, FakeConfig
+    ):
+        usn = USN(None, SAMPLE_USN_RESPONSE, series="trusty")
+        assert ["samba"] == list(usn.release_packages)
+        assert 0 == get_platform_info.call_count
+
+    def test_invalid_release_packages_raise_when_read(self):
+        usn = USN(
+            None,
+            {
+                "id": "USN-1-1",
+                "release_packages": {"focal": [{"name": "samba"}]},
+            },
+            series="focal",
+        )
+        for _ in range(2):
+            with pytest.raises(exceptions.SecurityAPIMetadataError) as exc:
+                usn.release_packages
+            assert "does not define release_packages source_link" in (
+                exc.value.msg
+            )
 
     @pytest.mark.parametrize(
         "usn1,usn2,are_equal",
         (
-            (USN(None, {"1": "2"}), USN(None, {"1": "2"}), True),
-            (USN("A", {"1": "2"}), USN("B", {"1": "2"}), True),
-            (USN(None, {}), USN("B", {"1": "2"}), False),
-            (USN(None, {"1": "2"}), CVE(None, {"1": "2"}), False),
+            (USN(None, {"id": "1"}), USN(None, {"id": "1"}), True),
+            (USN("A", {"id": "1"}), USN("B", {"id": "1"}), True),
+            (USN(None, {}), USN("B", {"id": "1"}), False),
+            (
+                USN(None, {"id": "1", "cves_ids": ["CVE-1"]}),
+                USN(None, {"id": "1", "cves_ids": ["CVE-2"]}),
+                False,
+            ),
+            (USN(None, {"id": "1"}), CVE(None, {"id": "1"}), False),
         ),
     )
     def test_equality(self, usn1, usn2, are_equal):
-        """Equality is based instance type and USN.response value"""
+        """Equality is based instance type and USN field values"""
         if are_equal:
-            assert usn1.response == usn2.response
             assert usn1 == usn2
         else:
-            if isinstance(usn1, USN) and isinstance(usn2, USN):
-                assert usn1.response != usn2.response
             assert usn1 != usn2
 
     @pytest.mark.parametrize(
@@ -511,7 +620,12 @@ https://ubuntu.com/security/CVE-2020-1472""",
             ),
         ),
     )
-    def test_get_url_header(self, FakeConfig, usn_response, expected):
+    @mock.patch(
+        "uaclient.util.get_platform_info", return_value={"series": "focal"}
+    )
+    def test_get_url_header(
+        self, _m_platform_info, FakeConfig, usn_response, expected
+    ):
         """USN.get_url_header returns a string based on the USN response."""
         client = UASecurityClient(FakeConfig())
         usn = USN(client, usn_response)
@@ -528,8 +642,11 @@ https://ubuntu.com/security/CVE-2020-1472""",
             ),
         ),
     )
+    @mock.patch(
+        "uaclient.util.get_platform_info", return_value={"series": "focal"}
+    )
     def test_cves_cached_and_sorted_from_cves_response(
-        self, cves_response, expected, FakeConfig
+        self, _m_platform_info, cves_response, expected, FakeConfig
     ):
         """List of USNs returned from CVE 'usns' response if present."""
         client = UASecurityClient(FakeConfig())
@@ -539,8 +656,7 @@ https://ubuntu.com/security/CVE-2020-1472""",
         usn = USN(client, usn_response)
         assert expected == usn.cves
         # white box test caching in effect
-        usn.response = "junk"
-        assert expected == usn.cves
+        assert usn.cves is usn.cves
 
 
 class TestCVEPackageStatus:
@@ -548,15 +664,24 @@ class TestCVEPackageStatus:
         pkg_status = CVEPackageStatus(
             cve_response=CVE_ESM_PACKAGE_STATUS_RESPONSE
         )
-        assert CVE_ESM_PACKAGE_STATUS_RESPONSE == pkg_status.response
-        assert pkg_status.response["description"] == pkg_status.description
+        response = CVE_ESM_PACKAGE_STATUS_RESPONSE
+        assert response["description"] == pkg_status.description
         assert pkg_status.description == pkg_status.fixed_version
-        assert pkg_status.response["pocket"] == pkg_status.pocket
-        assert (
-            pkg_status.response["release_codename"]
-            == pkg_status.release_codename
-        )
-        assert pkg_status.response["status"] == pkg_status.status
+        assert response["pocket"] == pkg_status.pocket
+        assert response["release_codename"] == pkg_status.release_codename
+        assert response["status"] == pkg_status.status
+
+    def test_replace_returns_modified_copy(self):
+        pkg_status = CVEPackageStatus(CVE_ESM_PACKAGE_STATUS_RESPONSE)
+        released = pkg_status.replace(status="needed", pocket=None)
+
+        assert ("needed", None) == (released.status, released.pocket)
+        assert pkg_status.release_codename == released.release_codename
+        assert "released" == pkg_status.status
+        with pytest.raises(AttributeError):
+            pkg_status.status = "needed"
+        with pytest.raises(TypeError):
+            pkg_status.replace(component="main")
 
     @pytest.mark.parametrize(
         "pocket,description,expected",
@@ -665,12 +790,15 @@ class TestUASecurityClient:
             for key in SAMPLE_GET_CVES_QUERY_PARAMS:
                 if key not in m_kwargs:
                     m_kwargs[key] = None
-            request_url.return_value = (["body1", "body2"], "headers")
+            request_url.return_value = (
+                [{"id": "cve-1"}, {"id": "cve-2"}],
+                "headers",
+            )
             [cve1, cve2] = client.get_cves(**m_kwargs)
             assert isinstance(cve1, CVE)
             assert isinstance(cve2, CVE)
-            assert "body1" == cve1.response
-            assert "body2" == cve2.response
+            assert "CVE-1" == cve1.id
+            assert "CVE-2" == cve2.id
             # get_cves transposes "query" to "q"
             m_kwargs["q"] = m_kwargs.pop("query")
 
@@ -759,6 +887,67 @@ class TestUASecurityClient:
             assert usns[0].id == "1"
             assert usns[1].id == "2"
 
+    def test_iter_notices_requests_pages_on_demand(
+        self, request_url, FakeConfig
+    ):
+        """Pages are requested as USNs are consumed, until a short page."""
+        client = UASecurityClient(FakeConfig())
+        request_url.side_effect = [
+            (
+                {
+                    "notices": [
+                        {"id": "USN-2", "cves_ids": ["cve1"]},
+                        {"id": "USN-1", "cves_ids": ["cve12"]},
+                    ]
+                },
+                "headers",
+            ),
+            ({"notices": [{"id": "USN-3", "cves_ids": ["cve1"]}]}, "headers"),
+        ]
+
+        usns = client.iter_notices(details="cve1", page_size=2)
+        assert 0 == request_url.call_count
+        assert "USN-2" == next(usns).id
+        assert 1 == request_url.call_count
+        # USN-1 doesn't list cve1, though returned by the Security API
+        assert ["USN-3"] == [usn.id for usn in usns]
+        query_params = {"details": "cve1", "release": None, "order": None}
+        assert [
+            mock.call(
+                API_V1_NOTICES,
+                query_params=dict(query_params, limit=2, offset=0),
+            ),
+            mock.call(
+                API_V1_NOTICES,
+                query_params=dict(query_params, limit=2, offset=2),
+            ),
+        ] == request_url.call_args_list
+
+    def test_iter_cves_stops_when_consumer_stops(
+        self, request_url, FakeConfig
+    ):
+        client = UASecurityClient(FakeConfig())
+        request_url.return_value = ([{"id": "cve-1"}, {"id": "cve-2"}], {})
+
+        cves = client.iter_cves(package="samba", page_size=2)
+        assert ["CVE-1", "CVE-2", "CVE-1"] == [next(cves).id for _ in range(3)]
+        assert [
+            mock.call(
+                API_V1_CVES,
+                query_params={
+                    "q": None,
+                    "priority": None,
+                    "package": "samba",
+                    "component": None,
+                    "version": None,
+                    "status": None,
+                    "limit": 2,
+                    "offset": offset,
+                },
+            )
+            for offset in (0, 2)
+        ] == request_url.call_args_list
+
     @pytest.mark.parametrize(
         "m_kwargs,expected_error, extra_security_params",
         (({}, TypeError, None), ({"cve_id": "CVE-1"}, None, {"test": "blah"})),
@@ -786,10 +975,10 @@ class TestUASecurityClient:
             ) == str(exc.value)
             assert 0 == request_url.call_count
         else:
-            request_url.return_value = ("body", "headers")
+            request_url.return_value = ({"id": "cve-1"}, "headers")
             cve = client.get_cve(**m_kwargs)
             assert isinstance(cve, CVE)
-            assert "body" == cve.response
+            assert "CVE-1" == cve.id
             assert [
                 mock.call(API_V1_CVE_TMPL.format(cve=m_kwargs["cve_id"]))
             ] == request_url.call_args_list
@@ -826,8 +1015,8 @@ class TestUASecurityClient:
             ) == str(exc.value)
             assert 0 == request_url.call_count
         else:
-            request_url.return_value = ("body", "headers")
-            assert "body" == client.get_notice(**m_kwargs).response
+            request_url.return_value = ({"id": "usn-1"}, "headers")
+            assert "USN-1" == client.get_notice(**m_kwargs).id
             assert [
                 mock.call(
                     API_V1_NOTICE_TMPL.format(notice=m_kwargs["notice_id"])
@@ -835,42 +1024,639 @@ class TestUASecurityClient:
             ] == request_url.call_args_list
 
 
+@mock.patch("uaclient.serviceclient.util.readurl")
+class TestSecurityAPIResponseCache:
+    CVE_URL = "https://ubuntu.com/security/cves/CVE-2020-1472.json"
+
+    def _get_client(self, FakeConfig, ttl=None):
+        cfg = FakeConfig()
+        if ttl is not None:
+            cfg.cfg["security_api_cache_ttl"] = ttl
+        return UASecurityClient(cfg)
+
+    def test_fresh_responses_are_not_refetched(self, readurl, FakeConfig):
+        readurl.return_value = ({"id": "CVE-2020-1472"}, {})
+        client = self._get_client(FakeConfig)
+        assert "CVE-2020-1472" == client.get_cve("CVE-2020-1472").id
+
+        # Another process with the same data_dir uses the cached response
+        client = self._get_client(FakeConfig)
+        assert "CVE-2020-1472" == client.get_cve("CVE-2020-1472").id
+        assert 1 == readurl.call_count
+
+    def test_responses_keyed_by_url_and_query_params(
+        self, readurl, FakeConfig
+    ):
+        readurl.return_value = ({"notices": []}, {})
+        client = self._get_client(FakeConfig)
+        client.get_notices(details="CVE-2020-1472")
+        client.get_notices(details="CVE-2020-1473")
+        client.get_notices(details="CVE-2020-1472")
+        assert 2 == readurl.call_count
+
+    def test_expired_responses_are_revalidated(self, readurl, FakeConfig):
+        readurl.return_value = (
+            {"id": "CVE-2020-1472"},
+            {"ETag": '"v1"', "Last-Modified": "Mon, 12 Oct 2020 10:00:00 GMT"},
+        )
+        client = self._get_client(FakeConfig, ttl=0)
+        client.get_cve("CVE-2020-1472")
+        readurl.side_effect = HTTPError(
+            self.CVE_URL, 304, "Not Modified", {}, BytesIO()
+        )
+        assert "CVE-2020-1472" == client.get_cve("CVE-2020-1472").id
+
+        headers = readurl.call_args[1]["headers"]
+        assert '"v1"' == headers["if-none-match"]
+        assert "Mon, 12 Oct 2020 10:00:00 GMT" == headers["if-modified-since"]
+        assert 2 == readurl.call_count
+
+    def test_changed_responses_replace_cached_ones(self, readurl, FakeConfig):
+        readurl.return_value = ({"id": "CVE-OLD"}, {"ETag": '"v1"'})
+        client = self._get_client(FakeConfig, ttl=0)
+        client.get_cve("CVE-2020-1472")
+        readurl.return_value = ({"id": "CVE-NEW"}, {"ETag": '"v2"'})
+        assert "CVE-NEW" == client.get_cve("CVE-2020-1472").id
+        assert "CVE-NEW" == client.get_cve("CVE-2020-1472").id
+        assert '"v2"' == readurl.call_args[1]["headers"]["if-none-match"]
+
+    @pytest.mark.parametrize(
+        "error",
+        (
+            URLError("Network is unreachable"),
+            HTTPError(CVE_URL, 503, "Unavailable", {}, BytesIO()),
+        ),
+    )
+    def test_stale_responses_served_on_network_failure(
+        self, readurl, error, FakeConfig
+    ):
+        readurl.return_value = ({"id": "CVE-2020-1472"}, {})
+        client = self._get_client(FakeConfig, ttl=0)
+        client.get_cve("CVE-2020-1472")
+        readurl.side_effect = error
+        assert "CVE-2020-1472" == client.get_cve("CVE-2020-1472").id
+
+        with pytest.raises(UrlError):
+            client.get_cve("CVE-2020-1473")
+
+    def test_client_errors_are_not_hidden_by_cache(self, readurl, FakeConfig):
+        readurl.return_value = ({"id": "CVE-2020-1472"}, {})
+        client = self._get_client(FakeConfig, ttl=0)
+        client.get_cve("CVE-2020-1472")
+        readurl.side_effect = HTTPError(
+            self.CVE_URL,
+            404,
+            "Not Found",
+            {},
+            BytesIO(b'{"message": "CVE not found"}'),
+        )
+        with pytest.raises(SecurityAPIError):
+            client.get_cve("CVE-2020-1472")
+
+    def test_unwritable_cache_is_ignored(self, readurl, FakeConfig):
+        readurl.return_value = ({"id": "CVE-2020-1472"}, {})
+        client = self._get_client(FakeConfig)
+        with mock.patch(
+            "uaclient.security.util.atomic_write_file",
+            side_effect=PermissionError("denied"),
+        ):
+            assert "CVE-2020-1472" == client.get_cve("CVE-2020-1472").id
+        client.get_cve("CVE-2020-1472")
+        assert 2 == readurl.call_count
+
+
+class TestOfflineSecurityClient:
+    CVE = {
+        "id": "CVE-2020-1472",
+        "description": "Samba netlogon elevation of privilege",
+        "priority": "high",
+        "notices_ids": ["USN-4510-1"],
+        "packages": [{"name": "samba", "statuses": []}],
+    }
+    USNS = [
+        {
+            "id": "USN-4510-1",
+            "title": "Samba vulnerability",
+            "cves_ids": ["CVE-2020-1472"],
+            "cves": [
+                {
+                    "id": "CVE-2020-1472",
+                    "notices_ids": ["USN-4510-1"],
+                    "packages": [],
+                }
+            ],
+            "release_packages": {
+                "focal": [{"name": "samba", "is_source": True}]
+            },
+        },
+        {
+            "id": "USN-4510-2",
+            "cves_ids": ["CVE-2020-1472"],
+            "release_packages": {
+                "xenial": [{"name": "samba", "is_source": True}]
+            },
+        },
+    ]
+
+    @pytest.fixture(autouse=True)
+    def platform_info(self):
+        with mock.patch(
+            "uaclient.util.get_platform_info", return_value={"series": "focal"}
+        ) as m_platform_info:
+            yield m_platform_info
+
+    @pytest.fixture
+    def cfg(self, FakeConfig, tmpdir):
+        cfg = FakeConfig()
+        export = tmpdir.join("export.json")
+        export.write(json.dumps({"cves": [self.CVE], "notices": self.USNS}))
+        SecurityDataset(
+            os.path.join(cfg.data_dir, SECURITY_DATASET_DIR)
+        ).import_exports([export.strpath])
+        return cfg
+
+    def test_missing_dataset_errors(self, FakeConfig):
+        with pytest.raises(exceptions.UserFacingError) as excinfo:
+            get_security_client(FakeConfig(), offline=True)
+        assert MESSAGE_SECURITY_DATASET_MISSING == excinfo.value.msg
+
+    def test_online_client_by_default(self, FakeConfig):
+        client = get_security_client(FakeConfig())
+        assert not isinstance(client, OfflineSecurityClient)
+
+    @mock.patch("uaclient.serviceclient.util.readurl")
+    def test_queries_answered_from_dataset(self, readurl, cfg):
+        client = get_security_client(cfg, offline=True)
+
+        cve = client.get_cve("cve-2020-1472")
+        assert CVE(client, self.CVE) == cve
+        assert "high" == cve.priority
+        assert USN(client, self.USNS[1]) == client.get_notice("USN-4510-2")
+        assert ["USN-4510-1", "USN-4510-2"] == [
+            usn.id for usn in client.get_notices(details="CVE-2020-1472")
+        ]
+        assert ["USN-4510-2"] == [
+            usn.id for usn in client.get_notices(release="xenial")
+        ]
+        assert ["USN-4510-2"] == [
+            usn.id for usn in client.get_notices(limit=1, offset=1)
+        ]
+        assert ["CVE-2020-1472"] == [
+            cve.id
+            for cve in client.get_cves(package="samba", query="NETLOGON")
+        ]
+        assert [] == client.get_cves(priority="low")
+        assert 0 == readurl.call_count
+
+    def test_iter_queries_load_issues_lazily(self, cfg):
+        client = get_security_client(cfg, offline=True)
+        with mock.patch.object(
+            client.dataset, "get_issue", wraps=client.dataset.get_issue
+        ) as m_get_issue:
+            usns = client.iter_notices(release="focal")
+            assert 0 == m_get_issue.call_count
+            assert ["USN-4510-1"] == [usn.id for usn in usns]
+            assert 1 == m_get_issue.call_count
+            assert ["CVE-2020-1472"] == [
+                cve.id for cve in client.iter_cves(query="netlogon")
+            ]
+
+    @pytest.mark.parametrize("issue_id", ("CVE-2020-1473", "USN-4511-1"))
+    def test_unknown_issues_not_found(self, issue_id, cfg):
+        client = get_security_client(cfg, offline=True)
+        with pytest.raises(exceptions.UserFacingError) as excinfo:
+            if issue_id.startswith("CVE"):
+                client.get_cve(issue_id)
+            else:
+                client.get_notice(issue_id)
+        assert "Error: {} not found.".format(issue_id) == excinfo.value.msg
+
+    @mock.patch("uaclient.serviceclient.util.readurl")
+    @mock.patch("uaclient.security.query_installed_source_pkg_versions")
+    @mock.patch("uaclient.util.get_platform_info")
+    def test_fix_security_issue_id_offline(
+        self, m_platform_info, m_installed_pkgs, readurl, cfg, capsys
+    ):
+        m_platform_info.return_value = {"series": "focal"}
+        m_installed_pkgs.return_value = {}
+
+        client = get_security_client(cfg, offline=True)
+        fix_security_issue_id(cfg, "USN-4510-1", client=client)
+
+        out, _err = capsys.readouterr()
+        assert "USN-4510-1: Samba vulnerability" in out
+        assert "does not affect your system" in out
+        assert 0 == readurl.call_count
+
+
+def _released_package(name, version, pocket="security"):
+    return {
+        "name": name,
+        "version": version,
+        "pocket": pocket,
+        "source_link": "https://launchpad.net/ubuntu/+source/" + name,
+    }
+
+
+class TestFixSecurityIssueIds:
+    CVES = [
+        {
+            "id": "CVE-2020-1001",
+            "description": "Samba vulnerability",
+            "notices_ids": ["USN-1001-1"],
+            "packages": [
+                {
+                    "name": "samba",
+                    "statuses": [
+                        {
+                            "release_codename": "focal",
+                            "status": "released",
+                            "description": "2.0",
+                            "pocket": "security",
+                        }
+                    ],
+                }
+            ],
+        },
+        {
+            "id": "CVE-2020-1002",
+            "description": "zip vulnerability",
+            "notices_ids": ["USN-1002-1"],
+            "packages": [
+                {
+                    "name": "zip",
+                    "statuses": [
+                        {
+                            "release_codename": "focal",
+                            "status": "released",
+                            "description": "3.0",
+                            "pocket": "security",
+                        }
+                    ],
+                }
+            ],
+        },
+    ]
+    USNS = [
+        {
+            "id": "USN-1001-1",
+            "title": "Samba vulnerability",
+            "cves_ids": ["CVE-2020-1001"],
+            "release_packages": {
+                "focal": [
+                    {"name": "samba", "is_source": True, "version": "2.0"},
+                    _released_package("samba", "2.0"),
+                ]
+            },
+        },
+        {
+            "id": "USN-1002-1",
+            "title": "zip vulnerability",
+            "cves_ids": ["CVE-2020-1002"],
+            "release_packages": {
+                "focal": [
+                    {"name": "zip", "is_source": True, "version": "3.0"},
+                    _released_package("zip", "3.0"),
+                ]
+            },
+        },
+    ]
+
+    def _make_client(self, cfg, tmpdir, cves, usns):
+        # The USN embeds its CVEs as the Security API does
+        notices = copy.deepcopy(usns)
+        for usn, cve in zip(notices, cves):
+            usn["cves"] = [cve]
+        export = tmpdir.join("export.json")
+        export.write(json.dumps({"cves": cves, "notices": notices}))
+        SecurityDataset(
+            os.path.join(cfg.data_dir, SECURITY_DATASET_DIR)
+        ).import_exports([export.strpath])
+        return get_security_client(cfg, offline=True)
+
+    @pytest.fixture
+    def client(self, FakeConfig, tmpdir):
+        return self._make_client(FakeConfig(), tmpdir, self.CVES, self.USNS)
+
+    @mock.patch("uaclient.util.should_reboot", return_value=False)
+    @mock.patch("uaclient.security._is_pocket_used_by_beta_service")
+    @mock.patch("uaclient.apt.run_apt_command")
+    @mock.patch("os.getuid", return_value=0)
+    @mock.patch("uaclient.security.query_installed_source_pkg_versions")
+    @mock.patch("uaclient.util.get_platform_info")
+    def test_issues_fixed_with_one_apt_transaction(
+        self,
+        m_platform_info,
+        m_installed_pkgs,
+        _m_getuid,
+        m_run_apt,
+        m_beta_pocket,
+        _m_should_reboot,
+        client,
+        capsys,
+    ):
+        m_platform_info.return_value = {"series": "focal"}
+        m_installed_pkgs.return_value = {
+            "samba": {"samba": "1.0"},
+            "zip": {"zip": "1.0"},
+        }
+        m_beta_pocket.return_value = False
+
+        with mock.patch.object(
+            client, "get_notice", wraps=client.get_notice
+        ) as m_get_notice:
+            assert fix_security_issue_ids(
+                client.cfg,
+                ["CVE-2020-1001", "usn-1001-1", "USN-1002-1"],
+                client=client,
+            )
+
+        # USN-1001-1 is fetched once, though related to two requested issues
+        assert [
+            mock.call(notice_id="USN-1001-1"),
+            mock.call(notice_id="USN-1002-1"),
+        ] == sorted(m_get_notice.call_args_list, key=str)
+        assert [
+            mock.call(["apt-get", "update"], mock.ANY),
+            mock.call(
+                cmd=[
+                    "apt-get",
+                    "install",
+                    "--only-upgrade",
+                    "-y",
+                    "samba",
+                    "zip",
+                ],
+                error_msg=mock.ANY,
+                env={"DEBIAN_FRONTEND": "noninteractive"},
+            ),
+        ] == m_run_apt.call_args_list
+        out, _err = capsys.readouterr()
+        for issue_id in ("CVE-2020-1001", "USN-1001-1", "USN-1002-1"):
+            assert (
+                MESSAGE_SECURITY_ISSUE_RESOLVED.format(issue=issue_id) in out
+            )
+
+    @mock.patch("uaclient.security._is_pocket_used_by_beta_service")
+    @mock.patch("uaclient.apt.run_apt_command")
+    @mock.patch("os.getuid", return_value=0)
+    @mock.patch("uaclient.security.query_installed_source_pkg_versions")
+    @mock.patch("uaclient.util.get_platform_info")
+    def test_unknown_issues_reported_without_stopping_others(
+        self,
+        m_platform_info,
+        m_installed_pkgs,
+        _m_getuid,
+        m_run_apt,
+        m_beta_pocket,
+        client,
+        capsys,
+    ):
+        m_platform_info.return_value = {"series": "focal"}
+        m_installed_pkgs.return_value = {"zip": {"zip": "3.0"}}
+        m_beta_pocket.return_value = False
+
+        assert not fix_security_issue_ids(
+            client.cfg, ["CVE-2020-9999", "CVE-2020-1002"], client=client
+        )
+
+        assert 0 == m_run_apt.call_count
+        out, _err = capsys.readouterr()
+        assert "Error: CVE-2020-9999 not found." in out
+        assert (
+            MESSAGE_SECURITY_ISSUE_RESOLVED.format(issue="CVE-2020-1002")
+            in out
+        )
+
+    @mock.patch("uaclient.security._is_pocket_used_by_beta_service")
+    @mock.patch("uaclient.apt.run_apt_command")
+    @mock.patch("os.getuid", return_value=1000)
+    @mock.patch("uaclient.security.query_installed_source_pkg_versions")
+    @mock.patch("uaclient.util.get_platform_info")
+    def test_issue_without_upgrades_in_failed_pocket_is_resolved(
+        self,
+        m_platform_info,
+        m_installed_pkgs,
+        _m_getuid,
+        m_run_apt,
+        m_beta_pocket,
+        FakeConfig,
+        tmpdir,
+        capsys,
+    ):
+        """Only issues with upgrades in a pocket are unfixed by its failure."""
+        cves = copy.deepcopy(self.CVES)
+        usns = copy.deepcopy(self.USNS)
+        for cve in cves:
+            cve["packages"][0]["statuses"][0]["pocket"] = "esm-infra"
+        for usn in usns:
+            src_pkg, binary_pkg = usn["release_packages"]["focal"]
+            binary_pkg["pocket"] = "esm-infra"
+        client = self._make_client(FakeConfig(), tmpdir, cves, usns)
+        m_platform_info.return_value = {"series": "focal"}
+        # samba already has the esm-infra fix, zip needs an upgrade
+        m_installed_pkgs.return_value = {
+            "samba": {"samba": "2.0"},
+            "zip": {"zip": "1.0"},
+        }
+        m_beta_pocket.return_value = False
+
+        assert fix_security_issue_ids(
+            client.cfg, ["CVE-2020-1001", "CVE-2020-1002"], client=client
+        )
+
+        assert 0 == m_run_apt.call_count
+        out, _err = capsys.readouterr()
+        assert MESSAGE_SECURITY_APT_NON_ROOT in out
+        assert (
+            MESSAGE_SECURITY_ISSUE_RESOLVED.format(issue="CVE-2020-1001")
+            in out
+        )
+        assert (
+            MESSAGE_SECURITY_ISSUE_NOT_RESOLVED.format(issue="CVE-2020-1002")
+            in out
+        )
+
+
+class TestUpgradePocketPackages:
+    @mock.patch("uaclient.apt.run_apt_command")
+    @mock.patch("os.getuid", return_value=1000)
+    def test_non_root_upgrades_nothing(
+        self, _m_getuid, m_run_apt, FakeConfig, capsys
+    ):
+        assert {"Ubuntu standard updates": False} == upgrade_pocket_packages(
+            FakeConfig(), {"Ubuntu standard updates": ["samba"]}
+        )
+        assert 0 == m_run_apt.call_count
+        assert MESSAGE_SECURITY_APT_NON_ROOT in capsys.readouterr()[0]
+
+    @mock.patch("uaclient.security._prompt_for_pocket_access")
+    @mock.patch("uaclient.apt.run_apt_command")
+    @mock.patch("os.getuid", return_value=0)
+    def test_inaccessible_pockets_are_skipped(
+        self, _m_getuid, m_run_apt, m_pocket_access, FakeConfig
+    ):
+        m_pocket_access.side_effect = lambda cfg, pocket: pocket != ("UA Apps")
+        pocket_pkgs = {
+            "Ubuntu standard updates": ["samba", "zip"],
+            "UA Infra": ["zip", "curl"],
+            "UA Apps": ["ansible"],
+        }
+
+        assert {
+            "Ubuntu standard updates": True,
+            "UA Infra": True,
+            "UA Apps": False,
+        } == upgrade_pocket_packages(FakeConfig(), pocket_pkgs)
+        assert 3 == m_pocket_access.call_count
+        assert 2 == m_run_apt.call_count
+        assert [
+            "apt-get",
+            "install",
+            "--only-upgrade",
+            "-y",
+            "samba",
+            "zip",
+            "curl",
+        ] == m_run_apt.call_args_list[1][1]["cmd"]
+
+
+def _scan_usn(client, usn_id, *binary_pkgs):
+    return USN(
+        client,
+        {
+            "id": usn_id,
+            "title": usn_id + " title",
+            "release_packages": {"focal": list(binary_pkgs)},
+        },
+    )
+
+
+class TestScanSecurityNotices:
+    @mock.patch("uaclient.security._get_beta_pockets")
+    @mock.patch("uaclient.security.query_installed_source_pkg_versions")
+    @mock.patch("uaclient.util.get_platform_info")
+    def test_outstanding_usns_by_pocket(
+        self, m_platform_info, m_installed_pkgs, m_beta_pockets, FakeConfig
+    ):
+        m_platform_info.return_value = {"series": "focal"}
+        m_installed_pkgs.return_value = {
+            "samba": {"samba": "1.0", "libwbclient0": "1.0"},
+            "curl": {"curl": "2.0"},
+            "zip": {"zip": "1.0"},
+        }
+        m_beta_pockets.return_value = {"esm-apps": True}
+        client = mock.MagicMock()
+        usns = [
+            # samba binaries fixed in two pockets
+            _scan_usn(
+                client,
+                "USN-1-1",
+                _released_package("samba", "2.0"),
+                dict(_released_package("samba", "2.0"), name="libwbclient0"),
+                _released_package("curl", "1.5+esm1", pocket="esm-infra"),
+            ),
+            # Fix already installed
+            _scan_usn(client, "USN-2-1", _released_package("curl", "2.0")),
+            # Package not installed
+            _scan_usn(client, "USN-3-1", _released_package("sl", "2.0")),
+            # Fix released in a beta pocket
+            _scan_usn(
+                client,
+                "USN-4-1",
+                _released_package("zip", "2.0", pocket="esm-apps"),
+            ),
+            _scan_usn(
+                client,
+                "USN-5-1",
+                _released_package("curl", "2.1+esm1", pocket="esm-infra"),
+            ),
+        ]
+        # The last USN is listed twice, as when published during the scan
+        client.iter_notices.return_value = iter(usns + usns[4:])
+
+        outstanding_usns = list(
+            scan_security_notices(FakeConfig(), client=client, page_size=3)
+        )
+        assert [
+            ("USN-1-1", {"Ubuntu standard updates": ["samba"]}),
+            ("USN-5-1", {"UA Infra": ["curl"]}),
+        ] == [(usn.id, usn.pocket_pkgs) for usn in outstanding_usns]
+        assert "USN-1-1 title" == outstanding_usns[0].title
+        assert [
+            mock.call(release="focal", page_size=3)
+        ] == client.iter_notices.call_args_list
+
+    @pytest.mark.parametrize(
+        "outstanding_usns,expected",
+        (
+            ([], "No USN with a released fix affects your system."),
+            (
+                [
+                    (
+                        "USN-1-1",
+                        "Samba vulnerability",
+                        {"UA Infra": ["samba"], "UA Apps": ["zip", "curl"]},
+                    )
+                ],
+                "USN-1-1: Samba vulnerability\n"
+                " - samba: A fix is available in UA Infra.\n"
+                " - curl, zip: A fix is available in UA Apps.\n"
+                + FAIL_X
+                + " 1 USN with released fixes affects your system.\n"
+                "Run ua fix USN-nnnn-d to resolve them.",
+            ),
+        ),
+    )
+    @mock.patch("uaclient.security.scan_security_notices")
+    def test_print_security_status(
+        self, m_scan, outstanding_usns, expected, FakeConfig, capsys
+    ):
+        m_scan.return_value = (
+            OutstandingUSN(*usn) for usn in outstanding_usns
+        )
+        count = print_security_status(FakeConfig())
+
+        assert len(outstanding_usns) == count
+        out, _err = capsys.readouterr()
+        assert expected in out
+
+
 class TestQueryInstalledPkgSources:
     @pytest.mark.parametrize(
-        "dpkg_out,results",
+        "dpkg_status,results",
         (
             # Ignore b non-installed status
-            ("a,,1.2,installed\nb,b,1.2,config-files", {"a": {"a": "1.2"}}),
+            (
+                "Package: a\nStatus: install ok installed\nVersion: 1.2\n\n"
+                "Package: b\nStatus: deinstall ok config-files\n"
+                "Source: b\nVersion: 1.2\n",
+                {"a": {"a": "1.2"}},
+            ),
             # Handle cases where no Source is defined for the pkg
             (
-                "a,,1.2,installed\nzip,zip,3.0,installed",
+                "Package: a\nStatus: install ok installed\nVersion: 1.2\n\n"
+                "Package: zip\nStatus: install ok installed\n"
+                "Source: zip\nVersion: 3.0\n",
                 {"a": {"a": "1.2"}, "zip": {"zip": "3.0"}},
             ),
             # Prefer Source package name to binary package name
             (
-                "b,bsrc,1.2,installed\nzip,zip,3.0,installed",
+                "Package: b\nStatus: install ok installed\n"
+                "Source: bsrc (1.1)\nVersion: 1.2\n\n"
+                "Package: zip\nStatus: install ok installed\n"
+                "Source: zip\nVersion: 3.0\n",
                 {"bsrc": {"b": "1.2"}, "zip": {"zip": "3.0"}},
             ),
         ),
     )
-    @pytest.mark.parametrize("series", ("trusty", "bionic"))
-    @mock.patch("uaclient.security.util.subp")
-    @mock.patch("uaclient.util.get_platform_info")
     def test_result_keyed_by_source_package_name(
-        self, get_platform_info, subp, series, dpkg_out, results
+        self, dpkg_status, results, tmpdir
     ):
-        get_platform_info.return_value = {"series": series}
-        subp.return_value = dpkg_out, ""
-        assert results == query_installed_source_pkg_versions()
-        if series == "trusty":
-            _format = "-f=${Package},${Source},${Version},${Status}\n"
-        else:
-            _format = (
-                "-f=${Package},${Source},${Version},${db:Status-Status}\n"
-            )
-        assert [
-            mock.call(["dpkg-query", _format, "-W"])
-        ] == subp.call_args_list
+        status_file = tmpdir.join("status")
+        status_file.write(dpkg_status)
+        with mock.patch("uaclient.dpkg.DPKG_STATUS_FILE", status_file.strpath):
+            assert results == query_installed_source_pkg_versions()
 
 
 CVE_PKG_STATUS_NEEDED = {
@@ -1461,6 +2247,23 @@ A fix is available in Ubuntu standard updates.\n"""
         )
         out, err = capsys.readouterr()
         assert expected in out
+        # All pockets are upgraded with a single apt transaction
+        assert [
+            mock.call(["apt-get", "update"], mock.ANY),
+            mock.call(
+                cmd=[
+                    "apt-get",
+                    "install",
+                    "--only-upgrade",
+                    "-y",
+                    "pkg2",
+                    "pkg3",
+                    "pkg1",
+                ],
+                error_msg=mock.ANY,
+                env=mock.ANY,
+            ),
+        ] == m_run_apt_cmd.call_args_list
 
     @pytest.mark.parametrize(
         "affected_pkg_status,installed_packages,usn_released_pkgs,expected",
@@ -1497,10 +2300,10 @@ A fix is available in Ubuntu standard updates.\n"""
         ),
     )
     @mock.patch("uaclient.util.should_reboot", return_value=False)
-    @mock.patch("uaclient.security.upgrade_packages_and_attach")
+    @mock.patch("uaclient.security._check_pocket_upgrade_access")
     def test_messages_for_affected_packages_when_fix_fail(
         self,
-        m_upgrade_packages,
+        m_check_pocket_upgrade_access,
         _m_should_reboot,
         affected_pkg_status,
         installed_packages,
@@ -1509,7 +2312,7 @@ A fix is available in Ubuntu standard updates.\n"""
         FakeConfig,
         capsys,
     ):
-        m_upgrade_packages.return_value = False
+        m_check_pocket_upgrade_access.return_value = False
 
         cfg = FakeConfig()
         prompt_for_affected_packages(
@@ -1522,6 +2325,60 @@ A fix is available in Ubuntu standard updates.\n"""
         out, err = capsys.readouterr()
         assert expected in out
 
+    @mock.patch("uaclient.util.should_reboot", return_value=False)
+    @mock.patch("os.getuid", return_value=0)
+    @mock.patch("uaclient.apt.run_apt_command", return_value="")
+    @mock.patch("uaclient.security._prompt_for_pocket_access")
+    def test_accessible_pockets_upgraded_when_later_pocket_cancelled(
+        self,
+        m_prompt_for_pocket_access,
+        m_run_apt_cmd,
+        _m_os_getuid,
+        _m_should_reboot,
+        FakeConfig,
+        capsys,
+    ):
+        """Prompts for all pockets are answered before upgrading once."""
+        m_prompt_for_pocket_access.side_effect = (
+            lambda cfg, pocket: pocket == "Ubuntu standard updates"
+        )
+
+        prompt_for_affected_packages(
+            cfg=FakeConfig(),
+            issue_id="USN-###",
+            affected_pkg_status={
+                "pkg1": CVEPackageStatus(CVE_PKG_STATUS_RELEASED_ESM_APPS),
+                "pkg2": CVEPackageStatus(CVE_PKG_STATUS_RELEASED),
+                "pkg3": CVEPackageStatus(CVE_PKG_STATUS_RELEASED_ESM_INFRA),
+            },
+            installed_packages={
+                "pkg1": {"pkg1": "1.8"},
+                "pkg2": {"pkg2": "1.8"},
+                "pkg3": {"pkg3": "1.8"},
+            },
+            usn_released_pkgs={
+                "pkg1": {"pkg1": {"version": "2.0"}},
+                "pkg2": {"pkg2": {"version": "2.0"}},
+                "pkg3": {"pkg3": {"version": "2.0"}},
+            },
+        )
+
+        out, _err = capsys.readouterr()
+        assert [
+            mock.call(mock.ANY, "Ubuntu standard updates"),
+            mock.call(mock.ANY, "UA Infra"),
+        ] == m_prompt_for_pocket_access.call_args_list
+        assert [
+            mock.call(["apt-get", "update"], mock.ANY),
+            mock.call(
+                cmd=["apt-get", "install", "--only-upgrade", "-y", "pkg2"],
+                error_msg=mock.ANY,
+                env=mock.ANY,
+            ),
+        ] == m_run_apt_cmd.call_args_list
+        assert "(3/3) pkg1" not in out
+        assert "2 packages are still affected: pkg1, pkg3" in out
+
     @pytest.mark.parametrize("should_reboot", (False, True))
     @pytest.mark.parametrize(
         "service_status",
@@ -2060,6 +2917,27 @@ A fix is available in Ubuntu standard updates.\n"""
 
 
 class TestUpgradePackagesAndAttach:
+    @mock.patch("uaclient.apt.are_apt_lists_fresh", return_value=True)
+    @mock.patch("os.getuid", return_value=0)
+    @mock.patch("uaclient.security.util.subp")
+    def test_apt_update_skipped_when_apt_lists_are_fresh(
+        self, m_subp, _m_os_getuid, _m_lists_fresh, capsys
+    ):
+        m_subp.return_value = ("", "")
+
+        upgrade_packages_and_attach(
+            cfg=None,
+            upgrade_packages=["t1", "t2"],
+            pocket="Ubuntu standard updates",
+        )
+
+        out, _err = capsys.readouterr()
+        assert "apt update" not in out
+        assert "apt install --only-upgrade -y t1 t2" in out
+        assert [
+            ["apt-get", "install", "--only-upgrade", "-y", "t1", "t2"]
+        ] == [call[0][0] for call in m_subp.call_args_list]
+
     @pytest.mark.parametrize("getuid_value", ((0), (1)))
     @mock.patch("os.getuid")
     @mock.patch("uaclient.security.util.subp")
@@ -2114,6 +2992,37 @@ class TestFixSecurityIssueId:
 
         assert expected_message == exc.value.msg
 
+    @mock.patch("uaclient.security.query_installed_source_pkg_versions")
+    def test_error_msg_when_related_usn_is_not_found(
+        self, m_query_installed_pkgs, FakeConfig
+    ):
+        m_query_installed_pkgs.return_value = {}
+        error_mock = mock.Mock()
+        type(error_mock).url = mock.PropertyMock(return_value="URL")
+
+        def get_notice(notice_id):
+            if notice_id == "USN-12345-12":
+                return USN(
+                    mock.Mock(),
+                    {
+                        "id": notice_id,
+                        "cves": [{"notices_ids": ["USN-54321-1"]}],
+                    },
+                )
+            raise SecurityAPIError(
+                e=error_mock,
+                error_response={"message": "USN with id 'ID' not found"},
+            )
+
+        with mock.patch.object(UrlError, "__str__", return_value="ERROR"):
+            with mock.patch.object(
+                UASecurityClient, "get_notice", side_effect=get_notice
+            ):
+                with pytest.raises(exceptions.UserFacingError) as exc:
+                    fix_security_issue_id(FakeConfig(), "USN-12345-12")
+
+        assert "Error: USN-12345-12 not found." == exc.value.msg
+
     @mock.patch("uaclient.security.query_installed_source_pkg_versions")
     @mock.patch("uaclient.security.get_usn_affected_packages_status")
     @mock.patch("uaclient.security.merge_usn_released_binary_package_versions")
@@ -2167,8 +3076,8 @@ class TestFixSecurityIssueId:
                 type(usn_mock).cves = mock.PropertyMock(
                     return_value=[cve_mock]
                 )
-                type(usn_mock).response = mock.PropertyMock(
-                    return_value={"release_packages": {}}
+                type(usn_mock).has_release_packages = mock.PropertyMock(
+                    return_value=False
                 )
                 type(usn_mock).cves_ids = mock.PropertyMock(
                     return_value=["cve-123"]
@@ -2187,6 +3096,108 @@ class TestFixSecurityIssueId:
         assert expected_msg in exc.value.msg
 
 
+def _usn_response(usn_id, related_ids):
+    return {
+        "id": usn_id,
+        "cves": [{"id": "CVE-" + usn_id, "notices_ids": related_ids}],
+    }
+
+
+class TestSecurityIssueFetcher:
+    def _get_client(self, FakeConfig, graph):
+        client = UASecurityClient(FakeConfig())
+        get_notice = mock.Mock(
+            side_effect=lambda notice_id: USN(
+                client, _usn_response(notice_id, graph[notice_id])
+            )
+        )
+        client.get_notice = get_notice
+        return client
+
+    def test_related_notices_fetched_once_each(self, FakeConfig):
+        graph = {"USN-2": ["USN-1", "USN-3"], "USN-3": ["USN-1"]}
+        client = self._get_client(FakeConfig, graph)
+        root_response = _usn_response("USN-1", ["USN-2", "USN-1"])
+        root_response["cves"].append(
+            {"id": "CVE-2", "notices_ids": ["USN-2", "USN-3"]}
+        )
+        root = USN(client, root_response)
+
+        fetcher = SecurityIssueFetcher(client)
+        related = fetcher.get_related_notices(root)
+        assert ["USN-2", "USN-1", "USN-3"] == [usn.id for usn in related]
+        assert related[1] is root
+        assert ["USN-2", "USN-3"] == sorted(
+            call[1]["notice_id"] for call in client.get_notice.call_args_list
+        )
+
+    def test_related_notices_expanded_breadth_first(self, FakeConfig):
+        graph = {"USN-2": ["USN-3"], "USN-3": ["USN-4"], "USN-4": []}
+        client = self._get_client(FakeConfig, graph)
+        root = USN(client, _usn_response("USN-1", ["USN-2"]))
+
+        fetcher = SecurityIssueFetcher(client)
+        related = fetcher.get_related_notices(root, max_depth=2)
+        assert ["USN-2", "USN-3"] == [usn.id for usn in related]
+        assert 2 == client.get_notice.call_count
+
+    def test_notices_fetched_concurrently(self, FakeConfig):
+        client = UASecurityClient(FakeConfig())
+        barrier = threading.Barrier(2, timeout=5)
+
+        def get_notice(notice_id):
+            # Both requests must be in flight for either to complete
+            barrier.wait()
+            return USN(client, {"id": notice_id})
+
+        client.get_notice = mock.Mock(side_effect=get_notice)
+        fetcher = SecurityIssueFetcher(client, max_workers=2)
+        usns = fetcher.get_notices(["USN-2", "USN-3"])
+        assert ["USN-2", "USN-3"] == [usn.id for usn in usns]
+
+    def test_first_failed_notice_error_is_raised(self, FakeConfig):
+        client = UASecurityClient(FakeConfig())
+        errors = {}
+
+        def get_notice(notice_id):
+            if notice_id in ("USN-2", "USN-4"):
+                error_mock = mock.Mock(url=notice_id)
+                errors[notice_id] = SecurityAPIError(
+                    e=error_mock, error_response={"message": "not found"}
+                )
+                raise errors[notice_id]
+            return USN(client, {"id": notice_id})
+
+        client.get_notice = mock.Mock(side_effect=get_notice)
+        fetcher = SecurityIssueFetcher(client)
+        with pytest.raises(SecurityAPIError) as excinfo:
+            fetcher.get_notices(["USN-1", "USN-2", "USN-3", "USN-4"])
+        assert errors["USN-2"] is excinfo.value
+
+    def test_pending_notices_cancelled_on_error(self, FakeConfig):
+        client = UASecurityClient(FakeConfig())
+
+        def get_notice(notice_id):
+            if notice_id == "USN-1":
+                error_mock = mock.Mock(url=notice_id)
+                raise SecurityAPIError(
+                    e=error_mock, error_response={"message": "not found"}
+                )
+            # Keep the only worker busy while the error is handled
+            time.sleep(0.2)
+            return USN(client, {"id": notice_id})
+
+        client.get_notice = mock.Mock(side_effect=get_notice)
+        fetcher = SecurityIssueFetcher(client, max_workers=1)
+        with pytest.raises(SecurityAPIError):
+            fetcher.get_notices(["USN-1", "USN-2", "USN-3", "USN-4"])
+        # Requests queued behind the failed and the running one aren't made
+        requested = [
+            call[1]["notice_id"] for call in client.get_notice.call_args_list
+        ]
+        assert requested in (["USN-1"], ["USN-1", "USN-2"])
+
+
 class TestMergeUSNReleasedBinaryPackageVersions:
     @pytest.mark.parametrize(
         "usns_released_packages, expected_pkgs_dict",
@@ -2290,6 +3301,55 @@ class TestMergeUSNReleasedBinaryPackageVersions:
         assert expected_pkgs_dict == usn_pkgs_dict
 
 
+class TestUSNReleasedPackagesMerger:
+    def _get_usn(self, usn_id, version):
+        return USN(
+            None,
+            {
+                "id": usn_id,
+                "release_packages": {
+                    "focal": [
+                        {
+                            "name": "linux-image-generic",
+                            "source_link": "https://l/linux",
+                            "version": version,
+                        }
+                    ]
+                },
+            },
+            series="focal",
+        )
+
+    @mock.patch("uaclient.security.util.subp")
+    @mock.patch("uaclient.security.version_cmp_le")
+    def test_max_versions_merged_by_version_key(
+        self, m_version_cmp_le, m_subp
+    ):
+        versions = ["5.4.0-42.46", "5.4.0-100.113", "5.4.0-9.10", "1:1.0"]
+        merger = USNReleasedPackagesMerger({})
+        for idx, version in enumerate(versions):
+            merger.add(self._get_usn("USN-{}-1".format(idx), version))
+
+        assert "1:1.0" == (
+            merger.released_packages["linux"]["linux-image-generic"]["version"]
+        )
+        assert 0 == m_version_cmp_le.call_count
+        assert 0 == m_subp.call_count
+
+    @mock.patch("uaclient.security.version_cmp_le")
+    def test_dpkg_compares_versions_when_enabled(self, m_version_cmp_le):
+        dpkg.setup_dpkg_compare_versions(True)
+        m_version_cmp_le.return_value = False
+        merger = USNReleasedPackagesMerger({})
+        merger.add(self._get_usn("USN-1-1", "1.0"))
+        merger.add(self._get_usn("USN-2-1", "2.0"))
+
+        assert "2.0" == (
+            merger.released_packages["linux"]["linux-image-generic"]["version"]
+        )
+        assert [mock.call("2.0", "1.0")] == m_version_cmp_le.call_args_list
+
+
 class TestOverrideUSNReleasePackageStatus:
     @pytest.mark.parametrize(
         "pkg_status",
@@ -2339,6 +3399,9 @@ class TestOverrideUSNReleasePackageStatus:
             orig_cve, usn_src_released_pkgs
         )
         if expected is None:  # Expect CVEPackageStatus unaltered
-            assert override.response == orig_cve.response
+            assert override == orig_cve
         else:
-            assert expected == override.response
+            expected = dict(
+                expected, release_codename=orig_cve.release_codename
+            )
+            assert CVEPackageStatus(expected) == override
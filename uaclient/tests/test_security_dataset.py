@@ -0,0 +1,114 @@
+"""Tests related to uaclient.security_dataset module."""
+
+import json
+import os
+
+import pytest
+
+from uaclient.security_dataset import SecurityDataset, SecurityDatasetError
+
+SAMPLE_CVE = {
+    "id": "CVE-2020-1472",
+    "notices_ids": ["USN-4510-1"],
+    "packages": [{"name": "samba", "statuses": []}],
+}
+SAMPLE_USN = {
+    "id": "USN-4510-1",
+    "cves_ids": ["CVE-2020-1472", "CVE-2020-1473"],
+    "release_packages": {
+        "focal": [
+            {"name": "samba", "is_source": True},
+            {"name": "libwbclient0", "source_link": "https://l/samba"},
+        ],
+        "bionic": [{"name": "samba4", "is_source": True}],
+    },
+}
+
+
+@pytest.fixture
+def dataset(tmpdir):
+    return SecurityDataset(tmpdir.join("security-dataset").strpath)
+
+
+def _write_export(tmpdir, export, name="export.json"):
+    export_file = tmpdir.join(name)
+    export_file.write(json.dumps(export))
+    return export_file.strpath
+
+
+def _assert_single_dataset_version(dataset):
+    """Assert dataset_dir links to the only dataset version left around."""
+    parent_dir, name = os.path.split(dataset.dataset_dir)
+    versions = [
+        entry for entry in os.listdir(parent_dir) if entry.startswith(name)
+    ]
+    assert os.path.islink(dataset.dataset_dir)
+    assert sorted([name, os.readlink(dataset.dataset_dir)]) == sorted(versions)
+
+
+class TestSecurityDataset:
+    def test_import_indexes_issues_and_source_packages(self, dataset, tmpdir):
+        export = _write_export(
+            tmpdir, {"cves": [SAMPLE_CVE], "notices": [SAMPLE_USN]}
+        )
+        assert not dataset.exists()
+        assert {"cves": 1, "notices": 1} == dataset.import_exports([export])
+
+        assert dataset.exists()
+        assert SAMPLE_CVE == dataset.get_issue("cve-2020-1472")
+        assert SAMPLE_USN == dataset.get_issue("USN-4510-1")
+        assert None is dataset.get_issue("USN-1-1")
+        assert ["USN-4510-1"] == dataset.get_cve_notices_ids("CVE-2020-1473")
+        assert ["CVE-2020-1472", "USN-4510-1"] == (
+            dataset.get_package_issues_ids("samba")
+        )
+        assert ["USN-4510-1"] == dataset.get_package_issues_ids("samba4")
+        assert ["CVE-2020-1472"] == dataset.get_issues_ids("CVE")
+        assert ["USN-4510-1"] == dataset.get_issues_ids("USN")
+        assert ["USN-4510-1"] == dataset.get_release_notices_ids("bionic")
+        assert [] == dataset.get_release_notices_ids("xenial")
+
+    def test_import_accepts_lists_of_issues(self, dataset, tmpdir):
+        exports = [
+            _write_export(tmpdir, [SAMPLE_CVE], "cves.json"),
+            _write_export(tmpdir, [SAMPLE_USN, SAMPLE_USN], "usns.json"),
+        ]
+        assert {"cves": 1, "notices": 1} == dataset.import_exports(exports)
+
+    def test_import_replaces_previous_dataset(self, dataset, tmpdir):
+        dataset.import_exports([_write_export(tmpdir, [SAMPLE_CVE])])
+        assert ["USN-4510-1"] == dataset.get_cve_notices_ids("CVE-2020-1472")
+        dataset.import_exports([_write_export(tmpdir, [SAMPLE_USN])])
+
+        assert None is dataset.get_issue("CVE-2020-1472")
+        assert ["USN-4510-1"] == dataset.get_cve_notices_ids("CVE-2020-1473")
+        _assert_single_dataset_version(dataset)
+
+    @pytest.mark.parametrize(
+        "export,error",
+        (
+            ("not json", "Unable to read security data"),
+            ("42", "Unexpected security data"),
+            ('[{"id": "../../etc/passwd"}]', "Invalid security issue id"),
+            ('[{"title": "no id"}]', "Invalid security issue id"),
+        ),
+    )
+    def test_failed_import_keeps_previous_dataset(
+        self, export, error, dataset, tmpdir
+    ):
+        dataset.import_exports([_write_export(tmpdir, [SAMPLE_CVE])])
+        bad_export = tmpdir.join("bad.json")
+        bad_export.write(export)
+        with pytest.raises(SecurityDatasetError) as excinfo:
+            dataset.import_exports([bad_export.strpath])
+
+        assert error in str(excinfo.value)
+        assert SAMPLE_CVE == dataset.get_issue("CVE-2020-1472")
+        _assert_single_dataset_version(dataset)
+
+    def test_unsupported_index_version(self, dataset, tmpdir):
+        dataset.import_exports([_write_export(tmpdir, [SAMPLE_CVE])])
+        with open(dataset.index_path, "w") as stream:
+            stream.write('{"version": 2}')
+        with pytest.raises(SecurityDatasetError):
+            SecurityDataset(dataset.dataset_dir).index
@@ -3,9 +3,11 @@ import mock
 import pytest
 
 from lib.upgrade_lts_contract import process_contract_delta_after_apt_lock
+from uaclient import util
 
 
 @pytest.mark.parametrize("caplog_text", [logging.DEBUG], indirect=True)
+@pytest.mark.usefixtures("distro_info_csv")
 class TestUpgradeLTSContract:
     @mock.patch(
         "uaclient.config.UAConfig.is_attached",
@@ -59,6 +61,28 @@ class TestUpgradeLTSContract:
         for log in expected_msgs + expected_logs:
             assert log in debug_logs
 
+    @mock.patch(
+        "uaclient.config.UAConfig.is_attached",
+        new_callable=mock.PropertyMock,
+        return_value=True,
+    )
+    @mock.patch("lib.upgrade_lts_contract.parse_os_release")
+    @mock.patch("lib.upgrade_lts_contract.subp")
+    def test_upgrade_abort_when_release_is_unknown(
+        self, m_subp, m_parse_os, m_is_attached, capsys, caplog_text
+    ):
+        m_parse_os.return_value = {"VERSION_ID": "99.04"}
+        m_subp.return_value = ("", "")
+
+        with pytest.raises(SystemExit) as execinfo:
+            process_contract_delta_after_apt_lock()
+
+        assert 1 == execinfo.value.code
+        out, _err = capsys.readouterr()
+        msg = "Unable to identify Ubuntu release for VERSION_ID 99.04"
+        assert msg in out
+        assert msg in caplog_text()
+
     @mock.patch(
         "uaclient.config.UAConfig.is_attached",
         new_callable=mock.PropertyMock,
@@ -68,8 +92,10 @@ class TestUpgradeLTSContract:
     @mock.patch("lib.upgrade_lts_contract.subp")
     @mock.patch("lib.upgrade_lts_contract.process_entitlements_delta")
     @mock.patch("lib.upgrade_lts_contract.time.sleep")
+    @mock.patch("uaclient.util.get_platform_info")
     def test_upgrade_contract_when_apt_lock_is_held(
         self,
+        m_platform_info,
         m_sleep,
         m_process_delta,
         m_subp,
@@ -79,6 +105,7 @@ class TestUpgradeLTSContract:
         caplog_text,
     ):
         m_parse_os.return_value = {"VERSION_ID": "20.04"}
+        m_platform_info.return_value = util.PlatformInfo(series="bionic")
 
         m_subp.side_effect = [
             ("apt     146195 root", ""),
@@ -116,3 +143,36 @@ class TestUpgradeLTSContract:
         debug_logs = caplog_text()
         for log in expected_msgs + ["Check whether to upgrade-lts-contract"]:
             assert log in debug_logs
+
+    @mock.patch(
+        "uaclient.config.UAConfig.is_attached",
+        new_callable=mock.PropertyMock,
+        return_value=True,
+    )
+    @mock.patch("uaclient.config.UAConfig.flush_notices")
+    @mock.patch("lib.upgrade_lts_contract.parse_os_release")
+    @mock.patch("lib.upgrade_lts_contract.subp", return_value=("", ""))
+    @mock.patch("lib.upgrade_lts_contract.process_entitlements_delta")
+    @mock.patch("uaclient.util.get_platform_info")
+    def test_notices_flushed_when_processing_deltas_fails(
+        self,
+        m_platform_info,
+        m_process_delta,
+        _m_subp,
+        m_parse_os,
+        m_flush_notices,
+        _m_is_attached,
+        caplog_text,
+    ):
+        m_parse_os.return_value = {"VERSION_ID": "20.04"}
+        m_platform_info.return_value = util.PlatformInfo(series="bionic")
+        m_process_delta.side_effect = RuntimeError("fips install failed")
+
+        with pytest.raises(RuntimeError):
+            process_contract_delta_after_apt_lock()
+
+        assert 1 == m_flush_notices.call_count
+        assert (
+            m_process_delta.call_args[1]["cfg"].flush_notices
+            is m_flush_notices
+        )
@@ -119,6 +119,79 @@ class TestGetDictDeltas:
         assert expected == util.get_dict_deltas(orig_dict, new_dict)
 
 
+class TestPersistentSystemFact:
+    @pytest.fixture
+    def facts_env(self, tmpdir):
+        boot_id = tmpdir.join("boot_id")
+        boot_id.write("boot-1\n")
+        os_release = tmpdir.join("os-release")
+        os_release.write("VERSION_ID=20.04")
+        data_dir = tmpdir.mkdir("data")
+        with mock.patch("uaclient.util.BOOT_ID_FILE", boot_id.strpath):
+            with mock.patch(
+                "uaclient.util.OS_RELEASE_FILE", os_release.strpath
+            ):
+                util.setup_system_facts_cache(data_dir.strpath)
+                yield boot_id, os_release, data_dir
+
+    def _fact_func(self):
+        calls = []
+
+        @util.persistent_system_fact("answer")
+        def answer(series):
+            calls.append(series)
+            return series == "xenial"
+
+        return answer, calls
+
+    @mock.patch("uaclient.util.os.getuid", return_value=0)
+    def test_facts_are_reused_by_later_processes(self, _m_getuid, facts_env):
+        """Persisted facts are reused after the in-memory state is reset."""
+        _boot_id, _os_release, data_dir = facts_env
+        answer, calls = self._fact_func()
+        assert answer("xenial") is True
+        assert answer("xenial") is True
+        assert ["xenial"] == calls
+        facts_file = data_dir.join(util.SYSTEM_FACTS_FILE)
+        assert {"answer:xenial": True} == json.loads(facts_file.read())[
+            "facts"
+        ]
+
+        # Simulate a new process
+        util.setup_system_facts_cache(data_dir.strpath)
+        assert answer("xenial") is True
+        assert answer("bionic") is False
+        assert ["xenial", "bionic"] == calls
+
+    @pytest.mark.parametrize("changed", ("boot_id", "os_release"))
+    @mock.patch("uaclient.util.os.getuid", return_value=0)
+    def test_facts_invalidated_on_reboot_or_release_change(
+        self, _m_getuid, changed, facts_env
+    ):
+        """Reboots and os-release changes drop previously persisted facts."""
+        boot_id, os_release, data_dir = facts_env
+        answer, calls = self._fact_func()
+        answer("xenial")
+        if changed == "boot_id":
+            boot_id.write("boot-2\n")
+        else:
+            os_release.setmtime(os_release.mtime() + 10)
+
+        util.setup_system_facts_cache(data_dir.strpath)
+        answer("xenial")
+        assert ["xenial", "xenial"] == calls
+
+    @mock.patch("uaclient.util.os.getuid", return_value=1000)
+    def test_non_root_does_not_write_facts(self, _m_getuid, facts_env):
+        """Only root persists the facts file."""
+        _boot_id, _os_release, data_dir = facts_env
+        answer, calls = self._fact_func()
+        answer("xenial")
+        answer("xenial")
+        assert ["xenial"] == calls
+        assert not data_dir.join(util.SYSTEM_FACTS_FILE).check()
+
+
 class TestIsLTS:
     @pytest.mark.parametrize(
         "series, supported_esm, expected",
@@ -128,8 +201,9 @@ class TestIsLTS:
             ("groovy", "trusty\nxenial\nbionic\nfocal", False),
         ),
     )
+    @pytest.mark.usefixtures("no_distro_info_csv")
     @mock.patch("uaclient.util.subp")
-    def test_is_lts_if_distro_info_supported_esm(
+    def test_is_lts_falls_back_to_distro_info_cli(
         self, subp, series, supported_esm, expected
     ):
         subp.return_value = supported_esm, ""
@@ -139,6 +213,27 @@ class TestIsLTS:
             mock.call(["/usr/bin/ubuntu-distro-info", "--supported-esm"])
         ] == subp.call_args_list
 
+    @pytest.mark.parametrize(
+        "series, expected",
+        (
+            ("trusty", True),
+            ("xenial", True),
+            ("focal", True),
+            ("groovy", False),
+            ("unknown", False),
+        ),
+    )
+    @pytest.mark.usefixtures("distro_info_csv")
+    @mock.patch("uaclient.distro_info.datetime")
+    @mock.patch("uaclient.util.subp")
+    def test_is_lts_reads_distro_info_data(
+        self, subp, m_datetime, series, expected
+    ):
+        m_datetime.date.today.return_value = datetime.date(2021, 1, 1)
+        m_datetime.datetime = datetime.datetime
+        assert expected is util.is_lts.__wrapped__(series)
+        assert 0 == subp.call_count
+
 
 class TestIsActiveESM:
     @pytest.mark.parametrize(
@@ -154,6 +249,7 @@ class TestIsActiveESM:
             ("groovy", False, 0, False),
         ),
     )
+    @pytest.mark.usefixtures("no_distro_info_csv")
     @mock.patch("uaclient.util.subp")
     @mock.patch("uaclient.util.is_lts")
     def test_true_when_supported_esm_release_and_active(
@@ -179,6 +275,29 @@ class TestIsActiveESM:
         assert expected is util.is_active_esm.__wrapped__(series)
         assert calls == subp.call_args_list
 
+    @pytest.mark.parametrize(
+        "series, today, expected",
+        (
+            ("trusty", datetime.date(2021, 1, 1), True),
+            ("xenial", datetime.date(2021, 4, 29), False),
+            ("xenial", datetime.date(2021, 4, 30), True),
+            ("focal", datetime.date(2021, 1, 1), False),
+            ("groovy", datetime.date(2021, 1, 1), False),
+        ),
+    )
+    @pytest.mark.usefixtures("distro_info_csv")
+    @mock.patch("uaclient.distro_info.datetime")
+    @mock.patch("uaclient.util.subp")
+    def test_active_esm_reads_distro_info_data(
+        self, subp, m_datetime, series, today, expected
+    ):
+        """Return True when series is supported by ESM and past its EOL."""
+        util.is_lts.cache_clear()
+        m_datetime.date.today.return_value = today
+        m_datetime.datetime = datetime.datetime
+        assert expected is util.is_active_esm.__wrapped__(series)
+        assert 0 == subp.call_count
+
 
 class TestIsContainer:
     @mock.patch("uaclient.util.subp")
@@ -437,6 +556,46 @@ class TestGetPlatformInfo:
                     m_subp.return_value = ("arm64\n", "")
                     assert expected == util.get_platform_info()
 
+    @mock.patch("uaclient.util.os.uname")
+    @mock.patch("uaclient.util.subp", return_value=("amd64\n", ""))
+    @mock.patch("uaclient.util.parse_os_release")
+    def test_get_platform_info_probes_arch_once(
+        self, m_parse, m_subp, m_uname
+    ):
+        """get_platform_info forks dpkg once until the cache is cleared."""
+        m_parse.return_value = {"NAME": "Ubuntu", "VERSION": "20.04 (Focal)"}
+        m_uname.return_value = posix.uname_result(
+            ("", "", "kernel-ver", "", "x86_64")
+        )
+        arch_call = mock.call(["dpkg", "--print-architecture"])
+
+        first = util.get_platform_info()
+        assert first is util.get_platform_info()
+        assert [arch_call] == m_subp.call_args_list
+
+        util.clear_platform_info_cache()
+        assert first == util.get_platform_info()
+        assert [arch_call, arch_call] == m_subp.call_args_list
+
+    def test_platform_info_is_immutable(self):
+        """PlatformInfo can not be mutated through the mapping interface."""
+        platform_info = util.PlatformInfo(series="xenial", arch="amd64")
+        with pytest.raises(TypeError):
+            platform_info["series"] = "bionic"  # type: ignore
+        replaced = platform_info.replace(series="bionic")
+        assert {"series": "xenial", "arch": "amd64"} == platform_info
+        assert {"series": "bionic", "arch": "amd64"} == replaced
+
+    @mock.patch("uaclient.util._probe_platform_info")
+    def test_override_platform_series(self, m_probe):
+        """override_platform_series only applies in the context body."""
+        m_probe.return_value = util.PlatformInfo(series="xenial", arch="s390x")
+        with util.override_platform_series("bionic"):
+            assert "bionic" == util.get_platform_info()["series"]
+            assert "s390x" == util.get_platform_info()["arch"]
+        assert "xenial" == util.get_platform_info()["series"]
+        assert 1 == m_probe.call_count
+
 
 class TestApplySeriesOverrides:
     def test_error_on_non_entitlement_dict(self):
@@ -857,3 +1016,35 @@ class TestRedactSensitiveLogs:
     def test_redact_all_matching_regexs(self, raw_log, expected):
         """Redact all sensitive matches from log messages."""
         assert expected == util.redact_sensitive_logs(raw_log)
+
+
+class TestAtomicWriteFile:
+    def test_replaces_file_content_and_mode(self, tmpdir):
+        target = tmpdir.join("auth.conf")
+        target.write("old")
+        util.atomic_write_file(target.strpath, "new\n", mode=0o600)
+        assert "new\n" == target.read()
+        assert 0o600 == target.stat().mode & 0o7777
+        assert ["auth.conf"] == [p.basename for p in tmpdir.listdir()]
+
+    def test_syncs_temp_file_before_rename(self, tmpdir):
+        """Content reaches the disk before it replaces the original file."""
+        target = tmpdir.join("auth.conf")
+        m_os = mock.Mock()
+        with mock.patch("uaclient.util.os.fsync", m_os.fsync):
+            with mock.patch("uaclient.util.os.rename", m_os.rename):
+                util.atomic_write_file(target.strpath, "new")
+        assert ["fsync", "rename"] == [c[0] for c in m_os.method_calls]
+        assert target.strpath == m_os.rename.call_args[0][1]
+
+    @mock.patch("uaclient.util.os.rename")
+    def test_failed_rename_keeps_original_and_removes_temp_file(
+        self, m_rename, tmpdir
+    ):
+        m_rename.side_effect = OSError("rename failed")
+        target = tmpdir.join("auth.conf")
+        target.write("old")
+        with pytest.raises(OSError):
+            util.atomic_write_file(target.strpath, "new")
+        assert "old" == target.read()
+        assert ["auth.conf"] == [p.basename for p in tmpdir.listdir()]
@@ -5,14 +5,17 @@ import logging
 import os
 import re
 import subprocess
+import tempfile
 import time
 from urllib import error, request
 from urllib.parse import urlparse
 import uuid
+import collections.abc
 from contextlib import contextmanager
 from functools import lru_cache, wraps
 from http.client import HTTPMessage  # noqa: F401
 
+from uaclient import distro_info
 from uaclient import exceptions
 from uaclient import status
 
@@ -43,6 +46,16 @@ DROPPED_KEY = object()
 # N.B. this relies on the version normalisation we perform in get_platform_info
 REGEX_OS_RELEASE_VERSION = r"(?P<release>\d+\.\d+) (LTS )?\((?P<series>\w+).*"
 
+# Process-wide PlatformInfo snapshot, see get_platform_info
+_PLATFORM_INFO = None  # type: Optional[PlatformInfo]
+
+# System facts persisted across processes, see persistent_system_fact
+SYSTEM_FACTS_FILE = "system-facts.json"
+BOOT_ID_FILE = "/proc/sys/kernel/random/boot_id"
+OS_RELEASE_FILE = "/etc/os-release"
+_SYSTEM_FACTS_PATH = None  # type: Optional[str]
+_SYSTEM_FACTS = None  # type: Optional[Dict[str, Any]]
+
 
 class LogFormatter(logging.Formatter):
 
@@ -305,13 +318,37 @@ def get_machine_id(data_dir: str) -> str:
     return machine_id
 
 
-def get_platform_info() -> "Dict[str, str]":
-    """
-    Returns a dict of platform information.
+class PlatformInfo(collections.abc.Mapping):
+    """Immutable snapshot of the platform information for this process.
 
-    N.B. This dict is sent to the contract server, which requires the
-    distribution, type and release keys.
+    Behaves as a read-only mapping so callers can keep using dict-style
+    access: platform_info["series"].
     """
+
+    def __init__(self, **info: str) -> None:
+        self._info = dict(info)
+
+    def __getitem__(self, key: str) -> str:
+        return self._info[key]
+
+    def __iter__(self):
+        return iter(self._info)
+
+    def __len__(self) -> int:
+        return len(self._info)
+
+    def __repr__(self) -> str:
+        return "PlatformInfo({!r})".format(self._info)
+
+    def replace(self, **changes: str) -> "PlatformInfo":
+        """Return a new PlatformInfo with the provided keys replaced."""
+        info = dict(self._info)
+        info.update(changes)
+        return PlatformInfo(**info)
+
+
+def _probe_platform_info() -> PlatformInfo:
+    """Collect platform information from os-release, uname and dpkg."""
     os_release = parse_os_release()
     platform_info = {
         "distribution": os_release.get("NAME", "UNKNOWN"),
@@ -345,11 +382,158 @@ def get_platform_info() -> "Dict[str, str]":
     out, _err = subp(["dpkg", "--print-architecture"])
     platform_info["arch"] = out.strip()
 
-    return platform_info
+    return PlatformInfo(**platform_info)
+
+
+def get_platform_info() -> PlatformInfo:
+    """
+    Returns a PlatformInfo mapping of platform information.
+
+    The platform is probed once per process and the same immutable snapshot
+    is returned on subsequent calls. Use clear_platform_info_cache when the
+    underlying release changes, for instance after do-release-upgrade.
+
+    N.B. This mapping is sent to the contract server, which requires the
+    distribution, type and release keys.
+    """
+    global _PLATFORM_INFO
+    if _PLATFORM_INFO is None:
+        _PLATFORM_INFO = _probe_platform_info()
+    return _PLATFORM_INFO
+
+
+def clear_platform_info_cache() -> None:
+    """Drop the cached PlatformInfo so the next call re-probes the system."""
+    global _PLATFORM_INFO
+    _PLATFORM_INFO = None
+    parse_os_release.cache_clear()
+
+
+@contextmanager
+def override_platform_series(series: str):
+    """Report series as the platform series for the body of this context.
+
+    Used by upgrade_lts_contract, which processes contract deltas on behalf
+    of a specific release.
+    """
+    global _PLATFORM_INFO
+    orig_platform_info = get_platform_info()
+    _PLATFORM_INFO = orig_platform_info.replace(series=series)
+    try:
+        yield
+    finally:
+        _PLATFORM_INFO = orig_platform_info
+
+
+def setup_system_facts_cache(data_dir: "Optional[str]") -> None:
+    """Persist system facts in data_dir so later processes can reuse them.
+
+    :param data_dir: The uaclient data_dir. None disables persistence.
+    """
+    global _SYSTEM_FACTS_PATH, _SYSTEM_FACTS
+    _SYSTEM_FACTS_PATH = None
+    if data_dir:
+        _SYSTEM_FACTS_PATH = os.path.join(data_dir, SYSTEM_FACTS_FILE)
+    _SYSTEM_FACTS = None
+
+
+def _get_system_facts_key() -> "Optional[Dict[str, Any]]":
+    """Return the values which invalidate persisted system facts.
+
+    Facts are valid for the current boot only and are dropped whenever
+    os-release changes.
+
+    :return: Dict of invalidation values or None if boot_id is unavailable.
+    """
+    try:
+        with open(BOOT_ID_FILE) as stream:
+            boot_id = stream.read().strip()
+    except (IOError, OSError):
+        return None
+    try:
+        os_release_mtime = os.stat(OS_RELEASE_FILE).st_mtime
+    except OSError:
+        os_release_mtime = None
+    return {"boot_id": boot_id, OS_RELEASE_FILE: os_release_mtime}
+
+
+def _load_system_facts() -> "Optional[Dict[str, Any]]":
+    """Return the persisted system facts valid for the current boot.
+
+    :return: Dict with key and facts items, or None when persistence is
+        disabled or unsupported on this system.
+    """
+    global _SYSTEM_FACTS
+    if not _SYSTEM_FACTS_PATH:
+        return None
+    if _SYSTEM_FACTS is None:
+        key = _get_system_facts_key()
+        if key is None:
+            return None
+        facts = {}  # type: Dict[str, Any]
+        if os.path.exists(_SYSTEM_FACTS_PATH):
+            try:
+                cached = json.loads(load_file(_SYSTEM_FACTS_PATH))
+            except (IOError, OSError, ValueError) as e:
+                logging.debug("Ignoring invalid system facts: %s", str(e))
+                cached = {}
+            if isinstance(cached, dict) and cached.get("key") == key:
+                facts = cached.get("facts", {})
+        _SYSTEM_FACTS = {"key": key, "facts": facts}
+    return _SYSTEM_FACTS
+
+
+def persistent_system_fact(fact_name: str):
+    """Decorator persisting a function's return value as a system fact.
+
+    The result is stored in the system facts file configured by
+    setup_system_facts_cache and reused by subsequent uaclient processes
+    until reboot or until os-release changes. Only root updates the facts
+    file. Use it for facts which need a subprocess to be computed.
+
+    @param fact_name: The name under which to store the value. Positional
+        and keyword arguments are appended to build the fact key.
+    """
+
+    def wrapper(f):
+        @wraps(f)
+        def new_f(*args, **kwargs):
+            system_facts = _load_system_facts()
+            if system_facts is None:
+                return f(*args, **kwargs)
+            fact_key = ":".join(
+                [fact_name]
+                + [str(arg) for arg in args]
+                + ["{}={}".format(k, kwargs[k]) for k in sorted(kwargs)]
+            )
+            facts = system_facts["facts"]
+            if fact_key in facts:
+                return facts[fact_key]
+            value = f(*args, **kwargs)
+            facts[fact_key] = value
+            facts_dir = os.path.dirname(str(_SYSTEM_FACTS_PATH))
+            if os.getuid() == 0 and os.path.isdir(facts_dir):
+                try:
+                    atomic_write_file(
+                        str(_SYSTEM_FACTS_PATH), json.dumps(system_facts)
+                    )
+                except (IOError, OSError) as e:
+                    logging.debug("Unable to persist system facts: %s", e)
+            return value
+
+        return new_f
+
+    return wrapper
 
 
 @lru_cache(maxsize=None)
 def is_lts(series: str) -> bool:
+    try:
+        return distro_info.get_distro_info().is_supported_esm(series)
+    except (IOError, ValueError) as e:
+        logging.debug(
+            "Falling back to ubuntu-distro-info CLI for LTS check: %s", str(e)
+        )
     out, _err = subp(["/usr/bin/ubuntu-distro-info", "--supported-esm"])
     return series in out
 
@@ -359,6 +543,12 @@ def is_active_esm(series: str) -> bool:
     """Return True when Ubuntu series supports ESM and is actively in ESM."""
     if not is_lts(series):
         return False
+    try:
+        return distro_info.get_distro_info().is_eol(series)
+    except (IOError, ValueError) as e:
+        logging.debug(
+            "Falling back to ubuntu-distro-info CLI for ESM check: %s", str(e)
+        )
     if series == "trusty":
         return True  # Trusty doesn't have a --series param
     out, _err = subp(
@@ -368,6 +558,7 @@ def is_active_esm(series: str) -> bool:
 
 
 @lru_cache(maxsize=None)
+@persistent_system_fact("is_container")
 def is_container(run_path: str = "/run") -> bool:
     """Checks to see if this code running in a container of some sort"""
 
@@ -650,6 +841,35 @@ def write_file(filename: str, content: str, mode: int = 0o644) -> None:
     os.chmod(filename, mode)
 
 
+def atomic_write_file(filename: str, content: str, mode: int = 0o644) -> None:
+    """Write content to filename through a rename of a temporary file.
+
+    Readers of filename only ever see its previous or its new content, never
+    a partial write. The content is synced to disk before the rename so a
+    crash can't leave an empty file in place of the previous one.
+
+    @param filename: The full path of the file to write.
+    @param content: The content to write to the file.
+    @param mode: The filesystem mode to set on the file.
+    """
+    logging.debug("Writing file atomically: %s", filename)
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=".{}.".format(os.path.basename(filename)),
+        dir=os.path.dirname(filename) or ".",
+    )
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(content.encode("utf-8"))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.chmod(tmp_path, mode)
+        os.rename(tmp_path, filename)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
 def remove_file(file_path: str) -> None:
     """Remove a file if it exists, logging a message about removal."""
     if os.path.exists(file_path):